@@ -1,11 +1,18 @@
 # app/api/deps.py
-from typing import Generator, Optional, Dict, Any
+from typing import AsyncGenerator, Callable, Generator, Optional, Dict, Any, TypeVar, Union
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, AsyncSessionLocal
 from app.core.config import settings
+from app.core.profiling import current_request_stats
+
+T = TypeVar("T")
+AnyDb = Union[Session, AsyncSession]
+
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
@@ -14,6 +21,36 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency cho các route KH/NV/CN/CT: chọn sync/async theo settings.DB_ASYNC
+get_service_db = get_async_db if settings.DB_ASYNC else get_db
+
+async def run_db(db: AnyDb, fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Gọi service sync `fn(db, ...)` từ route async.
+    - AsyncSession: chạy qua run_sync (greenlet), I/O đi bằng aioodbc, không chiếm threadpool.
+    - Session: chạy trong threadpool như route `def` trước đây.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+def statement_budget(limit: int):
+    """
+    Depends(statement_budget(n)): route được chạy tối đa n câu SQL (xem SQL_BUDGET_MODE).
+    Giá trị nằm ở .limit để scripts.check_statement_budgets đọc lại từ route.
+    """
+    async def _dep() -> None:
+        req = current_request_stats()
+        if req is not None:
+            req.budget = limit
+
+    _dep.limit = limit
+    return _dep
+
 def decode_token(token: str) -> Dict[str, Any]:
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
@@ -1,7 +1,7 @@
 # app/api/router.py
 from fastapi import APIRouter
 
-from app.api.routes import auth, customer, staff, branch, company
+from app.api.routes import auth, customer, staff, branch, company, internal
 
 api_router = APIRouter()
 
@@ -10,3 +10,4 @@ api_router.include_router(customer.router, prefix="/customer", tags=["customer"]
 api_router.include_router(staff.router, prefix="/staff", tags=["staff"])
 api_router.include_router(branch.router, prefix="/branch", tags=["branch"])
 api_router.include_router(company.router, prefix="/company", tags=["company"])
+api_router.include_router(internal.router, prefix="/_internal", tags=["internal"])
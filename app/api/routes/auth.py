@@ -8,6 +8,7 @@ from passlib.context import CryptContext
 
 from app.api.deps import get_db
 from app.core.config import settings
+from app.services import search_index
 import uuid
 
 router = APIRouter()
@@ -122,6 +123,7 @@ def customer_register(
         })
 
         db.commit()
+        search_index.refresh(db, "KHACHHANG", new_ma_kh)
         return {"status": "success", "ma_kh": new_ma_kh}
 
     except Exception as e:
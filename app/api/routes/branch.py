@@ -1,23 +1,29 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
 
-from app.api.deps import get_db
+from app.api.deps import AnyDb, get_service_db, run_db
+from app.core.cache import report_cache
 from app.services import branch_service
 
 router = APIRouter()
 
 @router.get("/{ma_cn}/revenue")
-def revenue(ma_cn: str, granularity: str = "day", db: Session = Depends(get_db)):
-    return {"items": branch_service.revenue(db, ma_cn, granularity)}
+async def revenue(ma_cn: str, granularity: str = "day", db: AnyDb = Depends(get_service_db)):
+    return {"items": await report_cache.get_or_set(
+        "branch", f"revenue:{ma_cn}:{granularity}",
+        lambda: run_db(db, branch_service.revenue, ma_cn, granularity),
+    )}
 
 @router.get("/{ma_cn}/inventory/products")
-def inv_products(ma_cn: str, db: Session = Depends(get_db)):
-    return {"items": branch_service.inv_products(db, ma_cn)}
+async def inv_products(ma_cn: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, branch_service.inv_products, ma_cn)}
 
 @router.get("/{ma_cn}/inventory/vaccines")
-def inv_vaccines(ma_cn: str, db: Session = Depends(get_db)):
-    return {"items": branch_service.inv_vaccines(db, ma_cn)}
+async def inv_vaccines(ma_cn: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, branch_service.inv_vaccines, ma_cn)}
 
 @router.get("/{ma_cn}/vaccinations")
-def vaccinations_in_range(ma_cn: str, from_date: str, to_date: str, db: Session = Depends(get_db)):
-    return {"items": branch_service.vaccinations_in_range(db, ma_cn, from_date, to_date)}
+async def vaccinations_in_range(ma_cn: str, from_date: str, to_date: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await report_cache.get_or_set(
+        "branch", f"vaccinations:{ma_cn}:{from_date}:{to_date}",
+        lambda: run_db(db, branch_service.vaccinations_in_range, ma_cn, from_date, to_date),
+    )}
@@ -1,74 +1,100 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
 from typing import Optional, List, Dict, Any
 
-from app.api.deps import get_db
+from app.api.deps import AnyDb, get_service_db, run_db, statement_budget
+from app.api.streaming import ndjson_response
+from app.core.cache import report_cache
 from app.services import company_service
+from app.services.pagination import MAX_LIMIT
 
 router = APIRouter()
 
 @router.get("/revenue/by-branch") # CT1
-def get_revenue_by_branch(db: Session = Depends(get_db)):
+async def get_revenue_by_branch(db: AnyDb = Depends(get_service_db)):
     """Doanh thu của từng chi nhánh [CT1]"""
-    return {"items": company_service.get_revenue_by_branch(db)}
+    return {"items": await report_cache.get_or_set(
+        "company", "ct1", lambda: run_db(db, company_service.get_revenue_by_branch)
+    )}
 
 @router.get("/revenue/total") # CT2
-def get_total_revenue(db: Session = Depends(get_db)):
+async def get_total_revenue(db: AnyDb = Depends(get_service_db)):
     """Tổng doanh thu của các chi nhánh [CT2]"""
-    return company_service.get_total_revenue(db)
+    return await report_cache.get_or_set(
+        "company", "ct2", lambda: run_db(db, company_service.get_total_revenue)
+    )
 
 @router.get("/services/top-revenue") # CT3
-def get_top_services(db: Session = Depends(get_db)):
+async def get_top_services(db: AnyDb = Depends(get_service_db)):
     """Dịch vụ mang lại doanh thu cao nhất trong 6 tháng gần nhất [CT3]"""
-    return {"items": company_service.get_top_revenue_services(db)}
+    return {"items": await report_cache.get_or_set(
+        "company", "ct3", lambda: run_db(db, company_service.get_top_revenue_services)
+    )}
 
-@router.get("/memberships/distribution") # CT4
-def get_membership_stats(db: Session = Depends(get_db)):
-    """Tình hình hội viên (Cơ bản / Thân thiết / VIP) [CT4]"""
-    return {"items": company_service.get_membership_stats(db)}
+@router.get("/memberships/distribution", dependencies=[Depends(statement_budget(1))]) # CT4
+async def get_membership_stats(db: AnyDb = Depends(get_service_db)):
+    """Tình hình hội viên (Cơ bản / Thân thiết / VIP) [CT4]; đọc bảng đếm THANHVIEN_BAC nên không cần cache"""
+    return {"items": await run_db(db, company_service.get_membership_stats)}
 
 # Tra cứu nhân viên [CT5]
 @router.get("/staff/search")
-def search_staff(keyword: str = Query(""), db: Session = Depends(get_db)):
-    return {"items": company_service.search_staff(db, keyword)}
+async def search_staff(
+    keyword: str = Query(""),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AnyDb = Depends(get_service_db),
+):
+    if stream:
+        return ndjson_response(company_service.stream_staff(keyword, cursor))
+    return await run_db(db, company_service.search_staff, keyword, limit, cursor)
 
 # Thêm nhân viên [CT5]
 @router.post("/staff")
-def create_staff(staff_data: dict, db: Session = Depends(get_db)):
+async def create_staff(staff_data: dict, db: AnyDb = Depends(get_service_db)):
     try:
-        return company_service.create_staff(db, staff_data)
+        result = await run_db(db, company_service.create_staff, staff_data)
     except Exception as e:
         raise HTTPException(status_code=400, detail="Mã nhân viên đã tồn tại hoặc dữ liệu không hợp lệ")
+    await report_cache.invalidate("company", "branch")
+    return result
 
 # Sửa lương / Điều động [CT5, CT6]
 @router.put("/staff/{ma_nv}/assignment")
-def update_staff(ma_nv: str, payload: dict, db: Session = Depends(get_db)):
+async def update_staff(ma_nv: str, payload: dict, db: AnyDb = Depends(get_service_db)):
     try:
         ma_cn = payload.get("ma_cn_moi")
         luong = payload.get("luong_moi")
-        return company_service.update_staff(db, ma_nv, ma_cn, luong)
+        result = await run_db(db, company_service.update_staff, ma_nv, ma_cn, luong)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    await report_cache.invalidate("company", "branch")
+    return result
 
 # Xóa nhân viên [CT5]
 @router.delete("/staff/{ma_nv}")
-def delete_staff(ma_nv: str, db: Session = Depends(get_db)):
+async def delete_staff(ma_nv: str, db: AnyDb = Depends(get_service_db)):
     try:
-        return company_service.delete_staff(db, ma_nv)
+        result = await run_db(db, company_service.delete_staff, ma_nv)
     except Exception as e:
         raise HTTPException(status_code=400, detail="Nhân viên này đã có dữ liệu giao dịch, không thể xóa")
+    await report_cache.invalidate("company", "branch")
+    return result
 
 @router.get("/customers/count-by-branch") # CT7
-def get_customer_count(db: Session = Depends(get_db)):
+async def get_customer_count(db: AnyDb = Depends(get_service_db)):
     """Tra cứu số khách hàng của từng chi nhánh [CT7]"""
-    return {"items": company_service.get_customer_count_by_branch(db)}
+    return {"items": await report_cache.get_or_set(
+        "company", "ct7", lambda: run_db(db, company_service.get_customer_count_by_branch)
+    )}
 
 @router.get("/pets/overall-stats") # CT8
-def get_pet_stats(db: Session = Depends(get_db)):
+async def get_pet_stats(db: AnyDb = Depends(get_service_db)):
     """Thống kê về số lượng thú cưng trên toàn hệ thống [CT8]"""
-    return {"items": company_service.get_total_pets_stats(db)}
+    return {"items": await report_cache.get_or_set(
+        "company", "ct8", lambda: run_db(db, company_service.get_total_pets_stats)
+    )}
 
 
 @router.get("/branches/all")
-def get_branches(db: Session = Depends(get_db)):
-    return {"items": company_service.get_all_branches(db)}
\ No newline at end of file
+async def get_branches(db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, company_service.get_all_branches)}
\ No newline at end of file
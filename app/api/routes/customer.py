@@ -1,148 +1,185 @@
 # app/api/routes/customer.py
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+import datetime as dt
+from typing import Optional
 
-from app.api.deps import get_db
+from fastapi import APIRouter, Depends, Query
+
+from app.api.deps import AnyDb, get_service_db, run_db, statement_budget
+from app.api.streaming import ndjson_response
+from app.core.cache import report_cache
 from app.services import customer_service
+from app.services.pagination import MAX_LIMIT
 from pydantic import BaseModel, Field
 
 router = APIRouter()
 
-@router.get("/packages")
-def list_packages(db: Session = Depends(get_db)):
-    return {"items": customer_service.kh1_list_packages(db)}
+@router.get("/packages", dependencies=[Depends(statement_budget(1))])
+async def list_packages(db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, customer_service.kh1_list_packages)}
 
 @router.get("/pets")
-def list_pets(ma_kh: str, db: Session = Depends(get_db)):
-    return {"items": customer_service.kh2_list_pets(db, ma_kh)}
+async def list_pets(ma_kh: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, customer_service.kh2_list_pets, ma_kh)}
 
 @router.post("/pets")
-def create_pet(ma_kh: str, ten: str, loai: str = None, giong: str = None, db: Session = Depends(get_db)):
-    return customer_service.kh2_create_pet(db, ma_kh, ten, loai, giong)
+async def create_pet(ma_kh: str, ten: str, loai: str = None, giong: str = None, db: AnyDb = Depends(get_service_db)):
+    return await run_db(db, customer_service.kh2_create_pet, ma_kh, ten, loai, giong)
 
 @router.delete("/pets/{ma_thu_cung}")
-def delete_pet(ma_thu_cung: str, ma_kh: str, db: Session = Depends(get_db)):
-    return customer_service.kh2_delete_pet(db, ma_thu_cung, ma_kh)
+async def delete_pet(ma_thu_cung: str, ma_kh: str, db: AnyDb = Depends(get_service_db)):
+    return await run_db(db, customer_service.kh2_delete_pet, ma_thu_cung, ma_kh)
 
 @router.get("/pets/{ma_thu_cung}/vaccinations")
-def pet_vaccination_history(ma_thu_cung: str, ma_kh: str, db: Session = Depends(get_db)):
-    return {"items": customer_service.kh3_pet_vaccination_history(db, ma_thu_cung, ma_kh)}
+async def pet_vaccination_history(ma_thu_cung: str, ma_kh: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, customer_service.kh3_pet_vaccination_history, ma_thu_cung, ma_kh)}
 
 # ==========================================================
 # BOOKING = PHIENDICHVU (TrangThai = BOOKING)
 # ==========================================================
 @router.post("/appointments")
-def create_booking(
+async def create_booking(
     ma_kh: str,
     ma_thu_cung: str,
     ma_dv: str,
     ma_cn: str,
     thoi_diem_bat_dau: str,
-    db: Session = Depends(get_db),
+    db: AnyDb = Depends(get_service_db),
 ):
-    return customer_service.kh16_create_booking(
-        db, ma_kh, ma_thu_cung, ma_dv, ma_cn, thoi_diem_bat_dau
+    return await run_db(
+        db, customer_service.kh16_create_booking, ma_kh, ma_thu_cung, ma_dv, ma_cn, thoi_diem_bat_dau
     )
 
+@router.get("/appointments/slots", dependencies=[Depends(statement_budget(1))])
+async def available_slots(
+    ma_cn: str,
+    ma_dv: str,
+    ngay: dt.date,
+    step: Optional[int] = Query(None, ge=5, le=240, description="phút, mặc định SCHEDULE_SLOT_MINUTES"),
+    db: AnyDb = Depends(get_service_db),
+):
+    return await run_db(db, customer_service.kh16_available_slots, ma_cn, ma_dv, ngay, step)
+
 @router.get("/me/bookings")
-def my_bookings(ma_kh: str, db: Session = Depends(get_db)):
-    return {"items": customer_service.kh17_my_bookings(db, ma_kh)}
+async def my_bookings(ma_kh: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, customer_service.kh17_my_bookings, ma_kh)}
     
 @router.get("/pets/{ma_thu_cung}/medical-history")
-def pet_medical_history(ma_thu_cung: str, ma_kh: str, db: Session = Depends(get_db)):
-    return {"items": customer_service.kh10_pet_medical_history(db, ma_thu_cung, ma_kh)}
+async def pet_medical_history(ma_thu_cung: str, ma_kh: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, customer_service.kh10_pet_medical_history, ma_thu_cung, ma_kh)}
 
 @router.get("/products/search")
-def search_products(
+async def search_products(
     keyword: str | None = None,
     loai: str | None = None,
     ma_cn: str | None = None, # Thêm tham số ma_cn ở đây
-    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AnyDb = Depends(get_service_db),
 ):
-    return {
-        "items": customer_service.kh8_search_products(db, keyword, loai, ma_cn)
-    }
+    if stream:
+        return ndjson_response(customer_service.kh8_stream_products(keyword, loai, ma_cn, cursor))
+    return await run_db(db, customer_service.kh8_search_products, keyword, loai, ma_cn, limit, cursor)
     
 @router.post("/orders/products")
-def booking_product(
+async def booking_product(
     ma_kh: str,      # Cần mã khách hàng để biết giỏ hàng của ai
     ma_sp: str,
     so_luong: int,
     ma_cn: str,
-    db: Session = Depends(get_db),
+    db: AnyDb = Depends(get_service_db),
 ):
-    return customer_service.kh4_booking_product(db, ma_kh, ma_sp, so_luong, ma_cn)
+    return await run_db(db, customer_service.kh4_booking_product, ma_kh, ma_sp, so_luong, ma_cn)
 
 @router.delete("/appointments/{ma_phien}")
-def cancel_booking(ma_phien: str, ma_kh: str, db: Session = Depends(get_db)):
-    return customer_service.kh15_cancel_appointment(db, ma_phien, ma_kh)
+async def cancel_booking(ma_phien: str, ma_kh: str, db: AnyDb = Depends(get_service_db)):
+    return await run_db(db, customer_service.kh15_cancel_appointment, ma_phien, ma_kh)
 
 
 @router.get("/services")
-def list_services(
+async def list_services(
     ma_cn: str | None = None, # Thêm tham số lọc theo chi nhánh
-    db: Session = Depends(get_db)
+    db: AnyDb = Depends(get_service_db)
 ):
-    return {"items": customer_service.kh13_list_services(db, ma_cn)}
+    return {"items": await run_db(db, customer_service.kh13_list_services, ma_cn)}
 
 @router.get("/me/appointments")
-def my_appointments(ma_kh: str, db: Session = Depends(get_db)):
-    return {"items": customer_service.kh14_my_appointments(db, ma_kh)}
+async def my_appointments(
+    ma_kh: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AnyDb = Depends(get_service_db),
+):
+    if stream:
+        return ndjson_response(customer_service.kh14_stream_appointments(ma_kh, cursor))
+    return await run_db(db, customer_service.kh14_my_appointments, ma_kh, limit, cursor)
 
 
 @router.get("/me/purchases")
-def my_purchases(ma_kh: str, db: Session = Depends(get_db)):
-    return {"items": customer_service.kh11_purchase_history(db, ma_kh)}
+async def my_purchases(
+    ma_kh: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AnyDb = Depends(get_service_db),
+):
+    if stream:
+        return ndjson_response(customer_service.kh11_stream_purchase_history(ma_kh, cursor))
+    return await run_db(db, customer_service.kh11_purchase_history, ma_kh, limit, cursor)
 
-@router.get("/invoices/{ma_hoa_don}")
-def get_invoice_detail(ma_hoa_don: str, ma_kh: str, db: Session = Depends(get_db)):
-    return customer_service.kh12_invoice_detail(db, ma_hoa_don, ma_kh)
+@router.get("/invoices/{ma_hoa_don}", dependencies=[Depends(statement_budget(1))])
+async def get_invoice_detail(ma_hoa_don: str, ma_kh: str, db: AnyDb = Depends(get_service_db)):
+    return await run_db(db, customer_service.kh12_invoice_detail, ma_hoa_don, ma_kh)
 
 @router.post("/orders/confirm")
-def confirm_invoice(
+async def confirm_invoice(
     ma_hoa_don: str,
     hinh_thuc_thanh_toan: str,
-    db: Session = Depends(get_db),
+    db: AnyDb = Depends(get_service_db),
 ):
-    return customer_service.kh_confirm_invoice(
-        db, ma_hoa_don, hinh_thuc_thanh_toan
+    result = await run_db(
+        db, customer_service.kh_confirm_invoice, ma_hoa_don, hinh_thuc_thanh_toan
     )
+    # hóa đơn vừa thanh toán vào doanh thu (CT1, CT2, CT7, doanh thu chi nhánh)
+    await report_cache.invalidate("company", "branch")
+    return result
     
 @router.post("/packages/buy")
-def buy_package(
+async def buy_package(
     ma_kh: str,
     ma_goi: str,
-    db: Session = Depends(get_db),
+    db: AnyDb = Depends(get_service_db),
 ):
-    return customer_service.kh_buy_package(db, ma_kh, ma_goi)
+    return await run_db(db, customer_service.kh_buy_package, ma_kh, ma_goi)
 
 @router.get("/me/purchased-packages/{ma_goi}/details")
-def get_purchased_package_details(
+async def get_purchased_package_details(
     ma_goi: str, 
     ma_kh: str, 
-    db: Session = Depends(get_db)
+    db: AnyDb = Depends(get_service_db)
 ):
     """
     Lấy chi tiết danh sách vaccine và số mũi còn lại trong một gói cụ thể của khách hàng
     """
     return {
-        "items": customer_service.kh_get_purchased_package_details(db, ma_kh, ma_goi)
+        "items": await run_db(db, customer_service.kh_get_purchased_package_details, ma_kh, ma_goi)
     }
 
 @router.get("/me/purchased-packages")
-def get_my_purchased_packages(ma_kh: str, db: Session = Depends(get_db)):
-    return {"items": customer_service.kh_get_my_purchased_packages(db, ma_kh)}
+async def get_my_purchased_packages(ma_kh: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, customer_service.kh_get_my_purchased_packages, ma_kh)}
 
 @router.get("/branches/by-service")
-def get_branch_by_service(ma_dv: str, db: Session = Depends(get_db)):
+async def get_branch_by_service(ma_dv: str, db: AnyDb = Depends(get_service_db)):
     return {
-        "items": customer_service.kh_get_chinhanh_by_service(db, ma_dv)
+        "items": await run_db(db, customer_service.kh_get_chinhanh_by_service, ma_dv)
     }
     
 @router.get("/branches/by-product")
-def get_branch_by_product(ma_sp: str, db: Session = Depends(get_db)):
+async def get_branch_by_product(ma_sp: str, db: AnyDb = Depends(get_service_db)):
     return {
-        "items": customer_service.kh_get_chinhanh_by_product(db, ma_sp)
+        "items": await run_db(db, customer_service.kh_get_chinhanh_by_product, ma_sp)
     }
     
 
@@ -154,15 +191,15 @@ class ReviewCreate(BaseModel):
     binh_luan: str | None = None
 
 @router.post("/invoices/{ma_hoa_don}/review")
-def create_review(
+async def create_review(
     ma_hoa_don: str, 
     ma_kh: str, 
     data: ReviewCreate, 
-    db: Session = Depends(get_db)
+    db: AnyDb = Depends(get_service_db)
 ):
-    return customer_service.kh_create_review(db, ma_kh, ma_hoa_don, data.dict())
+    return await run_db(db, customer_service.kh_create_review, ma_kh, ma_hoa_don, data.dict())
 
 @router.get("/invoices/{ma_hoa_don}/review")
-def get_review(ma_hoa_don: str, ma_kh: str, db: Session = Depends(get_db)):
-    review = customer_service.kh_get_review(db, ma_kh, ma_hoa_don)
+async def get_review(ma_hoa_don: str, ma_kh: str, db: AnyDb = Depends(get_service_db)):
+    review = await run_db(db, customer_service.kh_get_review, ma_kh, ma_hoa_don)
     return {"review": review}
\ No newline at end of file
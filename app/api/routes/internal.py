@@ -0,0 +1,77 @@
+# app/api/routes/internal.py
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core.cache import report_cache
+from app.core.profiling import top_statements
+from app.db.pool import pool_status
+from app.services import catalog_cache, scheduler, search_index, work_queue
+
+router = APIRouter()
+
+@router.get("/pool")
+def get_pool_status():
+    """Trạng thái + histogram (giây) của các connection pool, dùng để chỉnh DB_POOL_*"""
+    return {"pools": pool_status()}
+
+@router.get("/cache/catalog")
+def get_catalog_cache_stats():
+    """Hit/miss/eviction theo bảng của cache danh mục"""
+    return catalog_cache.catalog_cache.stats()
+
+@router.post("/cache/catalog/invalidate")
+def invalidate_catalog_cache(table: List[str] = Query(default=[])):
+    """Xoá cache sau khi sửa danh mục ngoài API (SQL tay, seed). Không truyền table = xoá hết"""
+    unknown = [t for t in table if t not in catalog_cache.TABLE_TTL]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown catalog table: {unknown}")
+    return {"ok": True, "removed": catalog_cache.invalidate(*table)}
+
+@router.get("/search/index")
+def get_search_index_stats():
+    """Số doc / token, số lần dựng lại / refresh của chỉ mục tìm kiếm (worker này)"""
+    return search_index.stats()
+
+@router.post("/search/index/rebuild")
+def rebuild_search_index(name: List[str] = Query(default=[])):
+    """Dựng lại ở lần tìm kế tiếp (sau khi sửa dữ liệu ngoài API: SQL tay, datagen). Không truyền name = mọi index"""
+    unknown = [n for n in name if n not in search_index.indexes]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search index: {unknown}")
+    search_index.mark_stale(*name)
+    return {"ok": True}
+
+@router.get("/schedule/index")
+def get_schedule_index_stats():
+    """Số (chi nhánh, dịch vụ) / lượt đã đặt trong lịch của worker này"""
+    return scheduler.schedule.stats()
+
+@router.post("/schedule/index/rebuild")
+def rebuild_schedule_index():
+    """Dựng lại ở lần đọc lịch kế tiếp (sau khi đổi ThoiLuongPhut / SoChoCungLuc hoặc sửa lịch bằng SQL tay)"""
+    scheduler.schedule.mark_stale()
+    return {"ok": True}
+
+@router.get("/queue/feed")
+def get_queue_feed_stats():
+    """Chi nhánh đang có client SSE theo dõi, số sự kiện phát / áp dụng / đọc lại (worker này)"""
+    return work_queue.hub.stats()
+
+@router.get("/cache/reports")
+def get_report_cache_stats():
+    """Hit/miss/single-flight của cache báo cáo CT/CN (số liệu riêng của worker này)"""
+    return report_cache.stats()
+
+@router.post("/cache/reports/bump")
+async def bump_report_cache(ns: str = Query(..., pattern="^(company|branch)$")):
+    """Vô hiệu cache báo cáo của namespace trên mọi worker (backend redis) hoặc worker này (memory)"""
+    return {"ns": ns, "version": await report_cache.bump(ns)}
+
+@router.get("/sql/statements")
+def get_sql_statements(
+    limit: int = Query(20, ge=1, le=500),
+    order: str = Query("sum", pattern="^(sum|max|avg|count|rows|errors)$"),
+):
+    """Câu SQL theo tổng thời gian / chậm nhất / số lần chạy; statement = label trên /metrics"""
+    return {"statements": top_statements(limit, order)}
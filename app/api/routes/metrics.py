@@ -0,0 +1,58 @@
+# app/api/routes/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import prometheus_header, prometheus_histogram, prometheus_sample
+from app.core.profiling import BUDGET_EXCEEDED, ROUTE_DB_SECONDS, ROUTE_LATENCY, ROUTE_STATEMENTS, SQL_STATS
+from app.db.pool import POOL_METRICS, pool_status
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus text format: request, SQL, connection pool (số liệu của worker này)"""
+    lines = []
+
+    prometheus_header(lines, "petcarex_http_request_duration_seconds", "Request latency by route template", "histogram")
+    for (method, path, status), hist in list(ROUTE_LATENCY.items()):
+        prometheus_histogram(lines, "petcarex_http_request_duration_seconds",
+                             {"method": method, "route": path, "status": status}, hist)
+
+    prometheus_header(lines, "petcarex_http_request_sql_statements", "SQL statements executed per request", "histogram")
+    for (method, path), hist in list(ROUTE_STATEMENTS.items()):
+        prometheus_histogram(lines, "petcarex_http_request_sql_statements", {"method": method, "route": path}, hist)
+
+    prometheus_header(lines, "petcarex_http_request_sql_seconds", "Time spent in SQL per request", "histogram")
+    for (method, path), hist in list(ROUTE_DB_SECONDS.items()):
+        prometheus_histogram(lines, "petcarex_http_request_sql_seconds", {"method": method, "route": path}, hist)
+
+    prometheus_header(lines, "petcarex_http_request_sql_budget_exceeded_total", "Requests over their SQL statement budget", "counter")
+    for (method, path), n in list(BUDGET_EXCEEDED.items()):
+        prometheus_sample(lines, "petcarex_http_request_sql_budget_exceeded_total", {"method": method, "route": path}, n)
+
+    # câu SQL: label statement = hash text đã chuẩn hoá, xem text ở /api/_internal/sql/statements
+    statements = SQL_STATS.all()
+    prometheus_header(lines, "petcarex_sql_statement_duration_seconds", "Duration per distinct SQL statement", "histogram")
+    for s in statements:
+        prometheus_histogram(lines, "petcarex_sql_statement_duration_seconds",
+                             {"statement": s.key, "op": s.op}, s.duration)
+    prometheus_header(lines, "petcarex_sql_statement_rows_total", "Rows affected (DML) per SQL statement", "counter")
+    for s in statements:
+        prometheus_sample(lines, "petcarex_sql_statement_rows_total", {"statement": s.key, "op": s.op}, s.rows)
+    prometheus_header(lines, "petcarex_sql_statement_errors_total", "Failed executions per SQL statement", "counter")
+    for s in statements:
+        prometheus_sample(lines, "petcarex_sql_statement_errors_total", {"statement": s.key, "op": s.op}, s.errors)
+
+    status = pool_status()
+    prometheus_header(lines, "petcarex_pool_checked_out", "Connections currently checked out", "gauge")
+    for name, st in status.items():
+        prometheus_sample(lines, "petcarex_pool_checked_out", {"pool": name}, st["checked_out"])
+    prometheus_header(lines, "petcarex_pool_timeouts_total", "Pool checkout timeouts", "counter")
+    for name, st in status.items():
+        prometheus_sample(lines, "petcarex_pool_timeouts_total", {"pool": name}, st["timeouts"])
+    prometheus_header(lines, "petcarex_pool_wait_seconds", "Time waiting for a pool slot", "histogram")
+    for name, m in POOL_METRICS.items():
+        prometheus_histogram(lines, "petcarex_pool_wait_seconds", {"pool": name}, m.wait)
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
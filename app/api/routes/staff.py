@@ -1,76 +1,117 @@
 # app/api/routes/staff.py
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from typing import List, Literal, Optional
 
-from app.api.deps import get_db
-from app.services import staff_service
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+
+from app.api.deps import AnyDb, get_service_db, run_db, statement_budget
+from app.api.streaming import ndjson_response, sse_response
+from app.core.cache import report_cache
+from app.services import staff_service, work_queue
+from app.services.pagination import MAX_LIMIT
 
 router = APIRouter()
 
 @router.post("/invoices")  # NV1
-def create_invoice(ma_hoa_don: str, ma_kh: str, hinh_thuc: str, ma_nv: str, db: Session = Depends(get_db)):
-    return staff_service.nv1_create_invoice(db, ma_hoa_don, ma_kh, hinh_thuc, ma_nv)
+async def create_invoice(ma_hoa_don: str, ma_kh: str, hinh_thuc: str, ma_nv: str, db: AnyDb = Depends(get_service_db)):
+    result = await run_db(db, staff_service.nv1_create_invoice, ma_hoa_don, ma_kh, hinh_thuc, ma_nv)
+    await report_cache.invalidate("company", "branch")
+    return result
 
-@router.get("/vaccines")  # NV2
-def list_vaccines(db: Session = Depends(get_db)):
-    return {"items": staff_service.nv2_list_vaccines(db)}
+@router.get("/vaccines", dependencies=[Depends(statement_budget(1))])  # NV2
+async def list_vaccines(db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, staff_service.nv2_list_vaccines)}
 
 @router.get("/reports/revenue/daily")  # NV3
-def revenue_daily(date: str, ma_cn: str, db: Session = Depends(get_db)):
-    return {"items": staff_service.nv3_revenue_daily(db, date, ma_cn)}
+async def revenue_daily(date: str, ma_cn: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, staff_service.nv3_revenue_daily, date, ma_cn)}
 
 @router.get("/schedule/vaccinations")  # NV4
-def vaccinations_today(date: str, ma_cn: str, db: Session = Depends(get_db)):
-    return {"items": staff_service.nv4_vaccinations_on_date(db, date, ma_cn)}
+async def vaccinations_today(date: str, ma_cn: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, staff_service.nv4_vaccinations_on_date, date, ma_cn)}
 
 @router.get("/schedule/exams")  # NV5
-def exams_today(date: str, ma_cn: str, db: Session = Depends(get_db)):
-    return {"items": staff_service.nv5_exams_on_date(db, date, ma_cn)}
+async def exams_today(date: str, ma_cn: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, staff_service.nv5_exams_on_date, date, ma_cn)}
 
 @router.get("/invoices")  # NV6
-def search_invoices(from_date: str, to_date: str, ma_cn: str, ma_kh: str = None, db: Session = Depends(get_db)):
-    return {"items": staff_service.nv6_search_invoices(db, from_date, to_date, ma_cn, ma_kh)}
+async def search_invoices(
+    from_date: str,
+    to_date: str,
+    ma_cn: str,
+    ma_kh: str = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AnyDb = Depends(get_service_db),
+):
+    if stream:
+        return ndjson_response(staff_service.nv6_stream_invoices(from_date, to_date, ma_cn, ma_kh, cursor))
+    return await run_db(db, staff_service.nv6_search_invoices, from_date, to_date, ma_cn, ma_kh, limit, cursor)
+
+@router.get("/autocomplete")
+async def autocomplete(
+    q: str = Query(..., min_length=1, max_length=100),
+    kind: List[Literal["customer", "pet", "staff"]] = Query(default=["customer", "pet"]),
+    limit: int = Query(10, ge=1, le=50),
+    ma_cn: Optional[str] = None,
+    db: AnyDb = Depends(get_service_db),
+):
+    """Gợi ý khi gõ: tên / SĐT khách, tên thú cưng (hoặc tên chủ), tên nhân viên (lọc ma_cn); không phân biệt dấu"""
+    return await run_db(db, staff_service.autocomplete, q, list(dict.fromkeys(kind)), limit, ma_cn)
 
-@router.get("/invoices/{ma_hoa_don}")  # NV6-DETAIL
-def invoice_detail(ma_hoa_don: str, db: Session = Depends(get_db)):
-    return staff_service.nv6_invoice_detail(db, ma_hoa_don)
+@router.get("/invoices/{ma_hoa_don}", dependencies=[Depends(statement_budget(1))])  # NV6-DETAIL
+async def invoice_detail(ma_hoa_don: str, db: AnyDb = Depends(get_service_db)):
+    return await run_db(db, staff_service.nv6_invoice_detail, ma_hoa_don)
 
-@router.get("/inventory")  # NV7
-def inventory(ma_cn: str, db: Session = Depends(get_db)):
-    return staff_service.nv7_inventory(db, ma_cn)
+@router.get("/inventory", dependencies=[Depends(statement_budget(1))])  # NV7
+async def inventory(ma_cn: str, db: AnyDb = Depends(get_service_db)):
+    return await run_db(db, staff_service.nv7_inventory, ma_cn)
 
 @router.post("/inventory/products/import")  # NV8
-def import_product_stock(ma_cn: str, ma_sp: str, so_luong: int, db: Session = Depends(get_db)):
-    return staff_service.nv8_import_product_stock(db, ma_cn, ma_sp, so_luong)
+async def import_product_stock(ma_cn: str, ma_sp: str, so_luong: int, db: AnyDb = Depends(get_service_db)):
+    return await run_db(db, staff_service.nv8_import_product_stock, ma_cn, ma_sp, so_luong)
 
 @router.get("/medicines")
-def list_medicines(ma_cn: str, db: Session = Depends(get_db)):
-    res = staff_service.nv7_inventory(db, ma_cn)
+async def list_medicines(ma_cn: str, db: AnyDb = Depends(get_service_db)):
+    res = await run_db(db, staff_service.nv7_inventory, ma_cn)
     return {"items": [p for p in res["products"] if p["LoaiSP"] == "Thuốc"]}
 
 @router.get("/history/exams")
-def get_pet_exam_history(ma_thu_cung: str, db: Session = Depends(get_db)):
-    return {"items": staff_service.get_exam_history_by_pet(db, ma_thu_cung)}
+async def get_pet_exam_history(ma_thu_cung: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, staff_service.get_exam_history_by_pet, ma_thu_cung)}
 
 @router.get("/history/vaccines")
-def get_pet_vaccine_history(ma_thu_cung: str, db: Session = Depends(get_db)):
-    return {"items": staff_service.get_vaccine_history_by_pet(db, ma_thu_cung)}
+async def get_pet_vaccine_history(ma_thu_cung: str, db: AnyDb = Depends(get_service_db)):
+    return {"items": await run_db(db, staff_service.get_vaccine_history_by_pet, ma_thu_cung)}
 
 from typing import Optional
 @router.get("/bookings")
-def get_customer_bookings(
+async def get_customer_bookings(
     ma_cn: str, 
     ma_kh: Optional[str] = None, 
     ma_dv: str = 'DV001',
-    db: Session = Depends(get_db)
+    db: AnyDb = Depends(get_service_db)
+):
+    return {"items": await run_db(db, staff_service.get_bookings_by_customer, ma_cn, ma_kh, ma_dv)}
+
+@router.get("/queue/stream")
+async def stream_queue(
+    ma_cn: str,
+    ma_dv: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
 ):
-    return {"items": staff_service.get_bookings_by_customer(db, ma_cn, ma_kh, ma_dv)}
+    """
+    Hàng đợi IN_SERVICE của chi nhánh qua SSE (thay cho gọi lại /staff/bookings):
+    snapshot khi kết nối, sau đó chỉ add / remove. Không truyền ma_dv = mọi dịch vụ.
+    """
+    return sse_response(work_queue.hub.subscribe(ma_cn, ma_dv, last_event_id))
 
 @router.post("/examination/complete")
-def complete_examination(data: dict, db: Session = Depends(get_db)):
+async def complete_examination(data: dict, db: AnyDb = Depends(get_service_db)):
     # data bao gồm: ma_phien, ma_bs, trieu_chung, chan_doan, thuoc_list
-    return staff_service.complete_exam_process(
+    return await run_db(
         db, 
+        staff_service.complete_exam_process,
         data['ma_phien'], 
         data['ma_bs'], 
         data['trieu_chung'], 
@@ -79,34 +120,40 @@ def complete_examination(data: dict, db: Session = Depends(get_db)):
     )
 
 @router.post("/vaccination/complete")
-def complete_vaccination(data: dict, db: Session = Depends(get_db)):
+async def complete_vaccination(data: dict, db: AnyDb = Depends(get_service_db)):
     # Phải truyền đúng 4 tham số như định nghĩa hàm ở Service
-    return staff_service.complete_vaccine_process(
+    return await run_db(
         db,                     # 1. db
+        staff_service.complete_vaccine_process,
         data['ma_phien_goc'],   # 2. ma_phien
         data['ma_bs'],          # 3. ma_bs
         data['danh_sach_tiem']  # 4. danh_sach_tiem
     )
 
 @router.get("/all-medicines")
-def api_get_all_medicines(db: Session = Depends(get_db)):
+async def api_get_all_medicines(db: AnyDb = Depends(get_service_db)):
     """API riêng cho bác sĩ lấy danh mục thuốc tổng"""
-    items = staff_service.get_all_medicines(db)
+    items = await run_db(db, staff_service.get_all_medicines)
     return {"items": items}
 
-@router.post("/examination/start")
-def api_start_examination(data: dict, db: Session = Depends(get_db)):
+@router.post("/examination/start", dependencies=[Depends(statement_budget(1))])
+async def api_start_examination(data: dict, db: AnyDb = Depends(get_service_db)):
     ma_phien = data.get("ma_phien")
     if not ma_phien:
         raise HTTPException(status_code=400, detail="Thiếu mã phiên")
     
     # Gọi hàm từ service đã tách ở trên
-    return staff_service.start_examination(db, ma_phien)
+    return await run_db(db, staff_service.start_examination, ma_phien)
+
+@router.post("/examination/claim-next", dependencies=[Depends(statement_budget(1))])
+async def api_claim_next_examination(ma_cn: str, ma_dv: str = 'DV001', db: AnyDb = Depends(get_service_db)):
+    """Nhận ca chờ lâu nhất của chi nhánh + dịch vụ (404 nếu hết ca); nhiều bác sĩ gọi cùng lúc không trùng ca"""
+    return await run_db(db, staff_service.claim_next_examination, ma_cn, ma_dv)
 
 @router.get("/history/daily-all")
-def get_daily_history(ma_cn: str, date: str, db: Session = Depends(get_db)):
+async def get_daily_history(ma_cn: str, date: str, db: AnyDb = Depends(get_service_db)):
     """
     API trả về nhật ký làm việc trong ngày của chi nhánh
     """
     # date định dạng: YYYY-MM-DD
-    return staff_service.get_daily_history_all(db, ma_cn, date)
\ No newline at end of file
+    return await run_db(db, staff_service.get_daily_history_all, ma_cn, date)
\ No newline at end of file
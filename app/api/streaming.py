@@ -0,0 +1,43 @@
+# app/api/streaming.py
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+
+def _ndjson_lines(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    for row in rows:
+        yield (json.dumps(jsonable_encoder(row), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _sse_frames(events: AsyncIterable[Tuple[str, Optional[str], Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    async for name, event_id, data in events:
+        if name == "ping":
+            yield b": ping\n\n"  # comment: giữ kết nối qua proxy, client không nhận sự kiện
+            continue
+        frame = f"event: {name}\n"
+        if event_id is not None:
+            frame += f"id: {event_id}\n"
+        frame += f"data: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+        yield frame.encode("utf-8")
+
+
+def sse_response(events: AsyncIterable[Tuple[str, Optional[str], Dict[str, Any]]]) -> StreamingResponse:
+    """
+    Server-Sent Events: `events` là async generator (tên sự kiện, id, data); "ping" => dòng comment.
+    Tắt buffer của nginx (X-Accel-Buffering) để sự kiện tới client ngay.
+    """
+    return StreamingResponse(
+        _sse_frames(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def ndjson_response(rows: Iterable[Dict[str, Any]]) -> StreamingResponse:
+    """
+    Trả danh sách dạng NDJSON (mỗi dòng 1 object JSON), gửi dần theo từng dòng.
+    `rows` là generator sync (vd db_utils.stream_sql): Starlette chạy nó trong threadpool.
+    """
+    return StreamingResponse(_ndjson_lines(rows), media_type="application/x-ndjson")
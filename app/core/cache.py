@@ -0,0 +1,238 @@
+# app/core/cache.py
+"""
+Cache dùng chung cho các báo cáo (CT1-CT8, báo cáo chi nhánh).
+
+Backend (settings.CACHE_BACKEND):
+  - "memory": LRU + TTL trong process (mặc định, mỗi worker 1 bản)
+  - "redis":  server Redis-compatible (Redis, Valkey, KeyDB...) dùng chung giữa các worker,
+              cần `pip install redis` (chỉ import khi bật)
+  - "none":   tắt cache
+
+Key có version theo namespace: {prefix}:{ns}:v{version}:{key}. bump(ns) tăng version
+=> mọi key cũ của namespace bị bỏ qua ngay (rồi tự hết hạn theo TTL), không cần SCAN/DEL.
+
+Single-flight: trong 1 process các request cùng key chờ chung 1 lần load; với backend
+dùng chung thì thêm lock SET NX để chỉ 1 worker chạy truy vấn, worker khác đợi kết quả.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+
+LOCK_TTL = 10.0       # giây giữ lock load trên backend dùng chung
+LOCK_POLL = 0.05      # giây giữa 2 lần kiểm tra kết quả khi worker khác đang load
+
+
+class MemoryBackend:
+    shared = False
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._live(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        if self._live(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def incr(self, key: str) -> int:
+        value = int(self._live(key) or 0) + 1
+        await self.set(key, str(value))
+        return value
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class RedisBackend:
+    shared = True
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # optional dependency
+
+        self._client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(await self._client.set(key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class Cache:
+    def __init__(self, backend: Optional[Any], prefix: str = "petcarex", default_ttl: float = 60):
+        self.backend = backend
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "lock_waits": 0, "errors": 0}
+
+    def _version_key(self, ns: str) -> str:
+        return f"{self.prefix}:ver:{ns}"
+
+    async def version(self, ns: str) -> int:
+        return int(await self.backend.get(self._version_key(ns)) or 0)
+
+    async def bump(self, ns: str) -> int:
+        """Vô hiệu toàn bộ key của namespace."""
+        if self.backend is None:
+            return 0
+        return await self.backend.incr(self._version_key(ns))
+
+    async def invalidate(self, *namespaces: str) -> None:
+        """
+        bump() sau khi ghi dữ liệu mà báo cáo đọc (thanh toán, thêm / điều động nhân viên...).
+        Dữ liệu đã commit => backend lỗi không làm request thất bại, key cũ tự hết hạn theo TTL.
+        """
+        for ns in namespaces:
+            try:
+                await self.bump(ns)
+            except Exception:
+                self._stats["errors"] += 1
+
+    async def get_or_set(
+        self,
+        ns: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """
+        Trả giá trị đã cache, hoặc await loader() rồi cache lại.
+        Giá trị được lưu ở dạng JSON (jsonable_encoder) nên hit và miss trả về cùng dạng.
+        Backend lỗi (Redis down...) => chạy loader như không có cache.
+        """
+        if self.backend is None:
+            return await loader()
+
+        try:
+            full_key = f"{self.prefix}:{ns}:v{await self.version(ns)}:{key}"
+            raw = await self.backend.get(full_key)
+        except Exception:
+            self._stats["errors"] += 1
+            return await loader()
+
+        if raw is not None:
+            self._stats["hits"] += 1
+            return json.loads(raw)
+        self._stats["misses"] += 1
+
+        pending = self._inflight.get(full_key)
+        if pending is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await self._load(full_key, loader, ttl or self.default_ttl)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # đánh dấu đã đọc, tránh log "never retrieved" khi không ai chờ
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(full_key, None)
+
+    async def _load(self, full_key: str, loader: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        lock_key = full_key + ":lock"
+        token = None
+        if self.backend.shared:
+            token = uuid.uuid4().hex
+            try:
+                if not await self.backend.add(lock_key, token, LOCK_TTL):
+                    # worker khác đang load: đợi kết quả tối đa LOCK_TTL rồi tự load
+                    self._stats["lock_waits"] += 1
+                    deadline = time.monotonic() + LOCK_TTL
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(LOCK_POLL)
+                        raw = await self.backend.get(full_key)
+                        if raw is not None:
+                            return json.loads(raw)
+                    token = None
+            except Exception:
+                self._stats["errors"] += 1
+                token = None
+
+        try:
+            value = jsonable_encoder(await loader())
+            try:
+                await self.backend.set(full_key, json.dumps(value, ensure_ascii=False), ttl)
+            except Exception:
+                self._stats["errors"] += 1
+            return value
+        finally:
+            if token is not None:
+                try:
+                    # chỉ xoá lock của mình (lock có thể đã hết hạn và worker khác giữ)
+                    if await self.backend.get(lock_key) == token:
+                        await self.backend.delete(lock_key)
+                except Exception:
+                    self._stats["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = self._stats["hits"], self._stats["misses"]
+        return {
+            "backend": settings.CACHE_BACKEND,
+            "entries": self.backend.size() if self.backend is not None else 0,
+            "inflight": len(self._inflight),
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+            **self._stats,
+        }
+
+
+def _make_backend():
+    if settings.CACHE_BACKEND == "redis":
+        return RedisBackend(settings.CACHE_REDIS_URL)
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryBackend(settings.CACHE_MAX_ENTRIES)
+    return None
+
+
+report_cache = Cache(_make_backend(), prefix=settings.CACHE_PREFIX, default_ttl=settings.REPORT_CACHE_TTL)
@@ -1,4 +1,6 @@
 # app/api/core/config.py
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -10,6 +12,55 @@ class Settings(BaseSettings):
     MSSQL_DB: str = "PetCareX"
     MSSQL_DRIVER: str = "ODBC Driver 17 for SQL Server"
 
+    # Connection pool (áp dụng cho ENGINE, MASTER_ENGINE và ASYNC_ENGINE)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = -1            # giây; -1 = không recycle
+    DB_POOL_PRE_PING: Literal["pessimistic", "optimistic"] = "pessimistic"
+    DB_POOL_USE_LIFO: bool = False
+
+    # True: route chạy service qua AsyncSession (mssql+aioodbc) thay vì Session + threadpool
+    DB_ASYNC: bool = False
+
+    # Cache danh mục trong process (app/services/catalog_cache.py)
+    CATALOG_CACHE_ENABLED: bool = True
+    CATALOG_CACHE_MAX_ENTRIES: int = 256
+
+    # Chỉ mục tìm kiếm trong process (app/services/search_index.py): tìm SANPHAM / NHANVIEN
+    # (false = quay về LIKE) và autocomplete KHACHHANG / THUCUNG / NHANVIEN (luôn dùng index)
+    SEARCH_INDEX_ENABLED: bool = True
+    SEARCH_INDEX_TTL: int = 300          # giây, sau đó dựng lại từ DB
+    SEARCH_MAX_HITS: int = 500           # số kết quả tối đa / truy vấn autocomplete (danh sách phân trang không cắt)
+
+    # Lịch đặt dịch vụ trong process (app/services/scheduler.py)
+    SCHEDULE_INDEX_TTL: int = 60         # giây, sau đó dựng lại từ PHIENDICHVU
+    SCHEDULE_SLOT_MINUTES: int = 30      # bước lưới khung giờ trống
+
+    # Hàng đợi khám / tiêm đẩy qua SSE (app/services/work_queue.py); nhiều worker cần CACHE_BACKEND=redis
+    QUEUE_FEED_HEARTBEAT: int = 15       # giây giữa 2 ping khi không có thay đổi
+    QUEUE_FEED_RESYNC: int = 300         # giây, sau đó đọc lại hàng đợi từ DB (bắt thay đổi ngoài API)
+    QUEUE_FEED_REPLAY: int = 256         # số delta gần nhất giữ để client nối lại bằng Last-Event-ID
+
+    # Cache báo cáo CT/CN (app/core/cache.py): memory | redis | none
+    CACHE_BACKEND: Literal["memory", "redis", "none"] = "memory"
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_PREFIX: str = "petcarex"
+    CACHE_MAX_ENTRIES: int = 1024
+    REPORT_CACHE_TTL: int = 60           # giây
+
+    # /metrics + header Server-Timing + thống kê từng câu SQL (app/core/profiling.py)
+    METRICS_ENABLED: bool = True
+    # Số câu SQL tối đa / request (phát hiện N+1); 0 = chỉ dùng budget khai báo trên route
+    SQL_STATEMENT_BUDGET: int = 0
+    # off | log (warning) | raise (dev/CI: câu vượt budget lỗi 500)
+    SQL_BUDGET_MODE: Literal["off", "log", "raise"] = "off"
+
+    # Migration khi worker start (app/db/migrate.py):
+    #   apply = chạy file pending (dev), check = chỉ cảnh báo, skip = không đụng DB
+    MIGRATE_ON_STARTUP: Literal["apply", "check", "skip"] = "apply"
+    MIGRATE_LOCK_TIMEOUT: int = 300      # giây chờ process khác migrate xong
+
     JWT_SECRET: str = "change-me"
     JWT_ALG: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
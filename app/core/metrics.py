@@ -0,0 +1,80 @@
+# app/core/metrics.py
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Dict, List, Mapping, Sequence
+
+# Mốc (giây) mặc định cho các histogram độ trễ: 1ms -> 10s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Histogram tích luỹ kiểu Prometheus (bucket `le`), thread-safe.
+    Chỉ giữ count theo bucket + sum/count nên chi phí observe là O(log số bucket).
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # phần tử cuối = +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            counts = list(self._counts)
+            total, count, vmax = self._sum, self._count, self._max
+
+        cumulative = []
+        running = 0
+        for le, c in zip(list(self.buckets) + ["+Inf"], counts):
+            running += c
+            cumulative.append({"le": le, "count": running})
+
+        return {
+            "count": count,
+            "sum": round(total, 6),
+            "avg": round(total / count, 6) if count else 0.0,
+            "max": round(vmax, 6),
+            "buckets": cumulative,
+        }
+
+
+# ---- Prometheus text format (exposition 0.0.4) ----
+def _labels(labels: Mapping[str, object]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def prometheus_header(lines: List[str], name: str, help_text: str, kind: str) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def prometheus_histogram(lines: List[str], name: str, labels: Mapping[str, object], hist: Histogram) -> None:
+    snap = hist.snapshot()
+    for b in snap["buckets"]:
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': b['le']})} {b['count']}")
+    lines.append(f"{name}_sum{_labels(labels)} {snap['sum']}")
+    lines.append(f"{name}_count{_labels(labels)} {snap['count']}")
+
+
+def prometheus_sample(lines: List[str], name: str, labels: Mapping[str, object], value: float) -> None:
+    lines.append(f"{name}{_labels(labels)} {value}")
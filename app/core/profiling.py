@@ -0,0 +1,273 @@
+# app/core/profiling.py
+"""
+Đo thời gian request + câu SQL.
+
+- ProfilingMiddleware (ASGI thuần, không bọc body nên StreamingResponse vẫn stream):
+  histogram độ trễ theo route template, số câu SQL / request, header Server-Timing
+  (db = tổng thời gian SQL, app = phần còn lại, tính tới lúc gửi header).
+- instrument_sql(engine): before/after_cursor_execute ghi thời gian, rowcount theo từng câu
+  (gom theo text đã chuẩn hoá khoảng trắng) và cộng vào RequestStats của request hiện tại.
+  RequestStats nằm trong ContextVar nên đi theo run_in_threadpool / run_sync.
+- Statement budget (phát hiện N+1): mỗi request được chạy tối đa N câu SQL
+  (settings.SQL_STATEMENT_BUDGET hoặc Depends(statement_budget(n)) trên route).
+  SQL_BUDGET_MODE: off | log (warning + counter) | raise (câu thứ N+1 lỗi StatementBudgetExceeded).
+  Ngoài request (script / test): with count_statements(max_statements=n): ...
+
+Số liệu là của 1 worker; Prometheus scrape từng worker (hoặc dùng label instance).
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+
+logger = logging.getLogger("petcarex.sql")
+
+# câu SQL khác nhau được theo dõi riêng; vượt quá thì gom vào "other" (giới hạn cardinality)
+MAX_STATEMENTS = 500
+STATEMENT_PREVIEW = 200
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class StatementBudgetExceeded(RuntimeError):
+    pass
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_seconds: float = 0.0
+    rows: int = 0
+    budget: Optional[int] = None          # None = dùng settings.SQL_STATEMENT_BUDGET
+    mode: str = field(default_factory=lambda: settings.SQL_BUDGET_MODE)
+    executed: List["StatementStats"] = field(default_factory=list)
+
+    def limit(self) -> Optional[int]:
+        if self.mode == "off":
+            return None
+        limit = self.budget if self.budget is not None else settings.SQL_STATEMENT_BUDGET
+        return limit or None
+
+    def exceeded_message(self, label: str) -> str:
+        counts: Dict[str, int] = {}
+        for s in self.executed:
+            counts[s.preview] = counts.get(s.preview, 0) + 1
+        detail = "; ".join(f"{n}x {sql[:80]}" for sql, n in sorted(counts.items(), key=lambda x: -x[1]))
+        return f"{label}: {self.statements} SQL statements > budget {self.limit()} ({detail})"
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("petcarex_request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+class StatementStats:
+    def __init__(self, key: str, op: str, preview: str):
+        self.key = key
+        self.op = op
+        self.preview = preview
+        self.duration = Histogram()
+        self.rows = 0
+        self.errors = 0
+
+
+class SqlStats:
+    def __init__(self):
+        self._by_text: Dict[str, StatementStats] = {}
+        self._lock = threading.Lock()
+
+    def get(self, statement: str) -> StatementStats:
+        stats = self._by_text.get(statement)
+        if stats is not None:
+            return stats
+        with self._lock:
+            stats = self._by_text.get(statement)
+            if stats is None:
+                if len(self._by_text) >= MAX_STATEMENTS:
+                    return self._other()
+                normalized = " ".join(statement.split())
+                key = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+                stats = StatementStats(key, _op(normalized), normalized[:STATEMENT_PREVIEW])
+                self._by_text[statement] = stats
+            return stats
+
+    def _other(self) -> StatementStats:
+        stats = self._by_text.get("")
+        if stats is None:
+            stats = self._by_text[""] = StatementStats("other", "OTHER", "(vượt MAX_STATEMENTS)")
+        return stats
+
+    def all(self) -> List[StatementStats]:
+        with self._lock:
+            return list(self._by_text.values())
+
+
+_OP_RE = re.compile(r"\b(SELECT|INSERT|UPDATE|DELETE|MERGE|EXEC|EXECUTE)\b", re.IGNORECASE)
+
+
+def _op(normalized: str) -> str:
+    # "SET NOCOUNT ON; DECLARE ...; INSERT ..." -> INSERT
+    m = _OP_RE.search(normalized)
+    if m is None:
+        return "OTHER"
+    op = m.group(1).upper()
+    return "EXEC" if op == "EXECUTE" else op
+
+
+SQL_STATS = SqlStats()
+
+# (method, route template, status class) -> Histogram
+ROUTE_LATENCY: Dict[Tuple[str, str, str], Histogram] = {}
+ROUTE_STATEMENTS: Dict[Tuple[str, str], Histogram] = {}
+ROUTE_DB_SECONDS: Dict[Tuple[str, str], Histogram] = {}
+BUDGET_EXCEEDED: Dict[Tuple[str, str], int] = {}
+_route_lock = threading.Lock()
+
+
+def _series(table: Dict, key, factory=Histogram) -> Histogram:
+    h = table.get(key)
+    if h is None:
+        with _route_lock:
+            h = table.setdefault(key, factory())
+    return h
+
+
+def instrument_sql(engine: Engine) -> None:
+    """Gắn listener đo SQL (async engine: truyền engine.sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        req = _current.get()
+        if req is not None and req.mode == "raise":
+            limit = req.limit()
+            if limit is not None and req.statements >= limit:
+                req.statements += 1
+                req.executed.append(SQL_STATS.get(statement))
+                raise StatementBudgetExceeded(req.exceeded_message("request"))
+        conn.info.setdefault("petcarex_sql_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["petcarex_sql_start"].pop()
+        stats = SQL_STATS.get(statement)
+        stats.duration.observe(elapsed)
+        # pyodbc: rowcount = số dòng bị ảnh hưởng (DML); SELECT trả -1 vì chưa fetch
+        rowcount = getattr(cursor, "rowcount", -1)
+        if rowcount and rowcount > 0:
+            stats.rows += rowcount
+
+        req = _current.get()
+        if req is not None:
+            req.statements += 1
+            req.db_seconds += elapsed
+            req.executed.append(stats)
+            if rowcount and rowcount > 0:
+                req.rows += rowcount
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get("petcarex_sql_start") if conn is not None else None
+        if starts:
+            starts.pop()
+        if exception_context.statement:
+            SQL_STATS.get(exception_context.statement).errors += 1
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        req = RequestStats()
+        token = _current.set(req)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                total = time.perf_counter() - start
+                timing = (
+                    f'db;dur={req.db_seconds * 1000:.1f};desc="{req.statements} queries", '
+                    f"app;dur={max(total - req.db_seconds, 0) * 1000:.1f}, "
+                    f"total;dur={total * 1000:.1f}"
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            # template (/customer/pets/{ma_thu_cung}) thay vì path thật => cardinality cố định
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            elapsed = time.perf_counter() - start
+            _series(ROUTE_LATENCY, (method, path, f"{status[0] // 100}xx")).observe(elapsed)
+            _series(ROUTE_STATEMENTS, (method, path), lambda: Histogram(COUNT_BUCKETS)).observe(req.statements)
+            _series(ROUTE_DB_SECONDS, (method, path)).observe(req.db_seconds)
+
+            limit = req.limit()
+            if limit is not None and req.statements > limit:
+                with _route_lock:
+                    BUDGET_EXCEEDED[(method, path)] = BUDGET_EXCEEDED.get((method, path), 0) + 1
+                logger.warning(req.exceeded_message(f"{method} {path}"))
+
+
+@contextmanager
+def count_statements(max_statements: Optional[int] = None) -> Iterator[RequestStats]:
+    """
+    Đếm câu SQL trong khối with (gọi service trực tiếp từ script / test):
+        with count_statements(max_statements=1) as st:
+            staff_service.nv6_invoice_detail(db, "HD000001")
+    Vượt budget => StatementBudgetExceeded khi ra khỏi khối (liệt kê các câu đã chạy).
+    """
+    req = RequestStats(budget=max_statements, mode="off")
+    token = _current.set(req)
+    try:
+        yield req
+    finally:
+        _current.reset(token)
+    if max_statements is not None and req.statements > max_statements:
+        req.mode = "log"  # để limit() trả về budget trong message
+        raise StatementBudgetExceeded(req.exceeded_message("block"))
+
+
+def top_statements(limit: int = 20, order: str = "sum") -> List[Dict[str, Any]]:
+    """Câu SQL tốn thời gian nhất (sum) / chậm nhất (max) / nhiều nhất (count)."""
+    rows = []
+    for s in SQL_STATS.all():
+        snap = s.duration.snapshot()
+        rows.append({
+            "statement": s.key,
+            "op": s.op,
+            "count": snap["count"],
+            "sum": snap["sum"],
+            "avg": snap["avg"],
+            "max": snap["max"],
+            "rows": s.rows,
+            "errors": s.errors,
+            "sql": s.preview,
+        })
+    rows.sort(key=lambda r: r[order], reverse=True)
+    return rows[:limit]
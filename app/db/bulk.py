@@ -0,0 +1,121 @@
+# app/db/bulk.py
+"""
+Nạp dữ liệu seed dạng CSV bằng pyodbc fast_executemany (gửi cả mảng tham số trong
+1 round-trip thay vì 1 INSERT / dòng), đọc file theo lô nên không giữ cả file trong RAM.
+
+- Dòng đầu là tên cột; ô rỗng => NULL; SQL Server tự chuyển kiểu từ chuỗi
+  (INT, DECIMAL, DATE...) như khi INSERT literal.
+- Trong migrations/: file NNN_<TABLE>.csv chạy theo thứ tự tên như file .sql.
+- Ngoài app: python -m scripts.bulk_load (nhiều file song song).
+"""
+from __future__ import annotations
+
+import csv
+import io
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+class Progress:
+    """In tiến độ mỗi `interval` giây: số đơn vị đã xử lý, % (nếu biết tổng), tốc độ."""
+
+    def __init__(self, label: str, total: Optional[int] = None, unit: str = "rows", interval: float = 5.0):
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.done = 0
+        self.start = time.perf_counter()
+        self._last = self.start
+
+    def update(self, n: int) -> None:
+        self.done += n
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self._print(now)
+
+    def _print(self, now: float) -> None:
+        pct = f" ({self.done * 100 / self.total:.1f}%)" if self.total else ""
+        rate = self.done / (now - self.start) if now > self.start else 0
+        print(f"  {self.label}: {self.done:,} {self.unit}{pct}, {rate:,.0f} {self.unit}/s")
+
+    def finish(self) -> Dict[str, float]:
+        seconds = time.perf_counter() - self.start
+        return {
+            self.unit: self.done,
+            "seconds": round(seconds, 3),
+            f"{self.unit}_per_s": round(self.done / seconds, 1) if seconds else None,
+        }
+
+
+def table_for_csv(path: Path) -> str:
+    """010_SANPHAM.csv -> SANPHAM"""
+    stem = path.stem
+    return stem.split("_", 1)[1] if "_" in stem and stem.split("_", 1)[0].isdigit() else stem
+
+
+def _check_ident(name: str) -> str:
+    if not _IDENT.match(name):
+        raise ValueError(f"Tên bảng / cột không hợp lệ: {name!r}")
+    return name
+
+
+def _batches(rows: Iterable[Sequence[Any]], size: int) -> Iterable[List[List[Any]]]:
+    batch: List[List[Any]] = []
+    for row in rows:
+        batch.append([v if v != "" else None for v in row])
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_insert(conn, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]],
+                batch_size: int = DEFAULT_BATCH_SIZE, progress: Optional[Progress] = None,
+                input_sizes: Optional[Sequence[Any]] = None) -> int:
+    """
+    INSERT rows vào table qua cursor DBAPI của conn (dùng chung transaction của conn).
+    input_sizes: truyền cho cursor.setinputsizes, cần khi bảng có cột (N)VARCHAR(MAX)
+    (pyodbc không tự giới hạn buffer => fast_executemany tốn RAM / chậm).
+    """
+    cols = ", ".join(f"[{_check_ident(c)}]" for c in columns)
+    sql = f"INSERT INTO [{_check_ident(table)}] ({cols}) VALUES ({', '.join('?' * len(columns))})"
+
+    cursor = conn.connection.cursor()
+    cursor.fast_executemany = True
+    if input_sizes is not None:
+        cursor.setinputsizes(list(input_sizes))
+    total = 0
+    try:
+        for batch in _batches(rows, batch_size):
+            cursor.executemany(sql, batch)
+            total += len(batch)
+            if progress is not None:
+                progress.update(len(batch))
+    finally:
+        cursor.close()
+    return total
+
+
+def load_csv(conn, path: Path, table: Optional[str] = None,
+             batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, float]:
+    """Nạp 1 file CSV, trả thống kê rows / seconds / rows_per_s."""
+    table = table or table_for_csv(path)
+    progress = Progress(f"{path.name} -> {table}")
+    with io.open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return progress.finish()
+        bulk_insert(conn, table, [c.strip() for c in header], reader, batch_size, progress)
+    stats = progress.finish()
+    print(f"  {path.name}: {stats['rows']:,} rows in {stats['seconds']}s ({stats['rows_per_s'] or 0:,.0f} rows/s)")
+    return stats
@@ -1,16 +1,42 @@
 # app/api/db/migrate.py
+"""
+Chạy *.sql (và seed *.csv, xem app/db/bulk.py) trong migrations/ theo thứ tự tên file.
+
+- Chỉ 1 process migrate tại 1 thời điểm: sp_getapplock (Exclusive, owner = Session) trên
+  master, các worker khác chờ tới MIGRATE_LOCK_TIMEOUT rồi thấy không còn file nào pending.
+- Danh sách file đã chạy lấy 1 lần (1 query), kèm checksum SHA-256 để phát hiện file
+  đã chạy nhưng bị sửa sau đó.
+- Mỗi file chạy trong transaction riêng: file lỗi không rollback các file trước.
+- File đọc theo dòng, batch (tách theo GO) được chạy ngay khi đọc xong => RAM không phụ thuộc
+  kích thước file; in tiến độ + tốc độ cho file lớn.
+
+CLI: python -m scripts.migrate [--status] [--strict]
+Startup: settings.MIGRATE_ON_STARTUP = apply | check | skip
+"""
+import csv
+import hashlib
+import re
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pyodbc
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.core.config import settings
+from app.db.bulk import Progress, load_csv
 from app.db.session import MASTER_ENGINE, ENGINE
 
 MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "migrations"
+LOCK_RESOURCE = f"petcarex:migrate:{settings.MSSQL_DB}"
+
+
+class MigrationError(RuntimeError):
+    pass
 
 
 def ensure_database_exists():
-    db = settings.MSSQL_DB 
+    db = settings.MSSQL_DB
     print("Ensuring database exists:", db)
     # 1) Check existence (can be in a transaction ok)
     with MASTER_ENGINE.connect() as conn:
@@ -31,55 +57,242 @@ def ensure_migrations_table():
             filename NVARCHAR(255) NOT NULL PRIMARY KEY,
             applied_at DATETIME NOT NULL DEFAULT GETDATE()
         );
+
+        -- bảng tạo trước khi có checksum
+        IF COL_LENGTH('__schema_migrations', 'checksum') IS NULL
+            ALTER TABLE __schema_migrations ADD checksum CHAR(64) NULL;
         """))
 
 
-def is_applied(conn, filename: str) -> bool:
-    return conn.execute(
-        text("SELECT 1 FROM __schema_migrations WHERE filename = :f"),
-        {"f": filename},
-    ).first() is not None
+def applied_migrations(conn) -> Dict[str, Optional[str]]:
+    """{filename: checksum} của mọi file đã chạy (checksum NULL = chạy trước khi có checksum)."""
+    rows = conn.execute(text("SELECT filename, checksum FROM __schema_migrations")).all()
+    return {r.filename: r.checksum for r in rows}
 
 
-def mark_applied(conn, filename: str):
+def mark_applied(conn, filename: str, checksum: str):
     conn.execute(
-        text("INSERT INTO __schema_migrations(filename) VALUES (:f)"),
-        {"f": filename},
+        text("INSERT INTO __schema_migrations(filename, checksum) VALUES (:f, :c)"),
+        {"f": filename, "c": checksum},
     )
 
 
+def file_checksum(path: Path) -> str:
+    # đọc theo dòng (file seed có thể vài trăm MB); bỏ \r để checkout Windows / Linux cùng checksum
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for raw in f:
+            h.update(raw.replace(b"\r\n", b"\n"))
+    return h.hexdigest()
+
+
+# GO là lệnh của sqlcmd/SSMS, không phải T-SQL: chỉ tính khi đứng riêng 1 dòng,
+# ngoài comment / chuỗi, có thể kèm số lần lặp (GO 5) và comment "--" phía sau
+_GO = re.compile(r"^\s*GO(?:\s+(\d+))?\s*(?:--.*)?$", re.IGNORECASE)
+_TOKEN = re.compile(r"'|\"|\[|/\*|\*/|--|\]")
+_CLOSE = {"'": "'", '"': '"', "[": "]"}
+
+
+def _scan(line: str, mode: Optional[str], depth: int) -> Tuple[Optional[str], int]:
+    """
+    Cập nhật trạng thái lexer sau 1 dòng. mode: None (code), "*" (block comment, lồng được),
+    hoặc ký tự đóng của chuỗi / identifier đang mở (', ", ]).
+    Chỉ dừng ở các token liên quan nên chi phí gần với 1 lần regex search / dòng.
+    """
+    pos = 0
+    while True:
+        m = _TOKEN.search(line, pos)
+        if m is None:
+            break
+        tok, pos = m.group(), m.end()
+        if mode == "*":
+            if tok == "/*":
+                depth += 1
+            elif tok == "*/":
+                depth -= 1
+                if depth == 0:
+                    mode = None
+        elif mode is not None:
+            if tok == mode:
+                if line.startswith(mode, pos):  # '' / "" / ]] là ký tự escape, chưa đóng
+                    pos += 1
+                else:
+                    mode = None
+        elif tok == "--":
+            break
+        elif tok == "/*":
+            mode, depth = "*", 1
+        elif tok in _CLOSE:
+            mode = _CLOSE[tok]
+    return mode, depth
+
+
+def iter_go_batches(lines: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """Tách luồng dòng thành (batch, số lần chạy), không cần đọc hết file."""
+    buf: List[str] = []
+    has_code = False
+    mode, depth = None, 0
+    for line in lines:
+        if mode is None:
+            m = _GO.match(line)
+            if m:
+                if has_code:
+                    yield "".join(buf), int(m.group(1) or 1)
+                buf, has_code = [], False
+                continue
+        buf.append(line)
+        has_code = has_code or bool(line.strip())
+        mode, depth = _scan(line, mode, depth)
+    if has_code:
+        yield "".join(buf), 1
+
+
 def split_go_batches(sql: str):
     batches = []
-    cur = []
-    for line in sql.splitlines():
-        if line.strip().upper() == "GO":
-            if cur:
-                batches.append("\n".join(cur))
-                cur = []
+    for batch, count in iter_go_batches(sql.splitlines(keepends=True)):
+        batches.extend([batch] * count)
+    return batches
+
+
+def _iter_lines(path: Path, progress: Optional[Progress] = None) -> Iterator[str]:
+    with open(path, "rb") as f:
+        first = True
+        for raw in f:
+            if progress is not None:
+                progress.update(len(raw))
+            if first:
+                raw = raw.removeprefix(b"\xef\xbb\xbf")
+                first = False
+            yield raw.decode("utf-8")
+
+
+def run_sql_file(conn, path: Path) -> Dict[str, float]:
+    """Chạy file .sql theo từng batch khi đang đọc; trả thống kê batches / bytes / seconds."""
+    progress = Progress(path.name, total=path.stat().st_size, unit="bytes")
+    batches = 0
+    for batch, count in iter_go_batches(_iter_lines(path, progress)):
+        for _ in range(count):
+            # exec_driver_sql: gửi nguyên văn, không parse ":name" như text() (seed có chuỗi chứa ":")
+            conn.exec_driver_sql(batch, execution_options={"no_parameters": True})
+            batches += 1
+    stats = progress.finish()
+    stats["batches"] = batches
+    return stats
+
+
+def run_migration_file(conn, path: Path) -> Dict[str, float]:
+    if path.suffix.lower() == ".csv":
+        return load_csv(conn, path)
+    return run_sql_file(conn, path)
+
+
+def migration_files() -> List[Path]:
+    files = list(MIGRATIONS_DIR.glob("*.sql")) + list(MIGRATIONS_DIR.glob("*.csv"))
+    return sorted(files, key=lambda f: f.name)
+
+
+def migration_status() -> Dict[str, List[str]]:
+    """pending / changed (đã chạy nhưng file bị sửa) / applied, chỉ tốn 1 query."""
+    with MASTER_ENGINE.connect() as conn:
+        if conn.execute(text("SELECT DB_ID(:db)"), {"db": settings.MSSQL_DB}).scalar() is None:
+            return {"pending": [f.name for f in migration_files()], "changed": [], "applied": []}
+
+    with ENGINE.connect() as conn:
+        if conn.execute(text("SELECT OBJECT_ID('__schema_migrations', 'U')")).scalar() is None:
+            applied = {}
         else:
-            cur.append(line)
-    if cur:
-        batches.append("\n".join(cur))
-    return [b for b in batches if b.strip()]
+            has_checksum = conn.execute(text("SELECT COL_LENGTH('__schema_migrations', 'checksum')")).scalar()
+            applied = applied_migrations(conn) if has_checksum else {
+                r[0]: None for r in conn.execute(text("SELECT filename FROM __schema_migrations"))
+            }
 
+    status = {"pending": [], "changed": [], "applied": []}
+    for f in migration_files():
+        if f.name not in applied:
+            status["pending"].append(f.name)
+        elif applied[f.name] is not None and applied[f.name] != file_checksum(f):
+            status["changed"].append(f.name)
+        else:
+            status["applied"].append(f.name)
+    return status
 
-def run_sql_file(conn, path: Path):
-    sql = path.read_text(encoding="utf-8")
-    for batch in split_go_batches(sql):
-        conn.execute(text(batch))
 
+def _acquire_lock(conn, timeout_s: int):
+    result = conn.execute(text("""
+        SET NOCOUNT ON;
+        DECLARE @r INT;
+        EXEC @r = sp_getapplock @Resource = :res, @LockMode = 'Exclusive',
+                                @LockOwner = 'Session', @LockTimeout = :ms;
+        SELECT @r;
+    """), {"res": LOCK_RESOURCE, "ms": timeout_s * 1000}).scalar()
+    # 0 = lấy ngay, 1 = lấy sau khi chờ, < 0 = timeout / deadlock / lỗi
+    if result is None or result < 0:
+        raise MigrationError(f"Không lấy được migration lock sau {timeout_s}s (sp_getapplock = {result})")
 
-def migrate():
-    ensure_database_exists()
-    ensure_migrations_table()
 
-    sql_files = sorted(MIGRATIONS_DIR.glob("*.sql"))
+def _release_lock(conn):
+    conn.execute(text("EXEC sp_releaseapplock @Resource = :res, @LockOwner = 'Session'"), {"res": LOCK_RESOURCE})
+
+
+def migrate(strict: bool = False) -> List[str]:
+    """Chạy các file chưa chạy, trả danh sách file đã chạy lần này."""
+    applied_now: List[str] = []
+
+    # lock nằm ở master vì DB có thể chưa tồn tại; đóng connection cũng tự nhả lock
+    with MASTER_ENGINE.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        _acquire_lock(lock_conn, settings.MIGRATE_LOCK_TIMEOUT)
+        try:
+            ensure_database_exists()
+            ensure_migrations_table()
+
+            with ENGINE.begin() as conn:
+                applied = applied_migrations(conn)
+
+            for f in migration_files():
+                checksum = file_checksum(f)
+
+                if f.name in applied:
+                    if applied[f.name] is None:
+                        with ENGINE.begin() as conn:
+                            conn.execute(
+                                text("UPDATE __schema_migrations SET checksum = :c WHERE filename = :f"),
+                                {"f": f.name, "c": checksum},
+                            )
+                    elif applied[f.name] != checksum:
+                        msg = f"Migration {f.name} đã chạy nhưng nội dung file đã thay đổi"
+                        if strict:
+                            raise MigrationError(msg)
+                        print("WARNING:", msg)
+                    continue
 
-    with ENGINE.begin() as conn:
-        for f in sql_files:
-            if not is_applied(conn, f.name):
                 print("Applying migration:", f.name)
-                run_sql_file(conn, f)
-                mark_applied(conn, f.name)
-            else:
-                print("Skipping already applied migration:", f.name)
+                try:
+                    with ENGINE.begin() as conn:
+                        stats = run_migration_file(conn, f)
+                        mark_applied(conn, f.name, checksum)
+                    print(f"  done: {stats}")
+                # CSV đi thẳng qua cursor pyodbc (pyodbc.Error), đọc file (OSError), CSV hỏng
+                # (csv.Error, ValueError kể cả UnicodeDecodeError); lỗi khác là bug => để nổi lên
+                except (SQLAlchemyError, pyodbc.Error, OSError, csv.Error, ValueError) as e:
+                    raise MigrationError(f"Migration {f.name} lỗi, đã rollback file này: {e}") from e
+                applied_now.append(f.name)
+
+            print(f"Migrations: {len(applied_now)} applied, {len(applied)} already applied")
+        finally:
+            _release_lock(lock_conn)
+
+    if applied_now:
+        # migration có thể sửa dữ liệu danh mục (seed, giá...)
+        from app.services.catalog_cache import invalidate
+        invalidate()
+    return applied_now
+
+
+def check_migrations() -> bool:
+    """Chế độ startup 'check': không chạy gì, chỉ cảnh báo nếu còn file pending / bị sửa."""
+    status = migration_status()
+    if status["pending"]:
+        print("WARNING: pending migrations (chạy python -m scripts.migrate):", ", ".join(status["pending"]))
+    if status["changed"]:
+        print("WARNING: migrations changed after apply:", ", ".join(status["changed"]))
+    return not status["pending"] and not status["changed"]
@@ -0,0 +1,152 @@
+# app/db/pool.py
+from __future__ import annotations
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+
+# QueuePool._do_get tự gọi lại chính nó khi tranh overflow -> chỉ đo ở lần gọi ngoài cùng
+_in_do_get: ContextVar[bool] = ContextVar("_in_do_get", default=False)
+
+
+class PoolMetrics:
+    """Số liệu của một pool: thời gian chờ slot, thời gian checkout, thời gian giữ connection."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wait = Histogram()      # chờ lấy slot trong queue (gồm cả tạo connection overflow)
+        self.checkout = Histogram()  # toàn bộ pool.connect(): chờ + mở connection + pre-ping
+        self.held = Histogram()      # từ checkout tới checkin
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def incr(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+
+class _InstrumentedPoolMixin:
+    _metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        if self._metrics is None or _in_do_get.get():
+            return super()._do_get()
+
+        token = _in_do_get.set(True)
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self._metrics.incr("timeouts")
+            raise
+        finally:
+            self._metrics.wait.observe(time.perf_counter() - start)
+            _in_do_get.reset(token)
+
+    def connect(self):
+        if self._metrics is None:
+            return super().connect()
+
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self._metrics.checkout.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() tạo pool mới cùng class -> giữ lại bộ đếm cũ
+        new_pool = super().recreate()
+        new_pool._metrics = self._metrics
+        return new_pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+POOL_METRICS: Dict[str, PoolMetrics] = {}
+_ENGINES: Dict[str, Engine] = {}
+
+
+def pool_options(*, is_async: bool = False) -> Dict[str, Any]:
+    """
+    Tham số pool cho create_engine/create_async_engine lấy từ Settings.
+    DB_POOL_PRE_PING:
+      - "pessimistic": ping (SELECT 1) mỗi lần checkout, an toàn nhưng thêm 1 round-trip
+      - "optimistic": không ping; connection chết bị phát hiện khi lỗi và pool tự invalidate,
+        nên đi kèm DB_POOL_RECYCLE nhỏ hơn timeout phía server/firewall
+    """
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING == "pessimistic",
+        "pool_use_lifo": settings.DB_POOL_USE_LIFO,
+    }
+
+
+def instrument_engine(engine: Engine, name: str) -> PoolMetrics:
+    """Gắn PoolMetrics vào pool của engine (async engine: truyền engine.sync_engine)."""
+    metrics = PoolMetrics(name)
+    engine.pool._metrics = metrics
+    POOL_METRICS[name] = metrics
+    _ENGINES[name] = engine
+
+    # Listener gắn ở mức engine nên vẫn còn sau khi pool bị recreate
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        metrics.incr("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        record.info["petcarex_checkout_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        started = record.info.pop("petcarex_checkout_at", None)
+        if started is not None:
+            metrics.held.observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exception):
+        metrics.incr("invalidations")
+
+    return metrics
+
+
+def pool_status() -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for name, engine in _ENGINES.items():
+        pool = engine.pool
+        metrics = POOL_METRICS[name]
+        out[name] = {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+            "timeouts": metrics.timeouts,
+            "connects": metrics.connects,
+            "invalidations": metrics.invalidations,
+            "wait_seconds": metrics.wait.snapshot(),
+            "checkout_seconds": metrics.checkout.snapshot(),
+            "held_seconds": metrics.held.snapshot(),
+        }
+    return out
@@ -3,10 +3,12 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 from sqlalchemy.engine import URL
+from app.core.profiling import instrument_sql
+from app.db.pool import instrument_engine, pool_options
 
-def build_conn_str(db_name: str) -> str:
+def build_conn_str(db_name: str, drivername: str = "mssql+pyodbc") -> str:
     return URL.create(
-        "mssql+pyodbc",
+        drivername,
         username=settings.MSSQL_USER,
         password=settings.MSSQL_PASSWORD,
         host=settings.MSSQL_SERVER,
@@ -18,7 +20,29 @@ def build_conn_str(db_name: str) -> str:
         },
     )
 
-ENGINE = create_engine(build_conn_str(settings.MSSQL_DB), pool_pre_ping=True, future=True)
+ENGINE = create_engine(build_conn_str(settings.MSSQL_DB), future=True, **pool_options())
 SessionLocal = sessionmaker(bind=ENGINE, autoflush=False, autocommit=False, future=True)
+instrument_engine(ENGINE, "app")
+if settings.METRICS_ENABLED:
+    instrument_sql(ENGINE)
 
-MASTER_ENGINE = create_engine(build_conn_str("master"), pool_pre_ping=True, future=True)
+MASTER_ENGINE = create_engine(build_conn_str("master"), future=True, **pool_options())
+instrument_engine(MASTER_ENGINE, "master")
+
+# Async mode (DB_ASYNC=true): cùng DB nhưng đi qua aioodbc, route không giữ worker threadpool
+# trong lúc chờ SQL Server. Chỉ tạo engine khi bật để không bắt buộc cài aioodbc.
+ASYNC_ENGINE = None
+AsyncSessionLocal = None
+
+if settings.DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    ASYNC_ENGINE = create_async_engine(
+        build_conn_str(settings.MSSQL_DB, "mssql+aioodbc"), **pool_options(is_async=True)
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        bind=ASYNC_ENGINE, autoflush=False, expire_on_commit=False
+    )
+    instrument_engine(ASYNC_ENGINE.sync_engine, "async")
+    if settings.METRICS_ENABLED:
+        instrument_sql(ASYNC_ENGINE.sync_engine)
@@ -1,9 +1,14 @@
 # app/main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from app.db.migrate import migrate
+from app.core.config import settings
+from app.db.migrate import check_migrations, migrate
 from app.api.router import api_router
+from app.api.routes import metrics
+from app.core.profiling import ProfilingMiddleware, StatementBudgetExceeded
+from app.services import scheduler, work_queue
 
 app = FastAPI(title="PetCareX API")
 
@@ -20,10 +25,37 @@ app.add_middleware(
     allow_credentials=True,     # nếu sau này dùng cookie auth
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+if settings.METRICS_ENABLED:
+    # thêm sau CORS => bọc ngoài cùng, đo cả thời gian middleware khác
+    app.add_middleware(ProfilingMiddleware)
+
+@app.exception_handler(StatementBudgetExceeded)
+async def statement_budget_exceeded(request: Request, exc: StatementBudgetExceeded):
+    # SQL_BUDGET_MODE=raise: trả rõ lý do thay vì 500 trống
+    return JSONResponse(status_code=500, content={"detail": str(exc)})
+
 @app.on_event("startup")
 def on_startup():
-    migrate()
+    if settings.MIGRATE_ON_STARTUP == "apply":
+        migrate()
+    elif settings.MIGRATE_ON_STARTUP == "check":
+        check_migrations()
+    # dựng lịch đặt chỗ ở mọi chế độ (kể cả skip khi deploy): lượt đặt đầu tiên không phải chờ;
+    # lỗi DB chỉ log, request đầu tiên dựng lại
+    scheduler.warm()
+
+@app.on_event("startup")
+async def start_queue_feed():
+    # CACHE_BACKEND=redis: nghe sự kiện hàng đợi của các worker khác
+    await work_queue.hub.start()
+
+@app.on_event("shutdown")
+async def stop_queue_feed():
+    await work_queue.hub.stop()
 
 app.include_router(api_router, prefix="/api")
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
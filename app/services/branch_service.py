@@ -6,18 +6,18 @@ from sqlalchemy import text
 def revenue(db: Session, ma_cn: str, granularity: str = "day"):
     # whitelist chống injection (đừng f-string bừa)
     group_map = {
-        "day": "CAST(h.NgayLap AS DATE)",
-        "month": "FORMAT(h.NgayLap, 'yyyy-MM')",
-        "year": "FORMAT(h.NgayLap, 'yyyy')",
+        "day": "r.Ngay",
+        "month": "FORMAT(r.Ngay, 'yyyy-MM')",
+        "year": "FORMAT(r.Ngay, 'yyyy')",
     }
     group_expr = group_map.get(granularity, group_map["day"])
 
+    # bảng tổng hợp theo ngày -> chi phí theo số ngày, không theo số hoá đơn
     rows = db.execute(
         text(f"""
-            SELECT {group_expr} AS Ky, SUM(h.TongTien) AS DoanhThu
-            FROM HOADON h
-            JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
-            WHERE nv.MaCN = :cn
+            SELECT {group_expr} AS Ky, SUM(r.DoanhThu) AS DoanhThu
+            FROM DOANHTHU_CHINHANH_NGAY r
+            WHERE r.MaCN = :cn
             GROUP BY {group_expr}
             ORDER BY Ky
         """),
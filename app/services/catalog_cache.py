@@ -0,0 +1,133 @@
+# app/services/catalog_cache.py
+"""
+Cache trong process cho dữ liệu danh mục ít thay đổi
+(DICHVU, SANPHAM, VACCINE, GOITIEMPHONG, CHINHANH, CUNGCAPDICHVU).
+
+- Mỗi entry ghi nhận các bảng nó phụ thuộc; TTL = TTL nhỏ nhất của các bảng đó.
+- invalidate(table) xoá mọi entry phụ thuộc bảng, tăng "generation" của bảng
+  để kết quả đang load dở (đọc trước khi invalidate) không được ghi vào cache.
+- Giới hạn số entry (LRU), đếm hit/miss/eviction theo bảng.
+
+Mỗi worker uvicorn có cache riêng: TTL là giới hạn độ trễ khi dữ liệu đổi
+ngoài process (SQL tay, worker khác).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Mapping, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# giây
+TABLE_TTL: Dict[str, float] = {
+    "CHINHANH": 3600,
+    "DICHVU": 600,
+    "CUNGCAPDICHVU": 600,
+    "GOITIEMPHONG": 600,
+    "VACCINE": 300,
+    "SANPHAM": 300,
+}
+
+
+def _freeze(value: Any) -> Any:
+    # RowMapping giữ tham chiếu tới Row/Result; cache bản dict thuần
+    if isinstance(value, list):
+        return [dict(v) if isinstance(v, Mapping) else v for v in value]
+    return value
+
+
+class CatalogCache:
+    def __init__(self, max_entries: int = 256, ttl: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.ttl = dict(ttl or TABLE_TTL)
+        self._data: "OrderedDict[Tuple, Tuple[float, Tuple[str, ...], Any]]" = OrderedDict()
+        self._generation: Dict[str, int] = {t: 0 for t in self.ttl}
+        self._stats: Dict[str, Dict[str, int]] = {
+            t: {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0} for t in self.ttl
+        }
+        self._lock = threading.Lock()
+
+    def get_or_load(self, tables: Sequence[str], key: Hashable, loader: Callable[[], Any]) -> Any:
+        tables = tuple(tables)
+        unknown = [t for t in tables if t not in self.ttl]
+        if unknown:
+            raise KeyError(f"Bảng không nằm trong catalog cache: {unknown}")
+        full_key = (tables, key)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._data.get(full_key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(full_key)
+                self._count(tables, "hits")
+                return entry[2]
+            self._count(tables, "misses")
+            generations = [self._generation[t] for t in tables]
+
+        value = _freeze(loader())
+
+        with self._lock:
+            if [self._generation[t] for t in tables] != generations:
+                return value  # bảng vừa bị invalidate trong lúc load
+            expires = time.monotonic() + min(self.ttl[t] for t in tables)
+            self._data[full_key] = (expires, tables, value)
+            self._data.move_to_end(full_key)
+            while len(self._data) > self.max_entries:
+                _, (_, old_tables, _) = self._data.popitem(last=False)
+                self._count(old_tables, "evictions")
+        return value
+
+    def invalidate(self, *tables: str) -> int:
+        """Xoá entry phụ thuộc các bảng (không truyền = xoá hết). Trả số entry đã xoá."""
+        targets = set(tables or self.ttl)
+        with self._lock:
+            for t in targets:
+                if t in self._generation:
+                    self._generation[t] += 1
+                    self._stats[t]["invalidations"] += 1
+            stale = [k for k, (_, deps, _) in self._data.items() if targets.intersection(deps)]
+            for k in stale:
+                del self._data[k]
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tables = {t: dict(s) for t, s in self._stats.items()}
+            sizes: Dict[str, int] = {t: 0 for t in self.ttl}
+            for _, deps, _ in self._data.values():
+                for t in deps:
+                    sizes[t] += 1
+        for t, s in tables.items():
+            total = s["hits"] + s["misses"]
+            s["entries"] = sizes[t]
+            s["ttl_s"] = self.ttl[t]
+            s["hit_ratio"] = round(s["hits"] / total, 4) if total else None
+        return {
+            "enabled": settings.CATALOG_CACHE_ENABLED,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "tables": tables,
+        }
+
+    def _count(self, tables: Iterable[str], field: str) -> None:
+        for t in tables:
+            self._stats[t][field] += 1
+
+
+catalog_cache = CatalogCache(max_entries=settings.CATALOG_CACHE_MAX_ENTRIES)
+
+
+def cached(tables: Sequence[str], key: Hashable, loader: Callable[[], Any]) -> Any:
+    """Dùng trong service: cached(("DICHVU",), ("kh13", ma_cn), lambda: db.execute(...).mappings().all())"""
+    if not settings.CATALOG_CACHE_ENABLED:
+        return loader()
+    return catalog_cache.get_or_load(tables, key, loader)
+
+
+def invalidate(*tables: str) -> int:
+    """Hook cho các đường ghi vào bảng danh mục (kèm chỉ mục tìm kiếm của bảng, nếu có)."""
+    from app.services import search_index
+    search_index.mark_stale(*tables)
+    return catalog_cache.invalidate(*tables)
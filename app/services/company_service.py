@@ -1,13 +1,20 @@
+from typing import Optional
+
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from app.services import search_index
+from app.services.catalog_cache import cached
+from app.services.db_utils import stream_sql
+from app.services.pagination import Key, keyset, offset_page, page, ranked
+
 # CT1: Doanh thu của từng chi nhánh [cite: 103, 134]
+# Đọc từ bảng tổng hợp DOANHTHU_CHINHANH_NGAY (trigger trên HOADON duy trì, xem 004_revenue_rollup.sql)
 def get_revenue_by_branch(db: Session):
     query = text("""
-        SELECT cn.MaCN, cn.TenCN, COALESCE(SUM(h.TongTien), 0) AS DoanhThu
+        SELECT cn.MaCN, cn.TenCN, COALESCE(SUM(r.DoanhThu), 0) AS DoanhThu
         FROM CHINHANH cn
-        LEFT JOIN NHANVIEN nv ON cn.MaCN = nv.MaCN
-        LEFT JOIN HOADON h ON nv.MaNV = h.NhanVienLap
+        LEFT JOIN DOANHTHU_CHINHANH_NGAY r ON r.MaCN = cn.MaCN
         GROUP BY cn.MaCN, cn.TenCN
         ORDER BY DoanhThu DESC
     """)
@@ -66,27 +73,59 @@ def get_top_revenue_services(db: Session):
     return db.execute(query).mappings().all()
 
 # CT4: Tình hình hội viên (Cơ bản / Thân thiết / VIP) [cite: 105, 137]
+# THANHVIEN_BAC do trigger trên KHACHHANG giữ đúng (010_loyalty.sql): 3 dòng, không quét KHACHHANG
 def get_membership_stats(db: Session):
     query = text("""
-        SELECT Bac, COUNT(*) AS SoLuong,
-               CAST(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM KHACHHANG) AS DECIMAL(5,2)) AS TyLe
-        FROM KHACHHANG
-        GROUP BY Bac
+        SELECT Bac, SoLuong,
+               CAST(SoLuong * 100.0 / SUM(SoLuong) OVER () AS DECIMAL(5,2)) AS TyLe
+        FROM THANHVIEN_BAC
+        WHERE SoLuong > 0
     """)
     return db.execute(query).mappings().all()
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
 # CT5: Tra cứu nhân sự (Bổ sung TenCN để hiển thị lên bảng Front-end)
-def search_staff(db: Session, keyword: str = ""):
-    query = text("""
+STAFF_KEYS = (Key("MaNV", "nv.MaNV"),)
+
+
+def _search_staff_query(keyword: str = "", limit: Optional[int] = None, cursor: Optional[str] = None):
+    query = """
         SELECT nv.*, cn.TenCN 
         FROM NHANVIEN nv
         LEFT JOIN CHINHANH cn ON nv.MaCN = cn.MaCN
-        WHERE nv.HoTen LIKE :kw OR nv.MaNV LIKE :kw
-    """)
-    result = db.execute(query, {"kw": f"%{keyword}%"})
-    return result.mappings().all()
+        WHERE (nv.HoTen LIKE :kw OR nv.MaNV LIKE :kw)
+    """
+    return keyset(query, {"kw": f"%{keyword}%"}, STAFF_KEYS, cursor=cursor, limit=limit, descending=False)
+
+
+# Có từ khoá: thứ tự theo search_index (không dấu, xếp hạng), xem kh8_search_products
+RANKED_STAFF_QUERY = """
+    SELECT nv.*, cn.TenCN
+    FROM OPENJSON(:ids) r
+    JOIN NHANVIEN nv ON nv.MaNV = CAST(r.value AS VARCHAR(10))
+    LEFT JOIN CHINHANH cn ON nv.MaCN = cn.MaCN
+    ORDER BY CAST(r.[key] AS INT)
+"""
+
+
+def search_staff(db: Session, keyword: str = "", limit: Optional[int] = None, cursor: Optional[str] = None):
+    if search_index.enabled(keyword):
+        query, params, offset = ranked(RANKED_STAFF_QUERY, {}, cursor=cursor, limit=limit)
+        params["ids"] = search_index.ranked_keys(db, "NHANVIEN", keyword, None,
+                                                 search_index.page_hits(offset, limit))
+        return offset_page(db.execute(text(query), params).mappings().all(), offset, limit)
+    query, params = _search_staff_query(keyword, limit, cursor)
+    result = db.execute(text(query), params)
+    return page(result.mappings().all(), STAFF_KEYS, limit)
+
+
+def stream_staff(keyword: str = "", cursor: Optional[str] = None):
+    if search_index.enabled(keyword):
+        query, params, _ = ranked(RANKED_STAFF_QUERY, {}, cursor=cursor)
+        return search_index.stream_ranked("NHANVIEN", keyword, None, query, params)
+    query, params = _search_staff_query(keyword, cursor=cursor)
+    return stream_sql(query, params)
 
 # CT5: Thêm nhân viên mới
 def create_staff(db: Session, staff_data: dict):
@@ -104,6 +143,7 @@ def create_staff(db: Session, staff_data: dict):
         "luong": staff_data.get('Luong')
     })
     db.commit()
+    search_index.refresh(db, "NHANVIEN", staff_data.get('MaNV'))
     return {"status": "success"}
 
 # CT5 & CT6: Chỉnh sửa lương và chi nhánh (Hàm linh hoạt)
@@ -115,6 +155,7 @@ def update_staff(db: Session, ma_nv: str, ma_cn: str, luong: float):
     """)
     db.execute(query, {"ma_cn": ma_cn, "luong": luong, "ma_nv": ma_nv})
     db.commit()
+    search_index.refresh(db, "NHANVIEN", ma_nv)
     return {"status": "success"}
 
 # CT5: Xóa nhân viên
@@ -122,15 +163,15 @@ def delete_staff(db: Session, ma_nv: str):
     query = text("DELETE FROM NHANVIEN WHERE MaNV = :ma_nv")
     db.execute(query, {"ma_nv": ma_nv})
     db.commit()
+    search_index.refresh(db, "NHANVIEN", ma_nv)
     return {"status": "success"}
 
 # CT7: Tra cứu số khách hàng của từng chi nhánh [cite: 107, 137]
 def get_customer_count_by_branch(db: Session):
     query = text("""
-        SELECT cn.MaCN, cn.TenCN, COUNT(DISTINCT h.MaKH) AS SoKhachHang
+        SELECT cn.MaCN, cn.TenCN, COUNT(k.MaKH) AS SoKhachHang
         FROM CHINHANH cn
-        LEFT JOIN NHANVIEN nv ON cn.MaCN = nv.MaCN
-        LEFT JOIN HOADON h ON nv.MaNV = h.NhanVienLap
+        LEFT JOIN KHACHHANG_CHINHANH k ON k.MaCN = cn.MaCN
         GROUP BY cn.MaCN, cn.TenCN
         ORDER BY SoKhachHang DESC
     """)
@@ -149,4 +190,4 @@ def get_total_pets_stats(db: Session):
 
 def get_all_branches(db: Session):
     query = text("SELECT MaCN, TenCN FROM CHINHANH")
-    return db.execute(query).mappings().all()
\ No newline at end of file
+    return cached(("CHINHANH",), "get_all_branches", lambda: db.execute(query).mappings().all())
\ No newline at end of file
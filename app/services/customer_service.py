@@ -8,29 +8,32 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from sqlalchemy.exc import DBAPIError
 
-from app.services.db_utils import exec_sp
+from app.services import scheduler, search_index, work_queue
+from app.services.catalog_cache import cached
+from app.services.db_utils import exec_multi, exec_sp, exec_sp_first, stream_sql
+from app.services.pagination import Key, keyset, offset_page, page, ranked
+
+# Mã THROW của sp_ThemSanPhamVaoGio / sp_DatLichDichVu -> HTTP status (còn lại 400)
+CART_STATUS = {50040: 404, 50043: 404, 50045: 409}
 
 
 # ============================================================
 # KH1 - danh sách gói tiêm
 # ============================================================
 def kh1_list_packages(db: Session):
-    rows = db.execute(
-        text("SELECT MaGoi, TenGoi, ThoiGian, KhuyenMai FROM GOITIEMPHONG")
-    ).mappings().all()
-    return rows
+    return cached(
+        ("GOITIEMPHONG",),
+        "kh1_list_packages",
+        lambda: db.execute(
+            text("SELECT MaGoi, TenGoi, ThoiGian, KhuyenMai FROM GOITIEMPHONG")
+        ).mappings().all(),
+    )
 
 def kh_get_my_purchased_packages(db: Session, ma_kh: str):
     # Lấy danh sách gói đã thanh toán (HinhThucThanhToan IS NOT NULL)
     rows = db.execute(
         text("""
-            WITH GlobalStock AS (
-                -- Tính tổng tồn kho của từng loại vaccine trên toàn bộ chi nhánh
-                SELECT MaVC, SUM(SoLuongTonKho) as TotalGlobalStock
-                FROM CHINHANH_VACCINE
-                GROUP BY MaVC
-            ),
-            PackageDetails AS (
+            WITH PackageDetails AS (
                 -- Lấy thông tin chi tiết các liều trong gói của khách hàng
                 SELECT 
                     mg.MaHoaDon,
@@ -39,12 +42,13 @@ def kh_get_my_purchased_packages(db: Session, ma_kh: str):
                     v.TenVC,
                     gv.SoLieu AS SoMuiGoc,
                     gkv.Solieuconlai AS SoMuiConLai,
-                    ISNULL(gs.TotalGlobalStock, 0) as TonKhoToanHeThong
+                    ISNULL(gs.TongTonKho, 0) as TonKhoToanHeThong
                 FROM MUA_GOI mg
                 JOIN GOI_KHACHHANG_VACCINE gkv ON mg.MaKH = gkv.MaKH AND mg.MaGoi = gkv.MaGoi
                 JOIN GOITIEMPHONG_VACCINE gv ON mg.MaGoi = gv.MaGoi AND gkv.MaVC = gv.MaVC
                 JOIN VACCINE v ON gkv.MaVC = v.MaVC
-                LEFT JOIN GlobalStock gs ON gkv.MaVC = gs.MaVC
+                -- tổng tồn kho mọi chi nhánh: indexed view (014_vaccine_indexed_views.sql)
+                LEFT JOIN vw_TonKhoVaccine gs WITH (NOEXPAND) ON gkv.MaVC = gs.MaVC
                 WHERE mg.MaKH = :kh
             )
             SELECT 
@@ -99,6 +103,7 @@ def kh2_create_pet(db: Session, ma_kh: str, ten: str, loai=None, giong=None):
             {"makh": ma_kh, "ten": ten, "loai": loai, "giong": giong},
         ).scalar_one()
         db.commit()
+        search_index.refresh(db, "THUCUNG", row)
         return {"ok": True, "MaThuCung": row}
 
     except DBAPIError as e:
@@ -119,6 +124,7 @@ def kh2_delete_pet(db: Session, ma_thu_cung: str, ma_kh: str):
 
     if res.rowcount == 0:
         raise HTTPException(status_code=404, detail="Pet not found")
+    search_index.refresh(db, "THUCUNG", ma_thu_cung)
     return {"ok": True}
 
 
@@ -241,8 +247,11 @@ def kh10_pet_medical_history(db: Session, ma_thu_cung: str, ma_kh: str):
 # ============================================================
 # KH11 - Danh sách hóa đơn đã thanh toán
 # ============================================================
-def kh11_purchase_history(db: Session, ma_kh: str):
-    query = text("""
+KH11_KEYS = (Key("NgayLap", "HD.NgayLap", "DATETIME"), Key("MaHoaDon", "HD.MaHoaDon"))
+
+
+def _kh11_query(ma_kh: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    query = """
         SELECT 
             HD.MaHoaDon, 
             HD.NgayLap, 
@@ -252,11 +261,20 @@ def kh11_purchase_history(db: Session, ma_kh: str):
         FROM HOADON HD
         LEFT JOIN NHANXET NX ON HD.MaHoaDon = NX.MaHoaDon AND HD.MaKH = NX.MaKH
         WHERE HD.MaKH = :ma_kh -- Tên tham số ở đây là ma_kh
-    """)
-    
+    """
     # Ở đây phải dùng key là "ma_kh" cho khớp với :ma_kh ở trên
-    result = db.execute(query, {"ma_kh": ma_kh}).mappings().all() 
-    return result
+    return keyset(query, {"ma_kh": ma_kh}, KH11_KEYS, cursor=cursor, limit=limit)
+
+
+def kh11_purchase_history(db: Session, ma_kh: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    query, params = _kh11_query(ma_kh, limit, cursor)
+    result = db.execute(text(query), params).mappings().all()
+    return page(result, KH11_KEYS, limit)
+
+
+def kh11_stream_purchase_history(ma_kh: str, cursor: Optional[str] = None):
+    query, params = _kh11_query(ma_kh, cursor=cursor)
+    return stream_sql(query, params)
 
 
 
@@ -264,25 +282,25 @@ def kh11_purchase_history(db: Session, ma_kh: str):
 # KH12 - Chi tiết từng hạng mục trong hóa đơn
 # ============================================================
 def kh12_invoice_detail(db: Session, ma_hoa_don: str, ma_kh: str):
-    header = db.execute(
-        text("""
+    # header + hạng mục trong 1 round-trip
+    rs = exec_multi(
+        db,
+        """
+            SET NOCOUNT ON;
+
+            -- @hd = NULL nếu hóa đơn không thuộc khách => cả 2 result set rỗng
+            DECLARE @hd VARCHAR(10);
+            SELECT @hd = MaHoaDon FROM HOADON WHERE MaHoaDon = :hd AND MaKH = :kh;
+
             SELECT MaHoaDon, NgayLap, TongTien, KhuyenMai, HinhThucThanhToan
             FROM HOADON
-            WHERE MaHoaDon = :hd AND MaKH = :kh
-        """),
-        {"hd": ma_hoa_don, "kh": ma_kh},
-    ).mappings().first()
-
-    if not header:
-        raise HTTPException(status_code=404, detail="Invoice not found")
+            WHERE MaHoaDon = @hd;
 
-    items = db.execute(
-        text("""
             /* 1. Hạng mục Dịch vụ (Khám, Tiêm, Spa...) */
             SELECT dv.TenDV AS TenItem, 1 AS SoLuong, pd.GiaTien AS DonGia, pd.GiaTien AS ThanhTien, 'Service' AS Loai
             FROM PHIENDICHVU pd
             JOIN DICHVU dv ON pd.MaDV = dv.MaDV
-            WHERE pd.MaHoaDon = :hd AND pd.MaDV <> 'DV_RETAIL'
+            WHERE pd.MaHoaDon = @hd AND pd.MaDV <> 'DV_RETAIL'
 
             UNION ALL
 
@@ -291,7 +309,7 @@ def kh12_invoice_detail(db: Session, ma_hoa_don: str, ma_kh: str):
             FROM PHIENDICHVU pd
             JOIN TOATHUOC tt ON pd.MaPhien = tt.MaPhien
             JOIN SANPHAM sp ON tt.MaThuoc = sp.MaSP
-            WHERE pd.MaHoaDon = :hd
+            WHERE pd.MaHoaDon = @hd
 
             UNION ALL
 
@@ -300,74 +318,100 @@ def kh12_invoice_detail(db: Session, ma_hoa_don: str, ma_kh: str):
             FROM PHIENDICHVU pd
             JOIN MUAHANG mh ON pd.MaPhien = mh.MaPhien
             JOIN SANPHAM sp ON mh.MaSP = sp.MaSP
-            WHERE pd.MaHoaDon = :hd
+            WHERE pd.MaHoaDon = @hd
 
             UNION ALL
 
             /* 4. Hạng mục Gói tiêm */
-            SELECT g.TenGoi AS TenItem, 1 AS SoLuong, dbo.fn_GiaGoiTiemPhong(g.MaGoi) AS DonGia, 
-                   dbo.fn_GiaGoiTiemPhong(g.MaGoi) AS ThanhTien, 'Package' AS Loai
+            SELECT g.TenGoi AS TenItem, 1 AS SoLuong, gg.Gia AS DonGia, 
+                   gg.Gia AS ThanhTien, 'Package' AS Loai
             FROM MUA_GOI mg
             JOIN GOITIEMPHONG g ON g.MaGoi = mg.MaGoi
-            WHERE mg.MaHoaDon = :hd
-        """),
-        {"hd": ma_hoa_don},
-    ).mappings().all()
+            JOIN vw_GiaGoi gg ON gg.MaGoi = mg.MaGoi
+            WHERE mg.MaHoaDon = @hd;
+        """,
+        {"hd": ma_hoa_don, "kh": ma_kh},
+        ("header", "items"),
+    )
 
-    return {"header": header, "items": items}
+    if not rs["header"]:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+
+    return {"header": rs["header"][0], "items": rs["items"]}
 
 
 def kh13_list_services(db: Session, ma_cn: Optional[str] = None):
     # Nếu ma_cn có giá trị, lọc các dịch vụ mà chi nhánh đó cung cấp
     # Nếu ma_cn là None, lấy tất cả dịch vụ trong bảng DICHVU
-    rows = db.execute(
-        text("""
-            SELECT MaDV, TenDV, DonGia
-            FROM DICHVU
-            WHERE MaDV <> 'DV_RETAIL'
-               AND (:cn IS NULL OR MaDV IN (SELECT MaDV FROM CUNGCAPDICHVU WHERE MaCN = :cn))
-        """),
-        {"cn": ma_cn}
-    ).mappings().all()
-    return rows
+    return cached(
+        ("DICHVU", "CUNGCAPDICHVU"),
+        ("kh13_list_services", ma_cn),
+        lambda: db.execute(
+            text("""
+                SELECT MaDV, TenDV, DonGia
+                FROM DICHVU
+                WHERE MaDV <> 'DV_RETAIL'
+                   AND (:cn IS NULL OR MaDV IN (SELECT MaDV FROM CUNGCAPDICHVU WHERE MaCN = :cn))
+            """),
+            {"cn": ma_cn}
+        ).mappings().all(),
+    )
 
 
-def kh14_my_appointments(db: Session, ma_kh: str):
-    rows = db.execute(
-        text("""
-            SELECT h.MaHoaDon, h.NgayLap,
-                   tc.MaThuCung, tc.Ten AS TenThuCung,
-                   dv.TenDV, pd.GiaTien
-            FROM HOADON h
-            JOIN PHIENDICHVU pd ON h.MaHoaDon = pd.MaHoaDon
-            JOIN THUCUNG tc ON pd.MaThuCung = tc.MaThuCung
-            JOIN DICHVU dv ON pd.MaDV = dv.MaDV
-            WHERE h.MaKH = :kh
-            ORDER BY h.NgayLap DESC
-        """),
-        {"kh": ma_kh},
-    ).mappings().all()
-    return rows
+KH14_KEYS = (Key("NgayLap", "h.NgayLap", "DATETIME"), Key("MaPhien", "pd.MaPhien"))
+
+
+def _kh14_query(ma_kh: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    q = """
+        SELECT h.MaHoaDon, h.NgayLap, pd.MaPhien,
+               tc.MaThuCung, tc.Ten AS TenThuCung,
+               dv.TenDV, pd.GiaTien
+        FROM HOADON h
+        JOIN PHIENDICHVU pd ON h.MaHoaDon = pd.MaHoaDon
+        JOIN THUCUNG tc ON pd.MaThuCung = tc.MaThuCung
+        JOIN DICHVU dv ON pd.MaDV = dv.MaDV
+        WHERE h.MaKH = :kh
+    """
+    return keyset(q, {"kh": ma_kh}, KH14_KEYS, cursor=cursor, limit=limit)
+
+
+def kh14_my_appointments(db: Session, ma_kh: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    q, params = _kh14_query(ma_kh, limit, cursor)
+    rows = db.execute(text(q), params).mappings().all()
+    return page(rows, KH14_KEYS, limit)
+
+
+def kh14_stream_appointments(ma_kh: str, cursor: Optional[str] = None):
+    q, params = _kh14_query(ma_kh, cursor=cursor)
+    return stream_sql(q, params)
 
 
 def kh15_cancel_appointment(db: Session, ma_phien: str, ma_kh: str):
-    res = db.execute(
+    # OUTPUT ... INTO: PHIENDICHVU có trigger, không OUTPUT thẳng ra client được
+    row = db.execute(
         text("""
+            SET NOCOUNT ON;
+            DECLARE @out TABLE (MaCN VARCHAR(10), MaDV VARCHAR(10));
+
             UPDATE pd
             SET TrangThai = N'CANCELLED'
+            OUTPUT inserted.MaCN, inserted.MaDV INTO @out
             FROM PHIENDICHVU pd
             JOIN THUCUNG tc ON pd.MaThuCung = tc.MaThuCung
             WHERE pd.MaPhien = :ph
               AND tc.MaKH = :kh
-              AND pd.TrangThai = N'BOOKING'
+              AND pd.TrangThai = N'BOOKING';
+
+            SELECT MaCN, MaDV FROM @out;
         """),
         {"ph": ma_phien, "kh": ma_kh},
-    )
+    ).first()
     db.commit()
 
-    if res.rowcount == 0:
+    if row is None:
         raise HTTPException(status_code=400, detail="Cannot cancel this appointment")
 
+    scheduler.schedule.release(row.MaCN, row.MaDV, ma_phien)
     return {"ok": True}
 
 def kh_get_chinhanh_by_product(db: Session, ma_sp: str):
@@ -403,138 +447,46 @@ def kh16_create_booking(
     thoi_diem_bat_dau: str,
     ma_nv: Optional[str] = 'NV_SYSTEM'
 ):
-    # ---------------------------------------------------
-    # 0. KIỂM TRA CHI NHÁNH CÓ CUNG CẤP DỊCH VỤ
-    # ---------------------------------------------------
-    ok_cn = db.execute(
-        text("""
-            SELECT 1
-            FROM CUNGCAPDICHVU
-            WHERE MaDV = :dv AND MaCN = :cn
-        """),
-        {"dv": ma_dv, "cn": ma_cn},
-    ).first()
-
-    if not ok_cn:
-        raise HTTPException(
-            status_code=400,
-            detail="Chi nhánh này không cung cấp dịch vụ đã chọn",
-        )
-
-    # ---------------------------------------------------
-    # 1. KIỂM TRA THÚ CƯNG
-    # ---------------------------------------------------
-    pet = db.execute(
-        text("""
-            SELECT Ten
-            FROM THUCUNG
-            WHERE MaThuCung = :tc AND MaKH = :kh
-        """),
-        {"tc": ma_thu_cung, "kh": ma_kh},
-    ).fetchone()
-
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-
-    # ---------------------------------------------------
-    # 2. GIÁ DỊCH VỤ
-    # ---------------------------------------------------
-    gia = db.execute(
-        text("SELECT DonGia FROM DICHVU WHERE MaDV = :dv"),
-        {"dv": ma_dv},
-    ).scalar()
-
-    if gia is None:
-        raise HTTPException(status_code=400, detail="Service price not found")
-
-    try:
-        # ---------------------------------------------------
-        # 3. TÌM / TẠO HÓA ĐƠN BOOKING
-        # ---------------------------------------------------
-        ma_hd = db.execute(
-            text("""
-                SET NOCOUNT ON;
-                SELECT TOP 1 h.MaHoaDon
-                FROM HOADON h
-                JOIN PHIENDICHVU pd ON h.MaHoaDon = pd.MaHoaDon
-                WHERE h.MaKH = :kh
-                  AND pd.TrangThai = N'BOOKING'
-                ORDER BY h.NgayLap DESC
-            """),
-            {"kh": ma_kh},
-        ).scalar()
-
-        if not ma_hd:
-            ma_hd = db.execute(
-                text("""
-                    SET NOCOUNT ON;
-                    DECLARE @out TABLE (ID VARCHAR(10));
-
-                    INSERT INTO HOADON (MaKH, NgayLap, NhanVienLap, HinhThucThanhToan)
-                    OUTPUT INSERTED.MaHoaDon INTO @out
-                    VALUES (:kh, GETDATE(), :nv, NULL);
-
-                    SELECT ID FROM @out;
-                """),
-                {"kh": ma_kh, "nv": ma_nv},
-            ).scalar()
-
-        # ---------------------------------------------------
-        # 4. TẠO PHIÊN DỊCH VỤ
-        # ---------------------------------------------------
-        ma_phien = db.execute(
-            text("""
-                SET NOCOUNT ON;
-                DECLARE @out TABLE (MaPhien VARCHAR(10));
-
-                INSERT INTO PHIENDICHVU (
-                    MaHoaDon, MaThuCung, MaDV,
-                    GiaTien, TrangThai, MaCN, ThoiDiemBatDau
-                )
-                OUTPUT INSERTED.MaPhien INTO @out
-                VALUES (
-                    :hd, :tc, :dv,
-                    :gia, N'BOOKING', :cn, :start_time -- <--- Dùng tham số truyền vào
-                );
-
-                SELECT MaPhien FROM @out;
-            """),
-            {
-                "hd": ma_hd,
-                "tc": ma_thu_cung,
-                "dv": ma_dv,
-                "gia": gia,
-                "cn": ma_cn,
-                "start_time": thoi_diem_bat_dau # <--- Truyền vào SQL
-            },
-        ).scalar()
-
-        # ---------------------------------------------------
-        # 5. UPDATE TỔNG TIỀN
-        # ---------------------------------------------------
-        db.execute(
-            text("""
-                UPDATE HOADON
-                SET TongTien = dbo.fn_CalculateHoaDonTotal(:hd)
-                WHERE MaHoaDon = :hd
-            """),
-            {"hd": ma_hd},
-        )
+    # Khung giờ đã kín theo lịch trong process => 409 không cần gọi DB;
+    # SP vẫn kiểm tra lại sức chứa trong transaction (011_appointment_slots.sql)
+    start = scheduler.parse_start(thoi_diem_bat_dau)
+    if start is not None:
+        scheduler.check(db, ma_cn, ma_dv, start)
+
+    # Kiểm tra + tìm/tạo hóa đơn BOOKING + tạo phiên trong 1 lần gọi (xem 008_cart_procedures.sql)
+    row = exec_sp_first(
+        db,
+        """
+        EXEC dbo.sp_DatLichDichVu
+            @MaKH=:kh, @MaThuCung=:tc, @MaDV=:dv, @MaCN=:cn,
+            @ThoiDiemBatDau=:start_time, @MaNV=:nv
+        """,
+        {
+            "kh": ma_kh,
+            "tc": ma_thu_cung,
+            "dv": ma_dv,
+            "cn": ma_cn,
+            "start_time": thoi_diem_bat_dau,
+            "nv": ma_nv,
+        },
+        status_map=CART_STATUS,
+    )
+    if start is not None:
+        scheduler.schedule.book(ma_cn, ma_dv, row["MaPhien"], start)
+    return {
+        "ok": True,
+        "MaHoaDon": row["MaHoaDon"],
+        "MaPhien": row["MaPhien"],
+        "MaCN": ma_cn,
+        "TenThuCung": row["TenThuCung"],
+        "ThoiDiem": thoi_diem_bat_dau
+    }
 
-        db.commit()
-        return {
-            "ok": True,
-            "MaHoaDon": ma_hd,
-            "MaPhien": ma_phien,
-            "MaCN": ma_cn,
-            "TenThuCung": pet.Ten,
-            "ThoiDiem": thoi_diem_bat_dau
-        }
 
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
 
+def kh16_available_slots(db: Session, ma_cn: str, ma_dv: str, ngay, step: Optional[int] = None):
+    # Đọc lịch trong process (scheduler), không truy vấn PHIENDICHVU
+    return scheduler.available_slots(db, ma_cn, ma_dv, ngay, step)
 
 
 def kh17_my_bookings(db: Session, ma_kh: str):
@@ -592,12 +544,13 @@ def kh17_my_bookings(db: Session, ma_kh: str):
                     N'BOOKING' AS TrangThai,
                     NULL AS TenThuCung,
                     g.TenGoi AS TenDV,
-                    dbo.fn_GiaGoiTiemPhong(g.MaGoi) AS GiaTien,
+                    gg.Gia AS GiaTien,
                     h.NgayLap AS SortDate,
                     2 AS SortType
 
                 FROM MUA_GOI mg
                 JOIN GOITIEMPHONG g ON g.MaGoi = mg.MaGoi
+                JOIN vw_GiaGoi gg ON gg.MaGoi = mg.MaGoi
                 JOIN HOADON h ON h.MaHoaDon = mg.MaHoaDon
                 WHERE h.MaKH = :kh
                 AND h.HinhThucThanhToan IS NULL
@@ -607,26 +560,88 @@ def kh17_my_bookings(db: Session, ma_kh: str):
         {"kh": ma_kh},
     ).mappings().all()
 
-def kh8_search_products(db: Session, keyword: str | None, loai: str | None, ma_cn: str | None = None):
+KH8_KEYS = (Key("MaSP", "sp.MaSP"),)
+
+
+def _kh8_query(
+    keyword: str | None,
+    loai: str | None,
+    ma_cn: str | None = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
     # Nếu có ma_cn, ta lấy thêm cột SoLuongTonKho từ bảng CHINHANH_SANPHAM
     # Nếu không có ma_cn, hiển thị tồn kho là 0 hoặc không hiển thị
-    rows = db.execute(
-        text("""
-            SELECT 
-                sp.MaSP, 
-                sp.TenSP, 
-                sp.LoaiSP, 
-                sp.DonGia,
-                ISNULL(csp.SoLuongTonKho, '-') AS SoLuongTonKho
-            FROM SANPHAM sp
-            LEFT JOIN CHINHANH_SANPHAM csp ON sp.MaSP = csp.MaSP AND csp.MaCN = :cn
-            WHERE (:kw IS NULL OR sp.TenSP LIKE N'%' + :kw + N'%')
-              AND (:loai IS NULL OR sp.LoaiSP = :loai)
-              AND (:cn IS NULL OR csp.MaCN = :cn) -- Chỉ hiện sản phẩm chi nhánh có bán nếu truyền ma_cn
-        """),
-        {"kw": keyword, "loai": loai, "cn": ma_cn},
-    ).mappings().all()
-    return rows
+    q = """
+        SELECT 
+            sp.MaSP, 
+            sp.TenSP, 
+            sp.LoaiSP, 
+            sp.DonGia,
+            ISNULL(csp.SoLuongTonKho, '-') AS SoLuongTonKho
+        FROM SANPHAM sp
+        LEFT JOIN CHINHANH_SANPHAM csp ON sp.MaSP = csp.MaSP AND csp.MaCN = :cn
+        WHERE (:kw IS NULL OR sp.TenSP LIKE N'%' + :kw + N'%')
+          AND (:loai IS NULL OR sp.LoaiSP = :loai)
+          AND (:cn IS NULL OR csp.MaCN = :cn) -- Chỉ hiện sản phẩm chi nhánh có bán nếu truyền ma_cn
+    """
+    params = {"kw": keyword, "loai": loai, "cn": ma_cn}
+    return keyset(q, params, KH8_KEYS, cursor=cursor, limit=limit, descending=False)
+
+
+def _kh8_ranked_query(
+    loai: str | None,
+    ma_cn: str | None = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    # Có từ khoá: :ids = MaSP đã xếp hạng từ search_index, giữ thứ tự bằng [key] của OPENJSON.
+    # CAST sang VARCHAR để so với MaSP vẫn seek được PK (value của OPENJSON là NVARCHAR).
+    q = """
+        SELECT
+            sp.MaSP,
+            sp.TenSP,
+            sp.LoaiSP,
+            sp.DonGia,
+            ISNULL(csp.SoLuongTonKho, '-') AS SoLuongTonKho
+        FROM OPENJSON(:ids) r
+        JOIN SANPHAM sp ON sp.MaSP = CAST(r.value AS VARCHAR(10))
+        LEFT JOIN CHINHANH_SANPHAM csp ON sp.MaSP = csp.MaSP AND csp.MaCN = :cn
+        WHERE (:loai IS NULL OR sp.LoaiSP = :loai)
+          AND (:cn IS NULL OR csp.MaCN = :cn)
+        ORDER BY CAST(r.[key] AS INT)
+    """
+    return ranked(q, {"loai": loai, "cn": ma_cn}, cursor=cursor, limit=limit)
+
+
+def kh8_search_products(
+    db: Session,
+    keyword: str | None,
+    loai: str | None,
+    ma_cn: str | None = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    if search_index.enabled(keyword):
+        q, params, offset = _kh8_ranked_query(loai, ma_cn, limit, cursor)
+        # có ma_cn: lọc tồn kho chi nhánh trong SQL => gửi mọi hit, không cắt theo trang
+        params["ids"] = search_index.ranked_keys(
+            db, "SANPHAM", keyword, {"LoaiSP": loai},
+            search_index.page_hits(offset, limit, sql_filtered=ma_cn is not None),
+        )
+        rows = db.execute(text(q), params).mappings().all()
+        return offset_page(rows, offset, limit)
+    q, params = _kh8_query(keyword, loai, ma_cn, limit, cursor)
+    rows = db.execute(text(q), params).mappings().all()
+    return page(rows, KH8_KEYS, limit)
+
+
+def kh8_stream_products(keyword: str | None, loai: str | None, ma_cn: str | None = None, cursor: Optional[str] = None):
+    if search_index.enabled(keyword):
+        q, params, _ = _kh8_ranked_query(loai, ma_cn, cursor=cursor)
+        return search_index.stream_ranked("SANPHAM", keyword, {"LoaiSP": loai}, q, params)
+    q, params = _kh8_query(keyword, loai, ma_cn, cursor=cursor)
+    return stream_sql(q, params)
 
 def kh4_booking_product(
     db: Session,
@@ -636,138 +651,17 @@ def kh4_booking_product(
     ma_cn: str,
     ma_nv: Optional[str] = 'NV_SYSTEM',
 ):
-    # ---------------------------------------------------
-    # 1. KIỂM TRA SẢN PHẨM
-    # ---------------------------------------------------
-    sp = db.execute(
-        text("SELECT TenSP FROM SANPHAM WHERE MaSP = :sp"),
-        {"sp": ma_sp},
-    ).fetchone()
-
-    if not sp:
-        raise HTTPException(status_code=404, detail="Sản phẩm không tồn tại")
-
-    # ---------------------------------------------------
-    # 2. KIỂM TRA TỒN KHO TẠI CHI NHÁNH
-    # ---------------------------------------------------
-    ton = db.execute(
-        text("""
-            SELECT SoLuongTonKho
-            FROM CHINHANH_SANPHAM
-            WHERE MaSP = :sp AND MaCN = :cn
-        """),
-        {"sp": ma_sp, "cn": ma_cn},
-    ).scalar()
-
-    if ton is None or ton < so_luong:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Sản phẩm {sp.TenSP} không đủ tồn kho tại chi nhánh {ma_cn}",
-        )
-
-    try:
-        # ---------------------------------------------------
-        # 3. TÌM / TẠO HÓA ĐƠN BOOKING
-        # ---------------------------------------------------
-        ma_hd = db.execute(
-            text("""
-                SET NOCOUNT ON;
-                SELECT TOP 1 h.MaHoaDon
-                FROM HOADON h
-                JOIN PHIENDICHVU pd ON h.MaHoaDon = pd.MaHoaDon
-                WHERE h.MaKH = :kh
-                  AND pd.TrangThai = N'BOOKING'
-                ORDER BY h.NgayLap DESC
-            """),
-            {"kh": ma_kh},
-        ).scalar()
-
-        if not ma_hd:
-            ma_hd = db.execute(
-                text("""
-                    SET NOCOUNT ON;
-                    DECLARE @out TABLE (ID VARCHAR(10));
-
-                    INSERT INTO HOADON (MaKH, NhanVienLap, HinhThucThanhToan)
-                    OUTPUT INSERTED.MaHoaDon INTO @out
-                    VALUES (:kh, :nv, NULL);
-
-                    SELECT ID FROM @out;
-                """),
-                {"kh": ma_kh, "nv": ma_nv},
-            ).scalar()
-
-        # ---------------------------------------------------
-        # 4. TÌM / TẠO PHIÊN DV_RETAIL (THEO CHI NHÁNH)
-        # ---------------------------------------------------
-        ma_phien = db.execute(
-            text("""
-                SELECT MaPhien
-                FROM PHIENDICHVU
-                WHERE MaHoaDon = :hd
-                  AND MaDV = 'DV_RETAIL'
-                  AND MaCN = :cn
-            """),
-            {"hd": ma_hd, "cn": ma_cn},
-        ).scalar()
-
-        if not ma_phien:
-            ma_phien = db.execute(
-                text("""
-                    SET NOCOUNT ON;
-                    DECLARE @out TABLE (ID VARCHAR(10));
-
-                    INSERT INTO PHIENDICHVU (
-                        MaHoaDon, MaDV, GiaTien,
-                        TrangThai, MaCN, MaThuCung
-                    )
-                    OUTPUT INSERTED.MaPhien INTO @out
-                    VALUES (
-                        :hd, 'DV_RETAIL', 0, N'BOOKING', :cn, NULL
-                    );
-
-                    SELECT ID FROM @out;
-                """),
-                {"hd": ma_hd, "cn": ma_cn},
-            ).scalar()
-
-        # ---------------------------------------------------
-        # 5. THÊM / CỘNG SỐ LƯỢNG
-        # ---------------------------------------------------
-        db.execute(
-            text("""
-                IF EXISTS (
-                    SELECT 1 FROM MUAHANG
-                    WHERE MaPhien = :mp AND MaSP = :sp
-                )
-                    UPDATE MUAHANG
-                    SET SoLuong = SoLuong + :sl
-                    WHERE MaPhien = :mp AND MaSP = :sp
-                ELSE
-                    INSERT INTO MUAHANG (MaPhien, MaSP, SoLuong)
-                    VALUES (:mp, :sp, :sl)
-            """),
-            {"mp": ma_phien, "sp": ma_sp, "sl": so_luong},
-        )
-
-        # ---------------------------------------------------
-        # 6. UPDATE TỔNG TIỀN
-        # ---------------------------------------------------
-        db.execute(
-            text("""
-                UPDATE HOADON
-                SET TongTien = dbo.fn_CalculateHoaDonTotal(:hd)
-                WHERE MaHoaDon = :hd
-            """),
-            {"hd": ma_hd},
-        )
-
-        db.commit()
-        return {"ok": True, "MaCN": ma_cn}
-
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+    # Kiểm tra tồn kho + tìm/tạo giỏ + cộng MUAHANG + tổng tiền trong 1 lần gọi (xem 008_cart_procedures.sql)
+    row = exec_sp_first(
+        db,
+        """
+        EXEC dbo.sp_ThemSanPhamVaoGio
+            @MaKH=:kh, @MaSP=:sp, @SoLuong=:sl, @MaCN=:cn, @MaNV=:nv
+        """,
+        {"kh": ma_kh, "sp": ma_sp, "sl": so_luong, "cn": ma_cn, "nv": ma_nv},
+        status_map=CART_STATUS,
+    )
+    return {"ok": True, "MaCN": row["MaCN"]}
 
 
 def kh_buy_package(db: Session, ma_kh: str, ma_goi: str):
@@ -809,9 +703,11 @@ def kh_buy_package(db: Session, ma_kh: str, ma_goi: str):
         # 4. Cập nhật lại tổng tiền cho hóa đơn
         db.execute(
             text("""
-                UPDATE HOADON
-                SET TongTien = dbo.fn_CalculateHoaDonTotal(:hd)
-                WHERE MaHoaDon = :hd
+                UPDATE h
+                SET TongTien = t.TongTien
+                FROM HOADON h
+                CROSS APPLY dbo.fn_TongTienHoaDon(h.MaHoaDon) t
+                WHERE h.MaHoaDon = :hd
             """),
             {"hd": ma_hd},
         )
@@ -843,17 +739,14 @@ def kh_get_purchased_package_details(db: Session, ma_kh: str, ma_goi: str):
                 -- 5. Tính số mũi đã tiêm (Gốc - Còn lại)
                 (ISNULL(gv.SoLieu, gkv.Solieuconlai) - gkv.Solieuconlai) AS SoMuiDaDung,
                 
-                -- 6. Tính tổng tồn kho trên toàn bộ chi nhánh
-                ISNULL((
-                    SELECT SUM(SoLuongTonKho) 
-                    FROM CHINHANH_VACCINE 
-                    WHERE MaVC = gkv.MaVC
-                ), 0) as TonKhoHeThong
+                -- 6. Tổng tồn kho trên toàn bộ chi nhánh (indexed view vw_TonKhoVaccine)
+                ISNULL(tk.TongTonKho, 0) as TonKhoHeThong
                 
             FROM GOI_KHACHHANG_VACCINE gkv
             -- Sử dụng LEFT JOIN để đảm bảo record của khách luôn hiện lên
             LEFT JOIN VACCINE v ON gkv.MaVC = v.MaVC
             LEFT JOIN GOITIEMPHONG_VACCINE gv ON gkv.MaGoi = gv.MaGoi AND gkv.MaVC = gv.MaVC
+            LEFT JOIN vw_TonKhoVaccine tk WITH (NOEXPAND) ON tk.MaVC = gkv.MaVC
             
             WHERE gkv.MaKH = :kh AND gkv.MaGoi = :goi
         """),
@@ -878,6 +771,7 @@ def kh_confirm_invoice(
             },
         )
         db.commit()
+        work_queue.invoice_confirmed(db, ma_hoa_don)
         return {"ok": True}
     except DBAPIError as e:
         raise HTTPException(status_code=400, detail=str(e.orig))
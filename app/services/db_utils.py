@@ -2,13 +2,15 @@
 from __future__ import annotations
 
 import re
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence
 
 from fastapi import HTTPException
 from sqlalchemy import text
 from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
 
+from app.db.session import SessionLocal
+
 
 _ERRNO_RE = re.compile(r"\b(\d{5})\b")  # bắt 5 chữ số như 63006
 
@@ -35,26 +37,115 @@ def exec_sql(db: Session, sql: str, params: Optional[Dict[str, Any]] = None):
     return db.execute(text(sql), params or {})
 
 
-def exec_sp(db: Session, sp_sql: str, params: Dict[str, Any], *, commit: bool = True) -> None:
+# Số lần nextset() liên tiếp không gặp result set có cột trước khi coi như hết batch
+_MAX_EMPTY_SETS = 32
+
+
+def _advance(cursor) -> bool:
+    """
+    Sang result set kế tiếp; False nếu chắc chắn đã hết.
+    pyodbc trả True/False, nhưng cursor aioodbc do SQLAlchemy bọc (AsyncAdapt_dbapi_cursor,
+    DB_ASYNC=1) luôn trả None => không dựa vào giá trị trả về, người gọi xem cursor.description.
+    """
+    return cursor.nextset() is not False
+
+
+def exec_multi(
+    db: Session,
+    sql: str,
+    params: Optional[Dict[str, Any]],
+    names: Sequence[str],
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Chạy 1 batch T-SQL trả nhiều result set (SELECT ...; SELECT ...;) trong 1 round-trip,
+    trả {name: [dict, ...]} theo đúng thứ tự result set.
+    Đọc thẳng cursor DBAPI: nextset() rồi xem description (pyodbc và aioodbc đều chạy).
+    Nên mở batch bằng SET NOCOUNT ON để DML/DECLARE không sinh "result set" rowcount.
+    """
+    result = db.execute(text(sql), params or {})
+    cursor = result.cursor
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    try:
+        for i, name in enumerate(names):
+            if i > 0 and not _advance(cursor):
+                raise RuntimeError(f"Batch chỉ trả {i} result set, cần {len(names)}")
+            skipped = 0
+            while cursor.description is None:  # bỏ qua rowcount của lệnh không trả dòng
+                skipped += 1
+                if skipped > _MAX_EMPTY_SETS or not _advance(cursor):
+                    raise RuntimeError(f"Batch chỉ trả {i} result set, cần {len(names)}")
+            cols = [d[0] for d in cursor.description]
+            out[name] = [dict(zip(cols, row)) for row in cursor.fetchall()]
+    finally:
+        result.close()
+    return out
+
+
+def stream_sql(sql: str, params: Optional[Dict[str, Any]] = None, *, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Đọc từng lô `batch_size` dòng từ cursor thay vì .all(), bộ nhớ không phụ thuộc số dòng.
+    Tự mở Session riêng: generator chạy sau khi route đã trả về (StreamingResponse),
+    lúc đó session của Depends(get_db) đã đóng.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            text(sql), params or {}, execution_options={"yield_per": batch_size}
+        )
+        for row in result.mappings():
+            yield dict(row)
+    finally:
+        db.close()
+
+
+# Lỗi nghiệp vụ / validation → 400; xung đột tồn kho / không đủ liều → 409
+_DEFAULT_STATUS = {60005: 409, 61005: 409, 63004: 409, 63006: 409}
+
+
+def _raise_db_error(db: Session, e: DBAPIError, status_map: Optional[Dict[int, int]] = None):
+    db.rollback()
+
+    code = _extract_sqlserver_throw_code(e)
+    msg = str(e.orig) if getattr(e, "orig", None) is not None else str(e)
+
+    status = {**_DEFAULT_STATUS, **(status_map or {})}.get(code, 400)
+    raise HTTPException(status_code=status, detail=f"DB error{f' ({code})' if code else ''}: {msg}")
+
+
+def exec_sp(
+    db: Session,
+    sp_sql: str,
+    params: Dict[str, Any],
+    *,
+    commit: bool = True,
+    status_map: Optional[Dict[int, int]] = None,
+) -> None:
     """
     Gọi stored procedure: sp_sql dạng "EXEC dbo.sp_KeThuoc @MaPhien=:p, ..."
     Mặc định commit; nếu fail thì rollback và ném HTTPException.
+    status_map: mã THROW -> HTTP status riêng của SP (mặc định 400, tồn kho 409).
     """
     try:
         db.execute(text(sp_sql), params)
         if commit:
             db.commit()
     except DBAPIError as e:
-        db.rollback()
+        _raise_db_error(db, e, status_map)
 
-        code = _extract_sqlserver_throw_code(e)
-        msg = str(e.orig) if getattr(e, "orig", None) is not None else str(e)
 
-        # Mapping nhẹ nhàng:
-        # - Lỗi nghiệp vụ / validation → 400
-        # - Xung đột tồn kho / constraint → 409 (tuỳ bạn)
-        status = 400
-        if code in {60005, 61005, 63004, 63006}:  # không đủ tồn kho / không đủ liều
-            status = 409
-
-        raise HTTPException(status_code=status, detail=f"DB error{f' ({code})' if code else ''}: {msg}")
+def exec_sp_first(
+    db: Session,
+    sp_sql: str,
+    params: Dict[str, Any],
+    *,
+    commit: bool = True,
+    status_map: Optional[Dict[int, int]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Như exec_sp nhưng trả về dòng đầu của result set cuối SP (SELECT ... AS ...)."""
+    try:
+        row = db.execute(text(sp_sql), params).mappings().first()
+        if commit:
+            db.commit()
+        return dict(row) if row is not None else None
+    except DBAPIError as e:
+        _raise_db_error(db, e, status_map)
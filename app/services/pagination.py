@@ -0,0 +1,133 @@
+# app/services/pagination.py
+"""
+Keyset (cursor) pagination cho các API danh sách.
+
+- Client gửi `limit` (+ `cursor` lấy từ `next_cursor` của trang trước).
+- Cursor là giá trị khoá sắp xếp của dòng cuối trang, đóng gói base64 (opaque),
+  nên trang sau chỉ cần `WHERE (khoá) < (cursor)` theo index, không OFFSET.
+- Không truyền `limit`: trả toàn bộ như trước (next_cursor = None).
+- Danh sách xếp theo hạng (kết quả tìm kiếm, xem search_index.py) không có khoá sắp xếp
+  trên bảng: ranked() / offset_page() dùng cursor = vị trí dòng kế tiếp.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+MAX_LIMIT = 500
+
+
+@dataclass(frozen=True)
+class Key:
+    """Một cột trong khoá sắp xếp: `name` là tên cột trả về, `expr` là biểu thức SQL."""
+    name: str
+    expr: str
+    sql_type: Optional[str] = None  # vd "DATETIME": so sánh bằng CAST(:c AS DATETIME)
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, datetime):
+        # DATETIME của SQL Server chính xác tới ~3ms, giữ mili giây là đủ để round-trip
+        return value.isoformat(timespec="milliseconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keyset(
+    sql: str,
+    params: Dict[str, Any],
+    keys: Sequence[Key],
+    *,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    descending: bool = True,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Thêm điều kiện cursor + ORDER BY (+ lấy limit + 1 dòng) vào câu SELECT.
+    `sql` phải đã có WHERE; khoá cuối cùng phải unique (thường là mã chính).
+    """
+    params = dict(params)
+    if cursor:
+        values = decode_cursor(cursor, len(keys))
+        op = "<" if descending else ">"
+        ors = []
+        for i, key in enumerate(keys):
+            ands = [f"{keys[j].expr} = {_bind(keys[j], j)}" for j in range(i)]
+            ands.append(f"{key.expr} {op} {_bind(key, i)}")
+            ors.append("(" + " AND ".join(ands) + ")")
+            params[f"_c{i}"] = values[i]
+        sql += "\n AND (" + " OR ".join(ors) + ")"
+
+    direction = "DESC" if descending else "ASC"
+    sql += "\n ORDER BY " + ", ".join(f"{k.expr} {direction}" for k in keys)
+    if limit is not None:
+        sql += "\n OFFSET 0 ROWS FETCH NEXT :_limit ROWS ONLY"
+        params["_limit"] = limit + 1  # dư 1 dòng để biết còn trang sau
+    return sql, params
+
+
+def _bind(key: Key, i: int) -> str:
+    return f"CAST(:_c{i} AS {key.sql_type})" if key.sql_type else f":_c{i}"
+
+
+def page(rows: Sequence[Any], keys: Sequence[Key], limit: Optional[int]) -> Dict[str, Any]:
+    """Cắt về `limit` dòng và tạo next_cursor từ dòng cuối."""
+    rows = list(rows)
+    if limit is None or len(rows) <= limit:
+        return {"items": rows, "next_cursor": None}
+    items = rows[:limit]
+    last = items[-1]
+    return {"items": items, "next_cursor": encode_cursor([last[k.name] for k in keys])}
+
+
+def ranked(
+    sql: str,
+    params: Dict[str, Any],
+    *,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[str, Dict[str, Any], int]:
+    """Thêm OFFSET / FETCH vào câu SELECT đã có ORDER BY theo hạng; trả thêm offset của trang."""
+    offset = 0
+    if cursor:
+        offset = decode_cursor(cursor, 1)[0]
+        if not isinstance(offset, int) or offset < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    params = dict(params, _offset=offset)
+    sql += "\n OFFSET :_offset ROWS"
+    if limit is not None:
+        sql += " FETCH NEXT :_limit ROWS ONLY"
+        params["_limit"] = limit + 1
+    return sql, params, offset
+
+
+def offset_page(rows: Sequence[Any], offset: int, limit: Optional[int]) -> Dict[str, Any]:
+    rows = list(rows)
+    if limit is None or len(rows) <= limit:
+        return {"items": rows, "next_cursor": None}
+    return {"items": rows[:limit], "next_cursor": encode_cursor([offset + limit])}
@@ -0,0 +1,282 @@
+# app/services/scheduler.py
+"""
+Lịch đặt dịch vụ trong process: giờ bắt đầu các lượt đã đặt theo (MaCN, MaDV).
+
+- Mỗi (MaCN, MaDV) là 1 Lane: SoChoCungLuc lượt song song (CUNGCAPDICHVU), mỗi lượt dài
+  ThoiLuongPhut (DICHVU), giờ mở / đóng cửa của chi nhánh (CHINHANH).
+- Lượt đã đặt = phiên chưa huỷ có ThoiDiemBatDau, giữ trong list đã sắp xếp (bisect):
+  kiểm tra 1 khung giờ chỉ xét các lượt bắt đầu trong (t - ThoiLuong, t + ThoiLuong),
+  O(k log n) với k = số lượt chồng lên khung đó (vài lần SoCho), không quét PHIENDICHVU.
+- Dựng từ PHIENDICHVU khi worker start (app/main.py) và lại sau SCHEDULE_INDEX_TTL giây
+  ở thread nền (bắt thay đổi của worker khác / staff); đặt / huỷ qua API cập nhật ngay.
+- Đặt / huỷ sửa lane dưới Schedule._lock; đọc (check, available_slots) trên bản sao lấy dưới
+  cùng lock. Không chờ lock trong lúc đọc DB (xem Schedule.ensure).
+- Mỗi worker có bản riêng => chỉ để từ chối sớm và tính giờ trống; sp_DatLichDichVu vẫn
+  kiểm tra lại trong transaction (THROW 50045, xem 011_appointment_slots.sql).
+"""
+from __future__ import annotations
+
+import bisect
+import datetime as dt
+import logging
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+log = logging.getLogger(__name__)
+
+# Chi nhánh chưa khai báo giờ mở / đóng cửa
+DEFAULT_OPEN = dt.time(8, 0)
+DEFAULT_CLOSE = dt.time(20, 0)
+
+# Mỗi (chi nhánh, dịch vụ) + các lượt đã đặt từ hôm qua (lượt dài nhất < 1 ngày), 1 câu SQL:
+# OUTER APPLY seek IX_PHIENDICHVU_Lich theo từng cặp thay vì quét PHIENDICHVU
+LOAD_SQL = """
+    SELECT c.MaCN, c.MaDV, c.SoChoCungLuc, dv.ThoiLuongPhut, cn.Giomocua, cn.Giodongcua,
+           pd.MaPhien, pd.ThoiDiemBatDau
+    FROM CUNGCAPDICHVU c
+    JOIN DICHVU dv ON dv.MaDV = c.MaDV
+    JOIN CHINHANH cn ON cn.MaCN = c.MaCN
+    OUTER APPLY (
+        SELECT p.MaPhien, p.ThoiDiemBatDau
+        FROM PHIENDICHVU p
+        WHERE p.MaCN = c.MaCN
+          AND p.MaDV = c.MaDV
+          AND p.ThoiDiemBatDau >= :since
+          AND p.TrangThai <> N'CANCELLED'
+    ) pd
+"""
+
+Key = Tuple[str, str]
+
+
+@dataclass
+class Lane:
+    capacity: int
+    minutes: int
+    opens: dt.time = DEFAULT_OPEN
+    closes: dt.time = DEFAULT_CLOSE
+    starts: List[dt.datetime] = field(default_factory=list)     # đã sắp xếp, có thể trùng
+    booked: Dict[str, dt.datetime] = field(default_factory=dict)  # MaPhien -> giờ bắt đầu
+
+    @property
+    def length(self) -> dt.timedelta:
+        return dt.timedelta(minutes=self.minutes)
+
+    def add(self, ma_phien: str, start: dt.datetime) -> None:
+        if ma_phien in self.booked:
+            self.remove(ma_phien)
+        self.booked[ma_phien] = start
+        bisect.insort(self.starts, start)
+
+    def copy(self) -> "Lane":
+        return replace(self, starts=list(self.starts), booked=dict(self.booked))
+
+    def remove(self, ma_phien: str) -> bool:
+        start = self.booked.pop(ma_phien, None)
+        if start is None:
+            return False
+        i = bisect.bisect_left(self.starts, start)
+        if i < len(self.starts) and self.starts[i] == start:
+            del self.starts[i]
+        return True
+
+    def running(self, at: dt.datetime) -> int:
+        """Số lượt đang chạy tại thời điểm at: bắt đầu trong (at - ThoiLuong, at]."""
+        return bisect.bisect_right(self.starts, at) - bisect.bisect_right(self.starts, at - self.length)
+
+    def peak(self, start: dt.datetime) -> int:
+        """Số lượt chạy song song lớn nhất trong [start, start + ThoiLuong)."""
+        lo = bisect.bisect_left(self.starts, start)
+        hi = bisect.bisect_left(self.starts, start + self.length)
+        # số lượt chỉ tăng tại start hoặc khi 1 lượt khác bắt đầu trong khung
+        return max([self.running(start)] + [self.running(t) for t in self.starts[lo:hi]])
+
+    def free(self, start: dt.datetime) -> int:
+        return max(self.capacity - self.peak(start), 0)
+
+
+@dataclass
+class _State:
+    lanes: Dict[Key, Lane]
+    built_at: float
+
+
+class Schedule:
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._state: Optional[_State] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()        # ghi lane (đặt / huỷ) và thay bản mới
+        self._build_lock = threading.Lock()  # chỉ 1 lần dựng tại 1 thời điểm
+        self._writes = 0
+
+    # ---------- dựng ----------
+    def build(self, rows) -> None:
+        lanes: Dict[Key, Lane] = {}
+        for r in rows:
+            key = (r["MaCN"], r["MaDV"])
+            lane = lanes.get(key)
+            if lane is None:
+                lane = lanes[key] = Lane(
+                    capacity=int(r["SoChoCungLuc"]),
+                    minutes=int(r["ThoiLuongPhut"]),
+                    opens=r["Giomocua"] or DEFAULT_OPEN,
+                    closes=r["Giodongcua"] or DEFAULT_CLOSE,
+                )
+            if r["MaPhien"] is not None:
+                lane.booked[r["MaPhien"]] = r["ThoiDiemBatDau"]
+        for lane in lanes.values():
+            lane.starts = sorted(lane.booked.values())
+        with self._lock:
+            self._state = _State(lanes, time.time())
+            self._expires = time.monotonic() + self.ttl
+
+    def mark_stale(self) -> None:
+        self._expires = 0.0
+
+    def ensure(self, db) -> bool:
+        """
+        Dựng lần đầu (dùng db của request), hoặc dựng lại ở thread nền khi hết hạn.
+        Không chờ _build_lock: với DB_ASYNC service chạy trên thread của event loop, chờ ở đó là
+        treo cả worker. False = request khác đang dựng lần đầu, chưa có lịch để đọc.
+        """
+        if self._state is not None and time.monotonic() < self._expires:
+            return True
+        if not self._build_lock.acquire(blocking=False):
+            return self._state is not None  # đang dựng lại ở thread nền: dùng bản cũ
+        if self._state is not None:
+            if time.monotonic() < self._expires:  # request khác vừa dựng xong
+                self._build_lock.release()
+                return True
+            threading.Thread(target=self._rebuild, name="schedule-index", daemon=True).start()
+            return True
+        try:
+            self._load(db)
+        finally:
+            self._build_lock.release()
+        return True
+
+    def _rebuild(self) -> None:
+        try:
+            with SessionLocal() as db:
+                self._load(db)
+        except Exception:
+            self.mark_stale()
+            log.exception("Rebuild schedule index failed")
+        finally:
+            self._build_lock.release()
+
+    def _load(self, db) -> None:
+        writes = self._writes
+        since = dt.datetime.now() - dt.timedelta(days=1)
+        self.build(db.execute(text(LOAD_SQL), {"since": since}).mappings())
+        if self._writes != writes:
+            # có đặt / huỷ vào bản cũ trong lúc đọc DB: bản mới có thể thiếu, dựng lại ở lần sau
+            self.mark_stale()
+
+    # ---------- đọc / ghi ----------
+    def lane(self, db, ma_cn: str, ma_dv: str) -> Optional[Lane]:
+        """Bản sao lane (đọc ngoài lock, book / release không sửa lúc đang duyệt); 503 nếu đang dựng lần đầu."""
+        if not self.ensure(db):
+            raise HTTPException(status_code=503, detail="Đang dựng lịch đặt dịch vụ, vui lòng thử lại",
+                                headers={"Retry-After": "1"})
+        with self._lock:
+            lane = self._state.lanes.get((ma_cn, ma_dv))
+            return lane.copy() if lane is not None else None
+
+    def book(self, ma_cn: str, ma_dv: str, ma_phien: str, start: dt.datetime) -> None:
+        if self._state is None:
+            return
+        with self._lock:
+            self._writes += 1
+            lane = self._state.lanes.get((ma_cn, ma_dv))
+            if lane is not None:
+                lane.add(ma_phien, start)
+
+    def release(self, ma_cn: str, ma_dv: str, ma_phien: str) -> None:
+        if self._state is None:
+            return
+        with self._lock:
+            self._writes += 1
+            lane = self._state.lanes.get((ma_cn, ma_dv))
+            if lane is not None:
+                lane.remove(ma_phien)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            state = self._state
+            if state is None:
+                return {"built": False}
+            return {
+                "built": True,
+                "lanes": len(state.lanes),
+                "booked": sum(len(lane.starts) for lane in state.lanes.values()),
+                "age_s": round(time.time() - state.built_at, 1),
+            }
+
+
+schedule = Schedule(settings.SCHEDULE_INDEX_TTL)
+
+
+def parse_start(value) -> Optional[dt.datetime]:
+    """thoi_diem_bat_dau từ client ('2025-01-02T09:30', '2025-01-02 09:30:00'...); None nếu không đọc được."""
+    if isinstance(value, dt.datetime):
+        return value
+    try:
+        start = dt.datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+    # cột DATETIME không có múi giờ: đổi về giờ local rồi bỏ tzinfo
+    return start.astimezone().replace(tzinfo=None) if start.tzinfo else start
+
+
+def warm() -> None:
+    """Dựng lịch khi worker start; lỗi DB chỉ log, request đầu tiên sẽ dựng lại."""
+    try:
+        with SessionLocal() as db:
+            schedule.ensure(db)
+    except Exception:
+        log.exception("Build schedule index on startup failed")
+
+
+def check(db, ma_cn: str, ma_dv: str, start: dt.datetime) -> None:
+    """Từ chối sớm (409) nếu khung giờ đã đủ chỗ theo lịch của worker này."""
+    if not schedule.ensure(db):
+        return  # request khác đang dựng lịch: để sp_DatLichDichVu kiểm tra
+    lane = schedule.lane(db, ma_cn, ma_dv)
+    if lane is not None and lane.free(start) <= 0:
+        raise HTTPException(status_code=409, detail="Khung giờ này đã kín lịch")
+
+
+def available_slots(db, ma_cn: str, ma_dv: str, ngay: dt.date, step: Optional[int] = None):
+    """Các khung giờ trong ngày (bước SCHEDULE_SLOT_MINUTES, trong giờ mở cửa) còn chỗ."""
+    lane = schedule.lane(db, ma_cn, ma_dv)
+    if lane is None:
+        raise HTTPException(status_code=404, detail="Chi nhánh này không cung cấp dịch vụ đã chọn")
+    step_td = dt.timedelta(minutes=step or settings.SCHEDULE_SLOT_MINUTES)
+    t = dt.datetime.combine(ngay, lane.opens)
+    last = dt.datetime.combine(ngay, lane.closes) - lane.length
+    now = dt.datetime.now()
+    items = []
+    while t <= last:
+        if t >= now:
+            free = lane.free(t)
+            if free > 0:
+                items.append({"ThoiDiem": t.isoformat(timespec="minutes"), "ConTrong": free})
+        t += step_td
+    return {
+        "MaCN": ma_cn,
+        "MaDV": ma_dv,
+        "Ngay": ngay.isoformat(),
+        "ThoiLuongPhut": lane.minutes,
+        "SoChoCungLuc": lane.capacity,
+        "items": items,
+    }
@@ -0,0 +1,536 @@
+# app/services/search_index.py
+"""
+Chỉ mục tìm kiếm trong process (inverted index) thay cho LIKE N'%kw%' (quét cả bảng,
+không dùng được index, phân biệt dấu theo collation).
+
+- fold(): chữ thường + bỏ dấu tiếng Việt (đ -> d) => "thuoc" khớp "Thuốc".
+- Token: các từ chữ / số; mã dạng SP001 tách thêm "sp" và "001".
+- Truy vấn: mọi từ phải khớp (AND), mỗi từ khớp đủ từ hoặc khớp tiền tố (đang gõ dở);
+  tiền tố tìm bằng bisect trên danh sách token đã sắp xếp.
+- Xếp hạng: khớp đủ từ > tiền tố, trường chính (tên) > trường phụ (mã, loại), gõ đúng dấu
+  được cộng, khớp từ đầu của tên (tên người: từ cuối, tức tên gọi) được cộng, rồi tên ngắn hơn, rồi theo mã.
+- Số điện thoại: truy vấn chỉ gồm số (cho phép cách / chấm / gạch, +84) được ghép lại thành 1 token;
+  cột khai báo `tail` có thêm token 4 số cuối (tiếp tân hay hỏi "số đuôi").
+- Cập nhật: refresh(db, name, ids) sau khi ghi qua API; dựng lại toàn bộ sau SEARCH_INDEX_TTL giây
+  để bắt thay đổi ngoài process. Lần dựng đầu chạy trong request đầu tiên (request khác gặp lúc đó
+  nhận 503, xem ensure); hết hạn thì dựng lại ở thread nền, request vẫn dùng bản cũ.
+- Kết quả cho danh sách có phân trang (ranked_keys) không giới hạn số hit: bộ lọc chỉ có trong SQL
+  (vd tồn kho chi nhánh) chạy trên toàn bộ kết quả; autocomplete (search) vẫn cắt ở SEARCH_MAX_HITS.
+
+Mỗi worker uvicorn có index riêng (như catalog_cache).
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.db_utils import stream_sql
+
+log = logging.getLogger(__name__)
+
+# ---------------- chuẩn hoá chuỗi ----------------
+
+def _fold_table() -> Dict[int, str]:
+    table = {}
+    for cp in list(range(0xC0, 0x250)) + list(range(0x1E00, 0x1F00)):
+        ch = chr(cp)
+        base = "".join(c for c in unicodedata.normalize("NFD", ch) if not unicodedata.combining(c))
+        if base != ch:
+            table[cp] = base
+    table[ord("đ")] = "d"
+    table[ord("Đ")] = "d"
+    return table
+
+
+_FOLD = _fold_table()
+_WORD = re.compile(r"\w+")
+_PARTS = re.compile(r"[^\W\d_]+|\d+")
+_PHONE = re.compile(r"\+?[\d\s.()-]*\d[\d\s.()-]*")
+
+EXACT = 1.0
+PREFIX = 0.6
+ACCENT_BONUS = 0.25
+NAME_WORD_BONUS = 0.5
+MAX_EXPANSIONS = 256   # số token tối đa 1 tiền tố được mở rộng ra (tiền tố 1 ký tự)
+TAIL_DIGITS = 4
+
+
+def fold(value: str) -> str:
+    return value.lower().translate(_FOLD)
+
+
+def tokens(value: Optional[str]) -> List[str]:
+    """Token đã bỏ dấu, giữ thứ tự, có thêm phần chữ / số của token lẫn lộn (sp001 -> sp, 001)."""
+    if not value:
+        return []
+    out = []
+    for word in _WORD.findall(fold(value)):
+        out.append(word)
+        if not (word.isalpha() or word.isdigit()):
+            parts = _PARTS.findall(word)
+            if len(parts) > 1:
+                out.extend(parts)
+    return out
+
+
+def query_tokens(query: str) -> List[str]:
+    """Token của truy vấn; "090 123.45" / "+84 90 123" -> 1 token số ("09012345", "090123")."""
+    if _PHONE.fullmatch(query.strip()):
+        digits = re.sub(r"\D", "", query)
+        if query.strip().startswith("+84"):
+            digits = "0" + digits[2:]
+        return [digits]
+    return _WORD.findall(fold(query))
+
+
+# ---------------- nguồn dữ liệu ----------------
+
+@dataclass(frozen=True)
+class Source:
+    table: str
+    sql: str                          # SELECT toàn bộ; refresh thêm "WHERE key IN (...)"
+    key: str
+    fields: Mapping[str, float]       # cột -> trọng số; cột đầu tiên là tên (trường chính)
+    attrs: Tuple[str, ...] = ()       # cột dùng để lọc (filters=) và trả kèm kết quả (Hit.data)
+    tail: Tuple[str, ...] = ()        # cột số (SDT): thêm token cả dãy số và TAIL_DIGITS số cuối
+    given_name_last: bool = False     # tên người Việt: cộng điểm từ cuối (tên gọi) thay vì từ đầu
+
+    @property
+    def column(self) -> str:
+        """Tên cột khoá trong dòng kết quả ("tc.MaThuCung" -> "MaThuCung")."""
+        return self.key.rsplit(".", 1)[-1]
+
+
+SOURCES: Dict[str, Source] = {
+    "SANPHAM": Source(
+        "SANPHAM",
+        "SELECT MaSP, TenSP, LoaiSP FROM SANPHAM",
+        "MaSP",
+        {"TenSP": 3.0, "MaSP": 2.0, "LoaiSP": 1.0},
+        ("LoaiSP",),
+    ),
+    "NHANVIEN": Source(
+        "NHANVIEN",
+        "SELECT MaNV, HoTen, ChucVu, MaCN FROM NHANVIEN",
+        "MaNV",
+        {"HoTen": 3.0, "MaNV": 2.0, "ChucVu": 1.0},
+        ("HoTen", "ChucVu", "MaCN"),
+        given_name_last=True,
+    ),
+    "KHACHHANG": Source(
+        "KHACHHANG",
+        "SELECT MaKH, Hoten, SDT FROM KHACHHANG",
+        "MaKH",
+        {"Hoten": 3.0, "SDT": 2.5, "MaKH": 2.0},
+        ("Hoten", "SDT"),
+        tail=("SDT",),
+        given_name_last=True,
+    ),
+    # tìm được theo tên chủ ("milu lan"); tên chủ đổi thì cập nhật ở lần dựng lại
+    "THUCUNG": Source(
+        "THUCUNG",
+        """
+        SELECT tc.MaThuCung, tc.Ten, tc.Loai, tc.MaKH, kh.Hoten AS ChuNuoi
+        FROM THUCUNG tc
+        LEFT JOIN KHACHHANG kh ON kh.MaKH = tc.MaKH
+        """,
+        "tc.MaThuCung",
+        {"Ten": 3.0, "MaThuCung": 2.0, "Loai": 1.0, "ChuNuoi": 1.0},
+        ("Ten", "Loai", "MaKH", "ChuNuoi"),
+    ),
+}
+
+
+@dataclass
+class _Doc:
+    key: str
+    order: str                        # thứ tự khi bằng điểm: độ dài tên rồi mã ("0012KH000001")
+    raw: Set[str]                     # token còn dấu (chữ thường) của tên, cộng điểm gõ đúng dấu
+    attrs: Dict[str, Any]
+    terms: Dict[str, float]           # token -> trọng số tốt nhất trong doc
+
+
+@dataclass(frozen=True)
+class Hit:
+    key: str
+    score: float
+    data: Mapping[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _State:
+    docs: Dict[str, _Doc] = field(default_factory=dict)
+    order: Dict[str, str] = field(default_factory=dict)         # mã -> _Doc.order (sắp xếp bằng C)
+    postings: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    vocab: List[str] = field(default_factory=list)     # token đã sắp xếp, cho tìm tiền tố
+    accents: Dict[str, Set[str]] = field(default_factory=dict)   # token tên còn dấu -> mã
+    accent_vocab: List[str] = field(default_factory=list)
+
+
+class SearchIndex:
+    def __init__(self, source: Source, ttl: float):
+        self.source = source
+        self.ttl = ttl
+        self._state: Optional[_State] = None
+        self._expires = 0.0
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._stats = {"builds": 0, "refreshes": 0, "queries": 0, "build_ms": 0.0}
+        self._writes = 0
+        self._key = source.column
+
+    # ---------- dựng / cập nhật ----------
+    def _doc(self, row: Mapping[str, Any]) -> _Doc:
+        terms: Dict[str, float] = {}
+        raw: Set[str] = set()
+        primary = next(iter(self.source.fields))
+        for col, weight in self.source.fields.items():
+            value = row[col]
+            if value is None:
+                continue
+            value = str(value)
+            bonus = None
+            if col == primary:
+                words = _WORD.findall(value.lower())
+                raw.update(words)
+                if words:
+                    bonus = fold(words[-1] if self.source.given_name_last else words[0])
+            for tok in tokens(value):
+                w = weight + (NAME_WORD_BONUS if tok == bonus else 0)
+                if w > terms.get(tok, 0):
+                    terms[tok] = w
+            if col in self.source.tail:
+                digits = re.sub(r"\D", "", value)   # "0912 345 678" -> cả dãy số là 1 token
+                if digits and weight > terms.get(digits, 0):
+                    terms[digits] = weight
+                if len(digits) > TAIL_DIGITS:
+                    terms.setdefault(digits[-TAIL_DIGITS:], weight * PREFIX)
+        key = str(row[self._key])
+        return _Doc(key, f"{len(str(row[primary] or '')):04d}{key}", raw,
+                    {a: row[a] for a in self.source.attrs}, terms)
+
+    def build(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        start = time.perf_counter()
+        state = _State()
+        for row in rows:
+            doc = self._doc(row)
+            state.docs[doc.key] = doc
+            state.order[doc.key] = doc.order
+            for tok, w in doc.terms.items():
+                state.postings.setdefault(tok, {})[doc.key] = w
+            for tok in doc.raw:
+                state.accents.setdefault(tok, set()).add(doc.key)
+        state.vocab = sorted(state.postings)
+        state.accent_vocab = sorted(state.accents)
+        with self._lock:
+            self._state = state
+            self._expires = time.monotonic() + self.ttl
+            self._stats["builds"] += 1
+            self._stats["build_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    def upsert(self, row: Mapping[str, Any]) -> None:
+        with self._lock:
+            if self._state is None:
+                return  # chưa dựng: lần dựng đầu sẽ đọc dòng mới
+            doc = self._doc(row)
+            self._remove(doc.key)
+            self._writes += 1
+            st = self._state
+            st.docs[doc.key] = doc
+            st.order[doc.key] = doc.order
+            for tok, w in doc.terms.items():
+                posting = st.postings.get(tok)
+                if posting is None:
+                    posting = st.postings[tok] = {}
+                    bisect.insort(st.vocab, tok)
+                posting[doc.key] = w
+            for tok in doc.raw:
+                keys = st.accents.get(tok)
+                if keys is None:
+                    keys = st.accents[tok] = set()
+                    bisect.insort(st.accent_vocab, tok)
+                keys.add(doc.key)
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            if self._state is not None:
+                self._remove(key)
+                self._writes += 1
+
+    def _remove(self, key: str) -> None:
+        st = self._state
+        doc = st.docs.pop(key, None)
+        if doc is None:
+            return
+        del st.order[key]
+        for tok in doc.terms:
+            posting = st.postings.get(tok)
+            if posting is None:
+                continue
+            posting.pop(key, None)
+            if not posting:
+                del st.postings[tok]
+                _discard(st.vocab, tok)
+        for tok in doc.raw:
+            keys = st.accents.get(tok)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del st.accents[tok]
+                _discard(st.accent_vocab, tok)
+
+    def mark_stale(self) -> None:
+        with self._lock:
+            self._expires = 0.0
+
+    def ensure(self, db, block: bool = False) -> None:
+        """
+        Dựng lần đầu (dùng db của request), hoặc dựng lại ở thread nền khi hết hạn.
+        Không chờ lock trong lúc đang có request khác đọc DB: với DB_ASYNC, run_db chạy service trên
+        thread của event loop => chờ lock ở đó là treo cả worker. Request gặp lúc đang dựng lần đầu
+        nhận 503 (thử lại). block=True chỉ dùng ở thread riêng (generator của StreamingResponse).
+        """
+        if self._state is not None and time.monotonic() < self._expires:
+            return
+        if not self._build_lock.acquire(blocking=block):
+            if self._state is None:
+                raise HTTPException(status_code=503, detail="Đang dựng chỉ mục tìm kiếm, vui lòng thử lại",
+                                    headers={"Retry-After": "1"})
+            return  # đang dựng lại ở thread nền, dùng bản cũ
+        if self._state is not None:
+            if time.monotonic() < self._expires:  # request khác vừa dựng xong
+                self._build_lock.release()
+                return
+            threading.Thread(target=self._rebuild, name=f"search-index-{self.source.table}",
+                             daemon=True).start()
+            return
+        try:
+            self._load(db)
+        finally:
+            self._build_lock.release()
+
+    def _rebuild(self) -> None:
+        # _build_lock đã được ensure() giữ; threading.Lock nhả được từ thread khác
+        try:
+            with SessionLocal() as db:
+                self._load(db)
+        except Exception:
+            self.mark_stale()  # vẫn dùng bản cũ, lần tìm sau thử lại
+            log.exception("Rebuild search index %s failed", self.source.table)
+        finally:
+            self._build_lock.release()
+
+    def _load(self, db) -> None:
+        writes = self._writes
+        self.build(db.execute(text(self.source.sql)).mappings())
+        if self._writes != writes:
+            # có ghi vào bản cũ trong lúc đọc DB: bản mới có thể thiếu, dựng lại ở lần sau
+            self.mark_stale()
+
+    def refresh(self, db, keys: Sequence[str]) -> None:
+        """Đọc lại các dòng vừa ghi (thêm / sửa / xoá) và cập nhật index, 1 câu SQL."""
+        if self._state is None or not keys:
+            return
+        rows = db.execute(
+            text(f"{self.source.sql} WHERE {self.source.key} IN (SELECT value FROM OPENJSON(:keys))"),
+            {"keys": _json_list(keys)},
+        ).mappings().all()
+        found = {str(r[self._key]) for r in rows}
+        with self._lock:
+            for r in rows:
+                self.upsert(r)
+            for k in keys:
+                if k not in found:
+                    self.remove(k)
+            self._stats["refreshes"] += 1
+
+    # ---------- truy vấn ----------
+    @staticmethod
+    def _expand(vocab: List[str], tok: str) -> List[Tuple[str, float]]:
+        out = []
+        i = bisect.bisect_left(vocab, tok)
+        while i < len(vocab) and len(out) < MAX_EXPANSIONS and vocab[i].startswith(tok):
+            term = vocab[i]
+            out.append((term, EXACT if term == tok else PREFIX))
+            i += 1
+        return out
+
+    def search(self, query: str, limit: Optional[int] = None,
+               filters: Optional[Mapping[str, Any]] = None) -> List[Hit]:
+        q_fold = query_tokens(query)
+        q_raw = _WORD.findall(query.lower())
+        if len(q_raw) != len(q_fold):
+            q_raw = q_fold  # số điện thoại đã ghép: không có dấu
+        if not q_fold:
+            return []
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+
+        with self._lock:
+            st = self._state
+            self._stats["queries"] += 1
+            if st is None:
+                return []
+            # từ hiếm trước: các từ sau chỉ dò trong tập ứng viên (đã nhỏ) thay vì duyệt cả posting
+            terms = []
+            for tok in q_fold:
+                lists = [(st.postings[t], f) for t, f in self._expand(st.vocab, tok)]
+                if not lists:
+                    return []
+                terms.append((sum(len(p) for p, _ in lists), lists))
+            terms.sort(key=lambda t: t[0])
+
+            scores = _matches(terms[0][1])
+            for _, lists in terms[1:]:
+                if len(lists) == 1:
+                    posting, factor = lists[0]
+                    scores = {k: s + posting[k] * factor for k, s in scores.items() if k in posting}
+                else:
+                    scores = {
+                        k: s + best
+                        for k, s in scores.items()
+                        if (best := max(p.get(k, 0) * f for p, f in lists))
+                    }
+                if not scores:
+                    return []
+
+            # gõ có dấu: cộng điểm cho doc có từ trong tên bắt đầu đúng như vậy (còn dấu)
+            for r, f in zip(q_raw, q_fold):
+                if r != f:
+                    bonus = {k for term, _ in self._expand(st.accent_vocab, r) for k in st.accents[term]}
+                    for k in bonus.intersection(scores):
+                        scores[k] += ACCENT_BONUS
+
+            docs = st.docs
+            if filters:
+                scores = {
+                    key: score for key, score in scores.items()
+                    if all(docs[key].attrs.get(k) == v for k, v in filters.items())
+                }
+            order = st.order
+            keys: Iterable[str] = scores
+            if limit is not None and len(scores) > limit:
+                # từ phổ biến ("nguyen") khớp hàng chục nghìn doc cùng điểm: lấy ngưỡng điểm thứ `limit`,
+                # doc trên ngưỡng giữ hết, doc bằng ngưỡng chỉ lấy đủ số còn thiếu theo order
+                cut = heapq.nlargest(limit, scores.values())[-1]
+                above = [key for key, score in scores.items() if score > cut]
+                tied = [key for key, score in scores.items() if score == cut]
+                keys = above + heapq.nsmallest(limit - len(above), tied, key=order.__getitem__)
+            hits = sorted(keys, key=lambda k: (-scores[k], order[k]))
+        return [Hit(key, round(scores[key], 3), dict(docs[key].attrs)) for key in hits]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = self._state
+            return {
+                **self._stats,
+                "docs": len(st.docs) if st else 0,
+                "terms": len(st.vocab) if st else 0,
+                "ttl_s": self.ttl,
+                "expires_in_s": round(max(self._expires - time.monotonic(), 0), 1) if st else None,
+            }
+
+
+def _matches(lists: List[Tuple[Dict[str, float], float]]) -> Dict[str, float]:
+    """Điểm tốt nhất của mỗi doc trên các token mở rộng từ 1 từ truy vấn (bản sao, được sửa)."""
+    posting, factor = lists[0]
+    matched = dict(posting) if factor == EXACT else {k: w * factor for k, w in posting.items()}
+    for posting, factor in lists[1:]:
+        for key, w in posting.items():
+            s = w * factor
+            if s > matched.get(key, 0):
+                matched[key] = s
+    return matched
+
+
+def _discard(vocab: List[str], tok: str) -> None:
+    i = bisect.bisect_left(vocab, tok)
+    if i < len(vocab) and vocab[i] == tok:
+        del vocab[i]
+
+
+def _json_list(values: Sequence[str]) -> str:
+    return json.dumps([str(v) for v in values])
+
+
+indexes: Dict[str, SearchIndex] = {
+    name: SearchIndex(src, settings.SEARCH_INDEX_TTL) for name, src in SOURCES.items()
+}
+
+
+def enabled(keyword: Optional[str]) -> bool:
+    return settings.SEARCH_INDEX_ENABLED and bool(keyword and keyword.strip())
+
+
+def search(db, name: str, query: str, filters: Optional[Mapping[str, Any]] = None,
+           limit: Optional[int] = None) -> List[Hit]:
+    """Dùng trong service (autocomplete): kết quả đã xếp hạng, tối đa SEARCH_MAX_HITS."""
+    index = indexes[name]
+    index.ensure(db)
+    return index.search(query, min(limit or settings.SEARCH_MAX_HITS, settings.SEARCH_MAX_HITS), filters)
+
+
+def ranked_keys(db, name: str, query: str, filters: Optional[Mapping[str, Any]] = None,
+                limit: Optional[int] = None, block: bool = False) -> str:
+    """
+    Mã theo thứ tự xếp hạng dạng JSON, để SQL giữ thứ tự bằng OPENJSON(...) ORDER BY [key].
+    limit = None: mọi hit (SQL còn lọc thêm / phân trang bằng OFFSET, không được cắt trước);
+    chỉ truyền limit (= offset + limit + 1 của trang) khi SQL không lọc bớt dòng nào.
+    """
+    index = indexes[name]
+    index.ensure(db, block)
+    return _json_list([h.key for h in index.search(query, limit, filters)])
+
+
+def page_hits(offset: int, limit: Optional[int], sql_filtered: bool = False) -> Optional[int]:
+    """Số hit cần cho trang [offset, offset + limit] (+1 để biết còn trang sau); None = tất cả."""
+    if limit is None or sql_filtered:
+        return None
+    return offset + limit + 1
+
+
+def stream_ranked(name: str, query: str, filters: Optional[Mapping[str, Any]],
+                  sql: str, params: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    """
+    Như db_utils.stream_sql, :ids = ranked_keys(...). Là generator nên việc dựng index (nếu cần)
+    cũng chạy trong threadpool của StreamingResponse, với Session riêng.
+    """
+    db = SessionLocal()
+    try:
+        ids = ranked_keys(db, name, query, filters, block=True)
+    finally:
+        db.close()
+    yield from stream_sql(sql, {**params, "ids": ids})
+
+
+def refresh(db, name: str, *keys: str) -> None:
+    """Hook cho các đường ghi qua API (thêm / sửa / xoá), gọi sau commit; lỗi không làm hỏng request."""
+    try:
+        indexes[name].refresh(db, keys)
+    except Exception:
+        log.exception("Refresh search index %s failed, rebuilding on next search", name)
+        indexes[name].mark_stale()
+
+
+def mark_stale(*names: str) -> None:
+    """Dựng lại ở lần tìm kế tiếp (sửa dữ liệu ngoài API). Không truyền = mọi index."""
+    for name in names or indexes:
+        if name in indexes:
+            indexes[name].mark_stale()
+
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": settings.SEARCH_INDEX_ENABLED, "indexes": {n: i.stats() for n, i in indexes.items()}}
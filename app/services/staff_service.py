@@ -1,6 +1,8 @@
 # app/services/staff_service.py
 from __future__ import annotations
 
+import json
+import logging
 from typing import Optional
 
 from fastapi import HTTPException
@@ -8,7 +10,15 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from sqlalchemy.exc import DBAPIError
 
-from app.services.db_utils import exec_sp
+from app.services import search_index, work_queue
+from app.services.catalog_cache import cached
+from app.services.db_utils import exec_multi, exec_sp, stream_sql
+from app.services.pagination import Key, keyset, page
+
+log = logging.getLogger(__name__)
+
+# Mã THROW của sp_TiemPhongTheoLo -> HTTP status (63004 / 63006 đã là 409 trong db_utils)
+VACCINE_STATUS = {63001: 404, 63002: 409}
 
 
 # ============================================================
@@ -104,19 +114,20 @@ def nv1_create_invoice(db: Session, ma_hoa_don: str, ma_kh: str, hinh_thuc: str,
 
 # NV2
 def nv2_list_vaccines(db: Session):
-    rows = db.execute(text("SELECT * FROM VACCINE")).mappings().all()
-    return rows
+    return cached(
+        ("VACCINE",),
+        "nv2_list_vaccines",
+        lambda: db.execute(text("SELECT * FROM VACCINE")).mappings().all(),
+    )
 
 
 # NV3
 def nv3_revenue_daily(db: Session, date: str, ma_cn: str):
     rows = db.execute(
         text("""
-            SELECT CAST(h.NgayLap AS DATE) AS Ngay, SUM(h.TongTien) AS DoanhThu
-            FROM HOADON h
-            JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
-            WHERE nv.MaCN = :cn AND CAST(h.NgayLap AS DATE) = :d
-            GROUP BY CAST(h.NgayLap AS DATE)
+            SELECT r.Ngay, r.DoanhThu
+            FROM DOANHTHU_CHINHANH_NGAY r
+            WHERE r.MaCN = :cn AND r.Ngay = :d
         """),
         {"cn": ma_cn, "d": date},
     ).mappings().all()
@@ -150,7 +161,9 @@ def nv5_exams_on_date(db: Session, date: str, ma_cn: str):
             JOIN PHIENDICHVU pd ON pd.MaPhien = kb.MaPhien
             JOIN HOADON h ON h.MaHoaDon = pd.MaHoaDon
             JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
-            WHERE nv.MaCN = :cn AND CAST(h.NgayLap AS DATE) = :d
+            WHERE nv.MaCN = :cn
+              AND h.NgayLap >= CAST(:d AS DATE)
+              AND h.NgayLap < DATEADD(DAY, 1, CAST(:d AS DATE))
             ORDER BY kb.MaPhien
         """),
         {"cn": ma_cn, "d": date},
@@ -159,52 +172,80 @@ def nv5_exams_on_date(db: Session, date: str, ma_cn: str):
 
 
 # NV6
-def nv6_search_invoices(
-    db: Session,
+NV6_KEYS = (Key("NgayLap", "h.NgayLap", "DATETIME"), Key("MaHoaDon", "h.MaHoaDon"))
+
+
+def _nv6_query(
     from_date: str,
     to_date: str,
     ma_cn: str,
     ma_kh: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
 ):
+    # Cột tường minh (không h.*): IX_HOADON_NgayLap_NhanVienLap phủ đủ, không lookup
     q = """
-        SELECT h.*
+        SELECT h.MaHoaDon, h.NgayLap, h.NhanVienLap, h.MaKH,
+               h.TongTien, h.KhuyenMai, h.HinhThucThanhToan
         FROM HOADON h
         JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
         WHERE nv.MaCN = :cn
-          AND CAST(h.NgayLap AS DATE) BETWEEN :f AND :t
+          AND h.NgayLap >= CAST(:f AS DATE)
+          AND h.NgayLap < DATEADD(DAY, 1, CAST(:t AS DATE))
     """
     params = {"cn": ma_cn, "f": from_date, "t": to_date}
     if ma_kh:
         q += " AND h.MaKH = :kh"
         params["kh"] = ma_kh
 
+    return keyset(q, params, NV6_KEYS, cursor=cursor, limit=limit)
+
+
+def nv6_search_invoices(
+    db: Session,
+    from_date: str,
+    to_date: str,
+    ma_cn: str,
+    ma_kh: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    q, params = _nv6_query(from_date, to_date, ma_cn, ma_kh, limit, cursor)
     rows = db.execute(text(q), params).mappings().all()
-    return rows
+    return page(rows, NV6_KEYS, limit)
+
+
+def nv6_stream_invoices(
+    from_date: str,
+    to_date: str,
+    ma_cn: str,
+    ma_kh: Optional[str] = None,
+    cursor: Optional[str] = None,
+):
+    q, params = _nv6_query(from_date, to_date, ma_cn, ma_kh, cursor=cursor)
+    return stream_sql(q, params)
 
 
 # NV7
 def nv7_inventory(db: Session, ma_cn: str):
-    sp = db.execute(
-        text("""
+    return exec_multi(
+        db,
+        """
+            SET NOCOUNT ON;
+
             SELECT csp.MaSP, sp.TenSP, sp.LoaiSP, sp.DonGia, csp.SoLuongTonKho
             FROM CHINHANH_SANPHAM csp
             JOIN SANPHAM sp ON sp.MaSP = csp.MaSP
-            WHERE csp.MaCN = :cn
-        """),
-        {"cn": ma_cn},
-    ).mappings().all()
+            WHERE csp.MaCN = :cn;
 
-    vc = db.execute(
-        text("""
             SELECT cv.MaVC, v.TenVC, v.DonGia, cv.SoLuongTonKho
             FROM CHINHANH_VACCINE cv
             JOIN VACCINE v ON v.MaVC = cv.MaVC
-            WHERE cv.MaCN = :cn
-        """),
+            WHERE cv.MaCN = :cn;
+        """,
         {"cn": ma_cn},
-    ).mappings().all()
-
-    return {"products": sp, "vaccines": vc}
+        ("products", "vaccines"),
+    )
 
 
 # NV8
@@ -231,47 +272,30 @@ def nv8_import_product_stock(db: Session, ma_cn: str, ma_sp: str, so_luong: int)
 
 
 def nv6_invoice_detail(db: Session, ma_hoa_don: str):
-    hoa_don = db.execute(
-        text("SELECT * FROM HOADON WHERE MaHoaDon = :m"),
-        {"m": ma_hoa_don},
-    ).mappings().first()
+    # 5 result set trong 1 round-trip
+    rs = exec_multi(
+        db,
+        """
+            SET NOCOUNT ON;
 
-    if not hoa_don:
-        raise HTTPException(404, "Không tìm thấy hoá đơn")
+            SELECT * FROM HOADON WHERE MaHoaDon = :m;
 
-    phien = db.execute(
-        text("""
             SELECT pd.MaPhien, pd.MaThuCung, dv.TenDV, pd.GiaTien
             FROM PHIENDICHVU pd
             JOIN DICHVU dv ON dv.MaDV = pd.MaDV
-            WHERE pd.MaHoaDon = :m
-        """),
-        {"m": ma_hoa_don},
-    ).mappings().all()
+            WHERE pd.MaHoaDon = :m;
 
-    kham = db.execute(
-        text("""
             SELECT kb.*
             FROM KHAMBENH kb
             JOIN PHIENDICHVU pd ON pd.MaPhien = kb.MaPhien
-            WHERE pd.MaHoaDon = :m
-        """),
-        {"m": ma_hoa_don},
-    ).mappings().all()
+            WHERE pd.MaHoaDon = :m;
 
-    tiem = db.execute(
-        text("""
             SELECT tp.*, vc.TenVC
             FROM TIEMPHONG tp
             JOIN VACCINE vc ON vc.MaVC = tp.MaVC
             JOIN PHIENDICHVU pd ON pd.MaPhien = tp.MaPhien
-            WHERE pd.MaHoaDon = :m
-        """),
-        {"m": ma_hoa_don},
-    ).mappings().all()
+            WHERE pd.MaHoaDon = :m;
 
-    thuoc = db.execute(
-        text("""
             SELECT
                 tt.MaThuoc,
                 sp.TenSP AS TenThuoc,
@@ -281,18 +305,16 @@ def nv6_invoice_detail(db: Session, ma_hoa_don: str):
             FROM TOATHUOC tt
             JOIN SANPHAM sp ON sp.MaSP = tt.MaThuoc
             JOIN PHIENDICHVU pd ON pd.MaPhien = tt.MaPhien
-            WHERE pd.MaHoaDon = :m
-        """),
+            WHERE pd.MaHoaDon = :m;
+        """,
         {"m": ma_hoa_don},
-    ).mappings().all()
+        ("hoa_don", "phien_dich_vu", "kham_benh", "tiem_phong", "ke_thuoc"),
+    )
 
-    return {
-        "hoa_don": hoa_don,
-        "phien_dich_vu": phien,
-        "kham_benh": kham,
-        "tiem_phong": tiem,
-        "ke_thuoc": thuoc,
-    }
+    if not rs["hoa_don"]:
+        raise HTTPException(404, "Không tìm thấy hoá đơn")
+
+    return {**rs, "hoa_don": rs["hoa_don"][0]}
 
 def get_exam_history_by_pet(db: Session, ma_thu_cung: str):
     sql = """
@@ -355,68 +377,44 @@ def get_bookings_by_customer(db: Session, ma_cn: str, ma_kh: str = None, ma_dv:
     return [dict(row) for row in result]
 
 def complete_exam_process(db: Session, ma_phien: str, ma_bs: str, trieu_chung: str, chan_doan: str, thuoc_list: list):
+    # 1 lần gọi sp_HoanTatKhamBenh thay cho vòng lặp INSERT từng thuốc (xem 007_batch_exam_vaccine.sql)
     try:
-        db.execute(text("""
-            IF EXISTS (SELECT 1 FROM KHAMBENH WHERE MaPhien = :mp)
-                UPDATE KHAMBENH SET BacSiPhuTrach=:bs, CacTrieuChung=:tc, ChanDoan=:cd WHERE MaPhien=:mp
-            ELSE
-                INSERT INTO KHAMBENH (MaPhien, BacSiPhuTrach, CacTrieuChung, ChanDoan)
-                VALUES (:mp, :bs, :tc, :cd)
-        """), {"mp": ma_phien, "bs": ma_bs, "tc": trieu_chung, "cd": chan_doan})
-
-        if thuoc_list:
-            db.execute(text("DELETE FROM TOATHUOC WHERE MaPhien = :mp"), {"mp": ma_phien})
-            
-            for item in thuoc_list:
-                db.execute(text("""
-                    INSERT INTO TOATHUOC (MaPhien, MaThuoc, Soluong) 
-                    VALUES (:mp, :mt, :sl)
-                """), {
-                    "mp": ma_phien, 
-                    "mt": item['MaSP'], 
-                    "sl": item['SoLuong']
-                })
-
-        db.execute(text("""
-            UPDATE PHIENDICHVU 
-            SET ThoiDiemKetThuc = GETDATE() 
-            WHERE MaPhien = :mp
-        """), {"mp": ma_phien})
-
-        db.commit()
-        return {"ok": True, "message": "Đã lưu bệnh án và đơn thuốc thành công"}
+        toa = json.dumps(
+            [{"MaSP": item['MaSP'], "SoLuong": item['SoLuong']} for item in thuoc_list]
+        ) if thuoc_list else None
+    except (KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Không thể lưu: thuoc_list không hợp lệ ({e})")
 
-    except Exception as e:
-        db.rollback()
-        print(f"Lỗi tại complete_exam_process: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Không thể lưu: {str(e)}")
+    exec_sp(
+        db,
+        """
+        EXEC dbo.sp_HoanTatKhamBenh
+            @MaPhien=:mp, @BacSi=:bs, @TrieuChung=:tc, @ChanDoan=:cd, @ToaThuoc=:toa
+        """,
+        {"mp": ma_phien, "bs": ma_bs, "tc": trieu_chung, "cd": chan_doan, "toa": toa},
+    )
+    work_queue.sessions_left(ma_phien)
+    return {"ok": True, "message": "Đã lưu bệnh án và đơn thuốc thành công"}
     
 def complete_vaccine_process(db: Session, ma_phien: str, ma_bs: str, danh_sach_tiem: list):
     try:
-        db.execute(text("""
-            UPDATE PHIENDICHVU 
-            SET TrangThai = N'DONE_SERVICE', 
-                ThoiDiemKetThuc = GETDATE()
-            WHERE MaPhien = :mp
-        """), {"mp": ma_phien})
-
-        for item in danh_sach_tiem:
-            db.execute(text("""
-                INSERT INTO TIEMPHONG (MaPhien, MaVC, MaGoi, BacSiPhuTrach, NgayTiem, SoLieu)
-                VALUES (:mp, :mvc, :mgoi, :bs, CAST(GETDATE() AS DATE), :sl)
-            """), {
-                "mp": ma_phien, 
-                "mvc": item['ma_vc'],
-                "mgoi": item.get('ma_goi'), 
-                "bs": ma_bs,
-                "sl": item['so_lieu']
-            })
-
-        db.commit()
-        return {"ok": True, "message": "Đã lưu lịch sử tiêm phòng"}
-    except Exception as e:
-        db.rollback()
-        raise Exception(f"Lỗi tại Service: {str(e)}")
+        ds = json.dumps([
+            {"ma_vc": item['ma_vc'], "ma_goi": item.get('ma_goi'), "so_lieu": item['so_lieu']}
+            for item in danh_sach_tiem
+        ])
+    except (KeyError, TypeError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"danh_sach_tiem không hợp lệ ({e})")
+
+    # Trừ liều trong gói + kho vaccine chi nhánh cùng transaction (013_vaccine_dose_deduction.sql):
+    # thiếu liều 63004 / thiếu kho 63006 -> 409 (mặc định của exec_sp)
+    exec_sp(
+        db,
+        "EXEC dbo.sp_HoanTatTiemPhong @MaPhien=:mp, @BacSi=:bs, @DanhSachTiem=:ds",
+        {"mp": ma_phien, "bs": ma_bs, "ds": ds},
+        status_map=VACCINE_STATUS,
+    )
+    work_queue.sessions_left(ma_phien)
+    return {"ok": True, "message": "Đã lưu lịch sử tiêm phòng"}
     
 def get_all_medicines(db: Session):
     try:
@@ -425,39 +423,96 @@ def get_all_medicines(db: Session):
             FROM SANPHAM 
             WHERE LoaiSP = N'Thuốc'
         """)
-        result = db.execute(query)
-        data = [dict(row) for row in result.mappings()]
-        print(f"DEBUG: Đã tải {len(data)} loại thuốc từ SANPHAM")
-        return data
-    except Exception as e:
-        print(f"Lỗi SQL tại get_all_medicines: {e}")
-        return []
+        # lỗi SQL không được cache: loader ném exception trước khi ghi vào cache
+        return cached(
+            ("SANPHAM",),
+            "get_all_medicines",
+            lambda: [dict(row) for row in db.execute(query).mappings()],
+        )
+    except DBAPIError:
+        # không trả [] : bác sĩ sẽ thấy danh mục thuốc trống như thể không có thuốc nào
+        log.exception("get_all_medicines failed")
+        raise HTTPException(status_code=503, detail="Không đọc được danh mục thuốc, vui lòng thử lại")
+
+# Nhận ca = 1 câu UPDATE có điều kiện TrangThai (thay cho SELECT rồi UPDATE: 2 round-trip,
+# 2 bác sĩ cùng đọc IN_SERVICE rồi cùng nhận). Không READPAST: nhận đúng 1 mã phiên, dòng đang
+# bị bác sĩ khác nhận thì chờ câu đó commit (1 câu UPDATE, rất ngắn) rồi mới thấy DONE_SERVICE;
+# bỏ qua dòng bị khoá sẽ báo "đã có người nhận" cả khi bên kia rollback.
+# OUTPUT ... INTO: PHIENDICHVU có trigger, không OUTPUT thẳng ra client được.
+START_EXAM_SQL = """
+    SET NOCOUNT ON;
+    DECLARE @out TABLE (MaPhien VARCHAR(10));
+
+    UPDATE PHIENDICHVU WITH (ROWLOCK)
+    SET TrangThai = N'DONE_SERVICE',
+        ThoiDiemBatDau = GETDATE()
+    OUTPUT inserted.MaPhien INTO @out
+    WHERE MaPhien = :mp AND TrangThai = N'IN_SERVICE';
+
+    SELECT CAST(1 AS BIT) AS Nhan, N'IN_SERVICE' AS TrangThai FROM @out
+    UNION ALL
+    SELECT CAST(0 AS BIT), TrangThai
+    FROM PHIENDICHVU  -- không nhận được: đọc trạng thái đã commit để chọn thông báo lỗi
+    WHERE MaPhien = :mp AND NOT EXISTS (SELECT 1 FROM @out);
+"""
+
+# Lấy ca chờ lâu nhất (giờ hẹn sớm nhất) của chi nhánh + dịch vụ và nhận luôn, 1 round-trip.
+# UPDLOCK + READPAST: nhiều bác sĩ cùng gọi thì mỗi người lấy 1 dòng khác, không chờ nhau.
+# Seek IX_PHIENDICHVU_ChoKham (filtered, 012_claim_index.sql) theo (MaCN, MaDV). Phiên chưa hẹn giờ
+# (ThoiDiemBatDau NULL) xếp sau cùng: NULL đứng đầu thứ tự của index nên phải sort lại, nhưng chỉ trên
+# vài chục dòng đang chờ của cặp (MaCN, MaDV).
+CLAIM_NEXT_SQL = """
+    SET NOCOUNT ON;
+    DECLARE @out TABLE (MaPhien VARCHAR(10), MaDV VARCHAR(10), MaThuCung VARCHAR(10));
+
+    WITH ke AS (
+        SELECT TOP (1) MaPhien, MaDV, MaThuCung, TrangThai, ThoiDiemBatDau
+        FROM PHIENDICHVU WITH (ROWLOCK, UPDLOCK, READPAST)
+        WHERE MaCN = :cn AND MaDV = :dv AND TrangThai = N'IN_SERVICE'
+        ORDER BY CASE WHEN ThoiDiemBatDau IS NULL THEN 1 ELSE 0 END, ThoiDiemBatDau, MaPhien
+    )
+    UPDATE ke
+    SET TrangThai = N'DONE_SERVICE',
+        ThoiDiemBatDau = GETDATE()
+    OUTPUT inserted.MaPhien, inserted.MaDV, inserted.MaThuCung INTO @out;
+
+    SELECT o.MaPhien, t.MaKH, N'IN_SERVICE' AS TrangThai, t.Ten AS TenThuCung, o.MaDV, o.MaThuCung
+    FROM @out o
+    JOIN THUCUNG t ON t.MaThuCung = o.MaThuCung;
+"""
+
 
 def start_examination(db: Session, ma_phien: str):
     try:
-        phien = db.execute(
-            text("SELECT TrangThai FROM PHIENDICHVU WHERE MaPhien = :mp"), 
-            {"mp": ma_phien}
-        ).fetchone()
-
-        if not phien:
-            raise HTTPException(status_code=404, detail="Không tìm thấy phiên")
-        
-        if phien.TrangThai != 'IN_SERVICE':
-            raise HTTPException(status_code=400, detail="Ca này đã có bác sĩ khác nhận hoặc đã hoàn thành")
-
-        db.execute(text("""
-            UPDATE PHIENDICHVU 
-            SET TrangThai = N'DONE_SERVICE', 
-                ThoiDiemBatDau = GETDATE() 
-            WHERE MaPhien = :mp
-        """), {"mp": ma_phien})
-        
+        phien = db.execute(text(START_EXAM_SQL), {"mp": ma_phien}).fetchone()
         db.commit()
-        return {"ok": True}
-    except Exception as e:
+    except Exception:
         db.rollback()
-        raise e
+        raise
+
+    if not phien:
+        raise HTTPException(status_code=404, detail="Không tìm thấy phiên")
+    if not phien.Nhan:
+        raise HTTPException(status_code=400, detail="Ca này đã có bác sĩ khác nhận hoặc đã hoàn thành")
+
+    work_queue.sessions_left(ma_phien)
+    return {"ok": True}
+
+
+def claim_next_examination(db: Session, ma_cn: str, ma_dv: str = 'DV001'):
+    """Nhận ca chờ lâu nhất; trả phiên như 1 dòng của /staff/bookings (frontend mở phiên luôn)."""
+    try:
+        row = db.execute(text(CLAIM_NEXT_SQL), {"cn": ma_cn, "dv": ma_dv}).mappings().first()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="Không còn ca nào đang chờ")
+
+    work_queue.sessions_left(row["MaPhien"])
+    return {"ok": True, "item": dict(row)}
     
 def get_daily_history_all(db: Session, ma_cn: str, selected_date: str):
     try:
@@ -471,7 +526,9 @@ def get_daily_history_all(db: Session, ma_cn: str, selected_date: str):
             FROM KHAMBENH kb
             JOIN PHIENDICHVU pd ON kb.MaPhien = pd.MaPhien
             JOIN THUCUNG tc ON pd.MaThuCung = tc.MaThuCung
-            WHERE pd.MaCN = :cn AND CAST(pd.ThoiDiemKetThuc AS DATE) = :dt
+            WHERE pd.MaCN = :cn
+              AND pd.ThoiDiemKetThuc >= CAST(:dt AS DATE)
+              AND pd.ThoiDiemKetThuc < DATEADD(DAY, 1, CAST(:dt AS DATE))
             ORDER BY pd.ThoiDiemKetThuc DESC
         """)
 
@@ -493,4 +550,24 @@ def get_daily_history_all(db: Session, ma_cn: str, selected_date: str):
 
         return {"kham_list": res_kham, "tiem_list": res_tiem}
     except Exception as e:
-        raise e
\ No newline at end of file
+        raise e
+
+
+# ============================================================
+# Autocomplete cho tiếp tân: khách hàng (tên / SĐT), thú cưng, nhân viên
+# ============================================================
+AUTOCOMPLETE_SOURCES = {"customer": "KHACHHANG", "pet": "THUCUNG", "staff": "NHANVIEN"}
+
+
+def autocomplete(db: Session, q: str, kinds, limit: int = 10, ma_cn: Optional[str] = None):
+    # Chỉ đọc search_index trong bộ nhớ: 0 câu SQL khi index đã dựng (lần đầu / mỗi worker: 1 câu / loại)
+    out = {}
+    for kind in kinds:
+        name = AUTOCOMPLETE_SOURCES[kind]
+        column = search_index.SOURCES[name].column
+        filters = {"MaCN": ma_cn} if kind == "staff" else None
+        out[kind] = [
+            {column: h.key, **h.data, "score": h.score}
+            for h in search_index.search(db, name, q, filters, limit)
+        ]
+    return out
@@ -0,0 +1,337 @@
+# app/services/work_queue.py
+"""
+Hàng đợi khám / tiêm theo chi nhánh (phiên IN_SERVICE), đẩy tới màn hình bác sĩ / tiếp tân
+qua SSE thay cho gọi lại /staff/bookings (PHIENDICHVU ⋈ THUCUNG mỗi lần, mỗi client).
+
+- Mỗi worker giữ hàng đợi của chi nhánh đang có client theo dõi: đọc DB 1 lần khi client
+  đầu tiên của chi nhánh kết nối, sau đó chỉ cập nhật theo sự kiện; client cuối rời đi thì bỏ.
+- Sự kiện do các đường ghi qua API phát ra:
+    chốt hóa đơn (sp_ConfirmHoaDon)                  -> add    (phiên vừa sang IN_SERVICE)
+    nhận ca / hoàn tất khám (sp_HoanTatKhamBenh) / tiêm -> remove (theo MaPhien)
+- Client nhận snapshot khi kết nối, sau đó chỉ nhận delta kèm id tăng dần theo chi nhánh;
+  kết nối lại với Last-Event-ID còn trong bộ đệm (QUEUE_FEED_REPLAY) thì chỉ nhận phần thiếu.
+- Nhiều worker: CACHE_BACKEND=redis => sự kiện đi qua Redis pub/sub, mọi worker (kể cả worker
+  phát) áp dụng từ kênh; memory / none => chỉ trong process.
+- Thay đổi ngoài API (SQL tay, script): đọc lại sau QUEUE_FEED_RESYNC giây, gửi phần chênh lệch.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+log = logging.getLogger(__name__)
+
+CHANNEL = f"{settings.CACHE_PREFIX}:work-queue"
+
+_SELECT = """
+    SELECT p.MaPhien, t.MaKH, p.TrangThai, t.Ten AS TenThuCung, p.MaDV, p.MaThuCung, p.MaCN
+    FROM PHIENDICHVU p
+    INNER JOIN THUCUNG t ON p.MaThuCung = t.MaThuCung
+"""
+# IX_PHIENDICHVU_MaCN_TrangThai_MaDV
+BRANCH_SQL = _SELECT + " WHERE p.MaCN = :ma_cn AND p.TrangThai = N'IN_SERVICE'"
+# IX_PHIENDICHVU_MaHoaDon
+INVOICE_SQL = _SELECT + " WHERE p.MaHoaDon = :hd AND p.TrangThai = N'IN_SERVICE'"
+
+Event = Tuple[str, int, Dict[str, Any]]  # (tên sự kiện SSE, seq trong chi nhánh, data)
+
+
+@dataclass(eq=False)
+class _Subscriber:
+    loop: asyncio.AbstractEventLoop
+    ma_dv: Optional[str]
+    queue: "asyncio.Queue[Event]" = field(default_factory=asyncio.Queue)
+
+    def wants(self, ma_dv: Optional[str]) -> bool:
+        return self.ma_dv is None or ma_dv is None or ma_dv == self.ma_dv
+
+    def push(self, event: Event) -> None:
+        # gọi từ thread service (run_in_threadpool) hoặc từ event loop
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+
+class _Branch:
+    def __init__(self, ma_cn: str):
+        self.ma_cn = ma_cn
+        # seq đếm lại khi chi nhánh được đọc lại / ở worker khác => id gửi client kèm epoch
+        self.epoch = uuid.uuid4().hex[:8]
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.ready = False
+        self.loading = False
+        self.loaded = asyncio.Event()
+        self.pending: List[Dict[str, Any]] = []  # sự kiện đến trong lúc đang đọc DB
+        self.seq = 0
+        self.log: Deque[Event] = deque(maxlen=settings.QUEUE_FEED_REPLAY)
+        self.subscribers: Set[_Subscriber] = set()
+        self.refs = 0
+        self.loaded_at = 0.0
+        self.writes = 0
+        self.resyncing = False
+
+    def emit(self, name: str, data: Dict[str, Any]) -> None:
+        self.seq += 1
+        event = (name, self.seq, data)
+        self.log.append(event)
+        for sub in self.subscribers:
+            if sub.wants(data.get("MaDV")):
+                sub.push(event)
+
+    def add(self, item: Dict[str, Any]) -> None:
+        if self.items.get(item["MaPhien"]) == item:
+            return
+        self.items[item["MaPhien"]] = item
+        self.emit("add", item)
+
+    def remove(self, ma_phien: str) -> None:
+        item = self.items.pop(ma_phien, None)
+        if item is not None:
+            self.emit("remove", {"MaPhien": ma_phien, "MaDV": item["MaDV"]})
+
+    def snapshot(self, ma_dv: Optional[str]) -> Event:
+        items = [i for i in self.items.values() if ma_dv is None or i["MaDV"] == ma_dv]
+        return ("snapshot", self.seq, {"MaCN": self.ma_cn, "items": items})
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}:{seq}"
+
+    def replay(self, last_event_id: Optional[str], ma_dv: Optional[str]) -> Optional[List[Event]]:
+        """Các delta sau Last-Event-ID, None nếu không nối tiếp được (=> gửi snapshot)."""
+        epoch, _, seq = (last_event_id or "").partition(":")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        last_id = int(seq)
+        if last_id > self.seq or (last_id < self.seq and (not self.log or self.log[0][1] > last_id + 1)):
+            return None
+        return [e for e in self.log if e[1] > last_id and (ma_dv is None or e[2].get("MaDV") in (None, ma_dv))]
+
+
+class WorkQueueHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._branches: Dict[str, _Branch] = {}
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self._stats = {"published": 0, "applied": 0, "loads": 0, "resyncs": 0, "errors": 0}
+
+    # ---------- phát sự kiện (đường ghi, sync) ----------
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Không bao giờ làm hỏng request ghi: lỗi chỉ log, màn hình tự đọc lại sau QUEUE_FEED_RESYNC."""
+        self._stats["published"] += 1
+        if settings.CACHE_BACKEND == "redis":
+            try:
+                self._sync_redis().publish(CHANNEL, json.dumps(jsonable_encoder(event), ensure_ascii=False))
+                return
+            except Exception:
+                self._stats["errors"] += 1
+                log.exception("Publish work-queue event to Redis failed, applying locally")
+        self.apply(event)
+
+    def _sync_redis(self):
+        if self._redis is None:
+            import redis  # optional dependency, như app/core/cache.py
+
+            self._redis = redis.Redis.from_url(settings.CACHE_REDIS_URL)
+        return self._redis
+
+    # ---------- áp dụng sự kiện vào hàng đợi đang giữ ----------
+    def apply(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self._stats["applied"] += 1
+            for branch in self._targets(event):
+                branch.writes += 1
+                if not branch.ready:
+                    branch.pending.append(event)
+                else:
+                    self._apply(branch, event)
+
+    def _targets(self, event: Dict[str, Any]) -> Iterable[_Branch]:
+        if event["op"] == "add":
+            names = {i["MaCN"] for i in event["items"]}
+            return [b for n, b in self._branches.items() if n in names]
+        # remove chỉ có MaPhien: chi nhánh nào đang giữ phiên đó (hoặc đang đọc DB) tự bỏ
+        return list(self._branches.values())
+
+    @staticmethod
+    def _apply(branch: _Branch, event: Dict[str, Any]) -> None:
+        if event["op"] == "add":
+            for item in event["items"]:
+                if item["MaCN"] == branch.ma_cn:
+                    branch.add(item)
+        else:
+            for ma_phien in event["ids"]:
+                branch.remove(ma_phien)
+
+    # ---------- theo dõi (SSE) ----------
+    async def subscribe(self, ma_cn: str, ma_dv: Optional[str] = None,
+                        last_event_id: Optional[str] = None) -> AsyncIterator[Tuple[str, Optional[str], Dict[str, Any]]]:
+        """(tên sự kiện, id SSE, data): snapshot hoặc phần delta bị lỡ, rồi add / remove, ping khi rảnh."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            branch = self._branches.get(ma_cn)
+            if branch is None:
+                branch = self._branches[ma_cn] = _Branch(ma_cn)
+            branch.refs += 1
+            load = not branch.ready and not branch.loading
+            if load:
+                branch.loading = True
+        sub = _Subscriber(loop, ma_dv)
+        try:
+            if load:
+                await self._load(branch)
+            else:
+                await branch.loaded.wait()
+            if not branch.ready:
+                raise RuntimeError(f"Không đọc được hàng đợi chi nhánh {ma_cn}")
+
+            with self._lock:
+                events = branch.replay(last_event_id, ma_dv)
+                if events is None:
+                    events = [branch.snapshot(ma_dv)]
+                branch.subscribers.add(sub)
+            for name, seq, data in events:
+                yield name, branch.event_id(seq), data
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=settings.QUEUE_FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield "ping", None, {}
+                    if time.monotonic() - branch.loaded_at > settings.QUEUE_FEED_RESYNC:
+                        await self._resync(branch)
+                    continue
+                name, seq, data = event
+                yield name, branch.event_id(seq), data
+        finally:
+            with self._lock:
+                branch.subscribers.discard(sub)
+                branch.refs -= 1
+                if branch.refs <= 0 and self._branches.get(ma_cn) is branch:
+                    del self._branches[ma_cn]
+
+    @staticmethod
+    def _read(ma_cn: str) -> List[Dict[str, Any]]:
+        with SessionLocal() as db:
+            return [dict(r) for r in db.execute(text(BRANCH_SQL), {"ma_cn": ma_cn}).mappings()]
+
+    async def _read_async(self, ma_cn: str) -> List[Dict[str, Any]]:
+        # run_in_executor không mang ContextVar của request SSE => câu đọc lại không tính
+        # vào statement budget / thống kê của request đang stream
+        return await asyncio.get_running_loop().run_in_executor(None, self._read, ma_cn)
+
+    async def _load(self, branch: _Branch) -> None:
+        try:
+            rows = await self._read_async(branch.ma_cn)
+        except Exception:
+            self._stats["errors"] += 1
+            with self._lock:
+                branch.loading = False
+                branch.pending.clear()
+            branch.loaded.set()  # client đang chờ nhận lỗi; client sau thử đọc lại
+            branch.loaded = asyncio.Event()
+            raise
+        with self._lock:
+            self._stats["loads"] += 1
+            branch.items = {r["MaPhien"]: r for r in rows}
+            for event in branch.pending:
+                self._apply(branch, event)
+            branch.pending.clear()
+            branch.ready, branch.loading = True, False
+            branch.loaded_at = time.monotonic()
+        branch.loaded.set()
+
+    async def _resync(self, branch: _Branch) -> None:
+        with self._lock:
+            if branch.resyncing:
+                return
+            branch.resyncing = True
+            writes = branch.writes
+        try:
+            rows = await self._read_async(branch.ma_cn)
+        except Exception:
+            self._stats["errors"] += 1
+            log.exception("Resync work queue %s failed", branch.ma_cn)
+            return
+        finally:
+            with self._lock:
+                branch.resyncing = False
+        with self._lock:
+            if branch.writes != writes:
+                return  # có sự kiện trong lúc đọc: kết quả đọc có thể cũ, thử lại ở nhịp sau
+            self._stats["resyncs"] += 1
+            fresh = {r["MaPhien"]: r for r in rows}
+            for ma_phien in [k for k in branch.items if k not in fresh]:
+                branch.remove(ma_phien)
+            for item in fresh.values():
+                branch.add(item)
+            branch.loaded_at = time.monotonic()
+
+    # ---------- Redis pub/sub ----------
+    async def start(self) -> None:
+        if settings.CACHE_BACKEND == "redis" and self._listener is None:
+            self._listener = asyncio.create_task(self._listen(), name="work-queue-listener")
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self) -> None:
+        import redis.asyncio as redis  # optional dependency
+
+        while True:
+            try:
+                client = redis.from_url(settings.CACHE_REDIS_URL, decode_responses=True)
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self.apply(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._stats["errors"] += 1
+                log.exception("Work-queue Redis listener failed, reconnecting")
+                await asyncio.sleep(1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            branches = {
+                n: {"items": len(b.items), "subscribers": len(b.subscribers), "seq": b.seq, "ready": b.ready}
+                for n, b in self._branches.items()
+            }
+        return {"transport": "redis" if settings.CACHE_BACKEND == "redis" else "memory",
+                "branches": branches, **self._stats}
+
+
+hub = WorkQueueHub()
+
+
+def invoice_confirmed(db, ma_hoa_don: str) -> None:
+    """Sau sp_ConfirmHoaDon: phiên của hóa đơn vừa sang IN_SERVICE vào hàng đợi (1 câu seek theo MaHoaDon)."""
+    try:
+        items = [dict(r) for r in db.execute(text(INVOICE_SQL), {"hd": ma_hoa_don}).mappings()]
+        if items:
+            hub.publish({"op": "add", "items": items})
+    except Exception:
+        log.exception("Publish queue add for invoice %s failed", ma_hoa_don)
+
+
+def sessions_left(*ma_phien: str) -> None:
+    """Phiên đã được nhận / hoàn tất: rời hàng đợi. Không cần SQL, chi nhánh tự tìm theo MaPhien."""
+    try:
+        hub.publish({"op": "remove", "ids": list(ma_phien)})
+    except Exception:
+        log.exception("Publish queue remove %s failed", ma_phien)
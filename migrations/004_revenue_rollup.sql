@@ -0,0 +1,186 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   1. Chi nhánh được ghi nhận doanh thu của hóa đơn
+      (chốt lúc thanh toán, không đổi khi nhân viên bị điều động)
+   ========================================================= */
+IF COL_LENGTH('HOADON', 'MaCNGhiNhan') IS NULL
+    ALTER TABLE HOADON ADD MaCNGhiNhan VARCHAR(10) NULL REFERENCES CHINHANH(MaCN);
+GO
+
+/* =========================================================
+   2. Bảng tổng hợp doanh thu theo ngày / chi nhánh
+   ========================================================= */
+IF OBJECT_ID('DOANHTHU_CHINHANH_NGAY', 'U') IS NULL
+CREATE TABLE DOANHTHU_CHINHANH_NGAY (
+    MaCN VARCHAR(10) NOT NULL REFERENCES CHINHANH(MaCN),
+    Ngay DATE NOT NULL,
+    DoanhThu DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    SoHoaDon INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (MaCN, Ngay)
+);
+
+-- Khách hàng đã từng thanh toán tại chi nhánh (CT7)
+IF OBJECT_ID('KHACHHANG_CHINHANH', 'U') IS NULL
+CREATE TABLE KHACHHANG_CHINHANH (
+    MaCN VARCHAR(10) NOT NULL REFERENCES CHINHANH(MaCN),
+    MaKH VARCHAR(10) NOT NULL REFERENCES KHACHHANG(MaKH),
+    NgayDauTien DATE NOT NULL,
+    PRIMARY KEY (MaCN, MaKH)
+);
+GO
+
+/* =========================================================
+   3. TRIGGER: cập nhật tổng hợp theo delta
+      - Chỉ hóa đơn đã thanh toán (HinhThucThanhToan IS NOT NULL)
+      - sp_ConfirmHoaDon: NULL -> có hình thức TT => cộng toàn bộ TongTien
+      - trg_RecalcHD_All sau khi kê thuốc... => cộng phần chênh lệch
+   ========================================================= */
+CREATE OR ALTER TRIGGER trg_HOADON_DoanhThu
+ON HOADON
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    -- Chốt chi nhánh ghi nhận cho hóa đơn vừa thanh toán
+    -- (RECURSIVE_TRIGGERS OFF nên UPDATE này không gọi lại trigger)
+    UPDATE h
+    SET MaCNGhiNhan = nv.MaCN
+    FROM HOADON h
+    JOIN inserted i ON i.MaHoaDon = h.MaHoaDon
+    JOIN NHANVIEN nv ON nv.MaNV = i.NhanVienLap
+    WHERE i.HinhThucThanhToan IS NOT NULL
+      AND h.MaCNGhiNhan IS NULL;
+
+    ;WITH Delta AS (
+        SELECT COALESCE(i.MaCNGhiNhan, nv.MaCN) AS MaCN,
+               CAST(i.NgayLap AS DATE) AS Ngay,
+               ISNULL(i.TongTien, 0) AS DoanhThu,
+               1 AS SoHoaDon
+        FROM inserted i
+        LEFT JOIN NHANVIEN nv ON nv.MaNV = i.NhanVienLap
+        WHERE i.HinhThucThanhToan IS NOT NULL
+
+        UNION ALL
+
+        SELECT COALESCE(d.MaCNGhiNhan, nv.MaCN),
+               CAST(d.NgayLap AS DATE),
+               -ISNULL(d.TongTien, 0),
+               -1
+        FROM deleted d
+        LEFT JOIN NHANVIEN nv ON nv.MaNV = d.NhanVienLap
+        WHERE d.HinhThucThanhToan IS NOT NULL
+    ),
+    G AS (
+        SELECT MaCN, Ngay, SUM(DoanhThu) AS DoanhThu, SUM(SoHoaDon) AS SoHoaDon
+        FROM Delta
+        WHERE MaCN IS NOT NULL AND Ngay IS NOT NULL
+        GROUP BY MaCN, Ngay
+        HAVING SUM(DoanhThu) <> 0 OR SUM(SoHoaDon) <> 0
+    )
+    MERGE DOANHTHU_CHINHANH_NGAY WITH (HOLDLOCK) AS t
+    USING G AS s
+    ON (t.MaCN = s.MaCN AND t.Ngay = s.Ngay)
+    WHEN MATCHED THEN UPDATE SET
+        DoanhThu = t.DoanhThu + s.DoanhThu,
+        SoHoaDon = t.SoHoaDon + s.SoHoaDon
+    WHEN NOT MATCHED THEN
+        INSERT (MaCN, Ngay, DoanhThu, SoHoaDon)
+        VALUES (s.MaCN, s.Ngay, s.DoanhThu, s.SoHoaDon);
+
+    INSERT INTO KHACHHANG_CHINHANH (MaCN, MaKH, NgayDauTien)
+    SELECT x.MaCN, x.MaKH, MIN(x.Ngay)
+    FROM (
+        SELECT COALESCE(i.MaCNGhiNhan, nv.MaCN) AS MaCN, i.MaKH, CAST(i.NgayLap AS DATE) AS Ngay
+        FROM inserted i
+        LEFT JOIN NHANVIEN nv ON nv.MaNV = i.NhanVienLap
+        WHERE i.HinhThucThanhToan IS NOT NULL AND i.MaKH IS NOT NULL
+    ) x
+    WHERE x.MaCN IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM KHACHHANG_CHINHANH k WITH (UPDLOCK, HOLDLOCK)
+          WHERE k.MaCN = x.MaCN AND k.MaKH = x.MaKH
+      )
+    GROUP BY x.MaCN, x.MaKH;
+END;
+GO
+
+/* =========================================================
+   4. PROCEDURE: Backfill / dựng lại bảng tổng hợp
+      - Không truyền khoảng ngày: dựng lại toàn bộ (kể cả KHACHHANG_CHINHANH)
+      - Hóa đơn cũ chưa chốt chi nhánh: lấy chi nhánh theo LICHSUDIEUDONG
+        tại NgayLap, không có thì lấy chi nhánh hiện tại của nhân viên
+      - Khoá bảng tổng hợp trong lúc chạy, nên chạy ngoài giờ cao điểm
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_BackfillDoanhThuChiNhanh
+    @TuNgay  DATE = NULL,
+    @DenNgay DATE = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        UPDATE h
+        SET MaCNGhiNhan = COALESCE(ls.MaCN, nv.MaCN)
+        FROM HOADON h
+        JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
+        OUTER APPLY (
+            SELECT TOP 1 l.MaCN
+            FROM LICHSUDIEUDONG l
+            WHERE l.MaNV = h.NhanVienLap
+              AND h.NgayLap >= l.NgayBD AND h.NgayLap < l.NgayKT
+            ORDER BY l.NgayBD DESC
+        ) ls
+        WHERE h.HinhThucThanhToan IS NOT NULL
+          AND h.MaCNGhiNhan IS NULL
+          AND (@TuNgay IS NULL OR h.NgayLap >= @TuNgay)
+          AND (@DenNgay IS NULL OR h.NgayLap < DATEADD(DAY, 1, @DenNgay));
+
+        DELETE FROM DOANHTHU_CHINHANH_NGAY WITH (TABLOCKX)
+        WHERE (@TuNgay IS NULL OR Ngay >= @TuNgay)
+          AND (@DenNgay IS NULL OR Ngay <= @DenNgay);
+
+        INSERT INTO DOANHTHU_CHINHANH_NGAY (MaCN, Ngay, DoanhThu, SoHoaDon)
+        SELECT h.MaCNGhiNhan, CAST(h.NgayLap AS DATE), SUM(ISNULL(h.TongTien, 0)), COUNT(*)
+        FROM HOADON h
+        WHERE h.HinhThucThanhToan IS NOT NULL
+          AND h.MaCNGhiNhan IS NOT NULL
+          AND h.NgayLap IS NOT NULL
+          AND (@TuNgay IS NULL OR h.NgayLap >= @TuNgay)
+          AND (@DenNgay IS NULL OR h.NgayLap < DATEADD(DAY, 1, @DenNgay))
+        GROUP BY h.MaCNGhiNhan, CAST(h.NgayLap AS DATE);
+
+        IF @TuNgay IS NULL AND @DenNgay IS NULL
+            DELETE FROM KHACHHANG_CHINHANH WITH (TABLOCKX);
+
+        INSERT INTO KHACHHANG_CHINHANH (MaCN, MaKH, NgayDauTien)
+        SELECT h.MaCNGhiNhan, h.MaKH, MIN(CAST(h.NgayLap AS DATE))
+        FROM HOADON h
+        WHERE h.HinhThucThanhToan IS NOT NULL
+          AND h.MaCNGhiNhan IS NOT NULL
+          AND h.MaKH IS NOT NULL
+          AND h.NgayLap IS NOT NULL
+          AND (@TuNgay IS NULL OR h.NgayLap >= @TuNgay)
+          AND (@DenNgay IS NULL OR h.NgayLap < DATEADD(DAY, 1, @DenNgay))
+          AND NOT EXISTS (
+              SELECT 1 FROM KHACHHANG_CHINHANH k
+              WHERE k.MaCN = h.MaCNGhiNhan AND k.MaKH = h.MaKH
+          )
+        GROUP BY h.MaCNGhiNhan, h.MaKH;
+
+        COMMIT;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
+
+EXEC dbo.sp_BackfillDoanhThuChiNhanh;
+GO
@@ -0,0 +1,43 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Index hỗ trợ lọc theo khoảng ngày (NgayLap >= d AND NgayLap < d + 1)
+   và các truy vấn lịch / hàng chờ theo chi nhánh
+   ========================================================= */
+
+-- NV5, NV6: lọc hóa đơn theo khoảng NgayLap rồi join NHANVIEN
+CREATE NONCLUSTERED INDEX IX_HOADON_NgayLap_NhanVienLap
+ON HOADON (NgayLap, NhanVienLap)
+INCLUDE (MaKH, TongTien, KhuyenMai, HinhThucThanhToan);
+GO
+
+-- KH11, giỏ hàng: hóa đơn của khách theo trạng thái thanh toán
+CREATE NONCLUSTERED INDEX IX_HOADON_MaKH_HinhThucThanhToan
+ON HOADON (MaKH, HinhThucThanhToan)
+INCLUDE (NgayLap, TongTien);
+GO
+
+-- /staff/bookings: hàng chờ IN_SERVICE theo chi nhánh + dịch vụ
+CREATE NONCLUSTERED INDEX IX_PHIENDICHVU_MaCN_TrangThai_MaDV
+ON PHIENDICHVU (MaCN, TrangThai, MaDV)
+INCLUDE (MaThuCung, ThoiDiemBatDau);
+GO
+
+-- Chi tiết hóa đơn, trg_RecalcHD_All
+CREATE NONCLUSTERED INDEX IX_PHIENDICHVU_MaHoaDon
+ON PHIENDICHVU (MaHoaDon)
+INCLUDE (MaDV, MaCN, MaThuCung, TrangThai, GiaTien);
+GO
+
+-- Nhật ký làm việc trong ngày (get_daily_history_all)
+CREATE NONCLUSTERED INDEX IX_PHIENDICHVU_MaCN_ThoiDiemKetThuc
+ON PHIENDICHVU (MaCN, ThoiDiemKetThuc)
+INCLUDE (MaThuCung);
+GO
+
+-- NV4, CN vaccinations: lọc theo NgayTiem
+CREATE NONCLUSTERED INDEX IX_TIEMPHONG_NgayTiem
+ON TIEMPHONG (NgayTiem)
+INCLUDE (MaVC, MaGoi, SoLieu);
+GO
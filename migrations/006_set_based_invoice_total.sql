@@ -0,0 +1,293 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Tính tổng tiền hóa đơn theo tập (set-based)
+   - fn_GiaGoi / fn_TongTienHoaDon là inline TVF: optimizer "mở" vào câu
+     truy vấn gọi nó, nên trigger tính lại N hóa đơn bằng 1 câu UPDATE
+     thay vì gọi scalar UDF N lần (mỗi lần 5 truy vấn + UDF lồng theo gói).
+   - Giữ nguyên cách làm tròn của fn_CalculateHoaDonTotal:
+       dịch vụ + thuốc + mua hàng (DECIMAL)
+       + tiêm lẻ (FLOAT)            -> làm tròn DECIMAL(18,2)
+       + gói (mỗi gói DECIMAL(18,2)) -> làm tròn DECIMAL(18,2)
+       * (1 - KhuyenMai/100)         -> làm tròn DECIMAL(18,2)
+   - fn_GiaGoiTiemPhong / fn_CalculateHoaDonTotal vẫn giữ lại để đối chiếu
+     (scripts/check_invoice_totals.py)
+   ========================================================= */
+
+/* =========================================================
+   1. FUNCTION (inline): Giá gói tiêm
+   ========================================================= */
+CREATE OR ALTER FUNCTION dbo.fn_GiaGoi(@MaGoi VARCHAR(10))
+RETURNS TABLE
+AS
+RETURN
+    SELECT CAST(
+               ISNULL(SUM(gtpv.SoLieu * vc.DonGia) * (1 - ISNULL(MAX(g.KhuyenMai), 0) / 100.0), 0)
+           AS DECIMAL(18,2)) AS Gia
+    FROM GOITIEMPHONG g
+    LEFT JOIN GOITIEMPHONG_VACCINE gtpv ON g.MaGoi = gtpv.MaGoi
+    LEFT JOIN VACCINE vc ON vc.MaVC = gtpv.MaVC
+    WHERE g.MaGoi = @MaGoi;
+GO
+
+/* =========================================================
+   2. FUNCTION (inline): Tổng tiền hóa đơn
+   ========================================================= */
+CREATE OR ALTER FUNCTION dbo.fn_TongTienHoaDon(@MaHoaDon VARCHAR(10))
+RETURNS TABLE
+AS
+RETURN
+    SELECT
+        h.MaHoaDon,
+        CAST(
+            CAST(
+                CAST(
+                    CAST(ISNULL(dv.Tien, 0) + ISNULL(th.Tien, 0) + ISNULL(mh.Tien, 0) AS DECIMAL(18,2))
+                    + ISNULL(tp.Tien, 0)
+                AS DECIMAL(18,2))
+                + ISNULL(gg.Tien, 0)
+            AS DECIMAL(18,2))
+            * (1 - ISNULL(h.KhuyenMai, 0) / 100.0)
+        AS DECIMAL(18,2)) AS TongTien
+    FROM HOADON h
+    -- Dịch vụ
+    CROSS APPLY (
+        SELECT SUM(pd.GiaTien) AS Tien
+        FROM PHIENDICHVU pd
+        WHERE pd.MaHoaDon = h.MaHoaDon AND pd.TrangThai <> N'CANCELLED'
+    ) dv
+    -- Thuốc
+    CROSS APPLY (
+        SELECT SUM(tt.Soluong * sp.DonGia) AS Tien
+        FROM PHIENDICHVU pd
+        JOIN TOATHUOC tt ON pd.MaPhien = tt.MaPhien
+        JOIN SANPHAM sp ON tt.MaThuoc = sp.MaSP
+        WHERE pd.MaHoaDon = h.MaHoaDon AND pd.TrangThai <> N'CANCELLED'
+    ) th
+    -- Mua hàng
+    CROSS APPLY (
+        SELECT SUM(m.SoLuong * sp.DonGia) AS Tien
+        FROM PHIENDICHVU pd
+        JOIN MUAHANG m ON pd.MaPhien = m.MaPhien
+        JOIN SANPHAM sp ON m.MaSP = sp.MaSP
+        WHERE pd.MaHoaDon = h.MaHoaDon AND pd.TrangThai <> N'CANCELLED'
+    ) mh
+    -- Tiêm lẻ
+    CROSS APPLY (
+        SELECT SUM(t.SoLieu * vc.DonGia) AS Tien
+        FROM PHIENDICHVU pd
+        JOIN TIEMPHONG t ON pd.MaPhien = t.MaPhien
+        JOIN VACCINE vc ON t.MaVC = vc.MaVC
+        WHERE pd.MaHoaDon = h.MaHoaDon
+          AND t.MaGoi IS NULL AND pd.TrangThai <> N'CANCELLED'
+    ) tp
+    -- Gói
+    CROSS APPLY (
+        SELECT SUM(g.Gia) AS Tien
+        FROM MUA_GOI mg
+        CROSS APPLY dbo.fn_GiaGoi(mg.MaGoi) g
+        WHERE mg.MaHoaDon = h.MaHoaDon
+    ) gg
+    WHERE h.MaHoaDon = @MaHoaDon;
+GO
+
+/* =========================================================
+   3. TRIGGER: Recalculate hóa đơn (set-based)
+      - 1 câu UPDATE cho mọi hóa đơn bị ảnh hưởng
+      - Bỏ qua hóa đơn không đổi tổng tiền (không ghi log, không gọi
+        trg_HOADON_DoanhThu vô ích)
+   ========================================================= */
+CREATE OR ALTER TRIGGER trg_RecalcHD_All
+ON PHIENDICHVU
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    UPDATE h
+    SET TongTien = t.TongTien
+    FROM HOADON h
+    JOIN (
+        SELECT MaHoaDon FROM inserted
+        UNION
+        SELECT MaHoaDon FROM deleted
+    ) a ON a.MaHoaDon = h.MaHoaDon
+    CROSS APPLY dbo.fn_TongTienHoaDon(h.MaHoaDon) t
+    WHERE h.TongTien IS NULL OR h.TongTien <> t.TongTien;
+END;
+GO
+
+/* =========================================================
+   4. PROCEDURE: dùng fn_TongTienHoaDon khi chốt hóa đơn / mua gói
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_ConfirmHoaDon
+    @MaHoaDon        VARCHAR(10),
+    @HinhThucTT      NVARCHAR(50) = N'Chuyển khoản',
+    @NhanVienLap     VARCHAR(10) = 'NV_SYSTEM'
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        -- 0. Check còn phiên cần thanh toán không
+        IF NOT (
+            EXISTS (SELECT 1 FROM PHIENDICHVU WHERE MaHoaDon = @MaHoaDon AND TrangThai = N'BOOKING')
+            OR
+            EXISTS (SELECT 1 FROM MUA_GOI WHERE MaHoaDon = @MaHoaDon)
+        )
+            THROW 50020, N'Hóa đơn không còn phiên hoặc gói nào cần thanh toán', 1;
+
+        -- 1. Check tồn kho sản phẩm lẻ
+        IF EXISTS (
+            SELECT 1
+            FROM MUAHANG mh
+            JOIN PHIENDICHVU pd ON mh.MaPhien = pd.MaPhien
+            JOIN CHINHANH_SANPHAM csp ON csp.MaSP = mh.MaSP AND csp.MaCN = pd.MaCN
+            WHERE pd.MaHoaDon = @MaHoaDon 
+              AND pd.TrangThai = N'BOOKING'
+              AND csp.SoLuongTonKho < mh.SoLuong
+        )
+            THROW 50021, N'Một số sản phẩm không đủ hàng tại chi nhánh đã chọn', 1;
+
+        -- 2. Trừ kho sản phẩm lẻ
+        UPDATE csp
+        SET csp.SoLuongTonKho -= mh.SoLuong
+        FROM MUAHANG mh
+        JOIN PHIENDICHVU pd ON mh.MaPhien = pd.MaPhien
+        JOIN CHINHANH_SANPHAM csp ON csp.MaSP = mh.MaSP AND csp.MaCN = pd.MaCN
+        WHERE pd.MaHoaDon = @MaHoaDon 
+          AND pd.TrangThai = N'BOOKING';
+
+        -- 3. Confirm phiên dịch vụ
+        UPDATE pd
+        SET
+            pd.GiaTien = CASE
+                WHEN pd.MaDV = 'DV_RETAIL' THEN 0
+                WHEN pd.GiaTien IS NULL OR pd.GiaTien = 0 THEN dv.DonGia
+                ELSE pd.GiaTien
+            END,
+            pd.TrangThai = CASE
+                WHEN pd.MaDV = 'DV_RETAIL' THEN N'CONFIRMED'
+                ELSE N'IN_SERVICE'
+            END,
+            pd.ThoiDiemKetThuc = CASE
+                WHEN pd.MaDV = 'DV_RETAIL' THEN GETDATE()
+                ELSE NULL              -- đang IN_SERVICE thì thường chưa có thời điểm kết thúc
+            END
+            
+        FROM PHIENDICHVU pd
+        LEFT JOIN DICHVU dv ON pd.MaDV = dv.MaDV
+        WHERE pd.MaHoaDon = @MaHoaDon
+        AND pd.TrangThai = N'BOOKING';
+
+        -- 4. Update thông tin hóa đơn
+        UPDATE HOADON
+        SET 
+            HinhThucThanhToan = @HinhThucTT,
+            NhanVienLap = @NhanVienLap,
+            NgayLap = GETDATE(),
+            TongTien = (SELECT t.TongTien FROM dbo.fn_TongTienHoaDon(@MaHoaDon) t)
+        WHERE MaHoaDon = @MaHoaDon;
+
+        -- ========================================================
+        -- BƯỚC 5: KÍCH HOẠT GÓI VACCINE VÀO TÀI KHOẢN KHÁCH HÀNG
+        -- ========================================================
+        -- Logic: Nếu trong hóa đơn có mua gói (MUA_GOI), 
+        -- ta nạp số liều định nghĩa từ GOITIEMPHONG_VACCINE vào GOI_KHACHHANG_VACCINE
+        INSERT INTO GOI_KHACHHANG_VACCINE (MaKH, MaGoi, MaVC, Solieuconlai)
+        SELECT 
+            h.MaKH,
+            mg.MaGoi,
+            gv.MaVC,
+            gv.SoLieu -- Lấy số liều định nghĩa của gói nạp vào ví của khách
+        FROM HOADON h
+        JOIN MUA_GOI mg ON h.MaHoaDon = mg.MaHoaDon
+        JOIN GOITIEMPHONG_VACCINE gv ON mg.MaGoi = gv.MaGoi
+        WHERE h.MaHoaDon = @MaHoaDon
+        AND NOT EXISTS (
+            -- Tránh chèn trùng nếu chạy lại procedure cho cùng 1 hóa đơn
+            SELECT 1 FROM GOI_KHACHHANG_VACCINE gkv
+            WHERE gkv.MaKH = h.MaKH AND gkv.MaGoi = mg.MaGoi AND gkv.MaVC = gv.MaVC
+        );
+
+        COMMIT;
+        PRINT 'Thanh toan thanh cong va da kich hoat goi vaccine.';
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
+
+CREATE OR ALTER PROCEDURE dbo.sp_MuaGoiTiemPhong
+    @MaKH VARCHAR(10),
+    @MaGoi VARCHAR(10),
+    @MaHoaDon VARCHAR(10)
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        -- 1. Kiểm tra hóa đơn thuộc khách
+        IF NOT EXISTS (
+            SELECT 1 FROM HOADON
+            WHERE MaHoaDon = @MaHoaDon
+              AND MaKH = @MaKH
+        )
+            THROW 50030, N'Hóa đơn không thuộc khách hàng', 1;
+
+        -- 2. Ghi nhận mua gói
+        IF NOT EXISTS (
+            SELECT 1 FROM MUA_GOI
+            WHERE MaKH = @MaKH AND MaGoi = @MaGoi AND MaHoaDon = @MaHoaDon
+        )
+        INSERT INTO MUA_GOI (MaKH, MaGoi, MaHoaDon)
+        VALUES (@MaKH, @MaGoi, @MaHoaDon);
+
+        -- 3. Cấp quyền vaccine
+        INSERT INTO GOI_KHACHHANG_VACCINE (MaKH, MaGoi, MaVC, Solieuconlai)
+        SELECT
+            @MaKH,
+            g.MaGoi,
+            g.MaVC,
+            g.SoLieu
+        FROM GOITIEMPHONG_VACCINE g
+        WHERE g.MaGoi = @MaGoi
+          AND NOT EXISTS (
+              SELECT 1
+              FROM GOI_KHACHHANG_VACCINE x
+              WHERE x.MaKH = @MaKH
+                AND x.MaGoi = g.MaGoi
+                AND x.MaVC = g.MaVC
+          );
+
+        -- 4. Áp khuyến mãi vào hóa đơn
+        UPDATE HOADON
+        SET KhuyenMai = (
+            SELECT KhuyenMai FROM GOITIEMPHONG WHERE MaGoi = @MaGoi
+        )
+        WHERE MaHoaDon = @MaHoaDon;
+
+        -- 5. Recalculate
+        UPDATE h
+        SET TongTien = t.TongTien
+        FROM HOADON h
+        CROSS APPLY dbo.fn_TongTienHoaDon(h.MaHoaDon) t
+        WHERE h.MaHoaDon = @MaHoaDon;
+
+        COMMIT;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
@@ -0,0 +1,104 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Hoàn tất khám / tiêm trong 1 lần gọi
+   - Danh sách thuốc / mũi tiêm truyền vào dạng JSON, ghi bằng
+     INSERT ... SELECT FROM OPENJSON (1 câu cho cả toa, trigger chạy 1 lần)
+   - Thay cho vòng lặp INSERT từng dòng trong staff_service
+   ========================================================= */
+
+/* =========================================================
+   1. PROCEDURE: Hoàn tất khám bệnh + kê toa
+      @ToaThuoc: [{"MaSP": "SP001", "SoLuong": 2}, ...]
+      NULL / mảng rỗng => giữ nguyên toa cũ
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_HoanTatKhamBenh
+    @MaPhien     VARCHAR(10),
+    @BacSi       VARCHAR(10),
+    @TrieuChung  NVARCHAR(MAX),
+    @ChanDoan    NVARCHAR(MAX),
+    @ToaThuoc    NVARCHAR(MAX) = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        -- 1. Bệnh án
+        UPDATE KHAMBENH
+        SET BacSiPhuTrach = @BacSi, CacTrieuChung = @TrieuChung, ChanDoan = @ChanDoan
+        WHERE MaPhien = @MaPhien;
+
+        IF @@ROWCOUNT = 0
+            INSERT INTO KHAMBENH (MaPhien, BacSiPhuTrach, CacTrieuChung, ChanDoan)
+            VALUES (@MaPhien, @BacSi, @TrieuChung, @ChanDoan);
+
+        -- 2. Toa thuốc (ghi đè toàn bộ)
+        IF @ToaThuoc IS NOT NULL AND EXISTS (SELECT 1 FROM OPENJSON(@ToaThuoc))
+        BEGIN
+            DELETE FROM TOATHUOC WHERE MaPhien = @MaPhien;
+
+            INSERT INTO TOATHUOC (MaPhien, MaThuoc, Soluong)
+            SELECT @MaPhien, j.MaSP, j.SoLuong
+            FROM OPENJSON(@ToaThuoc)
+            WITH (
+                MaSP    VARCHAR(10) '$.MaSP',
+                SoLuong INT         '$.SoLuong'
+            ) j;
+        END
+
+        -- 3. Kết thúc phiên (trg_RecalcHD_All tính lại tổng tiền gồm thuốc)
+        UPDATE PHIENDICHVU
+        SET ThoiDiemKetThuc = GETDATE()
+        WHERE MaPhien = @MaPhien;
+
+        COMMIT;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
+
+/* =========================================================
+   2. PROCEDURE: Hoàn tất tiêm phòng
+      @DanhSachTiem: [{"ma_vc": "VC001", "ma_goi": null, "so_lieu": 1}, ...]
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_HoanTatTiemPhong
+    @MaPhien       VARCHAR(10),
+    @BacSi         VARCHAR(10),
+    @DanhSachTiem  NVARCHAR(MAX)
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        UPDATE PHIENDICHVU
+        SET TrangThai = N'DONE_SERVICE',
+            ThoiDiemKetThuc = GETDATE()
+        WHERE MaPhien = @MaPhien;
+
+        INSERT INTO TIEMPHONG (MaPhien, MaVC, MaGoi, BacSiPhuTrach, NgayTiem, SoLieu)
+        SELECT @MaPhien, j.MaVC, j.MaGoi, @BacSi, CAST(GETDATE() AS DATE), j.SoLieu
+        FROM OPENJSON(@DanhSachTiem)
+        WITH (
+            MaVC   VARCHAR(10) '$.ma_vc',
+            MaGoi  VARCHAR(10) '$.ma_goi',
+            SoLieu FLOAT       '$.so_lieu'
+        ) j;
+
+        COMMIT;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
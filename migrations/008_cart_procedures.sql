@@ -0,0 +1,183 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Giỏ hàng / đặt lịch trong 1 lần gọi (KH4, KH16)
+   - Kiểm tra + tìm/tạo hóa đơn BOOKING + thêm dòng + tính lại tổng tiền
+     trong cùng 1 transaction phía server
+   - Tìm hóa đơn mở với UPDLOCK, HOLDLOCK: 2 request đồng thời của cùng
+     khách hàng phải chờ nhau, không còn tạo 2 hóa đơn BOOKING song song
+     (seek theo IX_HOADON_MaKH_HinhThucThanhToan nên chỉ khoá range của khách đó)
+   - Mã lỗi: 50040-50044 (customer_service map sang HTTP status)
+   ========================================================= */
+
+/* =========================================================
+   1. PROCEDURE: Thêm sản phẩm vào giỏ (KH4)
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_ThemSanPhamVaoGio
+    @MaKH     VARCHAR(10),
+    @MaSP     VARCHAR(10),
+    @SoLuong  INT,
+    @MaCN     VARCHAR(10),
+    @MaNV     VARCHAR(10) = 'NV_SYSTEM'
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @MaHoaDon VARCHAR(10), @MaPhien VARCHAR(10);
+    DECLARE @out TABLE (ID VARCHAR(10));
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        -- 1. Sản phẩm + tồn kho tại chi nhánh
+        IF NOT EXISTS (SELECT 1 FROM SANPHAM WHERE MaSP = @MaSP)
+            THROW 50040, N'Sản phẩm không tồn tại', 1;
+
+        IF NOT EXISTS (
+            SELECT 1 FROM CHINHANH_SANPHAM
+            WHERE MaSP = @MaSP AND MaCN = @MaCN AND SoLuongTonKho >= @SoLuong
+        )
+            THROW 50041, N'Sản phẩm không đủ tồn kho tại chi nhánh đã chọn', 1;
+
+        -- 2. Tìm / tạo hóa đơn BOOKING
+        SELECT TOP 1 @MaHoaDon = h.MaHoaDon
+        FROM HOADON h WITH (UPDLOCK, HOLDLOCK)
+        WHERE h.MaKH = @MaKH
+          AND h.HinhThucThanhToan IS NULL
+          AND EXISTS (
+              SELECT 1 FROM PHIENDICHVU pd
+              WHERE pd.MaHoaDon = h.MaHoaDon AND pd.TrangThai = N'BOOKING'
+          )
+        ORDER BY h.NgayLap DESC;
+
+        IF @MaHoaDon IS NULL
+        BEGIN
+            INSERT INTO HOADON (MaKH, NhanVienLap, HinhThucThanhToan)
+            OUTPUT INSERTED.MaHoaDon INTO @out
+            VALUES (@MaKH, @MaNV, NULL);
+
+            SELECT @MaHoaDon = ID FROM @out;
+            DELETE FROM @out;
+        END
+
+        -- 3. Tìm / tạo phiên DV_RETAIL theo chi nhánh
+        SELECT @MaPhien = MaPhien
+        FROM PHIENDICHVU
+        WHERE MaHoaDon = @MaHoaDon
+          AND MaDV = 'DV_RETAIL'
+          AND MaCN = @MaCN;
+
+        IF @MaPhien IS NULL
+        BEGIN
+            INSERT INTO PHIENDICHVU (MaHoaDon, MaDV, GiaTien, TrangThai, MaCN, MaThuCung)
+            OUTPUT INSERTED.MaPhien INTO @out
+            VALUES (@MaHoaDon, 'DV_RETAIL', 0, N'BOOKING', @MaCN, NULL);
+
+            SELECT @MaPhien = ID FROM @out;
+        END
+
+        -- 4. Thêm / cộng số lượng
+        UPDATE MUAHANG
+        SET SoLuong = SoLuong + @SoLuong
+        WHERE MaPhien = @MaPhien AND MaSP = @MaSP;
+
+        IF @@ROWCOUNT = 0
+            INSERT INTO MUAHANG (MaPhien, MaSP, SoLuong)
+            VALUES (@MaPhien, @MaSP, @SoLuong);
+
+        -- 5. Tổng tiền (MUAHANG không có trigger tính lại)
+        UPDATE h
+        SET TongTien = t.TongTien
+        FROM HOADON h
+        CROSS APPLY dbo.fn_TongTienHoaDon(h.MaHoaDon) t
+        WHERE h.MaHoaDon = @MaHoaDon;
+
+        COMMIT;
+
+        SELECT @MaHoaDon AS MaHoaDon, @MaPhien AS MaPhien, @MaCN AS MaCN;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
+
+/* =========================================================
+   2. PROCEDURE: Đặt lịch dịch vụ (KH16)
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_DatLichDichVu
+    @MaKH            VARCHAR(10),
+    @MaThuCung       VARCHAR(10),
+    @MaDV            VARCHAR(10),
+    @MaCN            VARCHAR(10),
+    @ThoiDiemBatDau  DATETIME,
+    @MaNV            VARCHAR(10) = 'NV_SYSTEM'
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @MaHoaDon VARCHAR(10), @MaPhien VARCHAR(10);
+    DECLARE @TenThuCung NVARCHAR(100), @Gia DECIMAL(18,2);
+    DECLARE @out TABLE (ID VARCHAR(10));
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        -- 1. Chi nhánh có cung cấp dịch vụ, thú cưng thuộc khách, giá dịch vụ
+        IF NOT EXISTS (SELECT 1 FROM CUNGCAPDICHVU WHERE MaDV = @MaDV AND MaCN = @MaCN)
+            THROW 50042, N'Chi nhánh này không cung cấp dịch vụ đã chọn', 1;
+
+        SELECT @TenThuCung = Ten
+        FROM THUCUNG
+        WHERE MaThuCung = @MaThuCung AND MaKH = @MaKH;
+
+        IF @TenThuCung IS NULL
+            THROW 50043, N'Pet not found', 1;
+
+        SELECT @Gia = DonGia FROM DICHVU WHERE MaDV = @MaDV;
+
+        IF @Gia IS NULL
+            THROW 50044, N'Service price not found', 1;
+
+        -- 2. Tìm / tạo hóa đơn BOOKING
+        SELECT TOP 1 @MaHoaDon = h.MaHoaDon
+        FROM HOADON h WITH (UPDLOCK, HOLDLOCK)
+        WHERE h.MaKH = @MaKH
+          AND h.HinhThucThanhToan IS NULL
+          AND EXISTS (
+              SELECT 1 FROM PHIENDICHVU pd
+              WHERE pd.MaHoaDon = h.MaHoaDon AND pd.TrangThai = N'BOOKING'
+          )
+        ORDER BY h.NgayLap DESC;
+
+        IF @MaHoaDon IS NULL
+        BEGIN
+            INSERT INTO HOADON (MaKH, NgayLap, NhanVienLap, HinhThucThanhToan)
+            OUTPUT INSERTED.MaHoaDon INTO @out
+            VALUES (@MaKH, GETDATE(), @MaNV, NULL);
+
+            SELECT @MaHoaDon = ID FROM @out;
+            DELETE FROM @out;
+        END
+
+        -- 3. Tạo phiên dịch vụ (trg_RecalcHD_All tính lại tổng tiền)
+        INSERT INTO PHIENDICHVU (MaHoaDon, MaThuCung, MaDV, GiaTien, TrangThai, MaCN, ThoiDiemBatDau)
+        OUTPUT INSERTED.MaPhien INTO @out
+        VALUES (@MaHoaDon, @MaThuCung, @MaDV, @Gia, N'BOOKING', @MaCN, @ThoiDiemBatDau);
+
+        SELECT @MaPhien = ID FROM @out;
+
+        COMMIT;
+
+        SELECT @MaHoaDon AS MaHoaDon, @MaPhien AS MaPhien, @TenThuCung AS TenThuCung;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
@@ -0,0 +1,43 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Mã tự sinh KH / TC / NV / HD / PD vượt 999.999
+   - DEFAULT cũ: RIGHT('000000' + CAST(NEXT VALUE ... AS VARCHAR(6)), 6)
+     => giá trị thứ 1.000.000 lỗi tràn CAST, bảng không nhận dòng mới.
+   - DEFAULT mới: vẫn đệm 0 đủ 6 chữ số (HD000123), dài hơn thì giữ nguyên,
+     tối đa 8 chữ số cho vừa VARCHAR(10): HD1000000 .. HD99999999.
+   - NEXT VALUE FOR không dùng được trong CASE / IIF; các lần gọi cùng 1 sequence
+     trong 1 câu lệnh trả cùng 1 giá trị cho mỗi dòng, nên đệm bằng
+     SUBSTRING('00000', LEN(s), 5) (LEN >= 6 => chuỗi rỗng).
+   - Mã > 6 chữ số không còn sắp theo chuỗi đúng thứ tự số (HD1000000 < HD999999):
+     ORDER BY MaHoaDon chỉ dùng làm tie-breaker, không dựa vào thứ tự tạo.
+   - scripts/datagen dùng cùng định dạng (format_id) với mã lấy từ sp_sequence_get_range.
+   ========================================================= */
+DECLARE @t TABLE (Bang SYSNAME, Cot SYSNAME, Tien VARCHAR(2), Seq SYSNAME);
+INSERT INTO @t (Bang, Cot, Tien, Seq) VALUES
+    ('KHACHHANG',   'MaKH',      'KH', 'SEQ_KHACHHANG'),
+    ('THUCUNG',     'MaThuCung', 'TC', 'SEQ_THUCUNG'),
+    ('NHANVIEN',    'MaNV',      'NV', 'SEQ_NHANVIEN'),
+    ('HOADON',      'MaHoaDon',  'HD', 'SEQ_HOADON'),
+    ('PHIENDICHVU', 'MaPhien',   'PD', 'SEQ_PHIENDICHVU');
+
+DECLARE @sql NVARCHAR(MAX);
+
+SELECT @sql = STRING_AGG(CAST(
+           -- DEFAULT tạo từ 000_base.sql có tên hệ thống tự đặt (DF__HOADON__MaHoa__...)
+           ISNULL(N'ALTER TABLE dbo.' + QUOTENAME(t.Bang) + N' DROP CONSTRAINT ' + QUOTENAME(dc.name) + N'; ', N'')
+         + N'ALTER TABLE dbo.' + QUOTENAME(t.Bang)
+         + N' ADD CONSTRAINT ' + QUOTENAME('DF_' + t.Bang + '_' + t.Cot)
+         + N' DEFAULT (''' + t.Tien + N''''
+         + N' + SUBSTRING(''00000'', LEN(CAST(NEXT VALUE FOR dbo.' + QUOTENAME(t.Seq) + N' AS VARCHAR(8))), 5)'
+         + N' + CAST(NEXT VALUE FOR dbo.' + QUOTENAME(t.Seq) + N' AS VARCHAR(8)))'
+         + N' FOR ' + QUOTENAME(t.Cot) + N';'
+       AS NVARCHAR(MAX)), CHAR(10))
+FROM @t t
+LEFT JOIN sys.default_constraints dc
+    ON dc.parent_object_id = OBJECT_ID('dbo.' + t.Bang)
+   AND dc.parent_column_id = COLUMNPROPERTY(OBJECT_ID('dbo.' + t.Bang), t.Cot, 'ColumnId');
+
+EXEC sys.sp_executesql @sql;
+GO
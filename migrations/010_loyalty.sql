@@ -0,0 +1,196 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Điểm tích luỹ / hạng hội viên cập nhật theo delta
+   - Mỗi hóa đơn đã thanh toán cho FLOOR(TongTien / DongMoiDiem) điểm.
+   - trg_HOADON_TichLuy chạy trong transaction của sp_ConfirmHoaDon (UPDATE HOADON
+     gán HinhThucThanhToan) và cả khi TongTien đổi sau đó (kê thuốc => trg_RecalcHD_All):
+     cộng phần chênh lệch điểm vào KHACHHANG.Tichluy, nâng hạng nếu đủ điểm.
+   - Hạng chỉ tăng tự động (không hạ hạng gán tay / từ seed).
+   - THANHVIEN_BAC: số khách mỗi hạng, trigger trên KHACHHANG giữ đúng
+     => CT4 đọc 3 dòng thay vì quét + GROUP BY cả KHACHHANG.
+   - sp_TinhLaiTichLuy: dựng lại toàn bộ (sau khi nạp dữ liệu lớn với trigger tắt).
+   ========================================================= */
+
+/* =========================================================
+   1. Bảng hạng: ngưỡng điểm (sửa được, không cần deploy)
+   ========================================================= */
+IF OBJECT_ID('HANGTHANHVIEN', 'U') IS NULL
+CREATE TABLE HANGTHANHVIEN (
+    Bac NVARCHAR(20) PRIMARY KEY,
+    ThuTu TINYINT NOT NULL UNIQUE,
+    DiemToiThieu INT NOT NULL CHECK (DiemToiThieu >= 0)
+);
+GO
+
+MERGE HANGTHANHVIEN AS t
+USING (VALUES (N'Cơ bản', 0, 0), (N'Thân thiết', 1, 100), (N'VIP', 2, 240)) AS s (Bac, ThuTu, DiemToiThieu)
+ON t.Bac = s.Bac
+WHEN NOT MATCHED THEN INSERT (Bac, ThuTu, DiemToiThieu) VALUES (s.Bac, s.ThuTu, s.DiemToiThieu);
+GO
+
+/* =========================================================
+   2. Bảng đếm số khách theo hạng (CT4)
+   ========================================================= */
+IF OBJECT_ID('THANHVIEN_BAC', 'U') IS NULL
+CREATE TABLE THANHVIEN_BAC (
+    Bac NVARCHAR(20) PRIMARY KEY REFERENCES HANGTHANHVIEN(Bac),
+    SoLuong INT NOT NULL DEFAULT 0
+);
+GO
+
+/* =========================================================
+   3. FUNCTION (inline): điểm của 1 hóa đơn - 1 điểm / 50.000đ
+   ========================================================= */
+CREATE OR ALTER FUNCTION dbo.fn_DiemTichLuy(@TongTien DECIMAL(18,2))
+RETURNS TABLE
+AS
+RETURN
+    SELECT CAST(FLOOR(ISNULL(@TongTien, 0) / 50000) AS INT) AS Diem;
+GO
+
+/* =========================================================
+   4. TRIGGER: HOADON -> KHACHHANG.Tichluy / Bac
+   ========================================================= */
+CREATE OR ALTER TRIGGER trg_HOADON_TichLuy
+ON HOADON
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    IF NOT EXISTS (SELECT 1 FROM inserted WHERE HinhThucThanhToan IS NOT NULL)
+       AND NOT EXISTS (SELECT 1 FROM deleted WHERE HinhThucThanhToan IS NOT NULL)
+        RETURN;  -- thêm / sửa giỏ hàng chưa thanh toán: không đụng KHACHHANG
+
+    ;WITH Delta AS (
+        SELECT i.MaKH, p.Diem
+        FROM inserted i
+        CROSS APPLY dbo.fn_DiemTichLuy(i.TongTien) p
+        WHERE i.HinhThucThanhToan IS NOT NULL AND i.MaKH IS NOT NULL
+
+        UNION ALL
+
+        SELECT d.MaKH, -p.Diem
+        FROM deleted d
+        CROSS APPLY dbo.fn_DiemTichLuy(d.TongTien) p
+        WHERE d.HinhThucThanhToan IS NOT NULL AND d.MaKH IS NOT NULL
+    ),
+    G AS (
+        SELECT MaKH, SUM(Diem) AS Diem
+        FROM Delta
+        GROUP BY MaKH
+        HAVING SUM(Diem) <> 0
+    )
+    UPDATE kh
+    SET Tichluy = x.Tichluy,
+        Bac = CASE WHEN moi.ThuTu > ISNULL(cu.ThuTu, 0) THEN moi.Bac ELSE kh.Bac END
+    FROM KHACHHANG kh
+    JOIN G g ON g.MaKH = kh.MaKH
+    CROSS APPLY (
+        SELECT CASE WHEN ISNULL(kh.Tichluy, 0) + g.Diem < 0 THEN 0 ELSE ISNULL(kh.Tichluy, 0) + g.Diem END AS Tichluy
+    ) x
+    LEFT JOIN HANGTHANHVIEN cu ON cu.Bac = kh.Bac
+    CROSS APPLY (
+        SELECT TOP 1 h.Bac, h.ThuTu
+        FROM HANGTHANHVIEN h
+        WHERE h.DiemToiThieu <= x.Tichluy
+        ORDER BY h.ThuTu DESC
+    ) moi;
+END;
+GO
+
+/* =========================================================
+   5. TRIGGER: KHACHHANG -> THANHVIEN_BAC (chỉ khi thêm / xoá khách hoặc đổi Bac)
+   ========================================================= */
+CREATE OR ALTER TRIGGER trg_KHACHHANG_DemBac
+ON KHACHHANG
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    IF EXISTS (SELECT 1 FROM inserted) AND EXISTS (SELECT 1 FROM deleted) AND NOT UPDATE(Bac)
+        RETURN;  -- UPDATE không đổi Bac (Tichluy, SDT...)
+
+    ;WITH Delta AS (
+        SELECT ISNULL(Bac, N'Cơ bản') AS Bac, 1 AS SoLuong FROM inserted
+        UNION ALL
+        SELECT ISNULL(Bac, N'Cơ bản'), -1 FROM deleted
+    ),
+    G AS (
+        SELECT Bac, SUM(SoLuong) AS SoLuong
+        FROM Delta
+        GROUP BY Bac
+        HAVING SUM(SoLuong) <> 0
+    )
+    MERGE THANHVIEN_BAC WITH (HOLDLOCK) AS t
+    USING G AS s
+    ON t.Bac = s.Bac
+    WHEN MATCHED THEN UPDATE SET SoLuong = t.SoLuong + s.SoLuong
+    WHEN NOT MATCHED THEN INSERT (Bac, SoLuong) VALUES (s.Bac, s.SoLuong);
+END;
+GO
+
+/* =========================================================
+   6. PROCEDURE: dựng lại Tichluy / Bac / THANHVIEN_BAC từ HOADON
+      - Hạng chỉ được nâng (giữ hạng cao hơn đã có)
+      - Khoá KHACHHANG trong lúc chạy, nên chạy ngoài giờ cao điểm
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_TinhLaiTichLuy
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        -- trigger đếm hạng tắt trong lúc cập nhật hàng loạt, đếm lại 1 lần ở cuối
+        DISABLE TRIGGER trg_KHACHHANG_DemBac ON KHACHHANG;
+
+        ;WITH Diem AS (
+            SELECT h.MaKH, SUM(p.Diem) AS Diem
+            FROM HOADON h
+            CROSS APPLY dbo.fn_DiemTichLuy(h.TongTien) p
+            WHERE h.HinhThucThanhToan IS NOT NULL AND h.MaKH IS NOT NULL
+            GROUP BY h.MaKH
+        )
+        UPDATE kh
+        SET Tichluy = x.Tichluy,
+            Bac = CASE WHEN moi.ThuTu > ISNULL(cu.ThuTu, 0) THEN moi.Bac ELSE ISNULL(kh.Bac, N'Cơ bản') END
+        FROM KHACHHANG kh WITH (TABLOCKX)
+        LEFT JOIN Diem d ON d.MaKH = kh.MaKH
+        CROSS APPLY (SELECT ISNULL(d.Diem, 0) AS Tichluy) x
+        LEFT JOIN HANGTHANHVIEN cu ON cu.Bac = kh.Bac
+        CROSS APPLY (
+            SELECT TOP 1 h.Bac, h.ThuTu
+            FROM HANGTHANHVIEN h
+            WHERE h.DiemToiThieu <= x.Tichluy
+            ORDER BY h.ThuTu DESC
+        ) moi
+        WHERE ISNULL(kh.Tichluy, -1) <> x.Tichluy
+           OR kh.Bac IS NULL
+           OR moi.ThuTu > ISNULL(cu.ThuTu, 0);
+
+        ENABLE TRIGGER trg_KHACHHANG_DemBac ON KHACHHANG;
+
+        DELETE FROM THANHVIEN_BAC WITH (TABLOCKX);
+        INSERT INTO THANHVIEN_BAC (Bac, SoLuong)
+        SELECT h.Bac, COUNT(kh.MaKH)
+        FROM HANGTHANHVIEN h
+        LEFT JOIN KHACHHANG kh ON ISNULL(kh.Bac, N'Cơ bản') = h.Bac
+        GROUP BY h.Bac;
+
+        COMMIT;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
+
+EXEC dbo.sp_TinhLaiTichLuy;
+GO
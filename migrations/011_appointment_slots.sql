@@ -0,0 +1,144 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Lịch hẹn dịch vụ: sức chứa theo (chi nhánh, dịch vụ)
+   - DICHVU.ThoiLuongPhut: mỗi lượt chiếm bao lâu.
+   - CUNGCAPDICHVU.SoChoCungLuc: số lượt chạy song song tại chi nhánh (bàn khám, phòng spa...).
+   - Phiên chưa huỷ có ThoiDiemBatDau giữ chỗ [ThoiDiemBatDau, + ThoiLuongPhut).
+   - sp_DatLichDichVu từ chối khi khung giờ đã đủ SoChoCungLuc (THROW 50045):
+     seek IX_PHIENDICHVU_Lich trong cửa sổ +- ThoiLuongPhut, giữ range lock tới COMMIT
+     => 2 worker đặt cùng khung giờ không vượt sức chứa.
+   - App giữ bản sao lịch trong process (app/services/scheduler.py) để từ chối sớm
+     và tính giờ trống không cần truy vấn.
+   ========================================================= */
+
+IF COL_LENGTH('DICHVU', 'ThoiLuongPhut') IS NULL
+ALTER TABLE DICHVU ADD ThoiLuongPhut INT NOT NULL
+    CONSTRAINT DF_DICHVU_ThoiLuongPhut DEFAULT 30
+    CONSTRAINT CHK_DICHVU_ThoiLuongPhut CHECK (ThoiLuongPhut > 0);
+GO
+
+IF COL_LENGTH('CUNGCAPDICHVU', 'SoChoCungLuc') IS NULL
+ALTER TABLE CUNGCAPDICHVU ADD SoChoCungLuc INT NOT NULL
+    CONSTRAINT DF_CUNGCAPDICHVU_SoChoCungLuc DEFAULT 1
+    CONSTRAINT CHK_CUNGCAPDICHVU_SoChoCungLuc CHECK (SoChoCungLuc > 0);
+GO
+
+-- Lịch đã đặt của 1 (chi nhánh, dịch vụ) theo giờ bắt đầu: kiểm tra trùng + dựng lịch khi start
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PHIENDICHVU_Lich' AND object_id = OBJECT_ID('PHIENDICHVU'))
+CREATE NONCLUSTERED INDEX IX_PHIENDICHVU_Lich
+ON PHIENDICHVU (MaCN, MaDV, ThoiDiemBatDau)
+INCLUDE (TrangThai);
+GO
+
+/* =========================================================
+   PROCEDURE: Đặt lịch dịch vụ (KH16) - thêm bước 1b kiểm tra sức chứa
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_DatLichDichVu
+    @MaKH            VARCHAR(10),
+    @MaThuCung       VARCHAR(10),
+    @MaDV            VARCHAR(10),
+    @MaCN            VARCHAR(10),
+    @ThoiDiemBatDau  DATETIME,
+    @MaNV            VARCHAR(10) = 'NV_SYSTEM'
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @MaHoaDon VARCHAR(10), @MaPhien VARCHAR(10);
+    DECLARE @TenThuCung NVARCHAR(100), @Gia DECIMAL(18,2);
+    DECLARE @SoCho INT, @ThoiLuong INT;
+    DECLARE @out TABLE (ID VARCHAR(10));
+    DECLARE @Lich TABLE (BatDau DATETIME NOT NULL);
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        -- 1. Chi nhánh có cung cấp dịch vụ, thú cưng thuộc khách, giá dịch vụ
+        SELECT @SoCho = c.SoChoCungLuc, @ThoiLuong = dv.ThoiLuongPhut, @Gia = dv.DonGia
+        FROM CUNGCAPDICHVU c
+        JOIN DICHVU dv ON dv.MaDV = c.MaDV
+        WHERE c.MaDV = @MaDV AND c.MaCN = @MaCN;
+
+        IF @SoCho IS NULL
+            THROW 50042, N'Chi nhánh này không cung cấp dịch vụ đã chọn', 1;
+
+        SELECT @TenThuCung = Ten
+        FROM THUCUNG
+        WHERE MaThuCung = @MaThuCung AND MaKH = @MaKH;
+
+        IF @TenThuCung IS NULL
+            THROW 50043, N'Pet not found', 1;
+
+        IF @Gia IS NULL
+            THROW 50044, N'Service price not found', 1;
+
+        -- 1b. Sức chứa: các lượt bắt đầu trong (t - ThoiLuong, t + ThoiLuong) có thể chồng lên [t, t + ThoiLuong).
+        --     Số lượt đang chạy chỉ tăng tại t hoặc tại giờ bắt đầu của lượt khác trong [t, t + ThoiLuong)
+        --     => đủ xét các mốc đó. UPDLOCK + HOLDLOCK: khoá khoảng khoá trên index tới COMMIT.
+        IF @ThoiDiemBatDau IS NOT NULL
+        BEGIN
+            INSERT INTO @Lich (BatDau)
+            SELECT pd.ThoiDiemBatDau
+            FROM PHIENDICHVU pd WITH (UPDLOCK, HOLDLOCK, INDEX(IX_PHIENDICHVU_Lich))
+            WHERE pd.MaCN = @MaCN
+              AND pd.MaDV = @MaDV
+              AND pd.ThoiDiemBatDau > DATEADD(MINUTE, -@ThoiLuong, @ThoiDiemBatDau)
+              AND pd.ThoiDiemBatDau < DATEADD(MINUTE, @ThoiLuong, @ThoiDiemBatDau)
+              AND pd.TrangThai <> N'CANCELLED';
+
+            IF EXISTS (
+                SELECT 1
+                FROM (
+                    SELECT @ThoiDiemBatDau AS Moc
+                    UNION
+                    SELECT BatDau FROM @Lich WHERE BatDau > @ThoiDiemBatDau
+                ) m
+                WHERE (
+                    SELECT COUNT(*) FROM @Lich l
+                    WHERE l.BatDau > DATEADD(MINUTE, -@ThoiLuong, m.Moc) AND l.BatDau <= m.Moc
+                ) >= @SoCho
+            )
+                THROW 50045, N'Khung giờ này đã kín lịch', 1;
+        END
+
+        -- 2. Tìm / tạo hóa đơn BOOKING
+        SELECT TOP 1 @MaHoaDon = h.MaHoaDon
+        FROM HOADON h WITH (UPDLOCK, HOLDLOCK)
+        WHERE h.MaKH = @MaKH
+          AND h.HinhThucThanhToan IS NULL
+          AND EXISTS (
+              SELECT 1 FROM PHIENDICHVU pd
+              WHERE pd.MaHoaDon = h.MaHoaDon AND pd.TrangThai = N'BOOKING'
+          )
+        ORDER BY h.NgayLap DESC;
+
+        IF @MaHoaDon IS NULL
+        BEGIN
+            INSERT INTO HOADON (MaKH, NgayLap, NhanVienLap, HinhThucThanhToan)
+            OUTPUT INSERTED.MaHoaDon INTO @out
+            VALUES (@MaKH, GETDATE(), @MaNV, NULL);
+
+            SELECT @MaHoaDon = ID FROM @out;
+            DELETE FROM @out;
+        END
+
+        -- 3. Tạo phiên dịch vụ (trg_RecalcHD_All tính lại tổng tiền)
+        INSERT INTO PHIENDICHVU (MaHoaDon, MaThuCung, MaDV, GiaTien, TrangThai, MaCN, ThoiDiemBatDau)
+        OUTPUT INSERTED.MaPhien INTO @out
+        VALUES (@MaHoaDon, @MaThuCung, @MaDV, @Gia, N'BOOKING', @MaCN, @ThoiDiemBatDau);
+
+        SELECT @MaPhien = ID FROM @out;
+
+        COMMIT;
+
+        SELECT @MaHoaDon AS MaHoaDon, @MaPhien AS MaPhien, @TenThuCung AS TenThuCung;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
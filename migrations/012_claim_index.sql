@@ -0,0 +1,17 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Nhận ca khám / tiêm (start_examination, claim-next)
+   - Hàng chờ = phiên IN_SERVICE, thường chỉ vài chục dòng / chi nhánh trong khi
+     PHIENDICHVU có hàng triệu dòng => filtered index chỉ chứa dòng đang chờ:
+     nhỏ, seek (MaCN, MaDV) rồi lấy theo giờ hẹn không cần sort.
+   - Dòng rời index ngay khi UPDATE sang DONE_SERVICE (cùng câu lệnh nhận ca).
+   - Câu dùng index phải ghi literal TrangThai = N'IN_SERVICE' (không tham số hoá).
+   ========================================================= */
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_PHIENDICHVU_ChoKham' AND object_id = OBJECT_ID('PHIENDICHVU'))
+CREATE NONCLUSTERED INDEX IX_PHIENDICHVU_ChoKham
+ON PHIENDICHVU (MaCN, MaDV, ThoiDiemBatDau, MaPhien)
+INCLUDE (MaThuCung)
+WHERE TrangThai = N'IN_SERVICE';
+GO
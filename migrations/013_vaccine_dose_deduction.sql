@@ -0,0 +1,143 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Hoàn tất tiêm: trừ liều trong gói của khách + tồn kho vaccine chi nhánh
+   - Trước đây sp_HoanTatTiemPhong chỉ ghi TIEMPHONG: Solieuconlai / SoLuongTonKho không đổi.
+   - sp_TiemPhongTheoLo nhận mọi mũi của phiên 1 lần (TVP dbo.LieuTiem), trừ theo tập:
+       GOI_KHACHHANG_VACCINE -> CHINHANH_VACCINE -> TIEMPHONG -> PHIENDICHVU
+     Mỗi bảng 1 câu UPDATE có điều kiện đủ số lượng (kiểm tra + trừ cùng lúc, không đọc trước
+     rồi mới khoá) => không có chuyển khoá S -> X; mọi đường ghi kho đi cùng thứ tự bảng,
+     trong 1 bảng duyệt theo khoá (bảng tạm có PRIMARY KEY) => không deadlock chéo.
+   - Thiếu liều trong gói: THROW 63004; thiếu tồn kho chi nhánh: THROW 63006 (API trả 409).
+   - sp_HoanTatTiemPhong (JSON, app gọi) giữ nguyên tham số, chuyển sang gọi sp_TiemPhongTheoLo.
+   ========================================================= */
+
+/* =========================================================
+   1. TYPE: danh sách mũi tiêm của 1 phiên
+   ========================================================= */
+IF TYPE_ID('dbo.LieuTiem') IS NULL
+CREATE TYPE dbo.LieuTiem AS TABLE (
+    MaVC   VARCHAR(10) NOT NULL,
+    MaGoi  VARCHAR(10) NULL,       -- NULL = tiêm lẻ, không trừ gói
+    SoLieu FLOAT NOT NULL CHECK (SoLieu > 0),
+    PRIMARY KEY (MaVC)             -- TIEMPHONG: 1 dòng / (MaPhien, MaVC)
+);
+GO
+
+/* =========================================================
+   2. PROCEDURE: ghi nhận + trừ liều các mũi tiêm của 1 phiên
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_TiemPhongTheoLo
+    @MaPhien  VARCHAR(10),
+    @BacSi    VARCHAR(10),
+    @Lieu     dbo.LieuTiem READONLY
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @MaCN VARCHAR(10), @MaKH VARCHAR(10), @Can INT;
+    -- số lọ cần lấy từ kho chi nhánh / số liều trừ trong gói, đã gộp theo khoá
+    DECLARE @Kho TABLE (MaVC VARCHAR(10) PRIMARY KEY, SoLuong INT NOT NULL);
+    DECLARE @Goi TABLE (MaGoi VARCHAR(10), MaVC VARCHAR(10), SoLieu FLOAT NOT NULL, PRIMARY KEY (MaGoi, MaVC));
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        -- 0. Phiên + chủ thú cưng; khoá dòng phiên => 2 lần gửi cùng phiên chạy lần lượt
+        SELECT @MaCN = pd.MaCN, @MaKH = tc.MaKH
+        FROM PHIENDICHVU pd WITH (UPDLOCK, ROWLOCK)
+        JOIN THUCUNG tc ON tc.MaThuCung = pd.MaThuCung
+        WHERE pd.MaPhien = @MaPhien;
+
+        IF @MaCN IS NULL
+            THROW 63001, N'Không tìm thấy phiên tiêm', 1;
+
+        IF EXISTS (SELECT 1 FROM TIEMPHONG t JOIN @Lieu l ON l.MaVC = t.MaVC WHERE t.MaPhien = @MaPhien)
+            THROW 63002, N'Phiên đã ghi nhận mũi tiêm này', 1;
+
+        INSERT INTO @Kho (MaVC, SoLuong)
+        SELECT MaVC, CAST(CEILING(SoLieu) AS INT) FROM @Lieu;
+
+        INSERT INTO @Goi (MaGoi, MaVC, SoLieu)
+        SELECT MaGoi, MaVC, SoLieu FROM @Lieu WHERE MaGoi IS NOT NULL;
+
+        -- 1. Ví liều của khách: chỉ trừ khi còn đủ
+        SELECT @Can = COUNT(*) FROM @Goi;
+        IF @Can > 0
+        BEGIN
+            UPDATE gkv
+            SET Solieuconlai = gkv.Solieuconlai - g.SoLieu
+            FROM @Goi g
+            JOIN GOI_KHACHHANG_VACCINE gkv WITH (ROWLOCK)
+              ON gkv.MaKH = @MaKH AND gkv.MaGoi = g.MaGoi AND gkv.MaVC = g.MaVC
+            WHERE gkv.Solieuconlai >= g.SoLieu;
+
+            IF @@ROWCOUNT <> @Can
+                THROW 63004, N'Gói của khách không còn đủ liều cho mũi tiêm', 1;
+        END
+
+        -- 2. Kho vaccine chi nhánh
+        SELECT @Can = COUNT(*) FROM @Kho;
+        IF @Can > 0
+        BEGIN
+            UPDATE cv
+            SET SoLuongTonKho = cv.SoLuongTonKho - k.SoLuong
+            FROM @Kho k
+            JOIN CHINHANH_VACCINE cv WITH (ROWLOCK)
+              ON cv.MaCN = @MaCN AND cv.MaVC = k.MaVC
+            WHERE cv.SoLuongTonKho >= k.SoLuong;
+
+            IF @@ROWCOUNT <> @Can
+                THROW 63006, N'Chi nhánh không đủ vaccine trong kho', 1;
+        END
+
+        -- 3. Lịch sử tiêm + kết thúc phiên
+        INSERT INTO TIEMPHONG (MaPhien, MaVC, MaGoi, BacSiPhuTrach, NgayTiem, SoLieu)
+        SELECT @MaPhien, l.MaVC, l.MaGoi, @BacSi, CAST(GETDATE() AS DATE), l.SoLieu
+        FROM @Lieu l;
+
+        UPDATE PHIENDICHVU
+        SET TrangThai = N'DONE_SERVICE',
+            ThoiDiemKetThuc = GETDATE()
+        WHERE MaPhien = @MaPhien;
+
+        COMMIT;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
+
+/* =========================================================
+   3. PROCEDURE: Hoàn tất tiêm phòng (JSON, app gọi) -> sp_TiemPhongTheoLo
+      @DanhSachTiem: [{"ma_vc": "VC001", "ma_goi": null, "so_lieu": 1}, ...]
+      pyodbc qua SQLAlchemy text() không truyền TVP được => app vẫn gửi JSON, 1 round-trip.
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_HoanTatTiemPhong
+    @MaPhien       VARCHAR(10),
+    @BacSi         VARCHAR(10),
+    @DanhSachTiem  NVARCHAR(MAX)
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @Lieu dbo.LieuTiem;
+
+    -- cùng 1 vaccine gửi 2 lần trong danh sách => gộp số liều (TIEMPHONG 1 dòng / vaccine)
+    INSERT INTO @Lieu (MaVC, MaGoi, SoLieu)
+    SELECT j.MaVC, MAX(NULLIF(j.MaGoi, '')), SUM(j.SoLieu)
+    FROM OPENJSON(@DanhSachTiem)
+    WITH (
+        MaVC   VARCHAR(10) '$.ma_vc',
+        MaGoi  VARCHAR(10) '$.ma_goi',
+        SoLieu FLOAT       '$.so_lieu'
+    ) j
+    GROUP BY j.MaVC;
+
+    EXEC dbo.sp_TiemPhongTheoLo @MaPhien = @MaPhien, @BacSi = @BacSi, @Lieu = @Lieu;
+END;
+GO
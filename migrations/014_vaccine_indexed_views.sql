@@ -0,0 +1,76 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Indexed view: tổng tồn kho mỗi vaccine + giá gốc mỗi gói tiêm
+   - vw_TonKhoVaccine: SUM(SoLuongTonKho) theo MaVC trên mọi chi nhánh. SQL Server tự giữ
+     đúng trong cùng câu UPDATE / INSERT / DELETE CHINHANH_VACCINE (kể cả khi tắt trigger,
+     nạp bcp / bulk) => không cần bảng tổng hợp + trigger + sp dựng lại.
+   - vw_GiaGoiGoc: SUM(SoLieu * DonGia) theo MaGoi. Indexed view không cho LEFT JOIN / MAX
+     => KhuyenMai áp ở view thường vw_GiaGoi (1 seek GOITIEMPHONG + 1 seek view), cùng
+     công thức fn_GiaGoiTiemPhong (gói chưa có vaccine: 0 thay vì NULL).
+   - Đọc bằng WITH (NOEXPAND): mọi edition đều dùng index của view, không mở ra bảng gốc.
+   - SCHEMABINDING: muốn sửa cột SoLuongTonKho / SoLieu / DonGia phải DROP view trước.
+   - Phiên ghi vào CHINHANH_VACCINE / GOITIEMPHONG_VACCINE / VACCINE cần ANSI_NULLS,
+     QUOTED_IDENTIFIER... ON (mặc định của ODBC; bcp cần -q, xem scripts/datagen/output.py).
+   ========================================================= */
+SET ANSI_NULLS ON;
+SET QUOTED_IDENTIFIER ON;
+SET ANSI_PADDING ON;
+SET ANSI_WARNINGS ON;
+SET ARITHABORT ON;
+SET CONCAT_NULL_YIELDS_NULL ON;
+SET NUMERIC_ROUNDABORT OFF;
+GO
+
+/* =========================================================
+   1. VIEW: tổng tồn kho theo vaccine
+   ========================================================= */
+IF OBJECT_ID('dbo.vw_TonKhoVaccine', 'V') IS NULL
+EXEC('
+CREATE VIEW dbo.vw_TonKhoVaccine
+WITH SCHEMABINDING
+AS
+SELECT cv.MaVC,
+       SUM(ISNULL(cv.SoLuongTonKho, 0)) AS TongTonKho,  -- indexed view: SUM không nhận cột NULL được
+       COUNT_BIG(*) AS SoChiNhanh
+FROM dbo.CHINHANH_VACCINE cv
+GROUP BY cv.MaVC;
+');
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_vw_TonKhoVaccine' AND object_id = OBJECT_ID('dbo.vw_TonKhoVaccine'))
+CREATE UNIQUE CLUSTERED INDEX UX_vw_TonKhoVaccine ON dbo.vw_TonKhoVaccine (MaVC);
+GO
+
+/* =========================================================
+   2. VIEW: giá gốc (chưa khuyến mãi) theo gói
+   ========================================================= */
+IF OBJECT_ID('dbo.vw_GiaGoiGoc', 'V') IS NULL
+EXEC('
+CREATE VIEW dbo.vw_GiaGoiGoc
+WITH SCHEMABINDING
+AS
+SELECT gv.MaGoi,
+       SUM(ISNULL(gv.SoLieu, 0) * ISNULL(vc.DonGia, 0)) AS TongGoc,
+       COUNT_BIG(*) AS SoVaccine
+FROM dbo.GOITIEMPHONG_VACCINE gv
+JOIN dbo.VACCINE vc ON vc.MaVC = gv.MaVC
+GROUP BY gv.MaGoi;
+');
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_vw_GiaGoiGoc' AND object_id = OBJECT_ID('dbo.vw_GiaGoiGoc'))
+CREATE UNIQUE CLUSTERED INDEX UX_vw_GiaGoiGoc ON dbo.vw_GiaGoiGoc (MaGoi);
+GO
+
+/* =========================================================
+   3. VIEW (thường): giá gói sau khuyến mãi, thay dbo.fn_GiaGoiTiemPhong(MaGoi) trong API
+   ========================================================= */
+CREATE OR ALTER VIEW dbo.vw_GiaGoi
+AS
+SELECT g.MaGoi,
+       CAST(ISNULL(gg.TongGoc, 0) * (1 - ISNULL(g.KhuyenMai, 0) / 100.0) AS DECIMAL(18,2)) AS Gia
+FROM dbo.GOITIEMPHONG g
+LEFT JOIN dbo.vw_GiaGoiGoc gg WITH (NOEXPAND) ON gg.MaGoi = g.MaGoi;
+GO
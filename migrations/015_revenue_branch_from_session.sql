@@ -0,0 +1,222 @@
+USE PetCareX;
+GO
+
+/* =========================================================
+   Chi nhánh ghi nhận doanh thu lấy theo nơi làm dịch vụ
+   - 004 lấy NHANVIEN.MaCN của NhanVienLap: đặt online luôn lập bằng NV_SYSTEM (CN001)
+     => mọi hóa đơn tự phục vụ bị tính cho CN001 (CT1, CT7, doanh thu chi nhánh, NV3).
+   - Nay: chi nhánh của các phiên trong hóa đơn (PHIENDICHVU.MaCN, nhiều chi nhánh thì lấy
+     chi nhánh có nhiều phiên nhất); hóa đơn không có phiên mới lấy chi nhánh của nhân viên
+     lập (theo LICHSUDIEUDONG tại NgayLap, không có thì chi nhánh hiện tại).
+   - Cùng 1 hàm cho trigger và sp_BackfillDoanhThuChiNhanh.
+   - Chốt lại các hóa đơn đã thanh toán có phiên rồi dựng lại toàn bộ bảng tổng hợp.
+   ========================================================= */
+
+/* =========================================================
+   1. FUNCTION (inline): chi nhánh ghi nhận của 1 hóa đơn
+   ========================================================= */
+CREATE OR ALTER FUNCTION dbo.fn_ChiNhanhGhiNhan(
+    @MaHoaDon    VARCHAR(10),
+    @NhanVienLap VARCHAR(10),
+    @NgayLap     DATETIME
+)
+RETURNS TABLE
+AS
+RETURN
+    SELECT COALESCE(
+        (   -- seek IX_PHIENDICHVU_MaHoaDon (INCLUDE MaCN)
+            SELECT TOP 1 pd.MaCN
+            FROM PHIENDICHVU pd
+            WHERE pd.MaHoaDon = @MaHoaDon AND pd.MaCN IS NOT NULL
+            GROUP BY pd.MaCN
+            ORDER BY COUNT(*) DESC, pd.MaCN
+        ),
+        (
+            SELECT TOP 1 l.MaCN
+            FROM LICHSUDIEUDONG l
+            WHERE l.MaNV = @NhanVienLap
+              AND @NgayLap >= l.NgayBD AND @NgayLap < l.NgayKT
+            ORDER BY l.NgayBD DESC
+        ),
+        (SELECT nv.MaCN FROM NHANVIEN nv WHERE nv.MaNV = @NhanVienLap)
+    ) AS MaCN;
+GO
+
+/* =========================================================
+   2. TRIGGER: cập nhật tổng hợp theo delta (như 004, đổi cách chọn chi nhánh)
+      - inserted không thấy MaCNGhiNhan vừa chốt trong trigger => delta dùng cùng
+        giá trị đã chốt (@Chot) để khớp các lần cập nhật sau
+   ========================================================= */
+CREATE OR ALTER TRIGGER trg_HOADON_DoanhThu
+ON HOADON
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @Chot TABLE (MaHoaDon VARCHAR(10) PRIMARY KEY, MaCN VARCHAR(10) NOT NULL);
+
+    -- Chốt chi nhánh ghi nhận cho hóa đơn vừa thanh toán
+    -- (RECURSIVE_TRIGGERS OFF nên UPDATE này không gọi lại trigger)
+    INSERT INTO @Chot (MaHoaDon, MaCN)
+    SELECT i.MaHoaDon, c.MaCN
+    FROM inserted i
+    CROSS APPLY dbo.fn_ChiNhanhGhiNhan(i.MaHoaDon, i.NhanVienLap, i.NgayLap) c
+    WHERE i.HinhThucThanhToan IS NOT NULL
+      AND i.MaCNGhiNhan IS NULL
+      AND c.MaCN IS NOT NULL;
+
+    UPDATE h
+    SET MaCNGhiNhan = c.MaCN
+    FROM HOADON h
+    JOIN @Chot c ON c.MaHoaDon = h.MaHoaDon
+    WHERE h.MaCNGhiNhan IS NULL;
+
+    ;WITH Delta AS (
+        SELECT COALESCE(i.MaCNGhiNhan, c.MaCN) AS MaCN,
+               CAST(i.NgayLap AS DATE) AS Ngay,
+               ISNULL(i.TongTien, 0) AS DoanhThu,
+               1 AS SoHoaDon
+        FROM inserted i
+        LEFT JOIN @Chot c ON c.MaHoaDon = i.MaHoaDon
+        WHERE i.HinhThucThanhToan IS NOT NULL
+
+        UNION ALL
+
+        -- hóa đơn cũ đã thanh toán nhưng chưa chốt (trước 004): tính lại như lúc cộng vào
+        SELECT COALESCE(d.MaCNGhiNhan, c.MaCN),
+               CAST(d.NgayLap AS DATE),
+               -ISNULL(d.TongTien, 0),
+               -1
+        FROM deleted d
+        OUTER APPLY (
+            SELECT f.MaCN
+            FROM dbo.fn_ChiNhanhGhiNhan(d.MaHoaDon, d.NhanVienLap, d.NgayLap) f
+            WHERE d.MaCNGhiNhan IS NULL   -- đã chốt (thường gặp): không tra PHIENDICHVU
+        ) c
+        WHERE d.HinhThucThanhToan IS NOT NULL
+    ),
+    G AS (
+        SELECT MaCN, Ngay, SUM(DoanhThu) AS DoanhThu, SUM(SoHoaDon) AS SoHoaDon
+        FROM Delta
+        WHERE MaCN IS NOT NULL AND Ngay IS NOT NULL
+        GROUP BY MaCN, Ngay
+        HAVING SUM(DoanhThu) <> 0 OR SUM(SoHoaDon) <> 0
+    )
+    MERGE DOANHTHU_CHINHANH_NGAY WITH (HOLDLOCK) AS t
+    USING G AS s
+    ON (t.MaCN = s.MaCN AND t.Ngay = s.Ngay)
+    WHEN MATCHED THEN UPDATE SET
+        DoanhThu = t.DoanhThu + s.DoanhThu,
+        SoHoaDon = t.SoHoaDon + s.SoHoaDon
+    WHEN NOT MATCHED THEN
+        INSERT (MaCN, Ngay, DoanhThu, SoHoaDon)
+        VALUES (s.MaCN, s.Ngay, s.DoanhThu, s.SoHoaDon);
+
+    INSERT INTO KHACHHANG_CHINHANH (MaCN, MaKH, NgayDauTien)
+    SELECT x.MaCN, x.MaKH, MIN(x.Ngay)
+    FROM (
+        SELECT COALESCE(i.MaCNGhiNhan, c.MaCN) AS MaCN, i.MaKH, CAST(i.NgayLap AS DATE) AS Ngay
+        FROM inserted i
+        LEFT JOIN @Chot c ON c.MaHoaDon = i.MaHoaDon
+        WHERE i.HinhThucThanhToan IS NOT NULL AND i.MaKH IS NOT NULL
+    ) x
+    WHERE x.MaCN IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM KHACHHANG_CHINHANH k WITH (UPDLOCK, HOLDLOCK)
+          WHERE k.MaCN = x.MaCN AND k.MaKH = x.MaKH
+      )
+    GROUP BY x.MaCN, x.MaKH;
+END;
+GO
+
+/* =========================================================
+   3. PROCEDURE: Backfill / dựng lại bảng tổng hợp (như 004, chốt chi nhánh bằng
+      dbo.fn_ChiNhanhGhiNhan cho hóa đơn cũ chưa chốt)
+   ========================================================= */
+CREATE OR ALTER PROCEDURE dbo.sp_BackfillDoanhThuChiNhanh
+    @TuNgay  DATE = NULL,
+    @DenNgay DATE = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRY
+        BEGIN TRAN;
+
+        UPDATE h
+        SET MaCNGhiNhan = c.MaCN
+        FROM HOADON h
+        CROSS APPLY dbo.fn_ChiNhanhGhiNhan(h.MaHoaDon, h.NhanVienLap, h.NgayLap) c
+        WHERE h.HinhThucThanhToan IS NOT NULL
+          AND h.MaCNGhiNhan IS NULL
+          AND c.MaCN IS NOT NULL
+          AND (@TuNgay IS NULL OR h.NgayLap >= @TuNgay)
+          AND (@DenNgay IS NULL OR h.NgayLap < DATEADD(DAY, 1, @DenNgay));
+
+        DELETE FROM DOANHTHU_CHINHANH_NGAY WITH (TABLOCKX)
+        WHERE (@TuNgay IS NULL OR Ngay >= @TuNgay)
+          AND (@DenNgay IS NULL OR Ngay <= @DenNgay);
+
+        INSERT INTO DOANHTHU_CHINHANH_NGAY (MaCN, Ngay, DoanhThu, SoHoaDon)
+        SELECT h.MaCNGhiNhan, CAST(h.NgayLap AS DATE), SUM(ISNULL(h.TongTien, 0)), COUNT(*)
+        FROM HOADON h
+        WHERE h.HinhThucThanhToan IS NOT NULL
+          AND h.MaCNGhiNhan IS NOT NULL
+          AND h.NgayLap IS NOT NULL
+          AND (@TuNgay IS NULL OR h.NgayLap >= @TuNgay)
+          AND (@DenNgay IS NULL OR h.NgayLap < DATEADD(DAY, 1, @DenNgay))
+        GROUP BY h.MaCNGhiNhan, CAST(h.NgayLap AS DATE);
+
+        IF @TuNgay IS NULL AND @DenNgay IS NULL
+            DELETE FROM KHACHHANG_CHINHANH WITH (TABLOCKX);
+
+        INSERT INTO KHACHHANG_CHINHANH (MaCN, MaKH, NgayDauTien)
+        SELECT h.MaCNGhiNhan, h.MaKH, MIN(CAST(h.NgayLap AS DATE))
+        FROM HOADON h
+        WHERE h.HinhThucThanhToan IS NOT NULL
+          AND h.MaCNGhiNhan IS NOT NULL
+          AND h.MaKH IS NOT NULL
+          AND h.NgayLap IS NOT NULL
+          AND (@TuNgay IS NULL OR h.NgayLap >= @TuNgay)
+          AND (@DenNgay IS NULL OR h.NgayLap < DATEADD(DAY, 1, @DenNgay))
+          AND NOT EXISTS (
+              SELECT 1 FROM KHACHHANG_CHINHANH k
+              WHERE k.MaCN = h.MaCNGhiNhan AND k.MaKH = h.MaKH
+          )
+        GROUP BY h.MaCNGhiNhan, h.MaKH;
+
+        COMMIT;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0 ROLLBACK;
+        THROW;
+    END CATCH
+END;
+GO
+
+/* =========================================================
+   4. Chốt lại hóa đơn đã thanh toán có phiên (trước đây tính theo nhân viên lập),
+      rồi dựng lại toàn bộ DOANHTHU_CHINHANH_NGAY / KHACHHANG_CHINHANH
+      - Hóa đơn không có phiên giữ nguyên chi nhánh đã chốt lúc thanh toán
+      - Trigger tắt trong lúc sửa hàng loạt, bảng tổng hợp dựng lại 1 lần ở cuối
+   ========================================================= */
+DISABLE TRIGGER trg_HOADON_DoanhThu ON HOADON;
+GO
+
+UPDATE h
+SET MaCNGhiNhan = c.MaCN
+FROM HOADON h
+CROSS APPLY dbo.fn_ChiNhanhGhiNhan(h.MaHoaDon, h.NhanVienLap, h.NgayLap) c
+WHERE h.HinhThucThanhToan IS NOT NULL
+  AND c.MaCN IS NOT NULL
+  AND (h.MaCNGhiNhan IS NULL OR h.MaCNGhiNhan <> c.MaCN)
+  AND EXISTS (SELECT 1 FROM PHIENDICHVU pd WHERE pd.MaHoaDon = h.MaHoaDon AND pd.MaCN IS NOT NULL);
+GO
+
+ENABLE TRIGGER trg_HOADON_DoanhThu ON HOADON;
+GO
+
+EXEC dbo.sp_BackfillDoanhThuChiNhanh;
+GO
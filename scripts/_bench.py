@@ -0,0 +1,71 @@
+# scripts/_bench.py
+# Tiện ích chung cho các script benchmark trong scripts/
+from __future__ import annotations
+
+import json
+import math
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+
+def percentile(samples: Sequence[float], p: float) -> float:
+    """Percentile kiểu nearest-rank."""
+    if not samples:
+        return 0.0
+    data = sorted(samples)
+    k = max(0, min(len(data) - 1, math.ceil(p / 100.0 * len(data)) - 1))
+    return data[k]
+
+
+def summarize(samples_ms: Sequence[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"n": 0}
+    return {
+        "n": len(samples_ms),
+        "min_ms": round(min(samples_ms), 3),
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+        "max_ms": round(max(samples_ms), 3),
+    }
+
+
+def measure(fn: Callable[[], Any], repeat: int = 20, warmup: int = 2) -> Dict[str, float]:
+    """Gọi fn() `repeat` lần (sau `warmup` lần chạy nóng), trả về thống kê độ trễ (ms)."""
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def print_table(results: Dict[str, Dict[str, float]]) -> None:
+    cols = ["n", "min_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    width = max([len(k) for k in results] + [10])
+    print(f"{'case':<{width}}  " + "  ".join(f"{c:>9}" for c in cols))
+    for name, stats in results.items():
+        print(f"{name:<{width}}  " + "  ".join(f"{stats.get(c, ''):>9}" for c in cols))
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def write_json(path: str | Path, payload: Dict[str, Any]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"git": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), **payload}
+    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    print("Wrote", path)
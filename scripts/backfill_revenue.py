@@ -0,0 +1,32 @@
+import argparse
+import asyncio
+
+from sqlalchemy import text
+from app.core.cache import report_cache
+from app.db.session import ENGINE
+
+
+def backfill(from_date: str | None = None, to_date: str | None = None):
+    # Dựng lại DOANHTHU_CHINHANH_NGAY / KHACHHANG_CHINHANH từ HOADON (xem 004_revenue_rollup.sql)
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("EXEC dbo.sp_BackfillDoanhThuChiNhanh @TuNgay=:f, @DenNgay=:t"),
+            {"f": from_date, "t": to_date},
+        )
+
+    # báo cáo CT/CN đang cache (backend redis) đọc lại số liệu mới
+    async def bump():
+        for ns in ("company", "branch"):
+            await report_cache.bump(ns)
+
+    asyncio.run(bump())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill bảng tổng hợp doanh thu chi nhánh")
+    parser.add_argument("--from", dest="from_date", help="YYYY-MM-DD (bỏ trống = dựng lại toàn bộ)")
+    parser.add_argument("--to", dest="to_date", help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    backfill(args.from_date, args.to_date)
+    print("Backfilled revenue rollup:", args.from_date or "*", "->", args.to_date or "*")
@@ -0,0 +1,184 @@
+# scripts/bench_cart.py
+"""
+Độ trễ thêm vào giỏ (KH4) / đặt lịch (KH16): chuỗi câu lệnh từ Python
+(trước 008_cart_procedures.sql) so với 1 lần gọi sp_ThemSanPhamVaoGio / sp_DatLichDichVu.
+
+    python -m scripts.bench_cart --workers 8 --ops 200 --json bench/cart.json
+
+Mỗi worker dùng 1 khách hàng riêng; mỗi thao tác chạy trong transaction rồi ROLLBACK
+nên không để lại hóa đơn. Báo cáo p50/p95/p99 và số round-trip mỗi thao tác.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.db.session import ENGINE
+from app.services import customer_service
+from scripts._bench import print_table, summarize, write_json
+
+
+# ---- Cách cũ: chuỗi câu lệnh find-or-create từ Python ----
+def legacy_add_product(db: Session, ma_kh, ma_sp, so_luong, ma_cn, ma_nv="NV_SYSTEM"):
+    db.execute(text("SELECT TenSP FROM SANPHAM WHERE MaSP = :sp"), {"sp": ma_sp}).fetchone()
+    db.execute(text("""
+        SELECT SoLuongTonKho FROM CHINHANH_SANPHAM WHERE MaSP = :sp AND MaCN = :cn
+    """), {"sp": ma_sp, "cn": ma_cn}).scalar()
+    ma_hd = db.execute(text("""
+        SELECT TOP 1 h.MaHoaDon
+        FROM HOADON h
+        JOIN PHIENDICHVU pd ON h.MaHoaDon = pd.MaHoaDon
+        WHERE h.MaKH = :kh AND pd.TrangThai = N'BOOKING'
+        ORDER BY h.NgayLap DESC
+    """), {"kh": ma_kh}).scalar()
+    if not ma_hd:
+        ma_hd = db.execute(text("""
+            SET NOCOUNT ON;
+            DECLARE @out TABLE (ID VARCHAR(10));
+            INSERT INTO HOADON (MaKH, NhanVienLap, HinhThucThanhToan)
+            OUTPUT INSERTED.MaHoaDon INTO @out
+            VALUES (:kh, :nv, NULL);
+            SELECT ID FROM @out;
+        """), {"kh": ma_kh, "nv": ma_nv}).scalar()
+    ma_phien = db.execute(text("""
+        SELECT MaPhien FROM PHIENDICHVU
+        WHERE MaHoaDon = :hd AND MaDV = 'DV_RETAIL' AND MaCN = :cn
+    """), {"hd": ma_hd, "cn": ma_cn}).scalar()
+    if not ma_phien:
+        ma_phien = db.execute(text("""
+            SET NOCOUNT ON;
+            DECLARE @out TABLE (ID VARCHAR(10));
+            INSERT INTO PHIENDICHVU (MaHoaDon, MaDV, GiaTien, TrangThai, MaCN, MaThuCung)
+            OUTPUT INSERTED.MaPhien INTO @out
+            VALUES (:hd, 'DV_RETAIL', 0, N'BOOKING', :cn, NULL);
+            SELECT ID FROM @out;
+        """), {"hd": ma_hd, "cn": ma_cn}).scalar()
+    db.execute(text("""
+        IF EXISTS (SELECT 1 FROM MUAHANG WHERE MaPhien = :mp AND MaSP = :sp)
+            UPDATE MUAHANG SET SoLuong = SoLuong + :sl WHERE MaPhien = :mp AND MaSP = :sp
+        ELSE
+            INSERT INTO MUAHANG (MaPhien, MaSP, SoLuong) VALUES (:mp, :sp, :sl)
+    """), {"mp": ma_phien, "sp": ma_sp, "sl": so_luong})
+    db.execute(text("""
+        UPDATE h SET TongTien = t.TongTien
+        FROM HOADON h CROSS APPLY dbo.fn_TongTienHoaDon(h.MaHoaDon) t
+        WHERE h.MaHoaDon = :hd
+    """), {"hd": ma_hd})
+    db.commit()
+
+
+def legacy_create_booking(db: Session, ma_kh, ma_thu_cung, ma_dv, ma_cn, start, ma_nv="NV_SYSTEM"):
+    db.execute(text("SELECT 1 FROM CUNGCAPDICHVU WHERE MaDV = :dv AND MaCN = :cn"),
+               {"dv": ma_dv, "cn": ma_cn}).first()
+    db.execute(text("SELECT Ten FROM THUCUNG WHERE MaThuCung = :tc AND MaKH = :kh"),
+               {"tc": ma_thu_cung, "kh": ma_kh}).fetchone()
+    gia = db.execute(text("SELECT DonGia FROM DICHVU WHERE MaDV = :dv"), {"dv": ma_dv}).scalar()
+    ma_hd = db.execute(text("""
+        SELECT TOP 1 h.MaHoaDon
+        FROM HOADON h
+        JOIN PHIENDICHVU pd ON h.MaHoaDon = pd.MaHoaDon
+        WHERE h.MaKH = :kh AND pd.TrangThai = N'BOOKING'
+        ORDER BY h.NgayLap DESC
+    """), {"kh": ma_kh}).scalar()
+    if not ma_hd:
+        ma_hd = db.execute(text("""
+            SET NOCOUNT ON;
+            DECLARE @out TABLE (ID VARCHAR(10));
+            INSERT INTO HOADON (MaKH, NgayLap, NhanVienLap, HinhThucThanhToan)
+            OUTPUT INSERTED.MaHoaDon INTO @out
+            VALUES (:kh, GETDATE(), :nv, NULL);
+            SELECT ID FROM @out;
+        """), {"kh": ma_kh, "nv": ma_nv}).scalar()
+    db.execute(text("""
+        SET NOCOUNT ON;
+        DECLARE @out TABLE (MaPhien VARCHAR(10));
+        INSERT INTO PHIENDICHVU (MaHoaDon, MaThuCung, MaDV, GiaTien, TrangThai, MaCN, ThoiDiemBatDau)
+        OUTPUT INSERTED.MaPhien INTO @out
+        VALUES (:hd, :tc, :dv, :gia, N'BOOKING', :cn, :start);
+        SELECT MaPhien FROM @out;
+    """), {"hd": ma_hd, "tc": ma_thu_cung, "dv": ma_dv, "gia": gia, "cn": ma_cn, "start": start}).scalar()
+    db.execute(text("""
+        UPDATE h SET TongTien = t.TongTien
+        FROM HOADON h CROSS APPLY dbo.fn_TongTienHoaDon(h.MaHoaDon) t
+        WHERE h.MaHoaDon = :hd
+    """), {"hd": ma_hd})
+    db.commit()
+
+
+def call_in_rollback(fn, args):
+    """Chạy fn(db, *args) trong transaction ngoài rồi ROLLBACK; trả (ms, round-trips)."""
+    count = [0]
+
+    def on_execute(*_):
+        count[0] += 1
+
+    with ENGINE.connect() as conn:
+        tx = conn.begin()
+        try:
+            event.listen(conn, "before_cursor_execute", on_execute)
+            db = Session(bind=conn, join_transaction_mode="create_savepoint")
+            start = time.perf_counter()
+            fn(db, *args)
+            elapsed = (time.perf_counter() - start) * 1000
+            db.close()
+        finally:
+            tx.rollback()
+    return elapsed, count[0]
+
+
+def load(fn, args_per_worker, ops: int):
+    def worker(args):
+        call_in_rollback(fn, args)  # làm nóng
+        return [call_in_rollback(fn, args) for _ in range(ops)]
+
+    with ThreadPoolExecutor(max_workers=len(args_per_worker)) as pool:
+        parts = list(pool.map(worker, args_per_worker))
+    samples = [ms for part in parts for ms, _ in part]
+    stats = summarize(samples)
+    stats["round_trips"] = max(n for part in parts for _, n in part)
+    return stats
+
+
+def run(workers: int, ops: int):
+    with ENGINE.connect() as conn:
+        ma_cn, ma_sp = conn.execute(text("""
+            SELECT TOP 1 MaCN, MaSP FROM CHINHANH_SANPHAM
+            WHERE SoLuongTonKho >= 100 ORDER BY SoLuongTonKho DESC
+        """)).one()
+        ma_dv = conn.execute(text(
+            "SELECT TOP 1 MaDV FROM CUNGCAPDICHVU WHERE MaCN = :cn AND MaDV <> 'DV_RETAIL' ORDER BY MaDV"
+        ), {"cn": ma_cn}).scalar()
+        pets = conn.execute(text("""
+            SELECT TOP (:n) MaKH, MIN(MaThuCung) AS MaThuCung
+            FROM THUCUNG GROUP BY MaKH ORDER BY MaKH
+        """), {"n": workers}).all()
+
+    start = "2030-01-01T09:00:00"
+    product_args = [(p.MaKH, ma_sp, 1, ma_cn) for p in pets]
+    booking_args = [(p.MaKH, p.MaThuCung, ma_dv, ma_cn, start) for p in pets]
+
+    results = {
+        "kh4_add_product/legacy": load(legacy_add_product, product_args, ops),
+        "kh4_add_product/sp": load(customer_service.kh4_booking_product, product_args, ops),
+        "kh16_booking/legacy": load(legacy_create_booking, booking_args, ops),
+        "kh16_booking/sp": load(customer_service.kh16_create_booking, booking_args, ops),
+    }
+
+    print_table(results)
+    for name, stats in results.items():
+        print(f"{name}: {stats['round_trips']} round-trips")
+    return {"workers": len(pets), "ops": ops, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark thêm vào giỏ / đặt lịch")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=100, help="số thao tác mỗi worker")
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    report = run(args.workers, args.ops)
+    if args.json:
+        write_json(args.json, {"benchmark": "cart", **report})
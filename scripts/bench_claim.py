@@ -0,0 +1,196 @@
+# scripts/bench_claim.py
+"""
+Stress nhận ca khám song song: chứng minh không có 2 bác sĩ nhận cùng 1 phiên.
+
+    python -m scripts.bench_claim --sessions 2000 --threads 15 --json bench/claim.json
+    DB_POOL_SIZE=64 DB_MAX_OVERFLOW=0 python -m scripts.bench_claim --threads 64
+
+Mỗi case tạo chi nhánh tổng hợp 'CN_BQ' + 1 hóa đơn chưa thanh toán + N phiên IN_SERVICE
+(mã 'BQ000001'...), chạy xong thì xoá. Không đụng hàng chờ của chi nhánh thật.
+
+Các case (mỗi thread 1 Session riêng, số thread <= DB_POOL_SIZE + DB_MAX_OVERFLOW):
+  - claim_next: mọi thread gọi claim_next_examination tới khi hết ca (404)
+  - start:      mọi thread cùng gọi start_examination trên cùng danh sách phiên (xáo trộn)
+  - legacy:     như start nhưng với SELECT rồi UPDATE (code trước 012_claim_index.sql)
+Mỗi phiên phải được nhận đúng 1 lần; claim_next / start có phiên nhận 2 lần => exit 1.
+legacy thường nhận trùng khi đủ song song (không đảm bảo lần nào cũng lộ ra).
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import ENGINE, SessionLocal
+from app.services import staff_service
+from scripts._bench import print_table, summarize, write_json
+
+MA_CN = "CN_BQ"
+MA_DV = "DV001"
+MA_HD = "BQ000000"
+
+SETUP = """
+SET NOCOUNT ON;
+INSERT INTO CHINHANH (MaCN, TenCN) VALUES (:cn, N'Benchmark nhận ca');
+INSERT INTO CUNGCAPDICHVU (MaCN, MaDV) VALUES (:cn, :dv);
+
+INSERT INTO HOADON (MaHoaDon, NgayLap, NhanVienLap, MaKH, TongTien, KhuyenMai, HinhThucThanhToan)
+SELECT TOP 1 :hd, GETDATE(), 'NV_SYSTEM', tc.MaKH, 0, 0, NULL
+FROM THUCUNG tc ORDER BY tc.MaThuCung;
+
+-- giờ hẹn trải đều theo phút => claim_next lấy theo thứ tự hẹn
+INSERT INTO PHIENDICHVU (MaPhien, MaHoaDon, MaThuCung, MaDV, MaCN, GiaTien, TrangThai, ThoiDiemBatDau)
+SELECT 'BQ' + RIGHT('000000' + CAST(n.i AS VARCHAR(6)), 6), :hd, tc.MaThuCung, :dv, :cn,
+       0, N'IN_SERVICE', DATEADD(MINUTE, n.i, CAST(CAST(GETDATE() AS DATE) AS DATETIME))
+FROM (SELECT TOP (:n) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+      FROM sys.all_objects a CROSS JOIN sys.all_objects b) n
+CROSS JOIN (SELECT TOP 1 MaThuCung FROM THUCUNG ORDER BY MaThuCung) tc;
+"""
+
+CLEANUP = """
+SET NOCOUNT ON;
+DELETE FROM PHIENDICHVU WHERE MaHoaDon = :hd;
+DELETE FROM HOADON WHERE MaHoaDon = :hd;
+DELETE FROM CUNGCAPDICHVU WHERE MaCN = :cn;
+DELETE FROM CHINHANH WHERE MaCN = :cn;
+"""
+
+
+# ---- Cách cũ: SELECT trạng thái rồi UPDATE (2 round-trip, không khoá giữa 2 câu) ----
+def legacy_start_examination(db: Session, ma_phien: str):
+    phien = db.execute(text("SELECT TrangThai FROM PHIENDICHVU WHERE MaPhien = :mp"), {"mp": ma_phien}).fetchone()
+    if not phien:
+        raise HTTPException(status_code=404, detail="Không tìm thấy phiên")
+    if phien.TrangThai != 'IN_SERVICE':
+        raise HTTPException(status_code=400, detail="Ca này đã có bác sĩ khác nhận hoặc đã hoàn thành")
+    db.execute(text("""
+        UPDATE PHIENDICHVU
+        SET TrangThai = N'DONE_SERVICE',
+            ThoiDiemBatDau = GETDATE()
+        WHERE MaPhien = :mp
+    """), {"mp": ma_phien})
+    db.commit()
+    return {"ok": True}
+
+
+def seed(n: int) -> list:
+    with ENGINE.begin() as conn:
+        conn.execute(text(CLEANUP), {"hd": MA_HD, "cn": MA_CN})
+        conn.execute(text(SETUP), {"hd": MA_HD, "cn": MA_CN, "dv": MA_DV, "n": n})
+        return conn.execute(text("SELECT MaPhien FROM PHIENDICHVU WHERE MaHoaDon = :hd"), {"hd": MA_HD}).scalars().all()
+
+
+def cleanup() -> None:
+    with ENGINE.begin() as conn:
+        conn.execute(text(CLEANUP), {"hd": MA_HD, "cn": MA_CN})
+
+
+def run_threads(threads: int, work) -> tuple:
+    """work(db, claimed: list, samples: list) chạy trên mỗi thread; trả (claimed, samples, giây, lỗi)."""
+    claimed, samples, errors = [], [], []
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        mine, times = [], []
+        try:
+            with SessionLocal() as db:
+                barrier.wait()
+                work(db, mine, times)
+        except Exception as e:  # lỗi ngoài dự kiến (deadlock, pool timeout...) vẫn báo
+            errors.append(repr(e))
+        claimed.extend(mine)
+        samples.extend(times)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return claimed, samples, time.perf_counter() - start, errors
+
+
+def claim_next_work(db, mine, times):
+    while True:
+        start = time.perf_counter()
+        try:
+            res = staff_service.claim_next_examination(db, MA_CN, MA_DV)
+        except HTTPException as e:
+            if e.status_code == 404:
+                return
+            raise
+        times.append((time.perf_counter() - start) * 1000)
+        mine.append(res["item"]["MaPhien"])
+
+
+def start_work(fn, ids):
+    def work(db, mine, times):
+        order = ids[:]
+        random.shuffle(order)
+        for ma_phien in order:
+            start = time.perf_counter()
+            try:
+                fn(db, ma_phien)
+                mine.append(ma_phien)
+            except HTTPException:
+                db.rollback()
+            times.append((time.perf_counter() - start) * 1000)
+    return work
+
+
+def run_case(sessions: int, threads: int, make_work):
+    ids = seed(sessions)
+    try:
+        claimed, samples, seconds, errors = run_threads(threads, make_work(ids))
+    finally:
+        cleanup()
+    counts = Counter(claimed)
+    stats = summarize(samples)
+    stats.update({
+        "sessions": len(ids),
+        "claimed": len(claimed),
+        "distinct": len(counts),
+        "double_claims": sum(1 for c in counts.values() if c > 1),
+        "missed": len(set(ids) - set(counts)),
+        "claims_per_s": round(len(claimed) / seconds, 1) if seconds else None,
+        "errors": errors[:5],
+    })
+    return stats
+
+
+def run(sessions: int, threads: int, cases: list):
+    makers = {
+        "claim_next": lambda ids: claim_next_work,
+        "start": lambda ids: start_work(staff_service.start_examination, ids),
+        "legacy": lambda ids: start_work(legacy_start_examination, ids),
+    }
+    results = {f"{c}/{threads}t": run_case(sessions, threads, makers[c]) for c in cases}
+    print_table(results)
+    failed = False
+    for name, s in results.items():
+        print(f"{name}: {s['claimed']}/{s['sessions']} claimed, {s['double_claims']} double, "
+              f"{s['missed']} missed, {s['claims_per_s']} claims/s", *(["errors:", s["errors"]] if s["errors"] else []))
+        if not name.startswith("legacy") and (s["double_claims"] or s["missed"] or s["errors"]):
+            failed = True
+    return {"sessions": sessions, "threads": threads, "results": results}, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress nhận ca khám song song (không nhận trùng)")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+    parser.add_argument("--case", action="append", choices=["claim_next", "start", "legacy"],
+                        help="mặc định: cả 3")
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    report, failed = run(args.sessions, args.threads, args.case or ["claim_next", "start", "legacy"])
+    if args.json:
+        write_json(args.json, {"benchmark": "claim", **report})
+    sys.exit(1 if failed else 0)
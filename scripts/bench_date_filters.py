@@ -0,0 +1,240 @@
+# scripts/bench_date_filters.py
+"""
+So sánh lọc theo ngày kiểu cũ (CAST(col AS DATE) = :d) và kiểu khoảng nửa mở
+(col >= :d AND col < :d + 1) trên dữ liệu tổng hợp ~1 triệu hóa đơn.
+
+    python -m scripts.bench_date_filters --rows 1000000 --json bench/date_filters.json
+    python -m scripts.bench_date_filters --cleanup
+
+Các biến thể:
+  - legacy:      predicate CAST + ép clustered index scan (mô phỏng trước 005_date_range_index.sql)
+  - cast:        predicate CAST, optimizer tự chọn index
+  - range:       predicate khoảng nửa mở (code hiện tại)
+
+Dữ liệu tổng hợp dùng mã riêng (HOADON 'BX%', PHIENDICHVU 'BY%') để xoá được sạch;
+nên chạy trên DB benchmark, không chạy trên DB thật.
+"""
+import argparse
+
+from sqlalchemy import text
+
+from app.db.session import ENGINE
+from scripts._bench import measure, print_table, write_json
+
+BATCH = 100_000
+DAYS = 730
+
+GEN_HOADON = """
+SET NOCOUNT ON;
+DECLARE @cntNV INT = (SELECT COUNT(*) FROM NHANVIEN WHERE MaNV <> 'NV_SYSTEM');
+DECLARE @cntKH INT = (SELECT COUNT(*) FROM KHACHHANG);
+
+;WITH N AS (
+    SELECT TOP (:n) CAST(ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS BIGINT) + :start - 1 AS i
+    FROM sys.all_objects a CROSS JOIN sys.all_objects b
+),
+NV AS (
+    SELECT MaNV, ROW_NUMBER() OVER (ORDER BY MaNV) - 1 AS rn
+    FROM NHANVIEN WHERE MaNV <> 'NV_SYSTEM'
+),
+KH AS (
+    SELECT MaKH, ROW_NUMBER() OVER (ORDER BY MaKH) - 1 AS rn FROM KHACHHANG
+)
+INSERT INTO HOADON (MaHoaDon, NgayLap, NhanVienLap, MaKH, TongTien, KhuyenMai, HinhThucThanhToan)
+SELECT
+    'BX' + RIGHT('00000000' + CAST(N.i AS VARCHAR(8)), 8),
+    DATEADD(SECOND, -CAST(N.i * 7919 % (:days * 86400) AS INT), GETDATE()),
+    nv.MaNV,
+    kh.MaKH,
+    100000 + (N.i % 50) * 10000,
+    0,
+    CASE N.i % 3 WHEN 0 THEN NULL WHEN 1 THEN N'Tiền mặt' ELSE N'Chuyển khoản' END
+FROM N
+JOIN NV nv ON nv.rn = N.i % @cntNV
+JOIN KH kh ON kh.rn = N.i % @cntKH;
+"""
+
+GEN_PHIEN = """
+SET NOCOUNT ON;
+DECLARE @cntTC INT = (SELECT COUNT(*) FROM THUCUNG);
+
+;WITH TC AS (
+    SELECT MaThuCung, ROW_NUMBER() OVER (ORDER BY MaThuCung) - 1 AS rn FROM THUCUNG
+)
+INSERT INTO PHIENDICHVU (MaPhien, MaHoaDon, MaThuCung, MaDV, MaCN, GiaTien, TrangThai, ThoiDiemBatDau, ThoiDiemKetThuc)
+SELECT
+    'BY' + SUBSTRING(h.MaHoaDon, 3, 8),
+    h.MaHoaDon,
+    tc.MaThuCung,
+    'DV001',
+    nv.MaCN,
+    150000,
+    CASE WHEN h.HinhThucThanhToan IS NULL THEN N'BOOKING' ELSE N'DONE_SERVICE' END,
+    h.NgayLap,
+    CASE WHEN h.HinhThucThanhToan IS NULL THEN NULL ELSE DATEADD(MINUTE, 30, h.NgayLap) END
+FROM HOADON h
+JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
+JOIN TC tc ON tc.rn = CAST(SUBSTRING(h.MaHoaDon, 3, 8) AS INT) % @cntTC
+WHERE h.MaHoaDon >= :lo AND h.MaHoaDon <= :hi;
+
+INSERT INTO KHAMBENH (MaPhien, BacSiPhuTrach, CacTrieuChung, ChanDoan)
+SELECT pd.MaPhien, h.NhanVienLap, N'Tổng hợp', N'Tổng hợp'
+FROM PHIENDICHVU pd
+JOIN HOADON h ON h.MaHoaDon = pd.MaHoaDon
+WHERE pd.MaPhien >= 'BY' + SUBSTRING(:lo, 3, 8) AND pd.MaPhien <= 'BY' + SUBSTRING(:hi, 3, 8)
+  AND pd.TrangThai = N'DONE_SERVICE';
+"""
+
+CASES = {
+    # NV6: hóa đơn của chi nhánh trong 7 ngày
+    "nv6_invoices_7d": {
+        "cast": """
+            SELECT h.MaHoaDon, h.NgayLap, h.TongTien
+            FROM HOADON h {hint}
+            JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
+            WHERE nv.MaCN = :cn AND CAST(h.NgayLap AS DATE) BETWEEN :f AND :t
+        """,
+        "range": """
+            SELECT h.MaHoaDon, h.NgayLap, h.TongTien
+            FROM HOADON h
+            JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
+            WHERE nv.MaCN = :cn
+              AND h.NgayLap >= CAST(:f AS DATE) AND h.NgayLap < DATEADD(DAY, 1, CAST(:t AS DATE))
+        """,
+    },
+    # NV5: ca khám theo ngày
+    "nv5_exams_1d": {
+        "cast": """
+            SELECT kb.MaPhien, pd.MaThuCung, kb.ChanDoan
+            FROM KHAMBENH kb
+            JOIN PHIENDICHVU pd ON pd.MaPhien = kb.MaPhien
+            JOIN HOADON h {hint} ON h.MaHoaDon = pd.MaHoaDon
+            JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
+            WHERE nv.MaCN = :cn AND CAST(h.NgayLap AS DATE) = :t
+        """,
+        "range": """
+            SELECT kb.MaPhien, pd.MaThuCung, kb.ChanDoan
+            FROM KHAMBENH kb
+            JOIN PHIENDICHVU pd ON pd.MaPhien = kb.MaPhien
+            JOIN HOADON h ON h.MaHoaDon = pd.MaHoaDon
+            JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
+            WHERE nv.MaCN = :cn
+              AND h.NgayLap >= CAST(:t AS DATE) AND h.NgayLap < DATEADD(DAY, 1, CAST(:t AS DATE))
+        """,
+    },
+    # Nhật ký trong ngày theo ThoiDiemKetThuc
+    "daily_history_1d": {
+        "cast": """
+            SELECT kb.MaPhien, pd.ThoiDiemKetThuc
+            FROM KHAMBENH kb
+            JOIN PHIENDICHVU pd {hint} ON kb.MaPhien = pd.MaPhien
+            WHERE pd.MaCN = :cn AND CAST(pd.ThoiDiemKetThuc AS DATE) = :t
+        """,
+        "range": """
+            SELECT kb.MaPhien, pd.ThoiDiemKetThuc
+            FROM KHAMBENH kb
+            JOIN PHIENDICHVU pd ON kb.MaPhien = pd.MaPhien
+            WHERE pd.MaCN = :cn
+              AND pd.ThoiDiemKetThuc >= CAST(:t AS DATE)
+              AND pd.ThoiDiemKetThuc < DATEADD(DAY, 1, CAST(:t AS DATE))
+        """,
+    },
+}
+
+
+def synthetic_code(i: int) -> str:
+    return "BX" + str(i).zfill(8)
+
+
+def generate(rows: int) -> None:
+    with ENGINE.connect() as conn:
+        have = conn.execute(text("SELECT COUNT(*) FROM HOADON WHERE MaHoaDon LIKE 'BX%'")).scalar()
+    print(f"Synthetic invoices: {have} / {rows}")
+
+    start = have + 1
+    while start <= rows:
+        n = min(BATCH, rows - start + 1)
+        with ENGINE.begin() as conn:
+            conn.execute(text(GEN_HOADON), {"n": n, "start": start, "days": DAYS})
+            conn.execute(
+                text(GEN_PHIEN),
+                {"lo": synthetic_code(start), "hi": synthetic_code(start + n - 1)},
+            )
+        start += n
+        print(f"  generated {start - 1} invoices")
+
+    with ENGINE.begin() as conn:
+        conn.execute(text("UPDATE STATISTICS HOADON; UPDATE STATISTICS PHIENDICHVU;"))
+
+
+def cleanup() -> None:
+    while True:
+        with ENGINE.begin() as conn:
+            deleted = conn.execute(text("""
+                SET NOCOUNT ON;
+                DECLARE @ids TABLE (MaHoaDon VARCHAR(10) PRIMARY KEY);
+                INSERT INTO @ids SELECT TOP (50000) MaHoaDon FROM HOADON WHERE MaHoaDon LIKE 'BX%';
+
+                DELETE kb FROM KHAMBENH kb
+                JOIN PHIENDICHVU pd ON pd.MaPhien = kb.MaPhien
+                JOIN @ids x ON x.MaHoaDon = pd.MaHoaDon;
+                DELETE pd FROM PHIENDICHVU pd JOIN @ids x ON x.MaHoaDon = pd.MaHoaDon;
+                DELETE h FROM HOADON h JOIN @ids x ON x.MaHoaDon = h.MaHoaDon;
+
+                SELECT COUNT(*) FROM @ids;
+            """)).scalar()
+        if not deleted:
+            break
+        print(f"  deleted {deleted} invoices")
+
+
+def run(repeat: int, ma_cn: str):
+    with ENGINE.connect() as conn:
+        # chọn ngày có nhiều dữ liệu nhất của chi nhánh để benchmark công bằng
+        day = conn.execute(text("""
+            SELECT TOP 1 CAST(h.NgayLap AS DATE)
+            FROM HOADON h JOIN NHANVIEN nv ON nv.MaNV = h.NhanVienLap
+            WHERE nv.MaCN = :cn AND h.MaHoaDon LIKE 'BX%'
+            GROUP BY CAST(h.NgayLap AS DATE)
+            ORDER BY COUNT(*) DESC
+        """), {"cn": ma_cn}).scalar()
+        if day is None:
+            raise SystemExit("Chưa có dữ liệu tổng hợp, chạy với --rows trước")
+        from_day = conn.execute(text("SELECT DATEADD(DAY, -6, :d)"), {"d": day}).scalar()
+
+        params = {"cn": ma_cn, "f": str(from_day)[:10], "t": str(day)[:10]}
+        results = {}
+        for name, sqls in CASES.items():
+            variants = {
+                "legacy": sqls["cast"].format(hint="WITH (INDEX(1))"),
+                "cast": sqls["cast"].format(hint=""),
+                "range": sqls["range"],
+            }
+            for variant, sql in variants.items():
+                stmt = text(sql)
+                rows = len(conn.execute(stmt, params).all())
+                stats = measure(lambda: conn.execute(stmt, params).all(), repeat=repeat)
+                stats["rows"] = rows
+                results[f"{name}/{variant}"] = stats
+
+    print_table(results)
+    return {"params": params, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark predicate ngày trên HOADON/PHIENDICHVU")
+    parser.add_argument("--rows", type=int, default=0, help="số hóa đơn tổng hợp cần có (vd 1000000)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--ma-cn", default="CN001")
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    parser.add_argument("--cleanup", action="store_true", help="xoá dữ liệu tổng hợp rồi thoát")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+    else:
+        if args.rows:
+            generate(args.rows)
+        report = run(args.repeat, args.ma_cn)
+        if args.json:
+            write_json(args.json, {"benchmark": "date_filters", "rows": args.rows, **report})
@@ -0,0 +1,217 @@
+# scripts/bench_invoice_total.py
+"""
+Benchmark tính lại tổng tiền hóa đơn: scalar UDF (fn_CalculateHoaDonTotal, trigger
+trg_RecalcHD_All bản cũ trong 001_logic.sql) so với inline TVF (fn_TongTienHoaDon,
+trigger bản set-based trong 006_set_based_invoice_total.sql).
+
+    python -m scripts.bench_invoice_total --carts 2000 --json bench/invoice_total.json
+    python -m scripts.bench_invoice_total --cleanup
+
+Các case (mọi thao tác ghi đều chạy trong transaction rồi ROLLBACK):
+  - recalc/scalar, recalc/set:   UPDATE TongTien cho toàn bộ giỏ hàng tổng hợp
+  - <trigger>/bulk_status:       1 câu UPDATE PHIENDICHVU chạm mọi giỏ (trigger tính lại N hóa đơn)
+  - <trigger>/confirm:           --workers luồng song song gọi sp_ConfirmHoaDon cho từng giỏ
+
+Script tạm cài trigger bản cũ để đo rồi luôn cài lại bản set-based khi kết thúc.
+Dữ liệu tổng hợp dùng mã 'BZ%' (HOADON, PHIENDICHVU); chỉ chạy trên DB benchmark.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from sqlalchemy import text
+
+from app.db.session import ENGINE
+from scripts._bench import measure, print_table, summarize, write_json
+
+MIGRATIONS = Path(__file__).resolve().parents[1] / "migrations"
+SESSIONS_PER_CART = 3
+
+GEN_CARTS = """
+SET NOCOUNT ON;
+DECLARE @cntKH INT = (SELECT COUNT(*) FROM KHACHHANG);
+DECLARE @cntTC INT = (SELECT COUNT(*) FROM THUCUNG);
+DECLARE @cn VARCHAR(10) = (SELECT TOP 1 MaCN FROM CHINHANH ORDER BY MaCN);
+DECLARE @thuoc VARCHAR(10) = (
+    SELECT TOP 1 MaSP FROM SANPHAM ORDER BY CASE WHEN LoaiSP LIKE N'Thuốc%' THEN 0 ELSE 1 END, MaSP
+);
+
+;WITH N AS (
+    SELECT TOP (:n) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+    FROM sys.all_objects a CROSS JOIN sys.all_objects b
+),
+KH AS (
+    SELECT MaKH, ROW_NUMBER() OVER (ORDER BY MaKH) - 1 AS rn FROM KHACHHANG
+)
+INSERT INTO HOADON (MaHoaDon, NgayLap, NhanVienLap, MaKH, TongTien, KhuyenMai, HinhThucThanhToan)
+SELECT 'BZ' + RIGHT('00000000' + CAST(N.i AS VARCHAR(8)), 8),
+       GETDATE(), 'NV_SYSTEM', kh.MaKH, 0, (N.i % 4) * 5, NULL
+FROM N
+JOIN KH kh ON kh.rn = N.i % @cntKH;
+
+;WITH TC AS (
+    SELECT MaThuCung, ROW_NUMBER() OVER (ORDER BY MaThuCung) - 1 AS rn FROM THUCUNG
+),
+S AS (
+    SELECT h.MaHoaDon, CAST(SUBSTRING(h.MaHoaDon, 3, 8) AS INT) AS i, k.k
+    FROM HOADON h
+    CROSS JOIN (VALUES (0), (1), (2)) k(k)
+    WHERE h.MaHoaDon LIKE 'BZ%'
+)
+INSERT INTO PHIENDICHVU (MaPhien, MaHoaDon, MaThuCung, MaDV, MaCN, GiaTien, TrangThai, ThoiDiemBatDau)
+SELECT 'BZ' + RIGHT('00000000' + CAST(S.i * 3 + S.k AS VARCHAR(8)), 8),
+       S.MaHoaDon, tc.MaThuCung, 'DV001', @cn, 0, N'BOOKING', GETDATE()
+FROM S
+JOIN TC tc ON tc.rn = (S.i * 3 + S.k) % @cntTC;
+
+INSERT INTO TOATHUOC (MaPhien, MaThuoc, Soluong)
+SELECT pd.MaPhien, @thuoc, 1 + CAST(SUBSTRING(pd.MaPhien, 3, 8) AS INT) % 5
+FROM PHIENDICHVU pd
+WHERE pd.MaPhien LIKE 'BZ%';
+
+UPDATE STATISTICS HOADON;
+UPDATE STATISTICS PHIENDICHVU;
+"""
+
+RECALC = {
+    "scalar": """
+        UPDATE HOADON
+        SET TongTien = dbo.fn_CalculateHoaDonTotal(MaHoaDon)
+        WHERE MaHoaDon LIKE 'BZ%'
+    """,
+    "set": """
+        UPDATE h
+        SET TongTien = t.TongTien
+        FROM HOADON h
+        CROSS APPLY dbo.fn_TongTienHoaDon(h.MaHoaDon) t
+        WHERE h.MaHoaDon LIKE 'BZ%'
+    """,
+}
+
+BULK_STATUS = """
+    UPDATE PHIENDICHVU
+    SET TrangThai = N'IN_SERVICE'
+    WHERE MaPhien LIKE 'BZ%' AND TrangThai = N'BOOKING'
+"""
+
+
+def trigger_sql(migration: str) -> str:
+    # Lấy nguyên khối CREATE OR ALTER TRIGGER trg_RecalcHD_All ... từ file migration
+    sql = (MIGRATIONS / migration).read_text(encoding="utf-8")
+    start = sql.index("CREATE OR ALTER TRIGGER trg_RecalcHD_All")
+    return sql[start:sql.index("\nGO", start)]
+
+
+TRIGGERS = {
+    "legacy_trigger": trigger_sql("001_logic.sql"),
+    "set_trigger": trigger_sql("006_set_based_invoice_total.sql"),
+}
+
+
+def install_trigger(name: str) -> None:
+    with ENGINE.begin() as conn:
+        conn.exec_driver_sql(TRIGGERS[name])
+
+
+def generate(carts: int) -> None:
+    cleanup()
+    with ENGINE.begin() as conn:
+        conn.execute(text(GEN_CARTS), {"n": carts})
+    print(f"Generated {carts} carts x {SESSIONS_PER_CART} sessions")
+
+
+def cleanup() -> None:
+    with ENGINE.begin() as conn:
+        conn.execute(text("""
+            SET NOCOUNT ON;
+            DELETE FROM TOATHUOC WHERE MaPhien LIKE 'BZ%';
+            DELETE FROM PHIENDICHVU WHERE MaPhien LIKE 'BZ%';
+            DELETE FROM HOADON WHERE MaHoaDon LIKE 'BZ%';
+        """))
+
+
+def in_rollback(sql: str, repeat: int):
+    def once():
+        with ENGINE.connect() as conn:
+            tx = conn.begin()
+            try:
+                conn.execute(text(sql))
+            finally:
+                tx.rollback()
+
+    return measure(once, repeat=repeat, warmup=1)
+
+
+def confirm_batch(carts, workers: int):
+    """Mỗi worker xác nhận một phần giỏ hàng trên connection riêng, ROLLBACK ở cuối."""
+    slices = [carts[i::workers] for i in range(workers)]
+
+    def worker(codes):
+        samples = []
+        with ENGINE.connect() as conn:
+            tx = conn.begin()
+            try:
+                for hd in codes:
+                    start = time.perf_counter()
+                    conn.execute(text("EXEC dbo.sp_ConfirmHoaDon @MaHoaDon=:hd"), {"hd": hd})
+                    samples.append((time.perf_counter() - start) * 1000)
+            finally:
+                tx.rollback()
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        samples = [s for part in pool.map(worker, slices) for s in part]
+    wall = time.perf_counter() - start
+
+    stats = summarize(samples)
+    stats["wall_s"] = round(wall, 3)
+    stats["confirms_per_s"] = round(len(samples) / wall, 1) if wall else 0
+    return stats
+
+
+def run(repeat: int, workers: int):
+    with ENGINE.connect() as conn:
+        carts = conn.execute(
+            text("SELECT MaHoaDon FROM HOADON WHERE MaHoaDon LIKE 'BZ%' ORDER BY MaHoaDon")
+        ).scalars().all()
+    if not carts:
+        raise SystemExit("Chưa có giỏ hàng tổng hợp, chạy với --carts trước")
+
+    results = {}
+    for variant, sql in RECALC.items():
+        results[f"recalc/{variant}"] = in_rollback(sql, repeat)
+
+    try:
+        for trig in ("legacy_trigger", "set_trigger"):
+            install_trigger(trig)
+            results[f"{trig}/bulk_status"] = in_rollback(BULK_STATUS, repeat)
+            results[f"{trig}/confirm"] = confirm_batch(carts, workers)
+    finally:
+        install_trigger("set_trigger")
+
+    print_table(results)
+    for name, stats in results.items():
+        if "wall_s" in stats:
+            print(f"{name}: {stats['confirms_per_s']} confirms/s ({stats['wall_s']} s)")
+    return {"carts": len(carts), "workers": workers, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark tính lại tổng tiền hóa đơn")
+    parser.add_argument("--carts", type=int, default=0, help="tạo lại N giỏ hàng tổng hợp (vd 2000)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    parser.add_argument("--cleanup", action="store_true", help="xoá dữ liệu tổng hợp rồi thoát")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+    else:
+        if args.carts:
+            generate(args.carts)
+        report = run(args.repeat, args.workers)
+        if args.json:
+            write_json(args.json, {"benchmark": "invoice_total", **report})
@@ -0,0 +1,147 @@
+# scripts/bench_prescription.py
+"""
+So sánh hoàn tất khám / tiêm: vòng lặp INSERT từng dòng (trước 007_batch_exam_vaccine.sql)
+và 1 lần gọi sp_HoanTatKhamBenh / sp_HoanTatTiemPhong với danh sách JSON.
+
+    python -m scripts.bench_prescription --items 20 --json bench/prescription.json
+
+Mỗi lần đo tạo 1 phiên tổng hợp ('BP000001') trong transaction rồi ROLLBACK,
+không để lại dữ liệu. Đếm round-trip bằng event before_cursor_execute
+(kể cả SAVEPOINT do Session lồng trong transaction ngoài, như nhau cho mọi biến thể).
+"""
+import argparse
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.db.session import ENGINE
+from app.services import staff_service
+from scripts._bench import print_table, summarize, write_json
+
+MA_PHIEN = "BP000001"
+
+SETUP = """
+SET NOCOUNT ON;
+INSERT INTO HOADON (MaHoaDon, NgayLap, NhanVienLap, MaKH, TongTien, KhuyenMai, HinhThucThanhToan)
+SELECT TOP 1 :mp, GETDATE(), 'NV_SYSTEM', tc.MaKH, 0, 0, NULL
+FROM THUCUNG tc ORDER BY tc.MaThuCung;
+
+INSERT INTO PHIENDICHVU (MaPhien, MaHoaDon, MaThuCung, MaDV, MaCN, GiaTien, TrangThai, ThoiDiemBatDau)
+SELECT TOP 1 :mp, :mp, tc.MaThuCung, 'DV001', (SELECT TOP 1 MaCN FROM CHINHANH ORDER BY MaCN),
+       0, N'IN_SERVICE', GETDATE()
+FROM THUCUNG tc ORDER BY tc.MaThuCung;
+"""
+
+
+# ---- Cách cũ: giữ nguyên vòng lặp trước khi chuyển sang stored procedure ----
+def legacy_complete_exam(db: Session, ma_phien, ma_bs, trieu_chung, chan_doan, thuoc_list):
+    db.execute(text("""
+        IF EXISTS (SELECT 1 FROM KHAMBENH WHERE MaPhien = :mp)
+            UPDATE KHAMBENH SET BacSiPhuTrach=:bs, CacTrieuChung=:tc, ChanDoan=:cd WHERE MaPhien=:mp
+        ELSE
+            INSERT INTO KHAMBENH (MaPhien, BacSiPhuTrach, CacTrieuChung, ChanDoan)
+            VALUES (:mp, :bs, :tc, :cd)
+    """), {"mp": ma_phien, "bs": ma_bs, "tc": trieu_chung, "cd": chan_doan})
+
+    if thuoc_list:
+        db.execute(text("DELETE FROM TOATHUOC WHERE MaPhien = :mp"), {"mp": ma_phien})
+        for item in thuoc_list:
+            db.execute(text("""
+                INSERT INTO TOATHUOC (MaPhien, MaThuoc, Soluong)
+                VALUES (:mp, :mt, :sl)
+            """), {"mp": ma_phien, "mt": item['MaSP'], "sl": item['SoLuong']})
+
+    db.execute(text("""
+        UPDATE PHIENDICHVU
+        SET ThoiDiemKetThuc = GETDATE()
+        WHERE MaPhien = :mp
+    """), {"mp": ma_phien})
+    db.commit()
+
+
+def legacy_complete_vaccine(db: Session, ma_phien, ma_bs, danh_sach_tiem):
+    db.execute(text("""
+        UPDATE PHIENDICHVU
+        SET TrangThai = N'DONE_SERVICE',
+            ThoiDiemKetThuc = GETDATE()
+        WHERE MaPhien = :mp
+    """), {"mp": ma_phien})
+    for item in danh_sach_tiem:
+        db.execute(text("""
+            INSERT INTO TIEMPHONG (MaPhien, MaVC, MaGoi, BacSiPhuTrach, NgayTiem, SoLieu)
+            VALUES (:mp, :mvc, :mgoi, :bs, CAST(GETDATE() AS DATE), :sl)
+        """), {"mp": ma_phien, "mvc": item['ma_vc'], "mgoi": item.get('ma_goi'),
+               "bs": ma_bs, "sl": item['so_lieu']})
+    db.commit()
+
+
+def measure_flow(fn, args, repeat: int):
+    samples, trips = [], []
+    for i in range(repeat + 1):
+        with ENGINE.connect() as conn:
+            tx = conn.begin()
+            try:
+                conn.execute(text(SETUP), {"mp": MA_PHIEN})
+
+                count = [0]
+
+                def on_execute(*_):
+                    count[0] += 1
+
+                event.listen(conn, "before_cursor_execute", on_execute)
+                db = Session(bind=conn, join_transaction_mode="create_savepoint")
+                start = time.perf_counter()
+                fn(db, MA_PHIEN, *args)
+                elapsed = (time.perf_counter() - start) * 1000
+                event.remove(conn, "before_cursor_execute", on_execute)
+                db.close()
+            finally:
+                tx.rollback()
+        if i:  # lần đầu để làm nóng plan cache
+            samples.append(elapsed)
+            trips.append(count[0])
+    stats = summarize(samples)
+    stats["round_trips"] = max(trips)
+    return stats
+
+
+def run(items: int, repeat: int):
+    with ENGINE.connect() as conn:
+        bs = conn.execute(text(
+            "SELECT TOP 1 MaNV FROM NHANVIEN WHERE ChucVu = N'Bác sĩ thú y' ORDER BY MaNV"
+        )).scalar()
+        thuoc = conn.execute(text(
+            "SELECT TOP (:n) MaSP FROM SANPHAM WHERE LoaiSP = N'Thuốc' ORDER BY MaSP"
+        ), {"n": items}).scalars().all()
+        vaccines = conn.execute(text(
+            "SELECT TOP (:n) MaVC FROM VACCINE ORDER BY MaVC"
+        ), {"n": items}).scalars().all()
+
+    thuoc_list = [{"MaSP": m, "SoLuong": 1 + i % 3} for i, m in enumerate(thuoc)]
+    danh_sach_tiem = [{"ma_vc": m, "ma_goi": None, "so_lieu": 1} for m in vaccines]
+    exam_args = (bs, "Tổng hợp", "Tổng hợp", thuoc_list)
+
+    results = {
+        f"exam_{len(thuoc_list)}/legacy": measure_flow(legacy_complete_exam, exam_args, repeat),
+        f"exam_{len(thuoc_list)}/sp": measure_flow(staff_service.complete_exam_process, exam_args, repeat),
+        f"vaccine_{len(danh_sach_tiem)}/legacy": measure_flow(legacy_complete_vaccine, (bs, danh_sach_tiem), repeat),
+        f"vaccine_{len(danh_sach_tiem)}/sp": measure_flow(staff_service.complete_vaccine_process, (bs, danh_sach_tiem), repeat),
+    }
+
+    print_table(results)
+    for name, stats in results.items():
+        print(f"{name}: {stats['round_trips']} round-trips")
+    return {"items": items, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hoàn tất khám / tiêm theo lô")
+    parser.add_argument("--items", type=int, default=20, help="số thuốc trong toa / số mũi tiêm")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    report = run(args.items, args.repeat)
+    if args.json:
+        write_json(args.json, {"benchmark": "prescription", **report})
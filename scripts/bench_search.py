@@ -0,0 +1,156 @@
+# scripts/bench_search.py
+"""
+So sánh tìm kiếm LIKE N'%kw%' (code cũ) với chỉ mục trong process (app/services/search_index.py).
+
+    python -m scripts.bench_search --json bench/search.json
+    python -m scripts.bench_search --keyword "thuoc" --keyword "Royal Canin" --repeat 50
+    python -m scripts.bench_search --synthetic 200000      # chỉ đo index, không cần DB
+    python -m scripts.bench_search --synthetic 200000 --source KHACHHANG --limit 10
+
+Các case (mỗi từ khoá):
+  - like:    câu LIKE trên bảng, có LIMIT như API
+  - index:   SearchIndex.search trong bộ nhớ (phần CPU của request)
+  - service: kh8_search_products / search_staff (index + 1 câu SQL lấy dòng theo mã),
+             autocomplete cho KHACHHANG / THUCUNG (chỉ đọc index, mục tiêu < 10 ms)
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import text
+
+from app.db.session import SessionLocal
+from app.services import search_index
+from app.services.company_service import search_staff
+from app.services.customer_service import kh8_search_products
+from app.services.staff_service import autocomplete
+from scripts._bench import measure, print_table, write_json
+
+LIMIT = 50
+
+LIKE = {
+    "SANPHAM": """
+        SELECT TOP (:n) sp.MaSP, sp.TenSP, sp.LoaiSP, sp.DonGia
+        FROM SANPHAM sp
+        WHERE sp.TenSP LIKE N'%' + :kw + N'%'
+        ORDER BY sp.MaSP
+    """,
+    "NHANVIEN": """
+        SELECT TOP (:n) nv.*, cn.TenCN
+        FROM NHANVIEN nv
+        LEFT JOIN CHINHANH cn ON nv.MaCN = cn.MaCN
+        WHERE (nv.HoTen LIKE :kwp OR nv.MaNV LIKE :kwp)
+        ORDER BY nv.MaNV
+    """,
+    "KHACHHANG": """
+        SELECT TOP (:n) MaKH, Hoten, SDT
+        FROM KHACHHANG
+        WHERE Hoten LIKE :kwp OR SDT LIKE :kwp
+        ORDER BY MaKH
+    """,
+    "THUCUNG": """
+        SELECT TOP (:n) MaThuCung, Ten, Loai, MaKH
+        FROM THUCUNG
+        WHERE Ten LIKE :kwp
+        ORDER BY MaThuCung
+    """,
+}
+
+DEFAULT_KEYWORDS = {
+    "SANPHAM": ["thuoc", "Thức ăn", "vitamin", "SP00"],
+    "NHANVIEN": ["nguyen", "Trần", "van a", "NV00"],
+    "KHACHHANG": ["ng", "nguyen van", "Lan", "0912", "4567"],
+    "THUCUNG": ["mi", "Milu", "lu"],
+}
+
+SYNTHETIC_WORDS = [
+    "Thức", "ăn", "hạt", "cho", "chó", "mèo", "Thuốc", "tẩy", "giun", "sữa", "tắm", "vitamin",
+    "Royal", "Canin", "pate", "cát", "vệ", "sinh", "vòng", "cổ", "đồ", "chơi", "nhỏ", "lớn", "con",
+]
+FAMILY = ["Nguyễn"] * 38 + ["Trần"] * 11 + ["Lê"] * 10 + ["Phạm"] * 7 + [
+    "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ", "Hồ", "Ngô", "Dương", "Lý"] * 2
+MIDDLE = ["Văn", "Thị", "Minh", "Ngọc", "Thanh", "Đức", "Hữu", "Quốc", "Thu", "Hoài", "Gia", "Bảo"]
+GIVEN = ["An", "Anh", "Bình", "Châu", "Dũng", "Giang", "Hà", "Hải", "Hạnh", "Hiếu", "Hoa", "Hùng",
+         "Hương", "Khánh", "Lan", "Linh", "Long", "Mai", "Minh", "Nam", "Ngân", "Nhung", "Phong",
+         "Phúc", "Quân", "Quỳnh", "Sơn", "Tâm", "Thảo", "Thắng", "Trang", "Tuấn", "Tú", "Vân", "Vy"]
+
+
+def synthetic_rows(source: str, n: int, rnd: random.Random):
+    for i in range(1, n + 1):
+        if source == "KHACHHANG":
+            yield {"MaKH": f"KH{i:06d}",
+                   "Hoten": f"{rnd.choice(FAMILY)} {rnd.choice(MIDDLE)} {rnd.choice(GIVEN)}",
+                   "SDT": "09" + "".join(rnd.choice("0123456789") for _ in range(8))}
+        else:
+            yield {"MaSP": f"SP{i:06d}",
+                   "TenSP": " ".join(rnd.sample(SYNTHETIC_WORDS, rnd.randint(2, 6))),
+                   "LoaiSP": rnd.choice(["Thuốc", "Thức ăn", "Phụ kiện"])}
+
+
+def run_db(repeat: int, keywords: dict):
+    results = {}
+    services = {
+        "SANPHAM": lambda db, kw: kh8_search_products(db, kw, None, limit=LIMIT),
+        "NHANVIEN": lambda db, kw: search_staff(db, kw, limit=LIMIT),
+        "KHACHHANG": lambda db, kw: autocomplete(db, kw, ["customer"])["customer"],
+        "THUCUNG": lambda db, kw: autocomplete(db, kw, ["pet"])["pet"],
+    }
+    with SessionLocal() as db:
+        for name, words in keywords.items():
+            start = time.perf_counter()
+            search_index.indexes[name].ensure(db)
+            print(f"{name}: built in {(time.perf_counter() - start) * 1000:.0f} ms",
+                  search_index.indexes[name].stats())
+            like = text(LIKE[name])
+            for kw in words:
+                params = {"n": LIMIT, "kw": kw, "kwp": f"%{kw}%"}
+                cases = {
+                    "like": lambda: db.execute(like, params).all(),
+                    "index": lambda: search_index.indexes[name].search(kw, LIMIT),
+                    "service": lambda: services[name](db, kw),
+                }
+                for case, fn in cases.items():
+                    stats = measure(fn, repeat=repeat)
+                    result = fn()
+                    stats["rows"] = len(result["items"] if isinstance(result, dict) else result)
+                    results[f"{name}/{kw}/{case}"] = stats
+    print_table(results)
+    return results
+
+
+def run_synthetic(repeat: int, source: str, docs: int, keywords: list, limit: int):
+    index = search_index.SearchIndex(search_index.SOURCES[source], ttl=3600)
+    start = time.perf_counter()
+    index.build(synthetic_rows(source, docs, random.Random(1)))
+    print(f"built {docs:,} docs in {(time.perf_counter() - start) * 1000:.0f} ms", index.stats())
+    results = {}
+    for kw in keywords:
+        stats = measure(lambda: index.search(kw, limit), repeat=repeat)
+        stats["rows"] = len(index.search(kw))
+        results[f"synthetic/{source}/{kw}"] = stats
+    print_table(results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark tìm kiếm LIKE và chỉ mục trong process")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keyword", action="append", help="từ khoá (lặp lại được), dùng cho mọi bảng")
+    parser.add_argument("--synthetic", type=int, default=0, help="số dòng giả lập, chỉ đo index")
+    parser.add_argument("--source", choices=["SANPHAM", "KHACHHANG"], default="SANPHAM",
+                        help="bảng giả lập cho --synthetic")
+    parser.add_argument("--limit", type=int, default=LIMIT, help="số kết quả cho --synthetic (autocomplete: 10)")
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        default = {"SANPHAM": ["thuoc", "cho meo", "Thức ăn hạt", "v", "royal can"],
+                   "KHACHHANG": ["ng", "nguyen", "nguyen van", "Lan", "0912", "4567"]}
+        words = args.keyword or default[args.source]
+        results = run_synthetic(args.repeat, args.source, args.synthetic, words, args.limit)
+        report = {"source": args.source, "docs": args.synthetic, "results": results}
+    else:
+        keywords = {n: args.keyword for n in LIKE} if args.keyword else DEFAULT_KEYWORDS
+        report = {"keywords": keywords, "results": run_db(args.repeat, keywords)}
+    if args.json:
+        write_json(args.json, {"benchmark": "search", **report})
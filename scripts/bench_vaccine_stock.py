@@ -0,0 +1,269 @@
+# scripts/bench_vaccine_stock.py
+"""
+Benchmark tổng tồn kho vaccine / giá gói tiêm: GROUP BY, subquery tương quan và scalar UDF
+(code trước 014_vaccine_indexed_views.sql) so với indexed view vw_TonKhoVaccine / vw_GiaGoi.
+
+    python -m scripts.bench_vaccine_stock --branches 100 --vaccines 1000 --json bench/vaccine_stock.json
+    python -m scripts.bench_vaccine_stock --cleanup
+
+Dữ liệu tổng hợp: chi nhánh 'BV001'..., vaccine 'BVC00001'..., gói 'BVG0001'... (mỗi gói
+--per-package vaccine), CHINHANH_VACCINE đủ branches x vaccines dòng, 1 khách có sẵn mua gói
+'BVG0001' (GOI_KHACHHANG_VACCINE). Chạy xong thì xoá (--keep để giữ lại); chỉ chạy trên DB benchmark.
+
+Các case:
+  - stock/package_*:  tồn kho các vaccine trong 1 gói (kh_get_my_purchased_packages / ..._details)
+  - stock/all_*:      tồn kho mọi vaccine tổng hợp
+  - price/*:          giá mọi gói tổng hợp, fn_GiaGoiTiemPhong so với vw_GiaGoi
+  - api/package_details: customer_service.kh_get_purchased_package_details
+  - write/stock_update:  UPDATE 1 dòng CHINHANH_VACCINE (kèm cập nhật view), ROLLBACK
+Kết quả view phải khớp cách tính cũ, lệch => exit 1.
+"""
+import argparse
+import sys
+
+from sqlalchemy import text
+
+from app.db.session import ENGINE, SessionLocal
+from app.services import customer_service
+from scripts._bench import measure, print_table, write_json
+
+MA_GOI = "BVG0001"
+
+SETUP = """
+SET NOCOUNT ON;
+;WITH N AS (
+    SELECT TOP (:vaccines) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+    FROM sys.all_objects a CROSS JOIN sys.all_objects b
+)
+INSERT INTO VACCINE (MaVC, TenVC, NgaySanXuat, LieuLuong, DonGia)
+SELECT 'BVC' + RIGHT('00000' + CAST(i AS VARCHAR(5)), 5), N'Vaccine benchmark ' + CAST(i AS NVARCHAR(10)),
+       '2025-01-01', 1, 50000 + (i % 20) * 10000
+FROM N;
+
+;WITH N AS (
+    SELECT TOP (:branches) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+    FROM sys.all_objects
+)
+INSERT INTO CHINHANH (MaCN, TenCN)
+SELECT 'BV' + RIGHT('000' + CAST(i AS VARCHAR(3)), 3), N'Benchmark kho ' + CAST(i AS NVARCHAR(10))
+FROM N;
+
+-- vài vaccine hết hàng ở mọi chi nhánh (i % 97 = 0) => có cảnh báo hết hàng
+INSERT INTO CHINHANH_VACCINE (MaCN, MaVC, SoLuongTonKho)
+SELECT cn.MaCN, vc.MaVC,
+       CASE WHEN CAST(SUBSTRING(vc.MaVC, 4, 5) AS INT) % 97 = 0 THEN 0
+            ELSE ABS(CHECKSUM(cn.MaCN, vc.MaVC)) % 50 END
+FROM CHINHANH cn
+JOIN VACCINE vc ON vc.MaVC LIKE 'BVC%'
+WHERE cn.MaCN LIKE 'BV[0-9]%';
+
+;WITH N AS (
+    SELECT TOP (:packages) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+    FROM sys.all_objects
+)
+INSERT INTO GOITIEMPHONG (MaGoi, TenGoi, ThoiGian, KhuyenMai)
+SELECT 'BVG' + RIGHT('0000' + CAST(i AS VARCHAR(4)), 4), N'Gói benchmark ' + CAST(i AS NVARCHAR(10)),
+       12, (i % 4) * 5
+FROM N;
+
+-- gói thứ g gồm per_package vaccine liên tiếp
+INSERT INTO GOITIEMPHONG_VACCINE (MaGoi, MaVC, SoLieu)
+SELECT g.MaGoi, 'BVC' + RIGHT('00000' + CAST((g.i * :per_package + k.k) % :vaccines + 1 AS VARCHAR(5)), 5),
+       1 + k.k % 3
+FROM (SELECT MaGoi, CAST(SUBSTRING(MaGoi, 4, 4) AS INT) AS i FROM GOITIEMPHONG WHERE MaGoi LIKE 'BVG%') g
+CROSS JOIN (SELECT TOP (:per_package) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) - 1 AS k
+            FROM sys.all_objects) k;
+
+INSERT INTO GOI_KHACHHANG_VACCINE (MaKH, MaGoi, MaVC, Solieuconlai)
+SELECT (SELECT TOP 1 MaKH FROM KHACHHANG ORDER BY MaKH), gv.MaGoi, gv.MaVC, gv.SoLieu
+FROM GOITIEMPHONG_VACCINE gv
+WHERE gv.MaGoi = :goi;
+
+UPDATE STATISTICS CHINHANH_VACCINE;
+UPDATE STATISTICS GOITIEMPHONG_VACCINE;
+"""
+
+CLEANUP = """
+SET NOCOUNT ON;
+DELETE FROM GOI_KHACHHANG_VACCINE WHERE MaGoi LIKE 'BVG%';
+DELETE FROM GOITIEMPHONG_VACCINE WHERE MaGoi LIKE 'BVG%';
+DELETE FROM GOITIEMPHONG WHERE MaGoi LIKE 'BVG%';
+DELETE FROM CHINHANH_VACCINE WHERE MaVC LIKE 'BVC%';
+DELETE FROM CHINHANH WHERE MaCN LIKE 'BV[0-9]%';
+DELETE FROM VACCINE WHERE MaVC LIKE 'BVC%';
+"""
+
+# ---- Tồn kho các vaccine trong 1 gói ----
+STOCK_PACKAGE = {
+    # kh_get_my_purchased_packages trước 013: CTE GROUP BY cả CHINHANH_VACCINE
+    "cte": """
+        WITH GlobalStock AS (
+            SELECT MaVC, SUM(SoLuongTonKho) AS TotalGlobalStock
+            FROM CHINHANH_VACCINE
+            GROUP BY MaVC
+        )
+        SELECT gv.MaVC, ISNULL(gs.TotalGlobalStock, 0) AS TonKho
+        FROM GOITIEMPHONG_VACCINE gv
+        LEFT JOIN GlobalStock gs ON gs.MaVC = gv.MaVC
+        WHERE gv.MaGoi = :goi
+    """,
+    # kh_get_purchased_package_details trước 013: subquery tương quan mỗi dòng
+    "correlated": """
+        SELECT gv.MaVC,
+               ISNULL((SELECT SUM(SoLuongTonKho) FROM CHINHANH_VACCINE WHERE MaVC = gv.MaVC), 0) AS TonKho
+        FROM GOITIEMPHONG_VACCINE gv
+        WHERE gv.MaGoi = :goi
+    """,
+    "view": """
+        SELECT gv.MaVC, ISNULL(tk.TongTonKho, 0) AS TonKho
+        FROM GOITIEMPHONG_VACCINE gv
+        LEFT JOIN vw_TonKhoVaccine tk WITH (NOEXPAND) ON tk.MaVC = gv.MaVC
+        WHERE gv.MaGoi = :goi
+    """,
+}
+
+# ---- Tồn kho mọi vaccine tổng hợp ----
+STOCK_ALL = {
+    "groupby": """
+        SELECT MaVC, SUM(SoLuongTonKho) AS TonKho
+        FROM CHINHANH_VACCINE
+        WHERE MaVC LIKE 'BVC%'
+        GROUP BY MaVC
+    """,
+    "view": """
+        SELECT MaVC, TongTonKho AS TonKho
+        FROM vw_TonKhoVaccine WITH (NOEXPAND)
+        WHERE MaVC LIKE 'BVC%'
+    """,
+}
+
+# ---- Giá mọi gói tổng hợp ----
+PRICE = {
+    "scalar": "SELECT MaGoi, dbo.fn_GiaGoiTiemPhong(MaGoi) AS Gia FROM GOITIEMPHONG WHERE MaGoi LIKE 'BVG%'",
+    "view": "SELECT MaGoi, Gia FROM vw_GiaGoi WHERE MaGoi LIKE 'BVG%'",
+}
+
+STOCK_UPDATE = """
+    UPDATE CHINHANH_VACCINE
+    SET SoLuongTonKho = SoLuongTonKho + 1
+    WHERE MaCN = 'BV001' AND MaVC = 'BVC00001'
+"""
+
+
+def generate(branches: int, vaccines: int, packages: int, per_package: int) -> None:
+    cleanup()
+    with ENGINE.begin() as conn:
+        conn.execute(text(SETUP), {"branches": branches, "vaccines": vaccines, "packages": packages,
+                                   "per_package": per_package, "goi": MA_GOI})
+    print(f"Generated {branches} branches x {vaccines} vaccines, {packages} packages x {per_package} vaccines")
+
+
+def cleanup() -> None:
+    with ENGINE.begin() as conn:
+        conn.execute(text(CLEANUP))
+
+
+def fetch(sql: str, params=None) -> dict:
+    with ENGINE.connect() as conn:
+        return {r[0]: r[1] for r in conn.execute(text(sql), params or {})}
+
+
+def query(sql: str, params=None):
+    def once():
+        with ENGINE.connect() as conn:
+            conn.execute(text(sql), params or {}).fetchall()
+    return once
+
+
+def in_rollback(sql: str):
+    def once():
+        with ENGINE.connect() as conn:
+            tx = conn.begin()
+            try:
+                conn.execute(text(sql))
+            finally:
+                tx.rollback()
+    return once
+
+
+def package_details(ma_kh: str):
+    def once():
+        with SessionLocal() as db:
+            customer_service.kh_get_purchased_package_details(db, ma_kh, MA_GOI)
+    return once
+
+
+def mismatches() -> list:
+    """Các cặp (cách cũ, view) cho kết quả khác nhau."""
+    bad = []
+    goi = {"goi": MA_GOI}
+    pairs = [
+        ("stock/package", fetch(STOCK_PACKAGE["cte"], goi), fetch(STOCK_PACKAGE["view"], goi)),
+        ("stock/all", fetch(STOCK_ALL["groupby"]), fetch(STOCK_ALL["view"])),
+        # gói tổng hợp luôn có vaccine => scalar UDF không trả NULL
+        ("price", fetch(PRICE["scalar"]), fetch(PRICE["view"])),
+    ]
+    for name, old, new in pairs:
+        if old != new:
+            diff = sorted(k for k in old.keys() | new.keys() if old.get(k) != new.get(k))
+            bad.append(f"{name}: {len(diff)} khác, vd {diff[:3]}")
+    return bad
+
+
+def run(repeat: int):
+    with ENGINE.connect() as conn:
+        ma_kh = conn.execute(
+            text("SELECT TOP 1 MaKH FROM GOI_KHACHHANG_VACCINE WHERE MaGoi = :goi"), {"goi": MA_GOI}
+        ).scalar()
+    if ma_kh is None:
+        raise SystemExit("Chưa có dữ liệu tổng hợp, chạy không kèm --skip-generate trước")
+
+    results = {}
+    for variant, sql in STOCK_PACKAGE.items():
+        results[f"stock/package_{variant}"] = measure(query(sql, {"goi": MA_GOI}), repeat=repeat)
+    for variant, sql in STOCK_ALL.items():
+        results[f"stock/all_{variant}"] = measure(query(sql), repeat=repeat)
+    for variant, sql in PRICE.items():
+        results[f"price/{variant}"] = measure(query(sql), repeat=repeat)
+    results["api/package_details"] = measure(package_details(ma_kh), repeat=repeat)
+    results["write/stock_update"] = measure(in_rollback(STOCK_UPDATE), repeat=repeat)
+
+    print_table(results)
+    bad = mismatches()
+    for line in bad:
+        print("MISMATCH", line)
+    return {"results": results, "mismatches": bad}, bool(bad)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark tồn kho vaccine / giá gói: indexed view")
+    parser.add_argument("--branches", type=int, default=100)
+    parser.add_argument("--vaccines", type=int, default=1000)
+    parser.add_argument("--packages", type=int, default=200)
+    parser.add_argument("--per-package", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--skip-generate", action="store_true", help="dùng lại dữ liệu 'BV%%' đã có")
+    parser.add_argument("--keep", action="store_true", help="không xoá dữ liệu tổng hợp khi xong")
+    parser.add_argument("--cleanup", action="store_true", help="chỉ xoá dữ liệu tổng hợp")
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        sys.exit(0)
+    if not args.skip_generate:
+        generate(args.branches, args.vaccines, args.packages, args.per_package)
+    try:
+        report, failed = run(args.repeat)
+    finally:
+        if not args.keep:
+            cleanup()
+    if args.json:
+        write_json(args.json, {
+            "benchmark": "vaccine_stock",
+            "branches": args.branches,
+            "vaccines": args.vaccines,
+            "packages": args.packages,
+            **report,
+        })
+    sys.exit(1 if failed else 0)
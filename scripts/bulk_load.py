@@ -0,0 +1,56 @@
+# scripts/bulk_load.py
+"""
+Nạp seed CSV lớn (fast_executemany), nhiều file song song, mỗi file 1 connection + transaction.
+
+    python -m scripts.bulk_load data/010_SANPHAM.csv data/011_KHACHHANG.csv --workers 4
+    python -m scripts.bulk_load kh.csv --table KHACHHANG --batch-size 10000
+
+Bảng lấy từ tên file (NNN_<TABLE>.csv hoặc <TABLE>.csv) nếu không truyền --table.
+Các file có khoá ngoại tới nhau nên nạp theo thứ tự (--workers 1) hoặc theo nhiều lượt.
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.db.bulk import DEFAULT_BATCH_SIZE, load_csv
+from app.db.session import ENGINE
+
+
+def load_one(path: Path, table, batch_size: int):
+    with ENGINE.begin() as conn:
+        return path.name, load_csv(conn, path, table, batch_size)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Nạp CSV vào SQL Server bằng fast_executemany")
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--table", help="bảng đích (chỉ khi nạp 1 file)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.table and len(args.files) > 1:
+        parser.error("--table chỉ dùng với 1 file")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(load_one, f, args.table, args.batch_size) for f in args.files]
+        results = []
+        failed = False
+        for fut in futures:
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                print("ERROR:", e, file=sys.stderr)
+                failed = True
+
+    elapsed = time.perf_counter() - start
+    rows = sum(stats["rows"] for _, stats in results)
+    print(f"Total: {rows:,} rows / {len(results)} files in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+# scripts/check_invoice_totals.py
+"""
+Đối chiếu tổng tiền hóa đơn giữa bản scalar cũ (fn_CalculateHoaDonTotal) và
+bản set-based (fn_TongTienHoaDon, dùng trong trg_RecalcHD_All từ 006_*.sql).
+
+    python -m scripts.check_invoice_totals             # toàn bộ HOADON
+    python -m scripts.check_invoice_totals --stored    # so thêm với HOADON.TongTien
+
+Thoát với mã 1 nếu có hóa đơn lệch.
+"""
+import argparse
+import sys
+
+from sqlalchemy import text
+
+from app.db.session import ENGINE
+
+COMPARE = """
+SELECT h.MaHoaDon,
+       h.TongTien AS DaLuu,
+       dbo.fn_CalculateHoaDonTotal(h.MaHoaDon) AS Scalar,
+       t.TongTien AS SetBased
+FROM HOADON h
+CROSS APPLY dbo.fn_TongTienHoaDon(h.MaHoaDon) t
+WHERE dbo.fn_CalculateHoaDonTotal(h.MaHoaDon) <> t.TongTien
+   {stored}
+ORDER BY h.MaHoaDon
+"""
+
+
+def check(include_stored: bool = False, show: int = 20) -> int:
+    stored = "OR ISNULL(h.TongTien, 0) <> t.TongTien" if include_stored else ""
+    with ENGINE.connect() as conn:
+        total = conn.execute(text("SELECT COUNT(*) FROM HOADON")).scalar()
+        rows = conn.execute(text(COMPARE.format(stored=stored))).all()
+
+    print(f"Checked {total} invoices, {len(rows)} mismatched")
+    for r in rows[:show]:
+        print(f"  {r.MaHoaDon}: stored={r.DaLuu} scalar={r.Scalar} set_based={r.SetBased}")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đối chiếu fn_CalculateHoaDonTotal và fn_TongTienHoaDon")
+    parser.add_argument("--stored", action="store_true", help="so thêm với HOADON.TongTien đang lưu")
+    parser.add_argument("--show", type=int, default=20, help="số dòng lệch in ra")
+    args = parser.parse_args()
+
+    sys.exit(1 if check(args.stored, args.show) else 0)
@@ -0,0 +1,131 @@
+# scripts/check_statement_budgets.py
+"""
+Kiểm tra số câu SQL của các route có Depends(statement_budget(n)) (phát hiện N+1 / round-trip tăng).
+
+    docker compose up -d db && python -m scripts.migrate
+    python -m scripts.check_statement_budgets      # chỉ route GET, đọc dữ liệu có sẵn
+    python -m pytest tests/test_statement_budgets.py   # mọi route, kể cả POST trên dữ liệu tổng hợp
+
+Gọi thẳng ASGI app trong process (không cần uvicorn), tham số path/query/body lấy từ dữ liệu có sẵn
+(1 hóa đơn có phiên dịch vụ), đếm câu SQL qua header Server-Timing. Route phải trả 2xx (4xx do
+thiếu tham số = chưa chạy tới SQL => FAIL) và không vượt budget; exit 1 nếu có route FAIL
+-> dùng được làm bước CI.
+
+Route ghi (POST...) không chạy ở đây: claim-next / start sẽ nhận ca thật trong DB đang trỏ tới.
+Test pytest chạy chúng trên chi nhánh tổng hợp của scripts.bench_claim rồi xoá.
+"""
+import asyncio
+import datetime as dt
+import json
+import re
+import sys
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+settings.METRICS_ENABLED = True
+settings.SQL_BUDGET_MODE = "log"  # chạy hết để biết số câu thực tế, không dừng ở câu N+1
+
+from app.db.session import ENGINE  # noqa: E402
+from app.main import app  # noqa: E402
+
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+# Body JSON của route nhận body (data: dict), dựng từ tham số mẫu
+BODIES: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "/api/staff/examination/start": lambda p: {"ma_phien": p["ma_phien"]},
+}
+
+
+def sample_params() -> Dict[str, Any]:
+    """Tham số cho route đọc: 1 hóa đơn có phiên + chi nhánh / dịch vụ của phiên đó."""
+    with ENGINE.connect() as conn:
+        row = conn.execute(text("""
+            SELECT TOP 1 h.MaHoaDon, h.MaKH, pd.MaCN, pd.MaDV, pd.MaPhien
+            FROM HOADON h
+            JOIN PHIENDICHVU pd ON pd.MaHoaDon = h.MaHoaDon
+            JOIN CUNGCAPDICHVU c ON c.MaCN = pd.MaCN AND c.MaDV = pd.MaDV
+            ORDER BY h.NgayLap DESC
+        """)).one()
+    return {
+        "ma_hoa_don": row.MaHoaDon,
+        "ma_kh": row.MaKH,
+        "ma_cn": row.MaCN,
+        "ma_dv": row.MaDV,
+        "ma_phien": row.MaPhien,
+        "ngay": dt.date.today().isoformat(),
+    }
+
+
+def budgeted_routes():
+    for route in app.routes:
+        for dep in getattr(route, "dependencies", []):
+            limit = getattr(dep.dependency, "limit", None)
+            if limit is not None:
+                yield route, limit
+
+
+def route_method(route) -> str:
+    return sorted(route.methods)[0]
+
+
+def is_read_only(route) -> bool:
+    return route_method(route) in ("GET", "HEAD")
+
+
+async def call(method: str, path: str, query: str, body: Optional[dict] = None) -> Tuple[int, Optional[int]]:
+    messages = []
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = [(b"content-type", b"application/json")] if body is not None else []
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "", "headers": headers,
+        "server": ("localhost", 8000), "client": ("127.0.0.1", 0),
+    }
+    await app(scope, receive, send)
+    start = next(m for m in messages if m["type"] == "http.response.start")
+    m = _QUERIES.search(dict(start["headers"]).get(b"server-timing", b"").decode())
+    return start["status"], int(m.group(1)) if m else None
+
+
+async def call_route(route, params: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+    """Gọi route với path / query (tham số có tên trùng trong params) và body (BODIES) mẫu."""
+    names = [p.name for p in route.dependant.query_params]
+    query = urlencode({k: params[k] for k in names if k in params})
+    body = BODIES[route.path](params) if route.path in BODIES else None
+    return await call(route_method(route), route.path.format(**params), query, body)
+
+
+def within_budget(status: int, count: Optional[int], limit: int) -> bool:
+    return 200 <= status < 300 and count is not None and count <= limit
+
+
+async def main() -> int:
+    params = sample_params()
+    failed = False
+    print(f"{'route':55} {'status':>6} {'sql':>4} {'budget':>6}")
+    for route, limit in budgeted_routes():
+        name = f"{route_method(route)} {route.path}"
+        if not is_read_only(route):
+            print(f"{name:55} {'-':>6} {'-':>4} {limit:>6} skip (ghi dữ liệu, xem tests/)")
+            continue
+        status, count = await call_route(route, params)
+        ok = within_budget(status, count, limit)
+        failed = failed or not ok
+        print(f"{name:55} {status:>6} {count!s:>4} {limit:>6} {'' if ok else 'FAIL'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,7 @@
+# scripts/datagen
+"""
+Sinh dữ liệu tổng hợp quy mô lớn (hàng triệu hóa đơn / phiên / toa thuốc) theo schema
+000_base.sql, tất định theo --seed, nạp bằng fast_executemany hoặc ghi file CSV / bcp.
+
+    python -m scripts.datagen.run --invoices 2000000 --seed 42 --end-date 2026-06-30
+"""
@@ -0,0 +1,356 @@
+# scripts/datagen/generate.py
+"""
+Sinh dòng cho KHACHHANG / THUCUNG / HOADON / PHIENDICHVU / KHAMBENH / TOATHUOC / TIEMPHONG / MUAHANG.
+
+- Tất định: random.Random(seed) dùng theo thứ tự => cùng seed + tham số + mã đầu dải sequence
+  cho ra cùng dữ liệu. Số thú cưng / số phiên (cần biết trước để giữ dải mã cho cả lô) lấy từ
+  luồng random riêng nên kết quả không phụ thuộc --chunk.
+- Mã lấy theo dải liên tục từ sequence (IdRanges.take), định dạng như DEFAULT của bảng
+  (009_wide_sequence_ids.sql) => ứng dụng tạo mã tiếp theo không trùng.
+- Thoả CHECK của 000_base.sql: giới tính, TrangThai, HinhThucThanhToan, Soluong > 0, SoLieu > 0;
+  TOATHUOC / MUAHANG không lặp sản phẩm trong 1 phiên (khoá chính).
+- TongTien tính giống dbo.fn_TongTienHoaDon (kể cả thứ tự làm tròn DECIMAL / FLOAT) để nạp
+  khi tắt trigger; đối chiếu: python -m scripts.check_invoice_totals --stored
+"""
+from __future__ import annotations
+
+import datetime as dt
+import random
+from array import array
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import text
+
+from scripts.datagen.profile import Weighted
+
+Row = Tuple[Any, ...]
+Batch = Dict[str, List[Row]]
+
+# thứ tự = thứ tự nạp (khoá ngoại)
+COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "KHACHHANG": ("MaKH", "Hoten", "CCCD", "SDT", "Email", "Gioitinh", "Ngaysinh", "Bac", "Tichluy"),
+    "THUCUNG": ("MaThuCung", "MaKH", "Ten", "Loai", "Giong", "NgaySinh", "GioiTinh"),
+    "HOADON": ("MaHoaDon", "NgayLap", "NhanVienLap", "MaKH", "TongTien", "KhuyenMai",
+               "HinhThucThanhToan", "MaCNGhiNhan"),
+    "PHIENDICHVU": ("MaPhien", "MaHoaDon", "MaThuCung", "MaDV", "MaCN", "GiaTien", "TrangThai",
+                    "ThoiDiemBatDau", "ThoiDiemKetThuc"),
+    "KHAMBENH": ("MaPhien", "BacSiPhuTrach", "CacTrieuChung", "ChanDoan", "NgayTaiKham"),
+    "TOATHUOC": ("MaPhien", "MaThuoc", "Soluong"),
+    "TIEMPHONG": ("MaPhien", "MaVC", "MaGoi", "BacSiPhuTrach", "NgayTiem", "SoLieu"),
+    "MUAHANG": ("MaPhien", "MaSP", "SoLuong"),
+}
+
+# bảng có mã tự sinh: (tiền tố, sequence)
+SEQUENCES: Dict[str, Tuple[str, str]] = {
+    "KHACHHANG": ("KH", "dbo.SEQ_KHACHHANG"),
+    "THUCUNG": ("TC", "dbo.SEQ_THUCUNG"),
+    "HOADON": ("HD", "dbo.SEQ_HOADON"),
+    "PHIENDICHVU": ("PD", "dbo.SEQ_PHIENDICHVU"),
+}
+
+MAX_ID = 99_999_999  # 2 ký tự tiền tố + 8 chữ số = VARCHAR(10)
+CENT = Decimal("0.01")
+
+HO = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ", "Ngô", "Dương", "Lý"]
+DEM = ["Văn", "Thị", "Minh", "Ngọc", "Thanh", "Hoàng", "Quốc", "Gia", "Bảo", "Thu"]
+TEN = ["An", "Bình", "Chi", "Dũng", "Giang", "Hà", "Hải", "Hùng", "Khoa", "Lan", "Linh", "Long",
+       "Mai", "Nam", "Nhi", "Phúc", "Quân", "Sơn", "Tâm", "Thảo", "Trang", "Tuấn", "Vy", "Yến"]
+TEN_PET = ["Lu Lu", "Miu", "Bông", "Mun", "Milu", "Kem", "Mập", "Đen", "Vàng", "Cún", "Mochi", "Bơ", "Sữa", "Tôm"]
+GIONG = {
+    "Chó": ["Poodle", "Corgi", "Husky", "Phú Quốc", "Becgie", "Samoyed", "Chihuahua", "Lai"],
+    "Mèo": ["Anh lông ngắn", "Ba Tư", "Xiêm", "Mèo mướp", "Munchkin", "Lai"],
+}
+TRIEU_CHUNG = ["Bỏ ăn", "Nôn", "Tiêu chảy", "Sốt", "Ho", "Ngứa, rụng lông", "Đi khập khiễng", "Chảy nước mắt"]
+CHAN_DOAN = ["Viêm ruột", "Viêm da", "Nhiễm ký sinh trùng", "Viêm đường hô hấp", "Viêm tai", "Khỏe mạnh"]
+OPEN_STATUS = Weighted({"BOOKING": 50, "IN_SERVICE": 30, "DONE_SERVICE": 20})
+
+
+def format_id(prefix: str, n: int) -> str:
+    """Giống DEFAULT của bảng: đệm 0 đủ 6 chữ số, dài hơn giữ nguyên (HD000123, HD1000000)."""
+    return prefix + str(n).zfill(6)
+
+
+def _dec(x: float) -> Decimal:
+    # CAST(float AS DECIMAL(18,2)) làm tròn half away from zero
+    return Decimal(repr(x)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def invoice_total(money: Decimal, vaccine: float, discount: float) -> Decimal:
+    """
+    dbo.fn_TongTienHoaDon cho hóa đơn không mua gói:
+    CAST(dịch vụ + thuốc + mua hàng AS DEC) + tiêm lẻ (FLOAT) -> DEC, * (1 - KM/100.0) (FLOAT) -> DEC
+    """
+    subtotal = money.quantize(CENT)
+    if vaccine:
+        subtotal = _dec(float(subtotal) + vaccine)
+    return _dec(float(subtotal) * (1 - discount / 100.0))
+
+
+class IdRanges:
+    """Lấy dải mã liên tục từ sequence: reserve(sequence, n) -> giá trị đầu tiên."""
+
+    def __init__(self, reserve: Callable[[str, int], int]):
+        self._reserve = reserve
+
+    def take(self, table: str, n: int) -> int:
+        if n <= 0:
+            return 0
+        first = self._reserve(SEQUENCES[table][1], n)
+        if first + n - 1 > MAX_ID:
+            raise ValueError(f"{SEQUENCES[table][1]} vượt {MAX_ID:,} (mã {table} tối đa 8 chữ số)")
+        return first
+
+
+@dataclass
+class Branch:
+    ma_cn: str
+    cashiers: List[str]               # NhanVienLap: tiếp tân / nhân viên bán hàng
+    vets: List[str]
+    services: List[str] = field(default_factory=list)   # CUNGCAPDICHVU, rỗng = mọi dịch vụ
+
+
+@dataclass
+class Reference:
+    """Danh mục có sẵn trong DB (seed / scripts.loadtest.seed) mà dữ liệu sinh ra tham chiếu tới."""
+    branches: List[Branch]
+    services: Dict[str, Decimal]      # MaDV -> DonGia
+    products: Dict[str, Decimal]      # MaSP -> DonGia
+    medicines: List[str]              # SANPHAM loại thuốc (TOATHUOC)
+    vaccines: Dict[str, Decimal]      # MaVC -> DonGia
+    skipped: List[str] = field(default_factory=list)     # chi nhánh thiếu nhân viên
+
+    @classmethod
+    def load(cls, conn) -> "Reference":
+        staff: Dict[str, Tuple[List[str], List[str]]] = {}
+        for r in conn.execute(text("""
+            SELECT MaNV, MaCN, ChucVu FROM NHANVIEN
+            WHERE MaCN IS NOT NULL AND MaNV <> 'NV_SYSTEM'
+            ORDER BY MaCN, MaNV
+        """)):
+            cashiers, vets = staff.setdefault(r.MaCN, ([], []))
+            if r.ChucVu in ("Tiếp tân", "Nhân viên bán hàng"):
+                cashiers.append(r.MaNV)
+            elif r.ChucVu == "Bác sĩ thú y":
+                vets.append(r.MaNV)
+
+        offered: Dict[str, List[str]] = {}
+        for r in conn.execute(text("SELECT MaCN, MaDV FROM CUNGCAPDICHVU ORDER BY MaCN, MaDV")):
+            offered.setdefault(r.MaCN, []).append(r.MaDV)
+
+        branches, skipped = [], []
+        for (ma_cn,) in conn.execute(text("SELECT MaCN FROM CHINHANH ORDER BY MaCN")):
+            cashiers, vets = staff.get(ma_cn, ([], []))
+            if cashiers and vets:
+                branches.append(Branch(ma_cn, cashiers, vets, offered.get(ma_cn, [])))
+            else:
+                skipped.append(ma_cn)
+
+        products = conn.execute(text("SELECT MaSP, DonGia, LoaiSP FROM SANPHAM ORDER BY MaSP")).all()
+        return cls(
+            branches=branches,
+            services={r.MaDV: r.DonGia for r in conn.execute(text("SELECT MaDV, DonGia FROM DICHVU ORDER BY MaDV"))},
+            products={r.MaSP: r.DonGia for r in products},
+            medicines=[r.MaSP for r in products if r.LoaiSP == "Thuốc"],
+            vaccines={r.MaVC: r.DonGia for r in conn.execute(text("SELECT MaVC, DonGia FROM VACCINE ORDER BY MaVC"))},
+            skipped=skipped,
+        )
+
+
+def ensure_staff(conn) -> int:
+    """Thêm 1 tiếp tân + 1 bác sĩ cho chi nhánh chưa có, để mọi chi nhánh đều sinh được hóa đơn."""
+    return conn.execute(text("""
+        INSERT INTO NHANVIEN (HoTen, NgaySinh, GioiTinh, ChucVu, MaCN, Luong, Thuong)
+        SELECT N'NV sinh dữ liệu ' + c.MaCN + N' ' + r.ChucVu, '1990-01-01', N'Nữ', r.ChucVu, c.MaCN, 10000000, 0
+        FROM CHINHANH c
+        CROSS JOIN (VALUES (N'Tiếp tân'), (N'Bác sĩ thú y')) r(ChucVu)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM NHANVIEN nv
+            WHERE nv.MaCN = c.MaCN AND nv.MaNV <> 'NV_SYSTEM'
+              AND (nv.ChucVu = r.ChucVu
+                   OR (r.ChucVu = N'Tiếp tân' AND nv.ChucVu = N'Nhân viên bán hàng'))
+        )
+    """)).rowcount
+
+
+def _distinct(rnd: random.Random, pool: Sequence[str], k: int) -> List[str]:
+    return rnd.sample(pool, min(k, len(pool)))
+
+
+class Generator:
+    def __init__(self, ref: Reference, profile: Dict[str, Any], seed: int, end: dt.date, ids: IdRanges):
+        if not ref.branches:
+            raise ValueError("Không có chi nhánh nào đủ tiếp tân + bác sĩ (chạy với --fill-staff)")
+        self.ref = ref
+        self.p = profile
+        self.rnd = random.Random(seed)
+        self.count_rnd = random.Random(f"{seed}:counts")
+        self.end = end
+        self.ids = ids
+
+        weights = profile["branches"] or {
+            b.ma_cn: 1 / (rank ** profile["branch_skew"]) for rank, b in enumerate(ref.branches, 1)
+        }
+        by_code = {b.ma_cn: b for b in ref.branches}
+        unknown = set(weights) - set(by_code)
+        if unknown:
+            raise ValueError(f"Chi nhánh không tồn tại / thiếu nhân viên: {', '.join(sorted(unknown))}")
+        self.branch_code = Weighted(weights)
+        self.by_code = by_code
+
+        retail = profile["retail_service"]
+        self.service: Dict[str, Weighted[str]] = {}
+        for b in (by_code[k] for k in self.branch_code.values):
+            offered = set(b.services or ref.services) | {retail}
+            w = {**profile["services"], **profile["branch_services"].get(b.ma_cn, {})}
+            self.service[b.ma_cn] = Weighted({
+                dv: x for dv, x in w.items() if dv in offered and dv in ref.services
+            })
+
+        self.exam = set(profile["exam_services"])
+        self.vaccine = set(profile["vaccine_services"])
+        self.retail = retail
+        self.pets = Weighted.of_ints(profile["pets_per_customer"])
+        self.sessions = Weighted.of_ints(profile["sessions_per_invoice"])
+        self.rx_items = Weighted.of_ints(profile["prescription_items"])
+        self.retail_items = Weighted.of_ints(profile["retail_items"])
+        self.quantity = Weighted.of_ints(profile["quantity"])
+        self.discount = Weighted.of_ints(profile["discount"])
+        self.payment = Weighted(profile["payment"])
+        self.product_list = list(ref.products)
+        self.vaccine_list = list(ref.vaccines)
+
+        # khách đã sinh: mã số + dải mã thú cưng (array => ~17 byte / khách thay vì tuple chuỗi)
+        self._kh = array("q")
+        self._pet_first = array("q")
+        self._pet_count = array("b")
+
+    # ---------------- khách hàng + thú cưng ----------------
+    def customers(self, n: int, chunk: int) -> Iterator[Batch]:
+        rnd = self.rnd
+        for start in range(0, n, chunk):
+            size = min(chunk, n - start)
+            pets = [self.pets.pick(self.count_rnd) for _ in range(size)]
+            kh0 = self.ids.take("KHACHHANG", size)
+            tc0 = self.ids.take("THUCUNG", sum(pets))
+
+            kh_rows: List[Row] = []
+            tc_rows: List[Row] = []
+            tc = tc0
+            for i in range(size):
+                num = kh0 + i
+                ma_kh = format_id("KH", num)
+                nam = rnd.random() < 0.5
+                kh_rows.append((
+                    ma_kh,
+                    f"{rnd.choice(HO)} {'Văn' if nam else rnd.choice(DEM)} {rnd.choice(TEN)}",
+                    "DG" + str(num).zfill(10),                  # CCCD UNIQUE, không trùng dữ liệu thật
+                    "09" + str(num % 100_000_000).zfill(8),
+                    f"kh{num}@example.com",
+                    "Nam" if nam else "Nữ",
+                    self.end - dt.timedelta(days=rnd.randint(18 * 365, 65 * 365)),
+                    "Cơ bản",
+                    0,
+                ))
+                for _ in range(pets[i]):
+                    loai = "Chó" if rnd.random() < 0.6 else "Mèo"
+                    tc_rows.append((
+                        format_id("TC", tc), ma_kh, rnd.choice(TEN_PET), loai, rnd.choice(GIONG[loai]),
+                        self.end - dt.timedelta(days=rnd.randint(60, 15 * 365)),
+                        "Đực" if rnd.random() < 0.5 else "Cái",
+                    ))
+                    tc += 1
+                self._kh.append(num)
+                self._pet_first.append(tc - pets[i])
+                self._pet_count.append(pets[i])
+            yield {"KHACHHANG": kh_rows, "THUCUNG": tc_rows}
+
+    def _customer(self) -> int:
+        # u^skew dồn về đầu danh sách: skew = 1 đều, lớn hơn => ít khách mua nhiều
+        return int(len(self._kh) * self.rnd.random() ** self.p["customer_skew"])
+
+    # ---------------- hóa đơn + phiên + chi tiết ----------------
+    def invoices(self, n: int, chunk: int) -> Iterator[Batch]:
+        if not self._kh:
+            raise ValueError("Chưa sinh khách hàng (customers) trước khi sinh hóa đơn")
+        rnd, p = self.rnd, self.p
+        hour_from, hour_to = p["hours"]
+        for start in range(0, n, chunk):
+            size = min(chunk, n - start)
+            counts = [self.sessions.pick(self.count_rnd) for _ in range(size)]
+            hd0 = self.ids.take("HOADON", size)
+            pd = self.ids.take("PHIENDICHVU", sum(counts))
+
+            batch: Batch = {t: [] for t in COLUMNS if t not in ("KHACHHANG", "THUCUNG")}
+            for i in range(size):
+                ma_hd = format_id("HD", hd0 + i)
+                branch = self.by_code[self.branch_code.pick(rnd)]
+                days_ago = rnd.randrange(p["days"])
+                day = self.end - dt.timedelta(days=days_ago)
+                ngay_lap = dt.datetime.combine(day, dt.time(rnd.randrange(hour_from, hour_to), rnd.randrange(60)))
+                c = self._customer()
+                ma_kh = format_id("KH", self._kh[c])
+                paid = not (days_ago < p["open_days"] and rnd.random() < p["open_rate"])
+                discount = self.discount.pick(rnd)
+
+                money, vaccine_money = Decimal(0), 0.0
+                for k in range(counts[i]):
+                    ma_phien = format_id("PD", pd)
+                    pd += 1
+                    ma_dv = self.service[branch.ma_cn].pick(rnd)
+                    if paid:
+                        status = "CANCELLED" if rnd.random() < p["cancel_rate"] else "CONFIRMED"
+                    else:
+                        status = OPEN_STATUS.pick(rnd)
+                    begin = ngay_lap + dt.timedelta(minutes=30 * k)
+                    end = None if status == "BOOKING" else begin + dt.timedelta(minutes=30)
+                    counted = status != "CANCELLED"
+
+                    pet = None
+                    if ma_dv != self.retail:
+                        pet = format_id("TC", self._pet_first[c] + rnd.randrange(self._pet_count[c]))
+                    price = self.ref.services[ma_dv]
+                    batch["PHIENDICHVU"].append(
+                        (ma_phien, ma_hd, pet, ma_dv, branch.ma_cn, price, status, begin, end))
+                    if counted:
+                        money += price
+
+                    if ma_dv in self.exam:
+                        vet = rnd.choice(branch.vets)
+                        follow = day + dt.timedelta(days=14) if rnd.random() < p["follow_up_rate"] else None
+                        batch["KHAMBENH"].append(
+                            (ma_phien, vet, rnd.choice(TRIEU_CHUNG), rnd.choice(CHAN_DOAN), follow))
+                        if self.ref.medicines and rnd.random() < p["prescription_rate"]:
+                            for sp in _distinct(rnd, self.ref.medicines, self.rx_items.pick(rnd)):
+                                qty = self.quantity.pick(rnd)
+                                batch["TOATHUOC"].append((ma_phien, sp, qty))
+                                if counted:
+                                    money += qty * self.ref.products[sp]
+                    elif ma_dv in self.vaccine and self.vaccine_list:
+                        vc = rnd.choice(self.vaccine_list)
+                        batch["TIEMPHONG"].append((ma_phien, vc, None, rnd.choice(branch.vets), day, 1.0))
+                        if counted:
+                            vaccine_money += 1.0 * float(self.ref.vaccines[vc])
+                    elif ma_dv == self.retail and self.product_list:
+                        for sp in _distinct(rnd, self.product_list, self.retail_items.pick(rnd)):
+                            qty = self.quantity.pick(rnd)
+                            batch["MUAHANG"].append((ma_phien, sp, qty))
+                            if counted:
+                                money += qty * self.ref.products[sp]
+
+                batch["HOADON"].append((
+                    ma_hd, ngay_lap, rnd.choice(branch.cashiers), ma_kh,
+                    invoice_total(money, vaccine_money, discount), float(discount),
+                    self.payment.pick(rnd) if paid else None,
+                    branch.ma_cn if paid else None,     # trg_HOADON_DoanhThu chốt khi thanh toán
+                ))
+            yield batch
+
+    @property
+    def customer_count(self) -> int:
+        return len(self._kh)
+
+
+def rows_in(batch: Batch) -> int:
+    return sum(len(rows) for rows in batch.values())
@@ -0,0 +1,173 @@
+# scripts/datagen/output.py
+"""
+Nơi ghi dữ liệu sinh ra:
+  DbSink   - nạp thẳng bằng app.db.bulk.bulk_insert (fast_executemany), 1 transaction / chunk
+  CsvSink  - NNN_<TABLE>.csv (UTF-8, có header), nạp lại bằng python -m scripts.bulk_load
+  BcpSink  - <TABLE>.dat (UTF-16LE, tab) + <TABLE>.fmt (format file non-XML) + load.sh gọi bcp
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import io
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.db.bulk import DEFAULT_BATCH_SIZE, Progress, bulk_insert
+from scripts.datagen.generate import COLUMNS, Batch
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, dt.datetime):
+        return value.isoformat(timespec="seconds")   # 2026-06-30T08:15:00: không phụ thuộc DATEFORMAT
+    if isinstance(value, dt.date):
+        return value.isoformat()
+    return str(value)
+
+
+class DbSink:
+    def __init__(self, engine, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.progress = {t: Progress(t) for t in COLUMNS}
+
+        import pyodbc
+        # cột NVARCHAR(MAX): khai báo kích thước để fast_executemany không cấp buffer tối đa cho mỗi ô
+        self.input_sizes: Dict[str, List[Any]] = {
+            "KHAMBENH": [(pyodbc.SQL_VARCHAR, 10, 0), (pyodbc.SQL_VARCHAR, 10, 0),
+                         (pyodbc.SQL_WVARCHAR, 200, 0), (pyodbc.SQL_WVARCHAR, 200, 0),
+                         (pyodbc.SQL_TYPE_DATE, 0, 0)],
+        }
+
+    def write(self, batch: Batch) -> None:
+        with self.engine.begin() as conn:
+            for table, rows in batch.items():
+                if rows:
+                    bulk_insert(conn, table, COLUMNS[table], rows, self.batch_size,
+                                self.progress[table], self.input_sizes.get(table))
+
+    def close(self) -> Dict[str, Dict[str, float]]:
+        return {t: p.finish() for t, p in self.progress.items() if p.done}
+
+
+class _FileSink(ABC):
+    def __init__(self, out: Path):
+        self.out = out
+        self.out.mkdir(parents=True, exist_ok=True)
+        self.progress = {t: Progress(t) for t in COLUMNS}
+        self._files: Dict[str, io.TextIOBase] = {}
+
+    @abstractmethod
+    def _open(self, table: str) -> io.TextIOBase:
+        """Mở file của bảng (lần đầu bảng có dòng), trả file đã ghi header nếu cần."""
+
+    @abstractmethod
+    def _write_rows(self, f, rows) -> None:
+        """Ghi 1 lô dòng (tuple theo COLUMNS[table]) vào file do _open trả về."""
+
+    def write(self, batch: Batch) -> None:
+        for table, rows in batch.items():
+            if not rows:
+                continue
+            f = self._files.get(table)
+            if f is None:
+                f = self._files[table] = self._open(table)
+            self._write_rows(f, rows)
+            self.progress[table].update(len(rows))
+
+    def close(self) -> Dict[str, Dict[str, float]]:
+        for f in self._files.values():
+            f.close()
+        return {t: p.finish() for t, p in self.progress.items() if p.done}
+
+
+class CsvSink(_FileSink):
+    def _open(self, table: str):
+        index = list(COLUMNS).index(table) + 1
+        f = open(self.out / f"{index:03d}_{table}.csv", "w", encoding="utf-8", newline="")
+        csv.writer(f).writerow(COLUMNS[table])
+        return f
+
+    def _write_rows(self, f, rows) -> None:
+        csv.writer(f).writerows([_text(v) for v in row] for row in rows)
+
+
+class BcpSink(_FileSink):
+    """
+    Ký tự Unicode (SQLNCHAR) để giữ tiếng Việt ở mọi bản bcp (Windows / Linux);
+    dữ liệu sinh ra không chứa tab / xuống dòng nên không cần escape.
+    """
+
+    def __init__(self, out: Path, conn, database: str, follow_up: Optional[List[str]] = None):
+        super().__init__(out)
+        self.database = database
+        self.follow_up = follow_up or []
+        self._columns = self._server_columns(conn)
+
+    @staticmethod
+    def _server_columns(conn) -> Dict[str, Dict[str, tuple]]:
+        # format file cần thứ tự cột phía server (MaCNGhiNhan thêm sau => cuối bảng HOADON)
+        rows = conn.execute(text("""
+            SELECT OBJECT_NAME(c.object_id) AS Bang, c.name AS Cot,
+                   ROW_NUMBER() OVER (PARTITION BY c.object_id ORDER BY c.column_id) AS ThuTu,
+                   t.name AS Kieu, c.max_length
+            FROM sys.columns c
+            JOIN sys.types t ON t.user_type_id = c.user_type_id
+            WHERE c.object_id IN (SELECT OBJECT_ID(value) FROM STRING_SPLIT(:tables, ','))
+        """), {"tables": ",".join(COLUMNS)}).all()
+        columns: Dict[str, Dict[str, tuple]] = {}
+        for r in rows:
+            columns.setdefault(r.Bang, {})[r.Cot] = (r.ThuTu, r.Kieu, r.max_length)
+        return columns
+
+    def _format_file(self, table: str) -> str:
+        cols = COLUMNS[table]
+        lines = ["14.0", str(len(cols))]
+        for i, name in enumerate(cols, 1):
+            order, kind, max_length = self._columns[table][name]
+            if max_length == -1:
+                length = 0
+            elif kind in ("varchar", "char"):
+                length = max_length * 2
+            elif kind in ("nvarchar", "nchar"):
+                length = max_length
+            else:
+                length = 100
+            term = r'"\r\0\n\0"' if i == len(cols) else r'"\t\0"'
+            lines.append(f'{i}\tSQLNCHAR\t0\t{length}\t{term}\t{order}\t{name}\t""')
+        return "\n".join(lines) + "\n"
+
+    def _open(self, table: str):
+        (self.out / f"{table}.fmt").write_text(self._format_file(table), encoding="ascii")
+        return open(self.out / f"{table}.dat", "w", encoding="utf-16-le", newline="")
+
+    def _write_rows(self, f, rows) -> None:
+        f.writelines("\t".join(_text(v) for v in row) + "\r\n" for row in rows)
+
+    def close(self) -> Dict[str, Dict[str, float]]:
+        stats = super().close()
+        lines = [
+            "#!/bin/sh",
+            "# Sinh bởi python -m scripts.datagen.run --format bcp; chạy từ thư mục gốc repo.",
+            "# BCP_OPTS: kết nối, ví dụ -S localhost,1433 -U sa -P '...' (bcp 18 thêm -u)",
+            "# CHECK_CONSTRAINTS: giữ FK / CHECK ở trạng thái trusted (optimizer còn dùng được).",
+            "# -q: QUOTED_IDENTIFIER ON, bắt buộc khi bảng có filtered index (PHIENDICHVU).",
+            "# bcp không chạy trigger => các bước cuối file dựng lại số liệu trigger thường làm.",
+            "set -e",
+            'DIR="$(dirname "$0")"',
+        ]
+        for table in COLUMNS:
+            if table in self._files:
+                lines.append(
+                    f'bcp {self.database}.dbo.{table} in "$DIR/{table}.dat" -f "$DIR/{table}.fmt" '
+                    f'-k -q -b 50000 -h "TABLOCK,CHECK_CONSTRAINTS" $BCP_OPTS'
+                )
+        lines += self.follow_up
+        path = self.out / "load.sh"
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        path.chmod(0o755)
+        return stats
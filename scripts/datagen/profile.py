@@ -0,0 +1,89 @@
+# scripts/datagen/profile.py
+"""
+Phân phối dùng khi sinh dữ liệu. Ghi đè bằng file JSON (--profile), khoá nào không có
+thì lấy mặc định, ví dụ:
+
+    {
+      "days": 365,
+      "branches": {"CN001": 40, "CN002": 25, "CN003": 10},
+      "services": {"DV001": 50, "DV002": 30, "DV_RETAIL": 20},
+      "branch_services": {"CN003": {"DV004": 30}},
+      "sessions_per_invoice": {"1": 50, "2": 30, "3": 20}
+    }
+
+- Trọng số là số tương đối (không cần cộng = 100); trọng số 0 = không sinh.
+- branches rỗng: chia theo Zipf (chi nhánh thứ k có trọng số 1 / k^branch_skew, theo MaCN).
+- branch_services: ghi đè trọng số dịch vụ riêng cho chi nhánh; dịch vụ chỉ sinh ở chi nhánh
+  có cung cấp (CUNGCAPDICHVU), chi nhánh chưa khai báo dịch vụ nào thì dùng mọi dịch vụ.
+- Khoá dạng số ("1", "2"...) là giá trị được chọn, ví dụ số phiên / hóa đơn.
+"""
+from __future__ import annotations
+
+import bisect
+import copy
+import itertools
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, Generic, Hashable, Mapping, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+DEFAULT_PROFILE: Dict[str, Any] = {
+    "days": 730,                      # NgayLap rải trong N ngày tính tới --end-date
+    "hours": [8, 20],                 # giờ lập hóa đơn [từ, tới)
+    "open_days": 2,                   # hóa đơn trong N ngày cuối có thể chưa thanh toán
+    "open_rate": 0.3,
+    "cancel_rate": 0.02,              # phiên bị huỷ trong hóa đơn đã thanh toán
+    "branches": {},
+    "branch_skew": 0.8,
+    "customer_skew": 1.5,             # > 1: một nhóm khách quay lại nhiều hơn
+    "invoices_per_customer": 6,       # dùng khi không truyền --customers
+    "services": {
+        "DV001": 35, "DV002": 20, "DV003": 8, "DV004": 6, "DV005": 3,
+        "DV006": 5, "DV007": 4, "DV008": 1, "DV009": 3, "DV010": 3, "DV_RETAIL": 12,
+    },
+    "branch_services": {},
+    "exam_services": ["DV001"],       # phiên có KHAMBENH (+ TOATHUOC)
+    "vaccine_services": ["DV002"],    # phiên có TIEMPHONG (tiêm lẻ)
+    "retail_service": "DV_RETAIL",    # phiên có MUAHANG, không gắn thú cưng
+    "sessions_per_invoice": {"1": 65, "2": 25, "3": 10},
+    "pets_per_customer": {"1": 60, "2": 30, "3": 10},
+    "prescription_rate": 0.7,
+    "prescription_items": {"1": 40, "2": 35, "3": 20, "4": 5},
+    "retail_items": {"1": 50, "2": 30, "3": 20},
+    "quantity": {"1": 55, "2": 25, "3": 12, "5": 8},
+    "discount": {"0": 85, "5": 10, "10": 5},
+    "payment": {"Chuyển khoản": 60, "Tiền mặt": 40},
+    "follow_up_rate": 0.2,            # KHAMBENH có NgayTaiKham
+}
+
+
+def load_profile(path: Optional[Path] = None) -> Dict[str, Any]:
+    profile = copy.deepcopy(DEFAULT_PROFILE)
+    if path is not None:
+        override = json.loads(Path(path).read_text(encoding="utf-8"))
+        unknown = set(override) - set(DEFAULT_PROFILE)
+        if unknown:
+            raise ValueError(f"Khoá profile không hợp lệ: {', '.join(sorted(unknown))}")
+        profile.update(override)
+    return profile
+
+
+class Weighted(Generic[K]):
+    """Chọn theo trọng số bằng bisect trên tổng cộng dồn (nhanh hơn random.choices từng lần)."""
+
+    def __init__(self, weights: Mapping[K, float]):
+        items = [(k, float(w)) for k, w in weights.items() if float(w) > 0]
+        if not items:
+            raise ValueError("Phân phối rỗng (mọi trọng số = 0)")
+        self.values = [k for k, _ in items]
+        self.cum = list(itertools.accumulate(w for _, w in items))
+        self.total = self.cum[-1]
+
+    def pick(self, rnd: random.Random) -> K:
+        return self.values[bisect.bisect_right(self.cum, rnd.random() * self.total)]
+
+    @classmethod
+    def of_ints(cls, weights: Mapping[str, float]) -> "Weighted[int]":
+        return cls({int(k): w for k, w in weights.items()})
@@ -0,0 +1,127 @@
+# scripts/datagen/run.py
+"""
+Sinh dữ liệu quy mô lớn cho đo hiệu năng.
+
+    python -m scripts.datagen.run --invoices 2000000 --seed 42 --end-date 2026-06-30
+    python -m scripts.datagen.run --invoices 5000000 --profile bench/profile.json --fill-staff
+    python -m scripts.datagen.run --invoices 2000000 --out data/gen --format bcp   # rồi data/gen/load.sh
+    python -m scripts.datagen.run --invoices 200000 --out data/gen --format csv    # scripts.bulk_load
+
+- Phân phối (chi nhánh, dịch vụ, số phiên / hóa đơn, toa thuốc...): scripts/datagen/profile.py.
+- Tất định theo --seed và --end-date (mặc định hôm nay => truyền cố định để so sánh giữa các lần).
+- Mã KH / TC / HD / PD giữ trước bằng sp_sequence_get_range => app sinh mã tiếp theo không trùng,
+  kể cả khi nạp file sau. Tối đa 99.999.999 mỗi loại (xem 009_wide_sequence_ids.sql).
+- Nạp thẳng: tắt trigger của các bảng được nạp trong lúc chạy (TongTien / MaCNGhiNhan đã tính sẵn),
+  xong thì dựng lại bảng tổng hợp doanh thu cho khoảng ngày sinh ra và điểm / hạng hội viên.
+  Chỉ chạy trên DB benchmark.
+"""
+import argparse
+import datetime as dt
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.bulk import DEFAULT_BATCH_SIZE
+from app.db.session import ENGINE
+from scripts.backfill_revenue import backfill
+from scripts.recalc_loyalty import recalc
+from scripts.datagen.generate import COLUMNS, Generator, IdRanges, Reference, ensure_staff
+from scripts.datagen.output import BcpSink, CsvSink, DbSink
+from scripts.datagen.profile import load_profile
+
+RESERVE = """
+SET NOCOUNT ON;
+DECLARE @first SQL_VARIANT;
+EXEC sys.sp_sequence_get_range @sequence_name = :seq, @range_size = :n, @range_first_value = @first OUTPUT;
+SELECT CAST(@first AS BIGINT);
+"""
+
+
+def reserve(sequence: str, n: int) -> int:
+    with ENGINE.begin() as conn:
+        return int(conn.execute(text(RESERVE), {"seq": sequence, "n": n}).scalar())
+
+
+@contextmanager
+def triggers_disabled(enabled: bool):
+    if not enabled:
+        yield
+        return
+    with ENGINE.begin() as conn:
+        for table in COLUMNS:
+            conn.execute(text(f"ALTER TABLE dbo.[{table}] DISABLE TRIGGER ALL"))
+    try:
+        yield
+    finally:
+        with ENGINE.begin() as conn:
+            for table in COLUMNS:
+                conn.execute(text(f"ALTER TABLE dbo.[{table}] ENABLE TRIGGER ALL"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu tổng hợp quy mô lớn cho PetCareX")
+    parser.add_argument("--invoices", type=int, required=True)
+    parser.add_argument("--customers", type=int, help="mặc định = invoices / invoices_per_customer")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--end-date", type=dt.date.fromisoformat, default=dt.date.today(),
+                        help="YYYY-MM-DD, ngày cuối của NgayLap")
+    parser.add_argument("--profile", type=Path, help="file JSON ghi đè phân phối mặc định")
+    parser.add_argument("--chunk", type=int, default=50000, help="số khách / hóa đơn mỗi lô (transaction)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="số dòng mỗi executemany")
+    parser.add_argument("--out", type=Path, help="ghi file vào thư mục này thay vì nạp thẳng")
+    parser.add_argument("--format", choices=["csv", "bcp"], default="bcp")
+    parser.add_argument("--fill-staff", action="store_true",
+                        help="thêm tiếp tân / bác sĩ cho chi nhánh chưa có (mặc định bỏ qua chi nhánh đó)")
+    parser.add_argument("--keep-triggers", action="store_true",
+                        help="nạp thẳng mà không tắt trigger (chậm, trigger tự tính TongTien / doanh thu)")
+    args = parser.parse_args()
+
+    profile = load_profile(args.profile)
+    customers = args.customers or max(1, round(args.invoices / profile["invoices_per_customer"]))
+    start_date = args.end_date - dt.timedelta(days=profile["days"] - 1)
+
+    with ENGINE.begin() as conn:
+        if args.fill_staff:
+            print(f"fill-staff: +{ensure_staff(conn)} nhân viên")
+        ref = Reference.load(conn)
+        if ref.skipped:
+            print("Bỏ qua chi nhánh thiếu tiếp tân / bác sĩ:", ", ".join(ref.skipped))
+
+        follow_up = [f"python -m scripts.backfill_revenue --from {start_date} --to {args.end_date}",
+                     "python -m scripts.recalc_loyalty"]
+        if args.out is None:
+            sink = DbSink(ENGINE, args.batch_size)
+        elif args.format == "csv":
+            sink = CsvSink(args.out)
+        else:
+            sink = BcpSink(args.out, conn, settings.MSSQL_DB, follow_up)
+
+    gen = Generator(ref, profile, args.seed, args.end_date, IdRanges(reserve))
+    load_db = args.out is None
+    start = time.perf_counter()
+
+    with triggers_disabled(load_db and not args.keep_triggers):
+        for batch in gen.customers(customers, args.chunk):
+            sink.write(batch)
+        for batch in gen.invoices(args.invoices, args.chunk):
+            sink.write(batch)
+        stats = sink.close()
+
+    for table, s in stats.items():
+        print(f"{table:12} {s['rows']:>12,} rows  {s['rows_per_s'] or 0:>10,.0f} rows/s")
+    print(f"Generated {customers:,} customers / {args.invoices:,} invoices in {time.perf_counter() - start:.1f}s")
+
+    if load_db and not args.keep_triggers:
+        backfill(start_date.isoformat(), args.end_date.isoformat())
+        print("Backfilled revenue rollup:", start_date, "->", args.end_date)
+        recalc()
+        print("Recalculated loyalty points / tiers")
+    elif not load_db:
+        print(f"Wrote {args.out}; sau khi nạp chạy:", *follow_up, sep="\n  ")
+
+
+if __name__ == "__main__":
+    main()
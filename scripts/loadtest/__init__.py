@@ -0,0 +1,3 @@
+# scripts/loadtest: dữ liệu tổng hợp + tải mô phỏng cho API (chạy trên DB benchmark)
+#   python -m scripts.loadtest.seed --customers 50000 --invoices 200000
+#   python -m scripts.loadtest.run --url http://localhost:8000 --users 50 --duration 60 --json bench/loadtest.json
@@ -0,0 +1,138 @@
+# scripts/loadtest/run.py
+"""
+Tải mô phỏng (asyncio + httpx) lên API đang chạy, báo p50/p95/p99 + throughput theo endpoint.
+
+    uvicorn app.main:app --workers 4 &
+    python -m scripts.loadtest.run --url http://localhost:8000 --users 50 --duration 60 \
+        --mix customer=60,receptionist=20,veterinarian=12,company=8 --json bench/loadtest.json
+    python -m scripts.loadtest.run ... --compare bench/loadtest-<commit cũ>.json
+
+- Mỗi user ảo chọn 1 vai theo --mix, lặp: chọn thao tác theo trọng số của vai -> gọi -> nghỉ --think.
+- --seed cố định chuỗi thao tác / tham số để so sánh giữa các commit.
+- Thao tác ghi (thêm vào giỏ, đặt lịch) tạo dữ liệu thật: chỉ chạy trên DB benchmark.
+- File JSON ghi kèm git commit (scripts/_bench.write_json); --compare in chênh lệch p95 / throughput.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from app.db.session import ENGINE
+from scripts._bench import print_table, summarize, write_json
+from scripts.loadtest.scenarios import DEFAULT_MIX, PERSONAS, Context, parse_mix
+
+
+class Recorder:
+    def __init__(self):
+        self.latency_ms: Dict[str, List[float]] = defaultdict(list)
+        self.status: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def add(self, label: str, ms: float, status: str) -> None:
+        self.latency_ms[label].append(ms)
+        self.status[label][status] += 1
+
+
+async def user(uid: int, client: httpx.AsyncClient, ctx: Context, mix: Dict[str, int],
+               rec: Recorder, deadline: float, think: float, seed: int, ramp: float) -> None:
+    rnd = random.Random(seed * 100003 + uid)
+    persona = rnd.choices(list(mix), weights=list(mix.values()))[0]
+    actions = PERSONAS[persona]
+    labels, weights = list(actions), [w for _, w in actions.values()]
+
+    await asyncio.sleep(ramp * uid)  # tăng dần số user thay vì dồn cùng lúc
+    while time.perf_counter() < deadline:
+        label = rnd.choices(labels, weights=weights)[0]
+        method, path, params = actions[label][0](ctx, rnd)
+        start = time.perf_counter()
+        try:
+            resp = await client.request(method, path, params=params)
+            status = str(resp.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        rec.add(label, (time.perf_counter() - start) * 1000, status)
+        if think:
+            await asyncio.sleep(rnd.expovariate(1 / think))
+
+
+async def run(url: str, users: int, duration: float, mix: Dict[str, int], think: float,
+              seed: int, ramp: float, timeout: float):
+    with ENGINE.connect() as conn:
+        ctx = Context.load(conn)
+
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            user(i, client, ctx, mix, rec, deadline, think, seed, ramp / max(users, 1))
+            for i in range(users)
+        ))
+        elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for label in sorted(rec.latency_ms):
+        samples = rec.latency_ms[label]
+        stats = summarize(samples)
+        stats["rps"] = round(len(samples) / elapsed, 2)
+        stats["errors"] = sum(n for s, n in rec.status[label].items() if not s.startswith(("2", "3")))
+        stats["status"] = dict(rec.status[label])
+        endpoints[label] = stats
+
+    all_samples = [ms for samples in rec.latency_ms.values() for ms in samples]
+    total = summarize(all_samples)
+    total["rps"] = round(len(all_samples) / elapsed, 2)
+    total["errors"] = sum(s["errors"] for s in endpoints.values())
+    return {
+        "url": url, "users": users, "duration_s": round(elapsed, 1), "mix": mix,
+        "think_s": think, "seed": seed, "total": total, "endpoints": endpoints,
+    }
+
+
+def report(result) -> None:
+    print_table({**result["endpoints"], "TOTAL": result["total"]})
+    print()
+    for label, stats in {**result["endpoints"], "TOTAL": result["total"]}.items():
+        print(f"{label}: {stats['rps']} req/s, {stats['errors']} errors")
+
+
+def compare(result, path: str) -> None:
+    old = json.loads(open(path, encoding="utf-8").read())
+    print(f"\nSo với {path} (git {old.get('git', '?')}):")
+    print(f"{'endpoint':45} {'p95 cũ':>10} {'p95 mới':>10} {'Δ%':>7} {'rps cũ':>8} {'rps mới':>8}")
+    rows = {**result["endpoints"], "TOTAL": result["total"]}
+    old_rows = {**old["endpoints"], "TOTAL": old["total"]}
+    for label, new in rows.items():
+        prev = old_rows.get(label)
+        if not prev or not prev.get("p95_ms"):
+            continue
+        delta = (new["p95_ms"] - prev["p95_ms"]) * 100 / prev["p95_ms"]
+        print(f"{label:45} {prev['p95_ms']:>10} {new['p95_ms']:>10} {delta:>+7.1f} {prev['rps']:>8} {new['rps']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test PetCareX API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60, help="giây")
+    parser.add_argument("--ramp", type=float, default=5, help="giây để khởi động hết user")
+    parser.add_argument("--think", type=float, default=0.2, help="thời gian nghỉ trung bình (giây), 0 = không nghỉ")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    parser.add_argument("--compare", help="file JSON của lần chạy trước để so sánh")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.users, args.duration, parse_mix(args.mix),
+                             args.think, args.seed, args.ramp, args.timeout))
+    report(result)
+    if args.compare:
+        compare(result, args.compare)
+    if args.json:
+        write_json(args.json, {"benchmark": "loadtest", **result})
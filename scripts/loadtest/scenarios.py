@@ -0,0 +1,210 @@
+# scripts/loadtest/scenarios.py
+"""
+Các "vai" người dùng và tỉ lệ thao tác của từng vai, theo cách frontend gọi API:
+  customer      - xem gói / dịch vụ / sản phẩm, lịch hẹn, hóa đơn, thêm vào giỏ, đặt lịch
+  receptionist  - tra cứu hóa đơn, lịch đặt, lịch khám / tiêm trong ngày, tồn kho
+  veterinarian  - lịch khám, lịch sử khám / tiêm của thú cưng, danh mục thuốc / vaccine
+  company       - dashboard CT1-CT8, doanh thu chi nhánh, tra cứu nhân viên
+
+Mỗi Action trả (method, path, params); label là route template để gom số liệu theo endpoint.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import text
+
+Request = Tuple[str, str, Dict[str, object]]
+
+
+@dataclass
+class Context:
+    """Mã có sẵn trong DB để tạo tham số hợp lệ (ưu tiên dữ liệu LT của scripts.loadtest.seed)."""
+    customers: List[Tuple[str, str]]          # (MaKH, MaThuCung)
+    branches: List[str]
+    products: List[str]
+    services: List[str]
+    invoices: List[Tuple[str, str]]           # (MaHoaDon, MaKH)
+    staff_keywords: List[str]
+
+    @classmethod
+    def load(cls, conn, sample: int = 2000) -> "Context":
+        def rows(sql: str):
+            return conn.execute(text(sql), {"n": sample}).all()
+
+        customers = [tuple(r) for r in rows("""
+            SELECT TOP (:n) k.MaKH, t.MaThuCung
+            FROM KHACHHANG k
+            CROSS APPLY (SELECT TOP 1 MaThuCung FROM THUCUNG WHERE MaKH = k.MaKH ORDER BY MaThuCung) t
+            ORDER BY CASE WHEN k.CCCD LIKE 'LT%' THEN 0 ELSE 1 END, NEWID()
+        """)]
+        branches = [r[0] for r in rows("""
+            SELECT TOP (:n) c.MaCN FROM CHINHANH c
+            WHERE EXISTS (SELECT 1 FROM NHANVIEN nv WHERE nv.MaCN = c.MaCN)
+            ORDER BY c.MaCN
+        """)]
+        products = [r[0] for r in rows("SELECT TOP (:n) MaSP FROM SANPHAM ORDER BY MaSP")]
+        services = [r[0] for r in rows("SELECT TOP (:n) MaDV FROM DICHVU WHERE MaDV <> 'DV_RETAIL' ORDER BY MaDV")]
+        invoices = [tuple(r) for r in rows("""
+            SELECT TOP (:n) MaHoaDon, MaKH FROM HOADON
+            WHERE MaKH IS NOT NULL
+            ORDER BY NEWID()
+        """)]
+        if not (customers and branches and products and services and invoices):
+            raise SystemExit("DB chưa có dữ liệu: chạy python -m scripts.loadtest.seed trước")
+        return cls(customers, branches, products, services, invoices, ["Nguyễn", "Trần", "Lê", "NV", "Bác sĩ"])
+
+
+def _date(days_back: int = 0) -> str:
+    return (dt.date.today() - dt.timedelta(days=days_back)).isoformat()
+
+
+# ---- customer ----
+def c_packages(ctx: Context, rnd: random.Random) -> Request:
+    return "GET", "/api/customer/packages", {}
+
+def c_services(ctx, rnd) -> Request:
+    return "GET", "/api/customer/services", {"ma_cn": rnd.choice(ctx.branches)}
+
+def c_search_products(ctx, rnd) -> Request:
+    return "GET", "/api/customer/products/search", {
+        "keyword": rnd.choice(["", "thuoc", "thức ăn", "vitamin", "do choi"]),
+        "ma_cn": rnd.choice(ctx.branches), "limit": 20,
+    }
+
+def c_pets(ctx, rnd) -> Request:
+    return "GET", "/api/customer/pets", {"ma_kh": rnd.choice(ctx.customers)[0]}
+
+def c_appointments(ctx, rnd) -> Request:
+    return "GET", "/api/customer/me/appointments", {"ma_kh": rnd.choice(ctx.customers)[0], "limit": 20}
+
+def c_purchases(ctx, rnd) -> Request:
+    return "GET", "/api/customer/me/purchases", {"ma_kh": rnd.choice(ctx.customers)[0], "limit": 20}
+
+def c_invoice_detail(ctx, rnd) -> Request:
+    hd, kh = rnd.choice(ctx.invoices)
+    return "GET", f"/api/customer/invoices/{hd}", {"ma_kh": kh}
+
+def c_add_to_cart(ctx, rnd) -> Request:
+    return "POST", "/api/customer/orders/products", {
+        "ma_kh": rnd.choice(ctx.customers)[0], "ma_sp": rnd.choice(ctx.products),
+        "so_luong": 1, "ma_cn": rnd.choice(ctx.branches),
+    }
+
+def c_book(ctx, rnd) -> Request:
+    kh, tc = rnd.choice(ctx.customers)
+    start = dt.datetime.now() + dt.timedelta(days=rnd.randint(1, 30), hours=rnd.randint(0, 9))
+    return "POST", "/api/customer/appointments", {
+        "ma_kh": kh, "ma_thu_cung": tc, "ma_dv": rnd.choice(ctx.services),
+        "ma_cn": rnd.choice(ctx.branches), "thoi_diem_bat_dau": start.strftime("%Y-%m-%dT%H:00:00"),
+    }
+
+
+# ---- receptionist ----
+def r_search_invoices(ctx, rnd) -> Request:
+    return "GET", "/api/staff/invoices", {
+        "from_date": _date(7), "to_date": _date(0), "ma_cn": rnd.choice(ctx.branches), "limit": 50,
+    }
+
+def r_invoice_detail(ctx, rnd) -> Request:
+    return "GET", f"/api/staff/invoices/{rnd.choice(ctx.invoices)[0]}", {}
+
+def r_bookings(ctx, rnd) -> Request:
+    return "GET", "/api/staff/bookings", {"ma_cn": rnd.choice(ctx.branches), "ma_dv": rnd.choice(ctx.services)}
+
+def r_exams_today(ctx, rnd) -> Request:
+    return "GET", "/api/staff/schedule/exams", {"date": _date(0), "ma_cn": rnd.choice(ctx.branches)}
+
+def r_vaccinations_today(ctx, rnd) -> Request:
+    return "GET", "/api/staff/schedule/vaccinations", {"date": _date(0), "ma_cn": rnd.choice(ctx.branches)}
+
+def r_inventory(ctx, rnd) -> Request:
+    return "GET", "/api/staff/inventory", {"ma_cn": rnd.choice(ctx.branches)}
+
+
+# ---- veterinarian ----
+def v_exam_history(ctx, rnd) -> Request:
+    return "GET", "/api/staff/history/exams", {"ma_thu_cung": rnd.choice(ctx.customers)[1]}
+
+def v_vaccine_history(ctx, rnd) -> Request:
+    return "GET", "/api/staff/history/vaccines", {"ma_thu_cung": rnd.choice(ctx.customers)[1]}
+
+def v_medicines(ctx, rnd) -> Request:
+    return "GET", "/api/staff/all-medicines", {}
+
+def v_vaccines(ctx, rnd) -> Request:
+    return "GET", "/api/staff/vaccines", {}
+
+def v_daily(ctx, rnd) -> Request:
+    return "GET", "/api/staff/history/daily-all", {"ma_cn": rnd.choice(ctx.branches), "date": _date(0)}
+
+
+# ---- company dashboard ----
+def _get(path: str) -> Callable[[Context, random.Random], Request]:
+    def action(ctx, rnd) -> Request:
+        return "GET", path, {}
+    return action
+
+def b_revenue(ctx, rnd) -> Request:
+    return "GET", f"/api/branch/{rnd.choice(ctx.branches)}/revenue", {"granularity": rnd.choice(["day", "month"])}
+
+def s_staff_search(ctx, rnd) -> Request:
+    return "GET", "/api/company/staff/search", {"keyword": rnd.choice(ctx.staff_keywords), "limit": 20}
+
+
+# label -> (action, weight) theo vai
+PERSONAS: Dict[str, Dict[str, Tuple[Callable, int]]] = {
+    "customer": {
+        "GET /customer/packages": (c_packages, 10),
+        "GET /customer/services": (c_services, 10),
+        "GET /customer/products/search": (c_search_products, 25),
+        "GET /customer/pets": (c_pets, 10),
+        "GET /customer/me/appointments": (c_appointments, 10),
+        "GET /customer/me/purchases": (c_purchases, 5),
+        "GET /customer/invoices/{ma_hoa_don}": (c_invoice_detail, 10),
+        "POST /customer/orders/products": (c_add_to_cart, 15),
+        "POST /customer/appointments": (c_book, 5),
+    },
+    "receptionist": {
+        "GET /staff/invoices": (r_search_invoices, 30),
+        "GET /staff/invoices/{ma_hoa_don}": (r_invoice_detail, 25),
+        "GET /staff/bookings": (r_bookings, 15),
+        "GET /staff/schedule/exams": (r_exams_today, 10),
+        "GET /staff/schedule/vaccinations": (r_vaccinations_today, 10),
+        "GET /staff/inventory": (r_inventory, 10),
+    },
+    "veterinarian": {
+        "GET /staff/history/exams": (v_exam_history, 30),
+        "GET /staff/history/vaccines": (v_vaccine_history, 20),
+        "GET /staff/all-medicines": (v_medicines, 20),
+        "GET /staff/vaccines": (v_vaccines, 10),
+        "GET /staff/history/daily-all": (v_daily, 20),
+    },
+    "company": {
+        "GET /company/revenue/by-branch": (_get("/api/company/revenue/by-branch"), 15),
+        "GET /company/revenue/total": (_get("/api/company/revenue/total"), 15),
+        "GET /company/services/top-revenue": (_get("/api/company/services/top-revenue"), 10),
+        "GET /company/memberships/distribution": (_get("/api/company/memberships/distribution"), 10),
+        "GET /company/customers/count-by-branch": (_get("/api/company/customers/count-by-branch"), 10),
+        "GET /company/pets/overall-stats": (_get("/api/company/pets/overall-stats"), 10),
+        "GET /branch/{ma_cn}/revenue": (b_revenue, 20),
+        "GET /company/staff/search": (s_staff_search, 10),
+    },
+}
+
+DEFAULT_MIX = {"customer": 60, "receptionist": 20, "veterinarian": 12, "company": 8}
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """"customer=60,company=40" -> {"customer": 60, "company": 40}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in PERSONAS:
+            raise ValueError(f"Vai không hợp lệ: {name!r} (có: {', '.join(PERSONAS)})")
+        mix[name] = int(weight or 1)
+    return mix
@@ -0,0 +1,201 @@
+# scripts/loadtest/seed.py
+"""
+Tăng quy mô dữ liệu cho load test: CHINHANH / NHANVIEN / KHACHHANG / THUCUNG / HOADON / PHIENDICHVU.
+
+    python -m scripts.loadtest.seed --branches 20 --customers 50000 --pets 2 --invoices 200000
+
+- Sinh bằng INSERT ... SELECT phía server theo lô (--chunk hóa đơn / transaction), không gửi từng dòng.
+- Chi nhánh 'LT0001'.., khách hàng có CCCD 'LT<run>-<i>' => chạy lại nhiều lần được, dữ liệu cộng dồn.
+- Mã KH / TC / HD / PD lấy từ sequence (DEFAULT của bảng, xem 009_wide_sequence_ids.sql).
+- Cần hàng triệu dòng / phân phối theo chi nhánh, dịch vụ: python -m scripts.datagen.run
+- Hóa đơn đã thanh toán, phiên CONFIRMED: trigger tính TongTien và bảng tổng hợp doanh thu như dữ liệu thật.
+"""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from app.db.session import ENGINE
+
+NUMBERS = """
+    SELECT TOP ({n}) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+    FROM sys.all_objects a CROSS JOIN sys.all_objects b CROSS JOIN sys.all_objects c
+"""
+
+BRANCHES = """
+SET NOCOUNT ON;
+
+;WITH n AS ({numbers})
+INSERT INTO CHINHANH (MaCN, TenCN, Diachi, SDT, Giomocua, Giodongcua)
+SELECT x.MaCN, N'Chi nhánh tải ' + CAST(n.i AS NVARCHAR(10)), N'Địa chỉ tải ' + CAST(n.i AS NVARCHAR(10)),
+       '09' + RIGHT('00000000' + CAST(n.i AS VARCHAR(8)), 8), '08:00', '20:00'
+FROM n
+CROSS APPLY (SELECT 'LT' + RIGHT('0000' + CAST(n.i AS VARCHAR(4)), 4) AS MaCN) x
+WHERE NOT EXISTS (SELECT 1 FROM CHINHANH c WHERE c.MaCN = x.MaCN);
+
+INSERT INTO CUNGCAPDICHVU (MaCN, MaDV)
+SELECT c.MaCN, d.MaDV
+FROM CHINHANH c CROSS JOIN DICHVU d
+WHERE c.MaCN LIKE 'LT%'
+  AND NOT EXISTS (SELECT 1 FROM CUNGCAPDICHVU x WHERE x.MaCN = c.MaCN AND x.MaDV = d.MaDV);
+
+INSERT INTO CHINHANH_SANPHAM (MaCN, MaSP, SoLuongTonKho)
+SELECT c.MaCN, s.MaSP, 1000000
+FROM CHINHANH c CROSS JOIN SANPHAM s
+WHERE c.MaCN LIKE 'LT%'
+  AND NOT EXISTS (SELECT 1 FROM CHINHANH_SANPHAM x WHERE x.MaCN = c.MaCN AND x.MaSP = s.MaSP);
+
+INSERT INTO CHINHANH_VACCINE (MaCN, MaVC, SoLuongTonKho)
+SELECT c.MaCN, v.MaVC, 1000000
+FROM CHINHANH c CROSS JOIN VACCINE v
+WHERE c.MaCN LIKE 'LT%'
+  AND NOT EXISTS (SELECT 1 FROM CHINHANH_VACCINE x WHERE x.MaCN = c.MaCN AND x.MaVC = v.MaVC);
+
+-- mỗi chi nhánh: 2 bác sĩ, 2 tiếp tân, 1 quản lí
+INSERT INTO NHANVIEN (HoTen, NgaySinh, GioiTinh, ChucVu, MaCN, Luong, Thuong)
+SELECT N'NV tải ' + c.MaCN + N' ' + r.ChucVu, '1990-01-01', N'Nữ', r.ChucVu, c.MaCN, 15000000, 0
+FROM CHINHANH c
+CROSS JOIN (VALUES (N'Bác sĩ thú y'), (N'Bác sĩ thú y'), (N'Tiếp tân'), (N'Tiếp tân'), (N'Quản lí')) r(ChucVu)
+WHERE c.MaCN LIKE 'LT%'
+  AND NOT EXISTS (SELECT 1 FROM NHANVIEN nv WHERE nv.MaCN = c.MaCN);
+"""
+
+CUSTOMERS = """
+SET NOCOUNT ON;
+
+CREATE TABLE #kh (MaKH VARCHAR(10) PRIMARY KEY);
+
+;WITH n AS ({numbers})
+INSERT INTO KHACHHANG (Hoten, CCCD, SDT, Email, Gioitinh, Ngaysinh)
+OUTPUT INSERTED.MaKH INTO #kh
+SELECT N'Khách tải ' + CAST(n.i + :offset AS NVARCHAR(10)),
+       'LT' + :run + '-' + CAST(n.i + :offset AS VARCHAR(10)),
+       '08' + RIGHT('00000000' + CAST(n.i + :offset AS VARCHAR(8)), 8),
+       'lt' + :run + '_' + CAST(n.i + :offset AS VARCHAR(10)) + '@example.com',
+       CASE WHEN n.i % 2 = 0 THEN N'Nam' ELSE N'Nữ' END,
+       DATEADD(DAY, -(7000 + n.i % 12000), CAST(GETDATE() AS DATE))
+FROM n;
+
+;WITH p AS ({pets})
+INSERT INTO THUCUNG (MaKH, Ten, Loai, Giong, NgaySinh, GioiTinh)
+SELECT k.MaKH, N'Pet ' + CAST(p.i AS NVARCHAR(5)),
+       CASE WHEN ABS(CHECKSUM(k.MaKH, p.i)) % 3 = 0 THEN N'Mèo' ELSE N'Chó' END,
+       N'Lai', DATEADD(DAY, -(200 + ABS(CHECKSUM(k.MaKH, p.i)) % 4000), CAST(GETDATE() AS DATE)),
+       CASE WHEN p.i % 2 = 0 THEN N'Đực' ELSE N'Cái' END
+FROM #kh k CROSS JOIN p;
+
+DROP TABLE #kh;
+"""
+
+INVOICES = """
+SET NOCOUNT ON;
+
+-- khách / nhân viên / dịch vụ đánh số để chọn ngẫu nhiên bằng phép chia dư
+SELECT ROW_NUMBER() OVER (ORDER BY k.MaKH) AS rn, k.MaKH, t.MaThuCung
+INTO #kh
+FROM KHACHHANG k
+CROSS APPLY (SELECT TOP 1 MaThuCung FROM THUCUNG WHERE MaKH = k.MaKH ORDER BY MaThuCung) t
+WHERE k.CCCD LIKE 'LT%';
+
+SELECT ROW_NUMBER() OVER (ORDER BY MaNV) AS rn, MaNV, MaCN
+INTO #nv
+FROM NHANVIEN
+WHERE MaCN LIKE 'LT%' AND ChucVu = N'Tiếp tân';
+
+SELECT ROW_NUMBER() OVER (ORDER BY MaDV) AS rn, MaDV, DonGia
+INTO #dv
+FROM DICHVU
+WHERE MaDV <> 'DV_RETAIL';
+
+DECLARE @nkh INT = (SELECT COUNT(*) FROM #kh), @nnv INT = (SELECT COUNT(*) FROM #nv), @ndv INT = (SELECT COUNT(*) FROM #dv);
+
+IF @nkh = 0 OR @nnv = 0 OR @ndv = 0
+    THROW 50090, N'Chưa có khách hàng / nhân viên LT hoặc dịch vụ: chạy seed với --branches, --customers trước', 1;
+
+;WITH n AS ({numbers})
+SELECT n.i,
+       1 + ABS(CHECKSUM(NEWID())) % @nkh AS rkh,
+       1 + ABS(CHECKSUM(NEWID())) % @nnv AS rnv,
+       ABS(CHECKSUM(NEWID())) % (:days * 1440) AS phut,
+       1 + ABS(CHECKSUM(NEWID())) % :max_sessions AS so_phien
+INTO #n
+FROM n;
+
+CREATE TABLE #hd (MaHoaDon VARCHAR(10) PRIMARY KEY, MaKH VARCHAR(10), NhanVienLap VARCHAR(10), NgayLap DATETIME);
+
+INSERT INTO HOADON (NgayLap, NhanVienLap, MaKH, TongTien, KhuyenMai, HinhThucThanhToan)
+OUTPUT INSERTED.MaHoaDon, INSERTED.MaKH, INSERTED.NhanVienLap, INSERTED.NgayLap INTO #hd
+SELECT DATEADD(MINUTE, -n.phut, GETDATE()), nv.MaNV, kh.MaKH, 0, 0,
+       CASE WHEN n.i % 3 = 0 THEN N'Tiền mặt' ELSE N'Chuyển khoản' END
+FROM #n n
+JOIN #kh kh ON kh.rn = n.rkh
+JOIN #nv nv ON nv.rn = n.rnv;
+
+;WITH s AS ({sessions})
+INSERT INTO PHIENDICHVU (MaHoaDon, MaThuCung, MaDV, MaCN, GiaTien, TrangThai, ThoiDiemBatDau, ThoiDiemKetThuc)
+SELECT h.MaHoaDon, kh.MaThuCung, dv.MaDV, nv.MaCN, dv.DonGia, N'CONFIRMED',
+       h.NgayLap, DATEADD(MINUTE, 30, h.NgayLap)
+FROM (SELECT h.*, ROW_NUMBER() OVER (ORDER BY h.MaHoaDon) AS rn FROM #hd h) h
+JOIN #n n ON n.i = h.rn
+JOIN #kh kh ON kh.MaKH = h.MaKH
+JOIN #nv nv ON nv.MaNV = h.NhanVienLap
+JOIN s ON s.i <= n.so_phien
+JOIN #dv dv ON dv.rn = 1 + ABS(CHECKSUM(h.MaHoaDon, s.i)) % @ndv;
+
+DROP TABLE #n; DROP TABLE #hd; DROP TABLE #kh; DROP TABLE #nv; DROP TABLE #dv;
+"""
+
+
+def _numbers(n: int) -> str:
+    return NUMBERS.format(n=int(n))
+
+
+def _chunks(total: int, size: int):
+    done = 0
+    while done < total:
+        n = min(size, total - done)
+        yield done, n
+        done += n
+
+
+def seed(branches: int, customers: int, pets: int, invoices: int, max_sessions: int, days: int, chunk: int):
+    run = format(int(time.time()), "x")[-6:]  # phân biệt CCCD / email giữa các lần chạy
+    start = time.perf_counter()
+
+    if branches:
+        with ENGINE.begin() as conn:
+            conn.execute(text(BRANCHES.format(numbers=_numbers(branches))))
+        print(f"branches: LT0001..LT{branches:04d}")
+
+    for offset, n in _chunks(customers, chunk):
+        with ENGINE.begin() as conn:
+            conn.execute(
+                text(CUSTOMERS.format(numbers=_numbers(n), pets=_numbers(pets))),
+                {"run": run, "offset": offset},
+            )
+        print(f"customers: {offset + n:,}/{customers:,} (+{pets} pets each)")
+
+    for offset, n in _chunks(invoices, chunk):
+        t0 = time.perf_counter()
+        with ENGINE.begin() as conn:
+            conn.execute(
+                text(INVOICES.format(numbers=_numbers(n), sessions=_numbers(max_sessions))),
+                {"days": days, "max_sessions": max_sessions},
+            )
+        print(f"invoices: {offset + n:,}/{invoices:,} ({n / (time.perf_counter() - t0):,.0f}/s)")
+
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu tải cho PetCareX")
+    parser.add_argument("--branches", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--pets", type=int, default=2, help="thú cưng mỗi khách")
+    parser.add_argument("--invoices", type=int, default=50000)
+    parser.add_argument("--max-sessions", type=int, default=3, help="số phiên tối đa mỗi hóa đơn")
+    parser.add_argument("--days", type=int, default=365, help="NgayLap rải trong N ngày gần nhất")
+    parser.add_argument("--chunk", type=int, default=20000, help="số dòng mỗi transaction")
+    args = parser.parse_args()
+
+    seed(args.branches, args.customers, args.pets, args.invoices, args.max_sessions, args.days, args.chunk)
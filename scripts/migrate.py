@@ -0,0 +1,39 @@
+# scripts/migrate.py
+"""
+Chạy migration ngoài app (deploy / CI), trước khi start các worker với MIGRATE_ON_STARTUP=skip.
+
+    python -m scripts.migrate            # chạy file pending
+    python -m scripts.migrate --status   # chỉ liệt kê, không chạy
+    python -m scripts.migrate --strict   # lỗi nếu file đã chạy bị sửa
+
+Exit code 1 nếu migration lỗi, hoặc --status thấy file pending / bị sửa.
+"""
+import argparse
+import sys
+
+from app.db.migrate import MigrationError, migrate, migration_status
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Chạy migrations/*.sql")
+    parser.add_argument("--status", action="store_true", help="chỉ in trạng thái")
+    parser.add_argument("--strict", action="store_true", help="dừng nếu file đã chạy bị sửa")
+    args = parser.parse_args()
+
+    if args.status:
+        status = migration_status()
+        for key in ("applied", "changed", "pending"):
+            for name in status[key]:
+                print(f"{key:8} {name}")
+        return 1 if status["pending"] or status["changed"] else 0
+
+    try:
+        migrate(strict=args.strict)
+    except MigrationError as e:
+        print("ERROR:", e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
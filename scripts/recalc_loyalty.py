@@ -0,0 +1,26 @@
+# scripts/recalc_loyalty.py
+"""
+Tính lại điểm tích luỹ / hạng hội viên và bảng đếm THANHVIEN_BAC từ HOADON (xem 010_loyalty.sql).
+Cần chạy sau khi nạp dữ liệu với trigger tắt (scripts.datagen, bcp); chạy qua API thì trigger tự cập nhật.
+
+    python -m scripts.recalc_loyalty
+"""
+import time
+
+from sqlalchemy import text
+
+from app.db.session import ENGINE
+
+
+def recalc() -> None:
+    with ENGINE.begin() as conn:
+        conn.execute(text("EXEC dbo.sp_TinhLaiTichLuy"))
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    recalc()
+    with ENGINE.connect() as conn:
+        rows = conn.execute(text("SELECT Bac, SoLuong FROM THANHVIEN_BAC ORDER BY Bac")).all()
+    print(f"Recalculated loyalty in {time.perf_counter() - start:.1f}s:",
+          ", ".join(f"{r.Bac}={r.SoLuong}" for r in rows))
@@ -0,0 +1,55 @@
+# tests/test_statement_budgets.py
+"""
+Budget số câu SQL cho mọi route có Depends(statement_budget(n)), chạy trên SQL Server local:
+
+    docker compose up -d db && python -m scripts.migrate
+    python -m pytest tests/test_statement_budgets.py
+
+Route đọc dùng dữ liệu có sẵn (scripts.check_statement_budgets.sample_params); route ghi
+(claim-next, start) chạy trên chi nhánh tổng hợp của scripts.bench_claim, xoá sau khi xong.
+Không kết nối được DB => skip.
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)  # cả khi thiếu libodbc
+
+from sqlalchemy.exc import DBAPIError  # noqa: E402
+
+from scripts import bench_claim  # noqa: E402
+from scripts import check_statement_budgets as budgets  # noqa: E402
+
+ROUTES = list(budgets.budgeted_routes())
+
+
+@pytest.fixture(scope="module")
+def read_params():
+    try:
+        return budgets.sample_params()
+    except DBAPIError as e:
+        pytest.skip(f"Không kết nối được SQL Server: {e.orig}")
+
+
+@pytest.fixture(scope="module")
+def write_params(read_params):
+    # 2 phiên IN_SERVICE: claim-next lấy phiên hẹn sớm nhất, start nhận phiên còn lại
+    ids = sorted(bench_claim.seed(2))
+    try:
+        yield {**read_params, "ma_cn": bench_claim.MA_CN, "ma_dv": bench_claim.MA_DV, "ma_phien": ids[-1]}
+    finally:
+        bench_claim.cleanup()
+
+
+@pytest.mark.parametrize(
+    "route,limit", ROUTES, ids=[f"{budgets.route_method(r)} {r.path}" for r, _ in ROUTES]
+)
+def test_statement_budget(route, limit, request):
+    fixture = "read_params" if budgets.is_read_only(route) else "write_params"
+    params = request.getfixturevalue(fixture)
+
+    status, count = asyncio.run(budgets.call_route(route, params))
+
+    assert 200 <= status < 300, f"{route.path} trả {status}: budget chưa được chạy tới"
+    assert count is not None, "thiếu header Server-Timing (METRICS_ENABLED?)"
+    assert count <= limit, f"{route.path}: {count} câu SQL > budget {limit}"